@@ -1,6 +1,51 @@
 // backend/controllers/mlController.js
+const http = require("http");
 const fetch = require("node-fetch");
 
+const ML_SERVICE_URL = process.env.ML_SERVICE_URL || "http://localhost:8001";
+
+// One pool of persistent connections to the ML service instead of a new
+// TCP connection per user call. Idle sockets are dropped after `timeout`,
+// which must stay below the service's keep-alive timeout (ML_KEEP_ALIVE_S,
+// 30 s by default) so we never reuse a socket the service just closed.
+const mlAgent = new http.Agent({
+  keepAlive: true,
+  keepAliveMsecs: 1000,
+  maxSockets: Number(process.env.ML_MAX_SOCKETS || 32),
+  maxFreeSockets: 8,
+  timeout: 10000,
+});
+
+// Identical requests already in flight share one call: key -> Promise of the
+// parsed ML response. Entries are removed as soon as the call settles, so
+// this coalesces bursts and never serves stale results.
+const inFlight = new Map();
+
+function fetchMl(path, payload) {
+  const body = JSON.stringify(payload);
+  const key = `${path} ${body}`;
+  let pending = inFlight.get(key);
+  if (!pending) {
+    pending = fetch(`${ML_SERVICE_URL}${path}`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body,
+      agent: mlAgent,
+    })
+      .then(async (mlRes) => {
+        if (!mlRes.ok) {
+          const err = new Error(`ML service status ${mlRes.status}`);
+          err.status = mlRes.status;
+          throw err;
+        }
+        return mlRes.json();
+      })
+      .finally(() => inFlight.delete(key));
+    inFlight.set(key, pending);
+  }
+  return pending;
+}
+
 // Map recipe_class -> human-readable treatment process
 const RECIPE_MAP = {
   recipe_1: {
@@ -64,19 +109,15 @@ async function getMlRecommendation(req, res) {
       intended_reuse: intendedReuse || "Irrigation",
     };
 
-    const mlRes = await fetch("http://localhost:8001/predict", {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(payload),
-    });
-
-    if (!mlRes.ok) {
-      console.error("ML service status:", mlRes.status);
+    let mlData;
+    try {
+      mlData = await fetchMl("/predict", payload);
+    } catch (err) {
+      if (!err.status) throw err;
+      console.error("ML service status:", err.status);
       return res.status(500).json({ message: "ML service error" });
     }
 
-    const mlData = await mlRes.json();
-
     const recipeKey = mlData.recipe_class;
     const recipeMeta = RECIPE_MAP[recipeKey] || {
       label: "Unknown recipe",
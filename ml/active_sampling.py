@@ -0,0 +1,388 @@
+"""
+Active sampling: build each type's training set from the generator a batch
+at a time, putting the rows where the models are unsure instead of drawing
+800-1000 rows uniformly.
+
+The generators label any inputs (generate_typeN(inputs=...)), so the
+generator is the oracle. Per plant type:
+
+  1. A uniform holdout (--holdout rows, fixed seed) and a small uniform
+     start set (--initial rows) are generated.
+  2. Every round fits the times / equipment / cost forests on the current
+     rows (the train_all_models.py recipe, --trees trees each) and scores
+     them on the holdout: stage-time MAE, equipment error rate (mean over
+     stages) and cost MAE.
+  3. The next --batch rows come from three sources (--mix):
+       boundary      pairs of training rows whose equipment differs are
+                     bisected with the oracle (--bisect steps), which lands
+                     on the generator's rule thresholds (turbidity < 10,
+                     flow_m3_day < 1000, BOD < 200, TDS < 2500, ...),
+                     including the ones on derived indices
+       disagreement  the candidates of a uniform pool (--pool-factor ×
+                     batch) with the least tree agreement: half by
+                     equipment vote margin, half by the spread of the
+                     trees' stage times and cost
+       uniform       plain generator draws, so no region goes unsampled
+  4. Stop when no holdout metric has improved by --min-delta (relative)
+     for --patience rounds, or at --max-rows.
+
+The report compares every type with the production models (400 trees on
+80% of the generator CSV) and with forests of the same size fitted on the
+same number of uniform rows, all on the same holdout. Stage times carry
+the generator's own noise (uniform base times), so their MAE flattens
+within a few hundred rows whatever the sampling; the equipment thresholds
+are where the selected rows pay off.
+
+Outputs in --out-dir (default active_sampling/), nothing in ml/ is replaced:
+  type<N>.csv   the selected rows, in the generator's CSV format
+  report.json   rounds, final metrics, row/tree/size comparison
+  model_type<N>_{times,equipment,cost}.joblib   with --save-models
+
+Usage (from ml/):
+  python active_sampling.py
+  python active_sampling.py --types 1 4 --trees 100 --batch 100 --save-models
+"""
+
+import argparse
+import io
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+from sklearn.multioutput import MultiOutputClassifier
+
+from golden import load_generators
+from plant_schema import (
+    COST_COL,
+    CSV_BY_TYPE,
+    EQUIP_COLS_BY_TYPE,
+    FEATURE_COLS,
+    HEAVY_METALS_P_BY_TYPE,
+    INPUT_BOUNDS_BY_TYPE,
+    TIME_COLS_BY_TYPE,
+    TYPE_IDS,
+    compact_classes,
+    encode_equipment,
+    validate_design_frame,
+)
+from thread_control import load_model, set_n_jobs
+
+
+OUT_DIR = "active_sampling"
+TREES = 100
+INITIAL_ROWS = 100
+BATCH_ROWS = 100
+MAX_ROWS = 1500
+HOLDOUT_ROWS = 2000
+HOLDOUT_SEED = 5000
+POOL_FACTOR = 20
+BISECT_STEPS = 8
+PATIENCE = 2
+MIN_DELTA = 0.05
+MIX = (0.1, 0.6, 0.3)  # boundary, disagreement, uniform
+PRODUCTION_TREES = 400
+METRICS = ("time_mae", "equip_error", "cost_mae")
+HM = FEATURE_COLS.index("heavy_metals")
+
+
+# ---------------------- ORACLE ----------------------
+
+class Oracle:
+    """Labels inputs with one type's generator; every call gets fresh noise."""
+
+    def __init__(self, generators, type_id: int, seed: int):
+        self.generate = getattr(generators, f"generate_type{type_id}")
+        self.type_id = type_id
+        self.seed = seed
+        self.calls = 0
+
+    def __call__(self, X: np.ndarray) -> pd.DataFrame:
+        self.calls += 1
+        return self.generate(inputs=X, random_state=self.seed + self.calls)
+
+    def equipment(self, X: np.ndarray) -> np.ndarray:
+        """(n, n_stages) equipment codes of the inputs (deterministic in the inputs)."""
+        df = self(X)
+        return encode_equipment(self.type_id, df[EQUIP_COLS_BY_TYPE[self.type_id]].values)
+
+
+def draw_inputs(type_id: int, n: int, rng) -> np.ndarray:
+    """n uniform inputs from the generator's ranges (heavy_metals ~ Bernoulli)."""
+    bounds = INPUT_BOUNDS_BY_TYPE[type_id]
+    X = bounds[:, 0] + rng.random((n, len(FEATURE_COLS))) * (bounds[:, 1] - bounds[:, 0])
+    X[:, HM] = rng.random(n) < HEAVY_METALS_P_BY_TYPE[type_id]
+    return X
+
+
+def frame(X: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame(X, columns=FEATURE_COLS)
+
+
+def split_frame(type_id: int, df: pd.DataFrame):
+    """X, stage times, equipment codes, cost of a generator frame."""
+    return (
+        df[FEATURE_COLS].to_numpy(dtype=np.float64),
+        df[TIME_COLS_BY_TYPE[type_id]].to_numpy(dtype=np.float64),
+        encode_equipment(type_id, df[EQUIP_COLS_BY_TYPE[type_id]].values),
+        df[COST_COL].to_numpy(dtype=np.float64),
+    )
+
+
+# ---------------------- MODELS ----------------------
+
+def fit_models(type_id: int, df: pd.DataFrame, trees: int) -> dict:
+    """Times / equipment / cost forests as train_all_models.py fits them."""
+    X, times, equip, cost = split_frame(type_id, df)
+    X = frame(X)
+    time_model = RandomForestRegressor(n_estimators=trees, random_state=42, n_jobs=-1)
+    time_model.fit(X, times)
+    equip_model = MultiOutputClassifier(
+        RandomForestClassifier(n_estimators=trees, random_state=42, n_jobs=-1)
+    )
+    equip_model.fit(X, equip)
+    compact_classes(equip_model)
+    cost_model = RandomForestRegressor(n_estimators=trees, random_state=42, n_jobs=-1)
+    cost_model.fit(X, cost)
+    return {"times": time_model, "equipment": equip_model, "cost": cost_model}
+
+
+def evaluate(models: dict, holdout: tuple) -> dict:
+    X, times, equip, cost = holdout
+    X = frame(X)
+    equip_pred = np.asarray(models["equipment"].predict(X))
+    return {
+        "time_mae": float(np.abs(models["times"].predict(X) - times).mean()),
+        "equip_error": float((equip_pred != equip).mean()),
+        "cost_mae": float(np.abs(models["cost"].predict(X) - cost).mean()),
+    }
+
+
+def model_bytes(models: dict) -> int:
+    total = 0
+    for model in models.values():
+        buf = io.BytesIO()
+        joblib.dump(set_n_jobs(model, None), buf)
+        total += buf.tell()
+    return total
+
+
+def production_models(type_id: int):
+    paths = {kind: f"model_type{type_id}_{kind}.joblib" for kind in ("times", "equipment", "cost")}
+    if not all(os.path.exists(p) for p in paths.values()):
+        return None
+    return {kind: load_model(p, n_jobs=-1) for kind, p in paths.items()}
+
+
+# ---------------------- ACQUISITION ----------------------
+
+def equipment_uncertainty(models: dict, X: np.ndarray) -> np.ndarray:
+    """1 - share of the majority vote, worst stage (0 = all trees agree)."""
+    probs = models["equipment"].predict_proba(frame(X))
+    return np.max([1.0 - p.max(axis=1) for p in probs], axis=0)
+
+
+def regression_spread(models: dict, X: np.ndarray, scale: np.ndarray) -> np.ndarray:
+    """Std of the per-tree stage times and cost, in holdout std units, mean over outputs."""
+    spreads = []
+    for kind in ("times", "cost"):
+        per_tree = np.stack([tree.predict(X) for tree in models[kind].estimators_])
+        std = per_tree.std(axis=0)
+        spreads.append(std.reshape(len(X), -1))
+    return (np.hstack(spreads) / scale).mean(axis=1)
+
+
+def by_disagreement(models, type_id, n, rng, scale, pool_factor: int) -> np.ndarray:
+    pool = draw_inputs(type_id, pool_factor * n, rng)
+    n_equip = (n + 1) // 2
+    first = np.argsort(-equipment_uncertainty(models, pool), kind="stable")[:n_equip]
+    rest = np.setdiff1d(np.arange(len(pool)), first)
+    spread = regression_spread(models, pool[rest], scale)
+    second = rest[np.argsort(-spread, kind="stable")[: n - n_equip]]
+    return pool[np.concatenate([first, second])]
+
+
+def by_boundary(oracle: Oracle, X: np.ndarray, equip: np.ndarray, n: int, rng,
+                steps: int) -> np.ndarray:
+    """
+    Bisect n random pairs of training rows with different equipment (same
+    heavy_metals) down to the threshold between them.
+    """
+    lo_idx = rng.integers(len(X), size=4 * n)
+    hi_idx = rng.integers(len(X), size=4 * n)
+    differ = (equip[lo_idx] != equip[hi_idx]).any(axis=1) & (X[lo_idx, HM] == X[hi_idx, HM])
+    lo_idx, hi_idx = lo_idx[differ][:n], hi_idx[differ][:n]
+    if not len(lo_idx):
+        return np.zeros((0, X.shape[1]))
+    lo, hi, lo_equip = X[lo_idx].copy(), X[hi_idx].copy(), equip[lo_idx]
+    for _ in range(steps):
+        mid = (lo + hi) / 2
+        same = (oracle.equipment(mid) == lo_equip).all(axis=1)
+        lo[same] = mid[same]
+        hi[~same] = mid[~same]
+    return (lo + hi) / 2
+
+
+def acquire(oracle, models, train: tuple, n: int, rng, scale, mix: tuple = MIX,
+            bisect: int = BISECT_STEPS, pool_factor: int = POOL_FACTOR) -> np.ndarray:
+    X, _, equip, _ = train
+    n_boundary = int(round(mix[0] * n))
+    n_disagree = int(round(mix[1] * n))
+    parts = [
+        by_boundary(oracle, X, equip, n_boundary, rng, bisect),
+        by_disagreement(models, oracle.type_id, n_disagree, rng, scale, pool_factor),
+    ]
+    # Pairs that could not be formed are made up with uniform rows
+    n_uniform = n - sum(len(p) for p in parts)
+    parts.append(draw_inputs(oracle.type_id, n_uniform, rng))
+    return np.vstack(parts)
+
+
+# ---------------------- LOOP ----------------------
+
+def plateaued(history: list, patience: int, min_delta: float) -> bool:
+    """No metric improved on its best by min_delta (relative) in the last patience rounds."""
+    if len(history) <= patience:
+        return False
+    best = {m: min(h[m] for h in history[:-patience]) for m in METRICS}
+    return not any(
+        h[m] < best[m] * (1 - min_delta) for h in history[-patience:] for m in METRICS
+    )
+
+
+def sample_type(generators, type_id: int, trees: int = TREES, initial: int = INITIAL_ROWS,
+                batch: int = BATCH_ROWS, max_rows: int = MAX_ROWS, holdout: int = HOLDOUT_ROWS,
+                mix: tuple = MIX, bisect: int = BISECT_STEPS, pool_factor: int = POOL_FACTOR,
+                patience: int = PATIENCE, min_delta: float = MIN_DELTA, seed: int = 0,
+                out_dir: str = OUT_DIR, save_models: bool = False) -> dict:
+    rng = np.random.default_rng(seed + type_id)
+    oracle = Oracle(generators, type_id, seed=seed * 1000 + type_id * 100_000)
+    holdout_rng = np.random.default_rng(HOLDOUT_SEED + type_id)
+    holdout_df = Oracle(generators, type_id, seed=HOLDOUT_SEED * 1000 + type_id)(
+        draw_inputs(type_id, holdout, holdout_rng)
+    )
+    holdout_split = split_frame(type_id, holdout_df)
+    scale = np.append(holdout_split[1].std(axis=0), holdout_split[3].std())
+    scale[scale == 0] = 1.0
+
+    df = oracle(draw_inputs(type_id, initial, rng))
+    history = []
+    t0 = time.perf_counter()
+    while True:
+        models = fit_models(type_id, df, trees)
+        metrics = evaluate(models, holdout_split)
+        history.append({"rows": len(df), **{m: round(v, 4) for m, v in metrics.items()}})
+        print(f"  [type {type_id}] {len(df):>5} rows: time MAE {metrics['time_mae']:.2f} min, "
+              f"equipment error {metrics['equip_error']:.4f}, "
+              f"cost MAE {metrics['cost_mae']:.2f} INR/m3")
+        if plateaued(history, patience, min_delta) or len(df) >= max_rows:
+            break
+        n = min(batch, max_rows - len(df))
+        rows = acquire(oracle, models, split_frame(type_id, df), n, rng, scale,
+                       mix, bisect, pool_factor)
+        df = pd.concat([df, oracle(rows)], ignore_index=True)
+    validate_design_frame(df, type_id)
+
+    result = {
+        "rows": len(df),
+        "rounds": len(history),
+        "oracle_calls": oracle.calls,
+        "elapsed_s": round(time.perf_counter() - t0, 1),
+        "trees": trees,
+        "model_bytes": model_bytes(models),
+        "metrics": history[-1],
+        "history": history,
+    }
+
+    # Same forests on as many uniform rows: what the sampling itself buys
+    uniform = oracle(draw_inputs(type_id, len(df), rng))
+    result["uniform_same_rows"] = {
+        "rows": len(uniform),
+        "trees": trees,
+        "metrics": {m: round(v, 4) for m, v in
+                    evaluate(fit_models(type_id, uniform, trees), holdout_split).items()},
+    }
+
+    production = production_models(type_id)
+    if production is not None:
+        n_csv = len(pd.read_csv(CSV_BY_TYPE[type_id]))
+        result["production"] = {
+            "rows": int(round(0.8 * n_csv)),
+            "trees": PRODUCTION_TREES,
+            "model_bytes": sum(
+                os.path.getsize(f"model_type{type_id}_{k}.joblib")
+                for k in ("times", "equipment", "cost")
+            ),
+            "metrics": {m: round(v, 4) for m, v in evaluate(production, holdout_split).items()},
+        }
+
+    os.makedirs(out_dir, exist_ok=True)
+    df.to_csv(os.path.join(out_dir, f"type{type_id}.csv"), index=False)
+    if save_models:
+        for kind, model in models.items():
+            path = os.path.join(out_dir, f"model_type{type_id}_{kind}.joblib")
+            joblib.dump(set_n_jobs(model, None), path)
+    return result
+
+
+def print_summary(report: dict):
+    print(f"\n{'type':>4} {'model':<12} {'rows':>6} {'trees':>6} {'MB':>7} "
+          f"{'time MAE':>9} {'equip err':>10} {'cost MAE':>9}")
+    for t, res in report["types"].items():
+        for name, row in (("active", res), ("uniform", res["uniform_same_rows"]),
+                          ("production", res.get("production"))):
+            if row is None:
+                continue
+            size = f"{row['model_bytes'] / 1e6:.1f}" if "model_bytes" in row else "-"
+            m = row["metrics"]
+            print(f"{t:>4} {name:<12} {row['rows']:>6} {row['trees']:>6} {size:>7} "
+                  f"{m['time_mae']:>9.2f} {m['equip_error']:>10.4f} {m['cost_mae']:>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Active sampling of generator training rows")
+    parser.add_argument("--types", type=int, nargs="+", default=TYPE_IDS)
+    parser.add_argument("--trees", type=int, default=TREES, help="trees per forest")
+    parser.add_argument("--initial", type=int, default=INITIAL_ROWS, help="uniform start rows")
+    parser.add_argument("--batch", type=int, default=BATCH_ROWS, help="rows added per round")
+    parser.add_argument("--max-rows", type=int, default=MAX_ROWS)
+    parser.add_argument("--holdout", type=int, default=HOLDOUT_ROWS, help="uniform holdout rows")
+    parser.add_argument("--mix", type=float, nargs=3, default=MIX,
+                        metavar=("BOUNDARY", "DISAGREEMENT", "UNIFORM"),
+                        help="shares of each batch by source")
+    parser.add_argument("--bisect", type=int, default=BISECT_STEPS,
+                        help="oracle bisection steps per boundary row")
+    parser.add_argument("--pool-factor", type=int, default=POOL_FACTOR,
+                        help="disagreement candidates per selected row")
+    parser.add_argument("--patience", type=int, default=PATIENCE)
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA,
+                        help="relative holdout improvement that counts as progress")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    parser.add_argument("--save-models", action="store_true")
+    args = parser.parse_args()
+    total = sum(args.mix)
+    args.mix = tuple(share / total for share in args.mix)
+
+    generators = load_generators()
+    report = {"settings": {k: v for k, v in vars(args).items() if k != "types"}, "types": {}}
+    for type_id in args.types:
+        print(f"\n=== Active sampling TYPE {type_id} ===")
+        report["types"][str(type_id)] = sample_type(
+            generators, type_id, args.trees, args.initial, args.batch, args.max_rows,
+            args.holdout, args.mix, args.bisect, args.pool_factor, args.patience,
+            args.min_delta, args.seed, args.out_dir, args.save_models,
+        )
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    with open(os.path.join(args.out_dir, "report.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    print_summary(report)
+    print(f"\nSaved: {args.out_dir}/type<N>.csv, {args.out_dir}/report.json")
+
+
+if __name__ == "__main__":
+    main()
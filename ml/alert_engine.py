@@ -0,0 +1,423 @@
+"""
+Vectorized threshold alert engine for SensorReading batches.
+
+Mirrors the fields of backend/models/SensorReading.js:
+  - ph, turbidity (NTU), tds (ppm), temperature (°C), ecoliCount
+  - tankLevel (%), recoveryUnitStatus ("online" / "offline" / "maintenance")
+
+Rules are compiled per location into threshold matrices, so a whole
+ingestion batch is evaluated with a handful of NumPy operations:
+
+  values (n_readings × n_rules)  vs  trip/clear thresholds gathered by location
+
+Each rule has a trip threshold and a clear threshold (hysteresis). A rule
+stays active until a reading crosses the clear threshold, and an Alert is only
+emitted on the inactive → active edge, so repeated bad readings from the same
+location do not flood the Alert collection. Active state is carried between
+batches per location.
+
+Emitted records match backend/models/Alert.js and can be written with a single
+insert_many() call. Locations keep the ObjectId they came with (state is
+keyed by its string form), and insert_alerts() sets createdAt/updatedAt
+itself, since insert_many() bypasses the mongoose timestamps.
+"""
+
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+import time
+
+import numpy as np
+
+
+# ---------------------- SENSOR READING SCHEMA ----------------------
+
+NUMERIC_FIELDS = [
+    "ph",
+    "turbidity",
+    "tds",
+    "temperature",
+    "ecoliCount",
+    "tankLevel",
+]
+
+RECOVERY_STATUSES = ["online", "offline", "maintenance"]
+
+# Alert.js enums
+SEVERITIES = ["low", "medium", "high", "critical"]
+ALERT_TYPES = ["water_quality", "system_failure", "health_risk"]
+
+
+# ---------------------- RULES ----------------------
+
+@dataclass(frozen=True)
+class Rule:
+    """
+    One threshold rule.
+
+    op:
+      "above"  – trips when value > threshold, clears when value <= threshold - hysteresis
+      "below"  – trips when value < threshold, clears when value >= threshold + hysteresis
+      "equals" – trips when field == threshold (recoveryUnitStatus), clears otherwise
+    """
+    name: str
+    field: str
+    op: str
+    threshold: object
+    hysteresis: float
+    severity: str
+    alert_type: str
+    message: str
+
+
+DEFAULT_RULES = [
+    Rule("ph_low", "ph", "below", 6.5, 0.1, "medium", "water_quality",
+         "pH too low ({value:.2f}, limit {threshold})"),
+    Rule("ph_high", "ph", "above", 8.5, 0.1, "medium", "water_quality",
+         "pH too high ({value:.2f}, limit {threshold})"),
+    Rule("turbidity_high", "turbidity", "above", 5.0, 0.5, "high", "water_quality",
+         "Turbidity above limit ({value:.1f} NTU, limit {threshold} NTU)"),
+    Rule("tds_high", "tds", "above", 500.0, 25.0, "medium", "water_quality",
+         "TDS above limit ({value:.0f} ppm, limit {threshold} ppm)"),
+    Rule("ecoli_present", "ecoliCount", "above", 0.0, 0.0, "critical", "health_risk",
+         "E. coli detected ({value:.0f} CFU/100ml)"),
+    Rule("tank_low", "tankLevel", "below", 20.0, 5.0, "low", "system_failure",
+         "Tank level low ({value:.0f}%, limit {threshold}%)"),
+    Rule("recovery_offline", "recoveryUnitStatus", "equals", "offline", 0.0, "high",
+         "system_failure", "Recovery unit went offline"),
+    Rule("recovery_maintenance", "recoveryUnitStatus", "equals", "maintenance", 0.0,
+         "low", "system_failure", "Recovery unit entered maintenance"),
+]
+
+
+def compile_thresholds(rule: Rule):
+    """
+    Return (sign, trip, clear) so that, for any rule,
+      tripped  <=> sign * value >  sign * trip
+      cleared  <=> sign * value <= sign * clear
+    "equals" rules are evaluated on a 0/1 match column.
+    """
+    if rule.op == "above":
+        return 1.0, float(rule.threshold), float(rule.threshold) - rule.hysteresis
+    if rule.op == "below":
+        return -1.0, float(rule.threshold), float(rule.threshold) + rule.hysteresis
+    if rule.op == "equals":
+        return 1.0, 0.5, 0.5
+    raise ValueError(f"Unknown rule op: {rule.op}")
+
+
+# ---------------------- BATCH INPUT ----------------------
+
+def epoch_seconds(created) -> float:
+    """
+    createdAt as epoch seconds. pymongo returns naive datetimes holding UTC
+    (unless the client has tz_aware=True); they are read as UTC, not local time.
+    """
+    if created is None:
+        return np.nan
+    if isinstance(created, datetime):
+        if created.tzinfo is None:
+            created = created.replace(tzinfo=timezone.utc)
+        return created.timestamp()
+    return created
+
+
+def batch_from_records(records):
+    """
+    Convert SensorReading documents (dicts) into a columnar batch.
+
+    Accepts both the Mongo field "location" and the POST body field "locationId";
+    the value is kept as-is (ObjectId or string).
+    Missing numeric fields become NaN (rules on them neither trip nor clear).
+    Timestamps are taken from "createdAt" (datetime or epoch seconds, naive
+    datetimes as UTC) when present;
+    a reading without one in such a batch gets a NaN timestamp and is dropped by
+    AlertEngine.evaluate.
+    """
+    n = len(records)
+    location = np.empty(n, dtype=object)
+    location[:] = [r.get("location", r.get("locationId")) for r in records]
+    batch = {"location": location}
+    for field in NUMERIC_FIELDS:
+        col = [r.get(field) for r in records]
+        batch[field] = np.array(
+            [np.nan if v is None else v for v in col], dtype=np.float64
+        )
+
+    status_index = {s: i for i, s in enumerate(RECOVERY_STATUSES)}
+    batch["recoveryUnitStatus"] = np.array(
+        [status_index.get(r.get("recoveryUnitStatus"), -1) for r in records],
+        dtype=np.int8,
+    )
+
+    created = [r.get("createdAt") for r in records]
+    if any(c is not None for c in created):
+        batch["timestamp"] = np.array([epoch_seconds(c) for c in created], dtype=np.float64)
+    else:
+        batch["timestamp"] = np.full(n, time.time())
+    return batch
+
+
+# ---------------------- ENGINE ----------------------
+
+class AlertEngine:
+    """
+    Evaluate SensorReading batches against per-location threshold rules.
+
+    Per-location overrides are given as {rule_name: threshold} or
+    {rule_name: {"threshold": ..., "hysteresis": ...}}.
+    """
+
+    def __init__(self, rules=None, cooldown_s: float = 0.0):
+        self.rules = list(rules or DEFAULT_RULES)
+        self.cooldown_s = cooldown_s
+
+        self._rule_index = {r.name: i for i, r in enumerate(self.rules)}
+        self._location_index = {}
+        self._location_ids = []
+        self._overrides = {}
+
+        n_rules = len(self.rules)
+        compiled = [compile_thresholds(r) for r in self.rules]
+        self._sign = np.array([c[0] for c in compiled])
+        self._default_trip = np.array([c[1] for c in compiled])
+        self._default_clear = np.array([c[2] for c in compiled])
+
+        # Per-location state, grown as new locations show up
+        self._trip = np.empty((0, n_rules))
+        self._clear = np.empty((0, n_rules))
+        self._active = np.zeros((0, n_rules), dtype=bool)
+        self._last_alert_ts = np.full((0, n_rules), -np.inf)
+
+    # ----- locations -----
+
+    def _location_codes(self, locations: np.ndarray) -> np.ndarray:
+        uniques, first, inverse = np.unique(
+            locations.astype(str), return_index=True, return_inverse=True
+        )
+        uniques = uniques.tolist()
+        codes = np.empty(len(uniques), dtype=np.int64)
+        new = []
+        for i, loc in enumerate(uniques):
+            code = self._location_index.get(loc)
+            if code is None:
+                code = len(self._location_ids)
+                self._location_index[loc] = code
+                # Alerts reference the location as it arrived (ObjectId from Mongo)
+                self._location_ids.append(locations[first[i]])
+                new.append(loc)
+            codes[i] = code
+        if new:
+            self._grow(len(new))
+            for loc in new:
+                if loc in self._overrides:
+                    self._apply_overrides(loc)
+        return codes[inverse]
+
+    def _grow(self, n_new: int):
+        n_rules = len(self.rules)
+        self._trip = np.vstack([self._trip, np.tile(self._default_trip, (n_new, 1))])
+        self._clear = np.vstack([self._clear, np.tile(self._default_clear, (n_new, 1))])
+        self._active = np.vstack([self._active, np.zeros((n_new, n_rules), dtype=bool)])
+        self._last_alert_ts = np.vstack(
+            [self._last_alert_ts, np.full((n_new, n_rules), -np.inf)]
+        )
+
+    def set_location_rules(self, location_id, overrides: dict):
+        """Override thresholds for one location (applied now or on first sighting)."""
+        location_id = str(location_id)
+        for name in overrides:
+            if name not in self._rule_index:
+                raise KeyError(f"Unknown rule: {name}")
+        self._overrides.setdefault(location_id, {}).update(overrides)
+        if location_id in self._location_index:
+            self._apply_overrides(location_id)
+
+    def _apply_overrides(self, location_id: str):
+        code = self._location_index[location_id]
+        for name, spec in self._overrides[location_id].items():
+            i = self._rule_index[name]
+            rule = self.rules[i]
+            if isinstance(spec, dict):
+                rule = replace(rule, **spec)
+            else:
+                rule = replace(rule, threshold=spec)
+            _, self._trip[code, i], self._clear[code, i] = compile_thresholds(rule)
+
+    # ----- evaluation -----
+
+    def _value_matrix(self, batch: dict) -> np.ndarray:
+        status = batch.get("recoveryUnitStatus")
+        status_index = {s: i for i, s in enumerate(RECOVERY_STATUSES)}
+        n = len(batch["location"])
+        values = np.empty((n, len(self.rules)))
+        for i, rule in enumerate(self.rules):
+            if rule.op == "equals":
+                if status is None:
+                    values[:, i] = np.nan
+                    continue
+                target = status_index[rule.threshold]
+                col = (status == target).astype(np.float64)
+                col[status < 0] = np.nan
+                values[:, i] = col
+            else:
+                values[:, i] = batch.get(rule.field, np.full(n, np.nan))
+        return values
+
+    def evaluate(self, batch: dict):
+        """
+        Evaluate a columnar batch (see batch_from_records) and return the list
+        of Alert records for rules that became active in this batch.
+        Readings without a timestamp (NaN) cannot be ordered and are dropped.
+        """
+        keep = np.isfinite(np.asarray(batch["timestamp"], dtype=np.float64))
+        if not keep.all():
+            batch = {k: np.asarray(v)[keep] for k, v in batch.items()}
+        n = len(batch["location"])
+        if n == 0:
+            return []
+
+        loc = self._location_codes(batch["location"])
+        ts = np.asarray(batch["timestamp"], dtype=np.float64)
+
+        # Group readings per location in arrival order
+        order = np.lexsort((ts, loc))
+        loc = loc[order]
+        ts = ts[order]
+        values = self._value_matrix(batch)[order]
+
+        signed = values * self._sign
+        tripped = signed > (self._trip[loc] * self._sign)
+        cleared = signed <= (self._clear[loc] * self._sign)
+        # 1 = trip, 0 = clear, -1 = hold (NaN or inside the hysteresis band)
+        event = np.where(tripped, 1, np.where(cleared, 0, -1)).astype(np.int8)
+
+        group_start = np.empty(n, dtype=bool)
+        group_start[0] = True
+        group_start[1:] = loc[1:] != loc[:-1]
+
+        # Forward-fill the last trip/clear event inside each location group.
+        rows = np.arange(n)[:, None]
+        defined = event >= 0
+        last = np.where(defined | group_start[:, None], rows, 0)
+        np.maximum.accumulate(last, axis=0, out=last)
+
+        # Rows with no event since the group start keep the carried-in state
+        carried = self._active[loc]
+        filled = event[last, np.arange(len(self.rules))]
+        state = np.where(filled >= 0, filled == 1, carried)
+
+        prev = np.empty_like(state)
+        prev[1:] = state[:-1]
+        prev[group_start] = carried[group_start]
+        rising = state & ~prev
+
+        # Carry the final state of each location into the next batch
+        group_end = np.empty(n, dtype=bool)
+        group_end[-1] = True
+        group_end[:-1] = group_start[1:]
+        self._active[loc[group_end]] = state[group_end]
+
+        return self._emit(rising, loc, ts, values)
+
+    def _emit(self, rising, loc, ts, values):
+        r_idx, k_idx = np.nonzero(rising)
+        if self.cooldown_s > 0 and len(r_idx):
+            keep = np.ones(len(r_idx), dtype=bool)
+            for j, (r, k) in enumerate(zip(r_idx, k_idx)):
+                code = loc[r]
+                if ts[r] - self._last_alert_ts[code, k] < self.cooldown_s:
+                    keep[j] = False
+                else:
+                    self._last_alert_ts[code, k] = ts[r]
+            r_idx, k_idx = r_idx[keep], k_idx[keep]
+        else:
+            self._last_alert_ts[loc[r_idx], k_idx] = ts[r_idx]
+
+        alerts = []
+        for r, k in zip(r_idx, k_idx):
+            rule = self.rules[k]
+            code = loc[r]
+            threshold = rule.threshold
+            if rule.op != "equals":
+                threshold = self._trip[code, k]
+            alerts.append({
+                "location": self._location_ids[code],
+                "severity": rule.severity,
+                "type": rule.alert_type,
+                "message": rule.message.format(value=values[r, k], threshold=threshold),
+                "acknowledged": False,
+                "rule": rule.name,
+                "readingTimestamp": float(ts[r]),
+            })
+        return alerts
+
+    def evaluate_records(self, records):
+        """Convenience wrapper for a list of SensorReading dicts."""
+        return self.evaluate(batch_from_records(records))
+
+    def active_alerts(self):
+        """{location_id: [rule names currently active]}"""
+        out = {}
+        for code, loc in enumerate(self._location_ids):
+            names = [self.rules[k].name for k in np.nonzero(self._active[code])[0]]
+            if names:
+                out[loc] = names
+        return out
+
+
+def insert_alerts(collection, alerts):
+    """
+    Write alerts in one round trip (pymongo-style collection).
+    Only the Alert.js fields are persisted. String locations (POST body
+    locationId) become ObjectIds, and createdAt/updatedAt are set here
+    because insert_many() bypasses the mongoose timestamps.
+    """
+    if not alerts:
+        return 0
+    now = datetime.now(timezone.utc)
+    docs = []
+    for a in alerts:
+        doc = {k: a[k] for k in ("location", "severity", "type", "message", "acknowledged")}
+        if isinstance(doc["location"], str):
+            from bson import ObjectId  # ships with pymongo
+
+            doc["location"] = ObjectId(doc["location"])
+        doc["createdAt"] = doc["updatedAt"] = now
+        docs.append(doc)
+    collection.insert_many(docs, ordered=False)
+    return len(docs)
+
+
+# ---------------------- BENCHMARK ----------------------
+
+def _synthetic_batch(n: int, n_locations: int, t0: float, rng) -> dict:
+    locations = np.array([f"loc{i:04d}" for i in range(n_locations)], dtype=object)
+    return {
+        "location": locations[rng.integers(0, n_locations, n)],
+        "timestamp": t0 + np.sort(rng.uniform(0, 60, n)),
+        "ph": rng.normal(7.4, 0.6, n),
+        "turbidity": rng.gamma(2.0, 1.5, n),
+        "tds": rng.normal(380, 80, n),
+        "temperature": rng.uniform(15, 35, n),
+        "ecoliCount": (rng.random(n) < 0.002) * rng.integers(1, 50, n),
+        "tankLevel": rng.uniform(5, 100, n),
+        "recoveryUnitStatus": rng.choice(
+            np.arange(3, dtype=np.int8), size=n, p=[0.97, 0.02, 0.01]
+        ),
+    }
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    engine = AlertEngine()
+    batches = [_synthetic_batch(100_000, 500, 60.0 * i, rng) for i in range(10)]
+
+    start = time.perf_counter()
+    total_alerts = 0
+    for batch in batches:
+        total_alerts += len(engine.evaluate(batch))
+    elapsed = time.perf_counter() - start
+
+    n = sum(len(b["location"]) for b in batches)
+    print(f"Evaluated {n} readings in {elapsed:.2f}s "
+          f"({n / elapsed:,.0f} readings/s), {total_alerts} alerts emitted")
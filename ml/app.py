@@ -1,9 +1,65 @@
 # ml/app.py
-from fastapi import FastAPI
+import time
+
+_T0 = time.perf_counter()
+
+import asyncio
+import contextvars
+import hmac
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Annotated, List
+
+# Thread budget + CPU affinity (ML_THREADS / ML_CPUS, see serve.py) before
+# numpy starts any native pool
+from thread_control import configure_process
+
+THREADING = configure_process()
+
+import numpy as np
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
-import joblib
-import pandas as pd
+from starlette.concurrency import run_in_threadpool
+
+from plant_schema import (
+    FEATURE_COLS,
+    TYPE_IDS,
+    TIME_COLS_BY_TYPE,
+    EQUIP_COLS_BY_TYPE,
+    allocate_outputs,
+    decode_equipment,
+    rule_cost_per_m3,
+)
+from binary_frames import (
+    FLAG_RULE_COST,
+    MAX_STAGES,
+    MEDIA_TYPE,
+    NO_EQUIPMENT,
+    FrameError,
+    FrameReader,
+    encode_error,
+    encode_response,
+)
+from columnar import ARROW_MEDIA_TYPE, encode_arrow, encode_json, expand_duplicates, wants_arrow
+from feature_envelope import EnvelopeGuard
+from profiling import SamplingProfiler, TraceMiddleware, Tracer
+from single_flight import SingleFlight
+from model_bundle import (
+    BUNDLE_PATH,
+    load_bundle,
+    model_files,
+    models_from_joblib,
+    sklearn_models,
+    stale_sources,
+)
+from model_pack import load_pack
+
+# Startup phases (seconds); served by GET /startup
+STARTUP = {"imports_s": round(time.perf_counter() - _T0, 4), **THREADING}
 
 app = FastAPI()
 
@@ -16,118 +72,6 @@ app.add_middleware(
 )
 
 
-# -------- Features (same order as training) --------
-FEATURE_COLS = [
-    "pH",
-    "TDS_mgL",
-    "turbidity_NTU",
-    "BOD_mgL",
-    "COD_mgL",
-    "total_nitrogen_mgL",
-    "temperature_C",
-    "flow_m3_day",
-    "heavy_metals",
-]
-
-# -------- Stage column names per type --------
-TIME_COLS_BY_TYPE = {
-    1: [
-        "t_screening_min",
-        "t_coag_floc_min",
-        "t_sedimentation_min",
-        "t_filtration_min",
-        "t_carbon_polishing_min",
-        "t_disinfection_min",
-    ],
-    2: [
-        "t_screening_min",
-        "t_oil_grease_min",
-        "t_equalization_min",
-        "t_coag_floc_min",
-        "t_primary_clarifier_min",
-        "t_aeration_min",
-        "t_secondary_clarifier_min",
-        "t_filtration_min",
-        "t_disinfection_min",
-    ],
-    3: [
-        "t_screening_min",
-        "t_grit_chamber_min",
-        "t_equalization_min",
-        "t_biological_reactor_min",
-        "t_mbr_min",
-        "t_activated_carbon_min",
-        "t_disinfection_min",
-    ],
-    4: [
-        "t_screening_min",
-        "t_neutralization_min",
-        "t_precipitation_min",
-        "t_heavy_metal_removal_min",
-        "t_filter_press_min",
-        "t_carbon_filter_min",
-        "t_ro_min",
-    ],
-    5: [
-        "t_screening_min",
-        "t_anaerobic_reactor_min",
-        "t_biogas_handling_min",
-        "t_aeration_min",
-        "t_secondary_clarifier_min",
-        "t_sludge_handling_min",
-        "t_tertiary_filtration_min",
-    ],
-}
-
-EQUIP_COLS_BY_TYPE = {
-    1: [
-        "equip_screening",
-        "equip_coag_floc",
-        "equip_sedimentation",
-        "equip_filtration",
-        "equip_carbon_polishing",
-        "equip_disinfection",
-    ],
-    2: [
-        "equip_screening",
-        "equip_oil_grease",
-        "equip_equalization",
-        "equip_coag_floc",
-        "equip_primary_clarifier",
-        "equip_aeration",
-        "equip_secondary_clarifier",
-        "equip_filtration",
-        "equip_disinfection",
-    ],
-    3: [
-        "equip_screening",
-        "equip_grit_chamber",
-        "equip_equalization",
-        "equip_biological_reactor",
-        "equip_mbr",
-        "equip_activated_carbon",
-        "equip_disinfection",
-    ],
-    4: [
-        "equip_screening",
-        "equip_neutralization",
-        "equip_precipitation",
-        "equip_heavy_metal_removal",
-        "equip_filter_press",
-        "equip_carbon_filter",
-        "equip_ro",
-    ],
-    5: [
-        "equip_screening",
-        "equip_anaerobic_reactor",
-        "equip_biogas_handling",
-        "equip_aeration",
-        "equip_secondary_clarifier",
-        "equip_sludge_handling",
-        "equip_tertiary_filtration",
-    ],
-}
-
 # -------- Pydantic input model --------
 class DesignInput(BaseModel):
     pH: float
@@ -142,64 +86,764 @@ class DesignInput(BaseModel):
 
 
 # -------- Load models at startup --------
-type_classifier = joblib.load("model_type_classifier.joblib")
+# The consolidated bundle (python model_bundle.py) is memory-mapped: no
+# pandas/sklearn import and no unpickling. Without it the joblib models are
+# loaded and flattened here, which imports sklearn and takes seconds.
+# ML_MODEL_BUNDLE may also name a compact models.pack (model_pack.py),
+# which is decoded into memory instead of mapped.
+_t = time.perf_counter()
+MODEL_BUNDLE = os.environ.get("ML_MODEL_BUNDLE", BUNDLE_PATH)
+if os.path.exists(MODEL_BUNDLE):
+    _models = (load_pack if MODEL_BUNDLE.endswith(".pack") else load_bundle)(MODEL_BUNDLE)
+    STARTUP["source"] = MODEL_BUNDLE
+    _stale = stale_sources(_models["meta"])
+    if _stale:
+        print(f"WARNING: {MODEL_BUNDLE} is older than {_stale}; rebuild it")
+else:
+    _models = models_from_joblib()
+    STARTUP["source"] = "joblib"
+    _stale = []
+STARTUP["models_s"] = round(time.perf_counter() - _t, 4)
 
-TYPE_MODELS = {}  # {type_id: {"time": ..., "equip": ..., "cost": ...}}
+# Flat copies of the forests: one vectorized pass gives every tree's output,
+# so predictions, spreads and quantiles come from the same leaf matrix.
+type_classifier_flat = _models["classifier"]
 
-for t in range(1, 6):
-    TYPE_MODELS[t] = {
-        "time": joblib.load(f"model_type{t}_times.joblib"),
-        "equip": joblib.load(f"model_type{t}_equipment.joblib"),
-        "cost": joblib.load(f"model_type{t}_cost.joblib"),
-    }
+# Vocabulary the equipment models were trained with (codes -> labels)
+EQUIP_VOCAB = _models["vocab"]
+EQUIP_LABEL_TABLES = EQUIP_VOCAB["tables"]
 
+# {type_id: {"members": [...], "equip_members": [...], "equip_codes": [...]}}
+TYPE_MODELS = _models["type_models"]
 
-@app.post("/predict-design")
-def predict_design(input_data: DesignInput):
-    # Build feature row in correct order
-    row = {
-        "pH": input_data.pH,
-        "TDS_mgL": input_data.TDS_mgL,
-        "turbidity_NTU": input_data.turbidity_NTU,
-        "BOD_mgL": input_data.BOD_mgL,
-        "COD_mgL": input_data.COD_mgL,
-        "total_nitrogen_mgL": input_data.total_nitrogen_mgL,
-        "temperature_C": input_data.temperature_C,
-        "flow_m3_day": input_data.flow_m3_day,
-        "heavy_metals": int(input_data.heavy_metals),  # convert bool -> 0/1
-    }
+# Every per-type forest in one node table: any set of types, each on its own
+# rows, is walked in a single vectorized pass.
+MODEL_GROUP = _models["group"]
+
+# Training feature ranges per type; rows outside are flagged (and counted)
+ENVELOPE_GUARD = EnvelopeGuard(_models["envelopes"])
+OOD_BITS = (1 << np.arange(len(FEATURE_COLS))).astype(np.uint16)
+del _models
+
+METRICS_LOCK = threading.Lock()
+METRICS = {
+    "requests": 0,
+    "rows": 0,
+    "ood_rows": 0,
+    "rule_cost_rows": 0,
+    "ood_rows_by_type": {str(t): 0 for t in TYPE_IDS},
+    "ood_by_feature": {col: 0 for col in FEATURE_COLS},
+    "batch_duplicate_rows": 0,
+}
+
+# Identical single-design requests in flight at the same time (same features
+# and options) are scored once and share the result
+SINGLE_FLIGHT = SingleFlight()
+
+# Per-type reductions of one request run concurrently here (NumPy releases
+# the GIL inside the large gathers/means of batch requests). Small requests
+# stay on the calling thread, where the hand-off would cost more than it saves,
+# and so does everything when the process has a single-thread budget.
+TYPE_POOL = ThreadPoolExecutor(
+    max_workers=max(1, min(len(TYPE_IDS), THREADING["threads"])),
+    thread_name_prefix="type-models",
+)
+POOL_MIN_ROWS = 256
+
+# Batches are scored BLOCK_ROWS rows at a time, which bounds the leaf
+# matrices and per-type buffers of a request whatever its size
+BLOCK_ROWS = 2048
+
+# The flat walk costs about 1.3 ms per row at any batch size. sklearn's
+# per-tree traversal costs about 0.2 ms per row, after a fixed ~1.5 s per
+# call for its 16 forests, so it wins from about 2,300 rows on. Blocks of
+# SKLEARN_MIN_ROWS or more (without uncertainty, which needs every tree's
+# output) are scored with the joblib estimators, up to SKLEARN_BLOCK_ROWS
+# at a time. They are loaded on first use (~7 s, ~500 MB), and only when
+# they are the models the bundle was built from. ML_SKLEARN_MIN_ROWS=0
+# turns this off.
+SKLEARN_MIN_ROWS = int(os.environ.get("ML_SKLEARN_MIN_ROWS", "3072"))
+SKLEARN_BLOCK_ROWS = 1 << 17
+
+
+class SklearnEngine:
+    """The joblib estimators behind the flat forests, loaded on first use."""
+
+    def __init__(self, available: bool):
+        self.available = available
+        self.root = os.getcwd()
+        self._models = None
+        self._lock = threading.Lock()
+
+    def models(self) -> dict:
+        with self._lock:
+            if self._models is None:
+                t0 = time.perf_counter()
+                self._models = sklearn_models(THREADING["threads"], self.root)
+                STARTUP["sklearn_models_s"] = round(time.perf_counter() - t0, 4)
+        return self._models
+
+
+SKLEARN_ENGINE = SklearnEngine(
+    SKLEARN_MIN_ROWS > 0 and not _stale and all(os.path.exists(f) for f in model_files())
+)
+
+
+def row_blocks(n_rows: int, quantiles=None):
+    """
+    (start, stop, engine) blocks covering n_rows: "sklearn" blocks of up to
+    SKLEARN_BLOCK_ROWS while at least SKLEARN_MIN_ROWS rows remain, then
+    "flat" blocks of BLOCK_ROWS.
+    """
+    start = 0
+    if quantiles is None and SKLEARN_ENGINE.available:
+        while n_rows - start >= SKLEARN_MIN_ROWS:
+            stop = min(n_rows, start + SKLEARN_BLOCK_ROWS)
+            yield start, stop, "sklearn"
+            start = stop
+    for first in range(start, n_rows, BLOCK_ROWS):
+        yield first, min(n_rows, first + BLOCK_ROWS), "flat"
+
+
+def features_matrix(inputs: List[DesignInput]) -> np.ndarray:
+    """Feature rows in training column order (heavy_metals as 0/1)."""
+    return np.array(
+        [[float(getattr(item, col)) for col in FEATURE_COLS] for item in inputs],
+        dtype=np.float64,
+    )
+
+
+def type_outputs(type_id: int, leaves: dict, n_rows: int, quantiles=None) -> dict:
+    """
+    Reduce one type's leaf matrices into preallocated time / equipment / cost
+    buffers. With quantiles (a tuple, possibly empty) the tree spread of the
+    time and cost forests is returned as well.
+    """
+    models = TYPE_MODELS[type_id]
+    out = allocate_outputs(type_id, n_rows)
+
+    times = MODEL_GROUP.reduce((type_id, "time"), leaves[(type_id, "time")], quantiles)
+    cost = MODEL_GROUP.reduce((type_id, "cost"), leaves[(type_id, "cost")], quantiles)
+    out["times"][:] = times["mean"]
+    out["cost"][:] = cost["mean"][:, 0]
+    if quantiles is not None:
+        out["times_std"] = times["std"]
+        out["times_q"] = times["quantiles"]
+        out["cost_std"] = cost["std"][:, 0]
+        out["cost_q"] = cost["quantiles"][:, :, 0]
+
+    # Same argmax as MultiOutputClassifier.predict, but yields schema codes
+    for i, (member, code_map) in enumerate(
+        zip(models["equip_members"], models["equip_codes"])
+    ):
+        proba = MODEL_GROUP.reduce(member, leaves[member])["mean"]
+        out["equip"][:, i] = code_map[proba.argmax(axis=1)]
+
+    return out
+
+
+def apply_rule_cost(type_id: int, out: dict, mask: np.ndarray, X: np.ndarray):
+    """Replace the forest cost of the masked rows by the analytic generator cost."""
+    cost = rule_cost_per_m3(type_id, X)
+    out["cost"][mask] = cost
+    if "cost_std" in out:
+        out["cost_std"][mask] = 0.0
+        out["cost_q"][:, mask] = cost
+
+
+def predict_type_batch(type_id: int, X: np.ndarray, quantiles=None) -> dict:
+    """Run the per-type time, equipment and cost models on every row of X."""
+    X = np.asarray(X, dtype=np.float64)
+    rows = np.arange(len(X))
+    (leaves,) = MODEL_GROUP.apply(X, [(TYPE_MODELS[type_id]["members"], rows)])
+    return type_outputs(type_id, leaves, len(X), quantiles)
+
+
+def sklearn_frame(X: np.ndarray):
+    import pandas as pd
 
-    X = pd.DataFrame([row], columns=FEATURE_COLS)
+    return pd.DataFrame(X, columns=FEATURE_COLS)
 
-    # 1) Predict type
-    predicted_type = int(type_classifier.predict(X)[0])
 
-    # 2) Get correct models for that type
-    models = TYPE_MODELS[predicted_type]
-    time_model = models["time"]
-    equip_model = models["equip"]
-    cost_model = models["cost"]
+def sklearn_type_outputs(type_id: int, X: np.ndarray) -> dict:
+    """type_outputs (without tree spread) of one type's rows from the sklearn estimators."""
+    models = SKLEARN_ENGINE.models()[type_id]
+    frame = sklearn_frame(X)
+    out = allocate_outputs(type_id, len(X))
+    out["times"][:] = np.asarray(models["times"].predict(frame)).reshape(len(X), -1)
+    out["cost"][:] = models["cost"].predict(frame)
+    labels = models["equipment"].predict(frame)
+    for i, (est, code_map) in enumerate(
+        zip(models["equipment"].estimators_, TYPE_MODELS[type_id]["equip_codes"])
+    ):
+        out["equip"][:, i] = code_map[np.searchsorted(est.classes_, labels[:, i])]
+    return out
 
-    # 3) Predict times
-    time_cols = TIME_COLS_BY_TYPE[predicted_type]
-    times_pred = time_model.predict(X)[0]
-    stage_times = {
-        col: round(float(val), 2) for col, val in zip(time_cols, times_pred)
+
+def type_probabilities(X: np.ndarray, engine: str = "flat") -> np.ndarray:
+    """Classifier probabilities, columns in type_classifier_flat.classes order."""
+    if engine == "sklearn":
+        return SKLEARN_ENGINE.models()["classifier"].predict_proba(sklearn_frame(X))
+    return type_classifier_flat.predict_proba(X)
+
+
+def group_outputs(X: np.ndarray, groups: dict, quantiles=None, engine: str = "flat"):
+    """
+    type_id -> type_outputs of groups[type_id] (row indices of X). The flat
+    engine walks the trees of every group in one pass up front; sklearn
+    predicts each type when asked.
+    """
+    if engine == "sklearn":
+        return lambda t: sklearn_type_outputs(t, X[groups[t]])
+    leaf_sets = MODEL_GROUP.apply(
+        X, [(TYPE_MODELS[t]["members"], rows) for t, rows in groups.items()]
+    )
+    leaves = dict(zip(groups, leaf_sets))
+    return lambda t: type_outputs(t, leaves[t], len(groups[t]), quantiles)
+
+
+def _stage_dict(type_id: int, values) -> dict:
+    return {
+        col: round(float(val), 2)
+        for col, val in zip(TIME_COLS_BY_TYPE[type_id], values)
     }
 
-    # 4) Predict equipment
-    equip_cols = EQUIP_COLS_BY_TYPE[predicted_type]
-    equip_pred = equip_model.predict(X)[0]
-    stage_equipment = {
-        col: str(val) for col, val in zip(equip_cols, equip_pred)
+
+def design_result(type_id: int, out: dict, j: int, equipment, equipment_mode: str,
+                  quantiles=None, type_proba=None, ood_features=None,
+                  rule_cost: bool = False) -> dict:
+    result = {
+        "predicted_type": type_id,
+        "stage_times_min": _stage_dict(type_id, out["times"][j]),
     }
+    if equipment_mode == "codes":
+        # Stage order of EQUIP_COLS_BY_TYPE; decode with GET /equipment-vocab
+        result["stage_equipment_codes"] = equipment
+        result["equipment_vocab_version"] = EQUIP_VOCAB["version"]
+    else:
+        result["stage_equipment"] = dict(zip(EQUIP_COLS_BY_TYPE[type_id], equipment))
+    result["cost_per_m3_inr"] = round(float(out["cost"][j]), 2)
+    if ood_features:
+        # Inputs outside this type's training envelope: the forests extrapolate flat
+        result["out_of_distribution"] = True
+        result["ood_features"] = ood_features
+        if rule_cost:
+            result["cost_source"] = "rules"
 
-    # 5) Predict cost
-    cost_per_m3 = float(cost_model.predict(X)[0])
+    if quantiles is not None:
+        result["type_probabilities"] = {
+            str(int(c)): round(float(p), 4)
+            for c, p in zip(type_classifier_flat.classes, type_proba)
+        }
+        result["stage_times_std_min"] = _stage_dict(type_id, out["times_std"][j])
+        result["stage_times_quantiles_min"] = {
+            f"q{q:g}": _stage_dict(type_id, out["times_q"][k, j])
+            for k, q in enumerate(quantiles)
+        }
+        result["cost_per_m3_std_inr"] = round(float(out["cost_std"][j]), 2)
+        result["cost_per_m3_quantiles_inr"] = {
+            f"q{q:g}": round(float(out["cost_q"][k, j]), 2)
+            for k, q in enumerate(quantiles)
+        }
+    return result
 
-    return {
-        "predicted_type": predicted_type,
-        "stage_times_min": stage_times,
-        "stage_equipment": stage_equipment,
-        "cost_per_m3_inr": round(cost_per_m3, 2),
+
+def predict_designs(X: np.ndarray, equipment_mode: str = "labels", quantiles=None,
+                    top_k: int = 1, min_probability: float = 0.0,
+                    ood_policy: str = "flag") -> list:
+    """
+    Classify every row, then run each type's models once on its group of rows.
+    See _predict_designs; batches are scored in row_blocks.
+    """
+    results = []
+    for start, stop, engine in row_blocks(len(X), quantiles):
+        results.extend(_predict_designs(
+            X[start:stop], equipment_mode, quantiles, top_k, min_probability, ood_policy,
+            engine,
+        ))
+    return results
+
+
+def _predict_designs(X: np.ndarray, equipment_mode: str, quantiles, top_k: int,
+                     min_probability: float, ood_policy: str, engine: str = "flat") -> list:
+    """
+    Classify every row, then run each type's models once on its group of rows.
+
+    With top_k > 1, the next most likely types whose probability is at least
+    min_probability are predicted too and returned as ranked "alternatives".
+    The trees of all requested types are walked in one pass; for batches of
+    POOL_MIN_ROWS or more the per-type reductions and response building then
+    run concurrently on TYPE_POOL.
+
+    Every design is checked against its type's feature envelope. Rows outside
+    it are flagged; with ood_policy="rules" their cost comes from the
+    analytic generator cost model instead of the forest.
+    """
+    type_proba = type_probabilities(X, engine)
+    classes = type_classifier_flat.classes.astype(int)
+
+    ranked = np.argsort(-type_proba, axis=1, kind="stable")[:, :max(top_k, 1)]
+    ranked_p = np.take_along_axis(type_proba, ranked, axis=1)
+    wanted = ranked_p >= min_probability
+    wanted[:, 0] = True  # the most likely type is always predicted
+    ranked_types = classes[ranked]
+
+    groups = {}
+    for t in np.unique(ranked_types[wanted]):
+        groups[int(t)] = np.flatnonzero(((ranked_types == t) & wanted).any(axis=1))
+
+    # Flat: one walk over all requested types' trees, each on its own rows
+    outputs = group_outputs(X, groups, quantiles, engine)
+
+    def run(t):
+        rows = groups[t]
+        out = outputs(t)
+        ood = ENVELOPE_GUARD.check(X[rows], t)
+        flagged = ood.any(axis=1)
+        use_rules = ood_policy == "rules" and flagged.any()
+        if use_rules:
+            apply_rule_cost(t, out, flagged, X[rows[flagged]])
+        if equipment_mode == "codes":
+            equipment = out["equip"].tolist()
+        else:
+            equipment = decode_equipment(t, out["equip"], EQUIP_LABEL_TABLES[t]).tolist()
+        return {
+            row: design_result(
+                t, out, j, equipment[j], equipment_mode, quantiles, type_proba[row],
+                ENVELOPE_GUARD.features(ood[j]) if flagged[j] else None, use_rules,
+            )
+            for j, row in enumerate(rows)
+        }
+
+    if len(groups) > 1 and len(X) >= POOL_MIN_ROWS and THREADING["threads"] > 1:
+        # Each task runs in a copy of the caller's context (request tracing)
+        futures = [TYPE_POOL.submit(contextvars.copy_context().run, run, t) for t in groups]
+        by_type = {t: f.result() for t, f in zip(groups, futures)}
+    else:
+        by_type = {t: run(t) for t in groups}
+
+    results = []
+    for row in range(len(X)):
+        primary = by_type[int(ranked_types[row, 0])][row]
+        if top_k > 1:
+            primary["alternatives"] = [
+                {
+                    "probability": round(float(ranked_p[row, k]), 4),
+                    **by_type[int(ranked_types[row, k])][row],
+                }
+                for k in range(1, ranked.shape[1])
+                if wanted[row, k]
+            ]
+        results.append(primary)
+    return results
+
+
+def predict_grouped(X: np.ndarray, ood_policy: str = "flag"):
+    """
+    Most likely type of every row and its design, grouped by type:
+    (probability, types, {type_id: (rows, outputs)}). outputs are the
+    unrounded type_outputs buffers plus "ood" (out-of-envelope bitmask,
+    bit i = FEATURE_COLS[i]) and "rule_cost" (rows costed by the rules).
+    Same models, envelope check and ood policy as predict_designs.
+    Scored in row_blocks; the blocks' groups are concatenated.
+    """
+    spans = list(row_blocks(len(X)))
+    if len(spans) <= 1:
+        return _predict_grouped(X, ood_policy, spans[0][2] if spans else "flat")
+    blocks = [
+        (start, _predict_grouped(X[start:stop], ood_policy, engine))
+        for start, stop, engine in spans
+    ]
+    probability = np.concatenate([b[0] for _, b in blocks])
+    types = np.concatenate([b[1] for _, b in blocks])
+    by_type = {}
+    for t in sorted({t for _, b in blocks for t in b[2]}):
+        parts = [(start, b[2][t]) for start, b in blocks if t in b[2]]
+        rows = np.concatenate([start + rows for start, (rows, _) in parts])
+        res = {k: np.concatenate([res[k] for _, (_, res) in parts]) for k in parts[0][1][1]}
+        by_type[t] = (rows, res)
+    return probability, types, by_type
+
+
+def _predict_grouped(X: np.ndarray, ood_policy: str, engine: str = "flat"):
+    type_proba = type_probabilities(X, engine)
+    best = type_proba.argmax(axis=1)
+    types = type_classifier_flat.classes.astype(int)[best]
+
+    groups = {int(t): np.flatnonzero(types == t) for t in np.unique(types)}
+    outputs = group_outputs(X, groups, engine=engine)
+    by_type = {}
+    for t, rows in groups.items():
+        res = outputs(t)
+        ood = ENVELOPE_GUARD.check(X[rows], t)
+        flagged = ood.any(axis=1)
+        res["rule_cost"] = np.zeros(len(rows), dtype=bool)
+        if ood_policy == "rules" and flagged.any():
+            apply_rule_cost(t, res, flagged, X[rows[flagged]])
+            res["rule_cost"] = flagged
+        res["ood"] = ood.astype(np.uint16) @ OOD_BITS
+        by_type[t] = (rows, res)
+    return type_proba[np.arange(len(X)), best], types, by_type
+
+
+def predict_packed(X: np.ndarray, ood_policy: str = "flag") -> dict:
+    """
+    Most likely type's design for every row as flat arrays (the response
+    frame layout of binary_frames.py): no per-row dicts or rounding.
+    """
+    n_rows = len(X)
+    probability, types, by_type = predict_grouped(X, ood_policy)
+    out = {
+        "cost": np.empty(n_rows, dtype=np.float32),
+        "probability": probability.astype(np.float32),
+        "times": np.full((n_rows, MAX_STAGES), np.nan, dtype=np.float32),
+        "ood": np.zeros(n_rows, dtype=np.uint16),
+        "type": types.astype(np.uint8),
+        "cost_source": np.zeros(n_rows, dtype=np.uint8),
+        "equip": np.full((n_rows, MAX_STAGES), NO_EQUIPMENT, dtype=np.uint8),
     }
+    for rows, res in by_type.values():
+        n_stages = res["times"].shape[1]
+        out["times"][rows, :n_stages] = res["times"]
+        out["equip"][rows, :n_stages] = res["equip"]
+        out["cost"][rows] = res["cost"]
+        out["ood"][rows] = res["ood"]
+        out["cost_source"][rows] = res["rule_cost"]
+    return out
+
+
+def predict_columnar(X: np.ndarray, equipment_mode: str = "labels",
+                     ood_policy: str = "flag") -> list:
+    """predict_grouped as the per-type groups of columnar.py (one array per column)."""
+    probability, _, by_type = predict_grouped(X, ood_policy)
+    groups = []
+    for t, (rows, res) in by_type.items():
+        if equipment_mode == "codes":
+            equipment = res["equip"]
+        else:
+            equipment = decode_equipment(t, res["equip"], EQUIP_LABEL_TABLES[t])
+        groups.append({
+            "type": t,
+            "time_cols": TIME_COLS_BY_TYPE[t],
+            "equip_cols": EQUIP_COLS_BY_TYPE[t],
+            "rows": rows,
+            "probability": probability[rows],
+            "times": res["times"],
+            "equipment": equipment,
+            # Codes + per-stage labels: columnar JSON sends labels dictionary-encoded
+            "equip_codes": res["equip"],
+            "equip_labels": [
+                [label for label in stage if label is not None]
+                for stage in EQUIP_LABEL_TABLES[t]
+            ],
+            "cost": res["cost"],
+            "ood": res["ood"],
+            "rule_cost": res["rule_cost"],
+        })
+    return groups
+
+
+def record_metrics(results: list):
+    """Count served rows and out-of-distribution primary designs."""
+    flagged = [r for r in results if r.get("out_of_distribution")]
+    with METRICS_LOCK:
+        METRICS["requests"] += 1
+        METRICS["rows"] += len(results)
+        METRICS["ood_rows"] += len(flagged)
+        for r in flagged:
+            METRICS["ood_rows_by_type"][str(r["predicted_type"])] += 1
+            METRICS["rule_cost_rows"] += r.get("cost_source") == "rules"
+            for col in r["ood_features"]:
+                METRICS["ood_by_feature"][col] += 1
+
+
+def record_packed_metrics(out: dict):
+    """record_metrics for predict_packed arrays."""
+    flagged = out["ood"] != 0
+    types, counts = np.unique(out["type"][flagged], return_counts=True)
+    with METRICS_LOCK:
+        METRICS["requests"] += 1
+        METRICS["rows"] += len(out["type"])
+        METRICS["ood_rows"] += int(flagged.sum())
+        METRICS["rule_cost_rows"] += int(out["cost_source"].sum())
+        for t, c in zip(types, counts):
+            METRICS["ood_rows_by_type"][str(int(t))] += int(c)
+        for i, col in enumerate(FEATURE_COLS):
+            METRICS["ood_by_feature"][col] += int(((out["ood"] >> i) & 1).sum())
+
+
+def record_columnar_metrics(groups: list):
+    """record_metrics for predict_columnar groups."""
+    record_packed_metrics({
+        "type": np.concatenate([np.full(len(g["rows"]), g["type"]) for g in groups]),
+        "ood": np.concatenate([g["ood"] for g in groups]),
+        "cost_source": np.concatenate([g["rule_cost"] for g in groups]),
+    })
+
+
+def parse_quantiles(uncertainty: bool, quantiles: str):
+    """None when uncertainty is off, else a tuple of quantiles in (0, 1)."""
+    if not uncertainty:
+        return None
+    try:
+        values = tuple(float(q) for q in quantiles.split(",") if q.strip())
+    except ValueError:
+        raise HTTPException(status_code=422, detail="quantiles must be comma-separated floats")
+    if any(not 0.0 < q < 1.0 for q in values):
+        raise HTTPException(status_code=422, detail="quantiles must be between 0 and 1")
+    return values
+
+
+def check_equipment_mode(equipment: str):
+    if equipment not in ("labels", "codes"):
+        raise HTTPException(status_code=422, detail="equipment must be 'labels' or 'codes'")
+
+
+def check_ood_policy(ood: str):
+    if ood not in ("flag", "rules"):
+        raise HTTPException(status_code=422, detail="ood must be 'flag' or 'rules'")
+
+
+# -------- Profiling + tracing (admin only, off by default) --------
+# Admin endpoints exist only when ML_ADMIN_TOKEN is set; callers send it
+# in the X-Admin-Token header.
+ADMIN_TOKEN = os.environ.get("ML_ADMIN_TOKEN", "")
+MAX_PROFILE_S = 120.0
+PROFILE_LOCK = asyncio.Lock()
+
+_module = sys.modules[__name__]
+TRACER = Tracer([
+    (_module, "features_matrix", "features_matrix"),
+    (type_classifier_flat, "predict_proba", "classifier"),
+    (MODEL_GROUP, "apply", "forest_walk"),
+    (MODEL_GROUP, "reduce", lambda name, *args, **kwargs: f"reduce_{name[1]}"),
+    (_module, "sklearn_type_outputs", "sklearn_predict"),
+    (ENVELOPE_GUARD, "check", "envelope_check"),
+    (_module, "apply_rule_cost", "rule_cost"),
+    (_module, "decode_equipment", "decode_equipment"),
+    (_module, "design_result", "build_response"),
+])
+if ADMIN_TOKEN:
+    # Without a token the middleware is not even in the stack
+    app.add_middleware(TraceMiddleware, tracer=TRACER)
+
+
+def require_admin(request: Request):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", ""), ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="admin token required")
+
+
+# -------- Warm-up: fault in the root pages of every forest before serving --------
+_t = time.perf_counter()
+predict_designs(np.zeros((1, len(FEATURE_COLS))), top_k=len(TYPE_IDS), min_probability=0.0)
+STARTUP["warmup_s"] = round(time.perf_counter() - _t, 4)
+STARTUP["ready_s"] = round(time.perf_counter() - _T0, 4)
+print(f"ML service startup: {STARTUP}")
+
+
+@app.get("/startup")
+def startup_timing():
+    return STARTUP
+
+
+@app.get("/metrics")
+def metrics():
+    with METRICS_LOCK:
+        snapshot = {
+            k: dict(v) if isinstance(v, dict) else v for k, v in METRICS.items()
+        }
+    snapshot["envelope_version"] = ENVELOPE_GUARD.version
+    snapshot["single_flight"] = SINGLE_FLIGHT.stats()
+    return snapshot
+
+
+@app.get("/equipment-vocab")
+def equipment_vocab():
+    return {"version": EQUIP_VOCAB["version"], "types": EQUIP_VOCAB["types"]}
+
+
+@app.post("/admin/profile")
+async def admin_profile(
+    request: Request,
+    seconds: Annotated[float, Query(gt=0.0, le=MAX_PROFILE_S)] = 10.0,
+    interval_ms: Annotated[float, Query(ge=1.0, le=1000.0)] = 5.0,
+    format: str = "speedscope",
+):
+    """
+    Sample every thread's stack for `seconds` while the service keeps
+    serving, then return collapsed stacks (text) or a speedscope profile.
+    """
+    require_admin(request)
+    if format not in ("speedscope", "collapsed"):
+        raise HTTPException(status_code=422, detail="format must be 'speedscope' or 'collapsed'")
+    if PROFILE_LOCK.locked():
+        raise HTTPException(status_code=409, detail="a profile is already running")
+    async with PROFILE_LOCK:
+        profiler = SamplingProfiler(interval_ms / 1000.0)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            profiler.stop()
+    if format == "collapsed":
+        return PlainTextResponse(profiler.collapsed())
+    return JSONResponse(profiler.speedscope())
+
+
+@app.post("/admin/tracing")
+def admin_tracing(request: Request, enabled: bool):
+    """While enabled, requests sent with an X-ML-Trace header are timed per model call."""
+    require_admin(request)
+    if enabled:
+        TRACER.enable()
+    else:
+        TRACER.disable()
+    return {"enabled": TRACER.enabled}
+
+
+@app.get("/admin/traces")
+def admin_traces(request: Request, limit: Annotated[int, Query(ge=1, le=200)] = 50):
+    require_admin(request)
+    return {"enabled": TRACER.enabled, "traces": list(TRACER.recent)[-limit:]}
+
+
+@app.post("/predict-design")
+def predict_design(
+    input_data: DesignInput,
+    equipment: str = "labels",
+    uncertainty: bool = False,
+    quantiles: str = "0.05,0.95",
+    top_k: Annotated[int, Query(ge=1, le=len(TYPE_IDS))] = 1,
+    min_probability: Annotated[float, Query(ge=0.0, le=1.0)] = 0.1,
+    ood: str = "flag",
+):
+    check_equipment_mode(equipment)
+    check_ood_policy(ood)
+    q = parse_quantiles(uncertainty, quantiles)
+    X = features_matrix([input_data])
+    key = (X.tobytes(), equipment, q, top_k, min_probability, ood)
+    results = SINGLE_FLIGHT.do(key, predict_designs, X, equipment, q, top_k, min_probability, ood)
+    record_metrics(results)
+    return results[0]
+
+
+@app.post("/predict-design/batch")
+def predict_design_batch(
+    inputs: List[DesignInput],
+    equipment: str = "labels",
+    uncertainty: bool = False,
+    quantiles: str = "0.05,0.95",
+    top_k: Annotated[int, Query(ge=1, le=len(TYPE_IDS))] = 1,
+    min_probability: Annotated[float, Query(ge=0.0, le=1.0)] = 0.1,
+    ood: str = "flag",
+    layout: str = "rows",
+    accept: Annotated[str, Header()] = "",
+):
+    """
+    layout=columnar returns struct-of-arrays groups per predicted type
+    (columnar.py) as JSON, or as an Arrow IPC stream when the Accept header
+    asks for it. It covers the most likely type's design only.
+    """
+    check_equipment_mode(equipment)
+    check_ood_policy(ood)
+    q = parse_quantiles(uncertainty, quantiles)
+    if layout not in ("rows", "columnar"):
+        raise HTTPException(status_code=422, detail="layout must be 'rows' or 'columnar'")
+    if layout == "columnar":
+        if uncertainty or top_k > 1:
+            raise HTTPException(
+                status_code=422, detail="layout=columnar does not support uncertainty or top_k"
+            )
+        return columnar_response(inputs, equipment, ood, accept)
+    if not inputs:
+        return []
+    X = features_matrix(inputs)
+    # Duplicate rows within the batch are scored once
+    unique, inverse = np.unique(X, axis=0, return_inverse=True)
+    if len(unique) < len(X):
+        scored = predict_designs(unique, equipment, q, top_k, min_probability, ood)
+        results = [scored[i] for i in inverse.reshape(-1)]
+        with METRICS_LOCK:
+            METRICS["batch_duplicate_rows"] += len(X) - len(unique)
+    else:
+        results = predict_designs(X, equipment, q, top_k, min_probability, ood)
+    record_metrics(results)
+    return results
+
+
+def columnar_response(inputs: List[DesignInput], equipment: str, ood: str, accept) -> Response:
+    arrow = wants_arrow(accept)
+    if arrow:
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=406, detail="Arrow output needs pyarrow on the server")
+    X = features_matrix(inputs) if inputs else np.empty((0, len(FEATURE_COLS)))
+    groups = []
+    if len(X):
+        unique, inverse = np.unique(X, axis=0, return_inverse=True)
+        groups = predict_columnar(unique, equipment, ood)
+        if len(unique) < len(X):
+            groups = expand_duplicates(groups, inverse.reshape(-1))
+            with METRICS_LOCK:
+                METRICS["batch_duplicate_rows"] += len(X) - len(unique)
+        record_columnar_metrics(groups)
+    version = EQUIP_VOCAB["version"] if equipment == "codes" else None
+    if arrow:
+        return Response(encode_arrow(groups, equipment, version), media_type=ARROW_MEDIA_TYPE)
+    return Response(encode_json(groups, len(X), equipment, version), media_type="application/json")
+
+
+class FrameStreamResponse(StreamingResponse):
+    """
+    StreamingResponse that leaves receive() to the request body: the stock
+    class polls it for disconnects while streaming, which would swallow the
+    request frames still being uploaded. A disconnect surfaces through
+    request.stream() instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.post("/predict-design/frames")
+async def predict_design_frames(request: Request):
+    """
+    Binary-framed batch scoring (see binary_frames.py): frames are scored
+    as soon as they have fully arrived and each answer is streamed back
+    before the rest of the request body is read.
+    """
+    if request.headers.get("content-type", "").split(";")[0].strip() != MEDIA_TYPE:
+        raise HTTPException(status_code=415, detail=f"Content-Type must be {MEDIA_TYPE}")
+    reader = FrameReader()
+
+    async def frames():
+        try:
+            async for chunk in request.stream():
+                for X, flags in reader.feed(chunk):
+                    policy = "rules" if flags & FLAG_RULE_COST else "flag"
+                    out = await run_in_threadpool(predict_packed, X, policy)
+                    record_packed_metrics(out)
+                    yield encode_response(out)
+            reader.close()
+        except FrameError as exc:
+            yield encode_error(str(exc))
+
+    return FrameStreamResponse(frames(), media_type=MEDIA_TYPE)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # The idle keep-alive must outlast the Node bridge's agent timeout
+    # (backend/controllers/mlController.js), so the bridge never reuses a
+    # connection the service has just closed.
+    uvicorn.run(
+        app,
+        host=os.environ.get("ML_HOST", "127.0.0.1"),
+        port=int(os.environ.get("ML_PORT", "8001")),
+        timeout_keep_alive=int(os.environ.get("ML_KEEP_ALIVE_S", "30")),
+        backlog=int(os.environ.get("ML_BACKLOG", "2048")),
+    )
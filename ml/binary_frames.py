@@ -0,0 +1,258 @@
+"""
+Length-prefixed binary frames for POST /predict-design/frames.
+
+High-volume callers send packed float32 feature rows and get packed arrays
+back, with no JSON on either side. Both directions are a stream of frames,
+so a client can keep writing request frames (chunked upload) while the
+service answers each one as soon as it is scored.
+
+All integers and floats are little-endian.
+
+Request frame (12-byte header + payload):
+  b"WTRQ" | uint32 n_rows | uint16 n_features (= 9) | uint16 flags
+  float32[n_rows, n_features]   rows in FEATURE_COLS order, heavy_metals 0/1
+  flags: FLAG_RULE_COST → out-of-envelope rows get the analytic cost
+         (the JSON endpoints' ood="rules")
+
+Response frame (16-byte header + payload), one per request frame:
+  b"WTRS" | uint32 n_rows | uint16 n_stages (= MAX_STAGES) | uint16 flags
+  | uint32 payload bytes
+  float32[n_rows]             cost_per_m3_inr
+  float32[n_rows]             probability of the predicted type
+  float32[n_rows, n_stages]   stage times (min), NaN past the type's stages
+  uint16[n_rows]              out-of-envelope bitmask (bit i = FEATURE_COLS[i])
+  uint8[n_rows]               predicted type
+  uint8[n_rows]               cost source: 0 forest, 1 rules
+  uint8[n_rows, n_stages]     equipment codes, NO_EQUIPMENT past the stages
+  zero padding to a multiple of 4 bytes
+
+Stage j of a row is TIME_COLS_BY_TYPE[type][j] / EQUIP_COLS_BY_TYPE[type][j];
+codes decode with GET /equipment-vocab, exactly like equipment=codes.
+
+Error frame (the stream ends after it):
+  b"WTER" | uint32 message bytes | utf-8 message
+
+Usage (from ml/, service running):
+  python binary_frames.py --rows 10000 --frame-rows 1000
+"""
+
+import argparse
+import struct
+import time
+
+import numpy as np
+
+from plant_schema import FEATURE_COLS, STAGES_BY_TYPE, TYPE_IDS
+
+
+MEDIA_TYPE = "application/x-wt-frames"
+REQUEST_MAGIC = b"WTRQ"
+RESPONSE_MAGIC = b"WTRS"
+ERROR_MAGIC = b"WTER"
+REQUEST_HEADER = struct.Struct("<4sIHH")
+RESPONSE_HEADER = struct.Struct("<4sIHHI")
+ERROR_HEADER = struct.Struct("<4sI")
+
+FLAG_RULE_COST = 1
+# app.predict_packed scores a frame in blocks of app.BLOCK_ROWS rows, so a
+# full frame stays within a few hundred MB (measured: 385 MB peak at 65,536
+# rows, one thread, about 75 s); the cap only bounds one frame's latency
+MAX_FRAME_ROWS = 1 << 16
+MAX_STAGES = max(len(STAGES_BY_TYPE[t]) for t in TYPE_IDS)
+NO_EQUIPMENT = 255
+
+# (name, dtype, per-row shape) in payload order
+RESPONSE_FIELDS = (
+    ("cost", np.dtype("<f4"), ()),
+    ("probability", np.dtype("<f4"), ()),
+    ("times", np.dtype("<f4"), (MAX_STAGES,)),
+    ("ood", np.dtype("<u2"), ()),
+    ("type", np.dtype("u1"), ()),
+    ("cost_source", np.dtype("u1"), ()),
+    ("equip", np.dtype("u1"), (MAX_STAGES,)),
+)
+
+
+class FrameError(ValueError):
+    pass
+
+
+def _payload_size(n_rows: int) -> int:
+    size = sum(dt.itemsize * int(np.prod(shape, dtype=np.int64)) for _, dt, shape in RESPONSE_FIELDS)
+    return (size * n_rows + 3) // 4 * 4
+
+
+# ---------------------- REQUESTS ----------------------
+
+def encode_request(X: np.ndarray, flags: int = 0) -> bytes:
+    X = np.ascontiguousarray(X, dtype="<f4")
+    if X.ndim != 2 or X.shape[1] != len(FEATURE_COLS):
+        raise FrameError(f"rows must have {len(FEATURE_COLS)} features")
+    return REQUEST_HEADER.pack(REQUEST_MAGIC, len(X), X.shape[1], flags) + X.tobytes()
+
+
+class FrameReader:
+    """
+    Incremental request parser: feed() arbitrary byte chunks as they arrive
+    and get back every frame completed so far as (float64 rows, flags).
+    """
+
+    def __init__(self, max_rows: int = MAX_FRAME_ROWS):
+        self.buf = bytearray()
+        self.max_rows = max_rows
+
+    def feed(self, chunk: bytes) -> list:
+        self.buf += chunk
+        frames = []
+        while len(self.buf) >= REQUEST_HEADER.size:
+            magic, n_rows, n_features, flags = REQUEST_HEADER.unpack_from(self.buf)
+            if magic != REQUEST_MAGIC:
+                raise FrameError("bad frame magic")
+            if n_features != len(FEATURE_COLS):
+                raise FrameError(f"frame has {n_features} features, expected {len(FEATURE_COLS)}")
+            if n_rows > self.max_rows:
+                raise FrameError(f"frame has {n_rows} rows, limit {self.max_rows}")
+            end = REQUEST_HEADER.size + n_rows * n_features * 4
+            if len(self.buf) < end:
+                break
+            # astype copies, so no view of buf outlives the del below
+            X = np.frombuffer(self.buf, dtype="<f4", count=n_rows * n_features,
+                              offset=REQUEST_HEADER.size).astype(np.float64)
+            frames.append((X.reshape(n_rows, n_features), flags))
+            del self.buf[:end]
+        return frames
+
+    def close(self):
+        if self.buf:
+            raise FrameError(f"stream ended inside a frame ({len(self.buf)} bytes left)")
+
+
+# ---------------------- RESPONSES ----------------------
+
+def encode_response(out: dict) -> bytes:
+    """out: RESPONSE_FIELDS arrays for n rows (see app.predict_packed)."""
+    n_rows = len(out["type"])
+    parts = [
+        np.ascontiguousarray(out[name], dtype=dt).reshape((n_rows,) + shape).tobytes()
+        for name, dt, shape in RESPONSE_FIELDS
+    ]
+    payload = b"".join(parts)
+    payload += b"\0" * (_payload_size(n_rows) - len(payload))
+    return RESPONSE_HEADER.pack(RESPONSE_MAGIC, n_rows, MAX_STAGES, 0, len(payload)) + payload
+
+
+def encode_error(message: str) -> bytes:
+    data = message.encode()
+    return ERROR_HEADER.pack(ERROR_MAGIC, len(data)) + data
+
+
+def decode_response(buf, offset: int = 0):
+    """(arrays, end offset) of the response frame at offset; None if incomplete.
+    The arrays are copies, so buf can be trimmed afterwards."""
+    if len(buf) - offset < ERROR_HEADER.size:
+        return None
+    if bytes(buf[offset:offset + 4]) == ERROR_MAGIC:
+        _, size = ERROR_HEADER.unpack_from(buf, offset)
+        end = offset + ERROR_HEADER.size + size
+        if len(buf) < end:
+            return None
+        raise FrameError(bytes(buf[offset + ERROR_HEADER.size:end]).decode())
+    if len(buf) - offset < RESPONSE_HEADER.size:
+        return None
+    magic, n_rows, n_stages, _, size = RESPONSE_HEADER.unpack_from(buf, offset)
+    if magic != RESPONSE_MAGIC or n_stages != MAX_STAGES:
+        raise FrameError("bad response frame")
+    end = offset + RESPONSE_HEADER.size + size
+    if len(buf) < end:
+        return None
+    arrays, pos = {}, offset + RESPONSE_HEADER.size
+    for name, dt, shape in RESPONSE_FIELDS:
+        count = n_rows * int(np.prod(shape, dtype=np.int64))
+        arrays[name] = np.frombuffer(buf, dtype=dt, count=count, offset=pos).reshape(
+            (n_rows,) + shape
+        ).copy()
+        pos += count * dt.itemsize
+    return arrays, end
+
+
+# ---------------------- CLIENT ----------------------
+
+def stream_predict(host: str, port: int, frames, flags: int = 0):
+    """
+    Send an iterable of feature matrices as one chunked request and yield
+    the response arrays frame by frame, as the service produces them.
+
+    The body is written from a background thread while this generator
+    reads answers, so neither side's socket buffer can fill up and stall
+    the other on long streams.
+    """
+    import http.client
+    import threading
+
+    conn = http.client.HTTPConnection(host, port)
+    conn.putrequest("POST", "/predict-design/frames")
+    conn.putheader("Content-Type", MEDIA_TYPE)
+    conn.putheader("Transfer-Encoding", "chunked")
+    conn.endheaders()
+
+    def send_body():
+        try:
+            for X in frames:
+                data = encode_request(X, flags)
+                conn.send(b"%X\r\n%s\r\n" % (len(data), data))
+            conn.send(b"0\r\n\r\n")
+        except OSError:
+            pass  # the service closed the stream (error frame or HTTP error)
+
+    sender = threading.Thread(target=send_body, daemon=True)
+    sender.start()
+    resp = conn.getresponse()
+    if resp.status != 200:
+        raise FrameError(f"HTTP {resp.status}: {resp.read()[:200]!r}")
+    buf = bytearray()
+    while True:
+        chunk = resp.read1(1 << 16)
+        if not chunk:
+            break
+        buf += chunk
+        while True:
+            decoded = decode_response(buf)
+            if decoded is None:
+                break
+            arrays, end = decoded
+            del buf[:end]
+            yield arrays
+    sender.join()
+    conn.close()
+    if buf:
+        raise FrameError("response ended inside a frame")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream random designs through the binary endpoint")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--frame-rows", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from plant_schema import INPUT_BOUNDS_BY_TYPE
+
+    rng = np.random.default_rng(args.seed)
+    bounds = np.stack([INPUT_BOUNDS_BY_TYPE[t] for t in TYPE_IDS])
+    lo, hi = bounds[:, :, 0].min(axis=0), bounds[:, :, 1].max(axis=0)
+    X = lo + rng.random((args.rows, len(FEATURE_COLS))) * (hi - lo)
+    X[:, FEATURE_COLS.index("heavy_metals")] = rng.random(args.rows) < 0.5
+
+    t0 = time.perf_counter()
+    frames = [X[i:i + args.frame_rows] for i in range(0, len(X), args.frame_rows)]
+    types = np.concatenate([out["type"] for out in stream_predict(args.host, args.port, frames)])
+    elapsed = time.perf_counter() - t0
+    print(f"{len(types)} rows in {len(frames)} frames: {elapsed:.2f} s "
+          f"({len(types) / elapsed:,.0f} rows/s)")
+    print("rows per type:", {int(t): int(c) for t, c in zip(*np.unique(types, return_counts=True))})
+
+
+if __name__ == "__main__":
+    main()
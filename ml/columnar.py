@@ -0,0 +1,258 @@
+"""
+Struct-of-arrays encodings of batch results:
+POST /predict-design/batch?layout=columnar.
+
+The row layout repeats every key (stage_times_min, t_screening_min, ...)
+in every design and formats each number inside its own dict. The columnar
+layout groups the rows by predicted type and returns one array per output
+column of each group, so encoding is a handful of list dumps per type.
+
+JSON (default):
+  {"layout": "columnar", "n_rows": N,
+   "predicted_type": [N],      type of input row r: entry j of a group is
+                               the j-th input row predicted as that type
+   "ood_feature_bits": FEATURE_COLS,
+   "groups": [{"predicted_type": t, "n_rows": n,
+               "type_probability": [n], "cost_per_m3_inr": [n],
+               "ood_mask": [n],          bit i = ood_feature_bits[i]
+               "rule_cost_entries": [k], entries costed by the rules (ood="rules")
+               "stage_times_min": {time column: [n]},
+               "stage_equipment": {equip column: {"dictionary": [labels],
+                                                  "index": [n]}}   (labels)
+               | "stage_equipment_codes": {equip column: [n]}}, ...]}
+  Labels are dictionary-encoded per column: entry j's label is
+  dictionary[index[j]]. Numbers are rounded like the row layout (times and
+  costs 0.01, probabilities 0.0001). With equipment=codes the document also
+  carries "equipment_vocab_version".
+
+Arrow IPC stream (Accept: application/vnd.apache.arrow.stream, needs
+pyarrow): one record batch per type group, all with the schema
+  row uint32, predicted_type uint8, type_probability float32,
+  cost_per_m3_inr float32, ood_mask uint16, rule_cost bool,
+  stage{i}_time_min float32, stage{i}_equipment (dictionary-encoded labels,
+  int8 indices, or uint8 codes) for i = 1..MAX_STAGES, null past the
+  type's last stage.
+Stage i of type t is TIME_COLS_BY_TYPE[t][i - 1]; the schema metadata
+("stages") lists them. Values are not rounded.
+
+--benchmark scores the same sampled designs in both layouts and times the
+scoring and the response encoding (row layout as FastAPI encodes it) for
+each --rows batch size. Payloads (50,000 rows, labels): rows 31.5 MB,
+columnar JSON 3.65 MB (8.6x), Arrow 3.05 MB (10.3x). The JSON numbers keep
+the row layout's rounding and make up most of the columnar JSON, so JSON
+stays just under an order of magnitude; Arrow is the layout for the full
+reduction.
+
+Usage (from ml/):
+  python columnar.py --benchmark --rows 1000 10000 50000
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from plant_schema import FEATURE_COLS, STAGES_BY_TYPE, TYPE_IDS
+
+
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+MAX_STAGES = max(len(STAGES_BY_TYPE[t]) for t in TYPE_IDS)
+
+# Per-row arrays of a group (everything but "type" and the column names)
+ROW_FIELDS = ("rows", "probability", "times", "equipment", "equip_codes", "cost", "ood",
+              "rule_cost")
+
+
+def wants_arrow(accept: str) -> bool:
+    return ARROW_MEDIA_TYPE in (accept or "")
+
+
+def expand_duplicates(groups: list, inverse: np.ndarray) -> list:
+    """
+    Groups scored on the unique rows of a batch → groups over the input rows
+    (np.unique(..., return_inverse=True) maps input row → unique row).
+    """
+    expanded = []
+    for g in groups:
+        position = np.full(inverse.max() + 1, -1)
+        position[g["rows"]] = np.arange(len(g["rows"]))
+        where = position[inverse]
+        rows = np.flatnonzero(where >= 0)
+        take = where[rows]
+        out = {k: v for k, v in g.items() if k not in ROW_FIELDS}
+        out.update({k: g[k][take] for k in ROW_FIELDS})
+        out["rows"] = rows
+        expanded.append(out)
+    return expanded
+
+
+def input_types(groups: list, n_rows: int) -> np.ndarray:
+    """Predicted type of every input row (group rows are in input order)."""
+    types = np.zeros(n_rows, dtype=np.int64)
+    for g in groups:
+        types[g["rows"]] = g["type"]
+    return types
+
+
+
+
+# ---------------------- JSON ----------------------
+
+def encode_json(groups: list, n_rows: int, equipment_mode: str, vocab_version=None) -> bytes:
+    def equipment(g, i):
+        if equipment_mode == "codes":
+            return g["equipment"][:, i].tolist()
+        # The stage's label list is the dictionary, the model's codes index it
+        return {"dictionary": g["equip_labels"][i], "index": g["equip_codes"][:, i].tolist()}
+
+    equip_key = "stage_equipment_codes" if equipment_mode == "codes" else "stage_equipment"
+    doc = {
+        "layout": "columnar",
+        "n_rows": n_rows,
+        "predicted_type": input_types(groups, n_rows).tolist(),
+        "ood_feature_bits": FEATURE_COLS,
+        "groups": [
+            {
+                "predicted_type": g["type"],
+                "n_rows": len(g["rows"]),
+                "type_probability": np.round(g["probability"], 4).tolist(),
+                "cost_per_m3_inr": np.round(g["cost"], 2).tolist(),
+                "ood_mask": g["ood"].tolist(),
+                "rule_cost_entries": np.flatnonzero(g["rule_cost"]).tolist(),
+                "stage_times_min": {
+                    col: np.round(g["times"][:, i], 2).tolist()
+                    for i, col in enumerate(g["time_cols"])
+                },
+                equip_key: {col: equipment(g, i) for i, col in enumerate(g["equip_cols"])},
+            }
+            for g in groups
+        ],
+    }
+    if equipment_mode == "codes":
+        doc["equipment_vocab_version"] = vocab_version
+    return json.dumps(doc, separators=(",", ":")).encode()
+
+
+# ---------------------- ARROW ----------------------
+
+def encode_arrow(groups: list, equipment_mode: str, vocab_version=None) -> bytes:
+    """Arrow IPC stream, one record batch per group; ImportError without pyarrow."""
+    import pyarrow as pa
+
+    if equipment_mode == "codes":
+        equip_type = pa.uint8()
+    else:
+        # One dictionary for the whole stream, so every batch shares it
+        labels = sorted(set().union(*(g["equipment"].ravel() for g in groups)))
+        lookup = {label: i for i, label in enumerate(labels)}
+        dictionary = pa.array(labels, type=pa.string())
+        small = len(labels) < 128
+        index_type, index_dtype = (pa.int8(), np.int8) if small else (pa.int16(), np.int16)
+        equip_type = pa.dictionary(index_type, pa.string())
+
+    fields = [
+        pa.field("row", pa.uint32()),
+        pa.field("predicted_type", pa.uint8()),
+        pa.field("type_probability", pa.float32()),
+        pa.field("cost_per_m3_inr", pa.float32()),
+        pa.field("ood_mask", pa.uint16()),
+        pa.field("rule_cost", pa.bool_()),
+    ]
+    for i in range(1, MAX_STAGES + 1):
+        fields += [pa.field(f"stage{i}_time_min", pa.float32()),
+                   pa.field(f"stage{i}_equipment", equip_type)]
+    metadata = {
+        "stages": json.dumps({str(t): STAGES_BY_TYPE[t] for t in TYPE_IDS}),
+        "ood_feature_bits": json.dumps(FEATURE_COLS),
+    }
+    if vocab_version is not None:
+        metadata["equipment_vocab_version"] = str(vocab_version)
+    schema = pa.schema(fields, metadata=metadata)
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for g in groups:
+            n, k = len(g["rows"]), g["times"].shape[1]
+            columns = [
+                pa.array(g["rows"], pa.uint32()),
+                pa.array(np.full(n, g["type"]), pa.uint8()),
+                pa.array(g["probability"], pa.float32()),
+                pa.array(g["cost"], pa.float32()),
+                pa.array(g["ood"], pa.uint16()),
+                pa.array(g["rule_cost"], pa.bool_()),
+            ]
+            for i in range(MAX_STAGES):
+                if i >= k:
+                    columns += [pa.nulls(n, pa.float32()), pa.nulls(n, equip_type)]
+                    continue
+                columns.append(pa.array(g["times"][:, i], pa.float32()))
+                if equipment_mode == "codes":
+                    columns.append(pa.array(g["equipment"][:, i], pa.uint8()))
+                else:
+                    idx = np.fromiter((lookup[x] for x in g["equipment"][:, i]), index_dtype, n)
+                    columns.append(pa.DictionaryArray.from_arrays(
+                        pa.array(idx, index_type), dictionary
+                    ))
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+    return sink.getvalue().to_pybytes()
+
+
+# ---------------------- BENCHMARK ----------------------
+
+def _timed(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def benchmark(rows: int, seed: int = 0) -> dict:
+    """Scoring and encoding time (s) and payload size (bytes) of both layouts."""
+    from fastapi.encoders import jsonable_encoder
+
+    import app
+    from serve import sample_designs
+
+    designs = sample_designs(rows, np.random.default_rng(seed))
+    X = np.array([[float(d[c]) for c in FEATURE_COLS] for d in designs], dtype=np.float64)
+
+    results, score_rows = _timed(app.predict_designs, X)
+    body, encode_rows = _timed(lambda: json.dumps(jsonable_encoder(results)).encode())
+    groups, score_columnar = _timed(app.predict_columnar, X)
+    doc, encode_columnar = _timed(encode_json, groups, rows, "labels")
+    row = {
+        "rows": rows,
+        "score_rows_s": score_rows, "encode_rows_s": encode_rows, "rows_bytes": len(body),
+        "score_columnar_s": score_columnar, "encode_json_s": encode_columnar,
+        "json_bytes": len(doc),
+    }
+    try:
+        encode_arrow([], "labels")  # pyarrow's lazy imports stay out of the timing
+        arrow, row["encode_arrow_s"] = _timed(encode_arrow, groups, "labels")
+        row["arrow_bytes"] = len(arrow)
+    except ImportError:
+        pass
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Row vs columnar batch response layouts")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10_000, 50_000])
+    args = parser.parse_args()
+    if not args.benchmark:
+        parser.error("nothing to do (library module; see --benchmark)")
+
+    for rows in args.rows:
+        r = benchmark(rows)
+        print(f"{rows:>7} rows: score {r['score_rows_s']:.2f}s rows / "
+              f"{r['score_columnar_s']:.2f}s columnar; encode rows {r['encode_rows_s']:.3f}s "
+              f"({r['rows_bytes'] / 1e6:.2f} MB), json {r['encode_json_s']:.3f}s "
+              f"({r['json_bytes'] / 1e6:.2f} MB)", end="")
+        if "encode_arrow_s" in r:
+            print(f", arrow {r['encode_arrow_s']:.3f}s ({r['arrow_bytes'] / 1e6:.2f} MB)", end="")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Monte Carlo cost risk over influent variability.
+
+N influent scenarios are sampled around a site's measured values: each
+continuous feature gets gaussian noise whose sigma is --spread times the
+standard deviation of the site type's generator distribution
+(INPUT_BOUNDS_BY_TYPE, uniform), clipped to the range covered by all
+generators. heavy_metals keeps its measured value unless --metals-flip is
+given.
+
+Every scenario goes through the type classifier and then the predicted
+type's time and cost models the API serves:
+  - cost_per_m3_inr from the cost forest (or the cost_lut tables with
+    --cost-engine lut, see cost_surrogate.py; types whose table is marked
+    unfit keep the forest and are listed in "cost_lut_unfit_types")
+  - CAPEX from the generator cost model on the predicted stage times
+    (plant_schema.capex_inr)
+  - type flip = predicted type differs from the site's own type
+
+Scenarios are generated and scored in fixed-size chunks on a process pool.
+Chunk i always uses the seed [seed, i], so results depend only on
+(--seed, --chunk), not on the number of workers. Workers write their
+results straight into shared memory arrays (shared_scoring.SharedArrays),
+so only the job parameters cross the process boundary.
+
+Usage (from ml/):
+  python cost_risk.py --n 1000000
+  python cost_risk.py --site site.json --spread 0.2 --cost-engine lut --json-out risk.json
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from plant_schema import (
+    FEATURE_COLS,
+    INPUT_BOUNDS_BY_TYPE,
+    TYPE_IDS,
+    capex_inr,
+)
+from shared_scoring import SharedArrays
+from thread_control import load_model
+
+
+CHUNK = 1 << 16
+SPREAD = 0.1
+RESULT_FIELDS = (("type", "u1"), ("cost", "<f4"), ("capex", "<f4"))
+QUANTILES = (0.05, 0.5, 0.95, 0.99)
+
+EXAMPLE_SITE = {
+    "pH": 7.2,
+    "TDS_mgL": 1200,
+    "turbidity_NTU": 120,
+    "BOD_mgL": 200,
+    "COD_mgL": 500,
+    "total_nitrogen_mgL": 45,
+    "temperature_C": 30,
+    "flow_m3_day": 1000,
+    "heavy_metals": 1,
+}
+
+HEAVY_METALS = FEATURE_COLS.index("heavy_metals")
+
+# Model domain: the union of every type's generator ranges
+DOMAIN = np.stack([INPUT_BOUNDS_BY_TYPE[t] for t in TYPE_IDS])
+DOMAIN = np.column_stack([DOMAIN[:, :, 0].min(axis=0), DOMAIN[:, :, 1].max(axis=0)])
+
+
+# ---------------------- SAMPLING ----------------------
+
+def sample_scenarios(site: np.ndarray, type_id: int, n: int, spread: float, rng,
+                     metals_flip: float = 0.0) -> np.ndarray:
+    """(n, len(FEATURE_COLS)) scenarios around one site row."""
+    bounds = INPUT_BOUNDS_BY_TYPE[type_id]
+    sigma = spread * (bounds[:, 1] - bounds[:, 0]) / np.sqrt(12.0)
+    sigma[HEAVY_METALS] = 0.0
+    X = site + rng.standard_normal((n, len(FEATURE_COLS))) * sigma
+    np.clip(X, DOMAIN[:, 0], DOMAIN[:, 1], out=X)
+    if metals_flip > 0:
+        flip = rng.random(n) < metals_flip
+        X[:, HEAVY_METALS] = np.where(flip, 1.0 - site[HEAVY_METALS], site[HEAVY_METALS])
+    return X
+
+
+# ---------------------- WORKERS ----------------------
+
+_MODELS = {}
+_RESULTS = {}
+
+
+def _load_models(cost_engine: str = "forest"):
+    """Per-process models (n_jobs=1: the pool already uses every core)."""
+    _MODELS.clear()
+    _MODELS["cost_engine"] = cost_engine
+    _MODELS["classifier"] = load_model("model_type_classifier.joblib", n_jobs=1)
+    for t in TYPE_IDS:
+        _MODELS[("times", t)] = load_model(f"model_type{t}_times.joblib", n_jobs=1)
+    tables = {}
+    if cost_engine == "lut":
+        from cost_surrogate import load_cost_tables
+        tables = load_cost_tables()
+    for t in TYPE_IDS:
+        if t in tables:
+            _MODELS[("cost", t)] = tables[t].lookup
+        else:
+            cost = load_model(f"model_type{t}_cost.joblib", n_jobs=1)
+            _MODELS[("cost", t)] = lambda X, m=cost: m.predict(pd.DataFrame(X, columns=FEATURE_COLS))
+    _MODELS["lut_types"] = sorted(tables)
+
+
+def score_scenarios(X: np.ndarray) -> dict:
+    """Predicted type, cost per m3 and CAPEX for every scenario row."""
+    frame = pd.DataFrame(X, columns=FEATURE_COLS)
+    pred = _MODELS["classifier"].predict(frame).astype(np.uint8)
+    cost = np.empty(len(X), dtype=np.float32)
+    capex = np.empty(len(X), dtype=np.float32)
+    for t in np.unique(pred):
+        rows = np.flatnonzero(pred == t)
+        times = _MODELS[("times", int(t))].predict(frame.iloc[rows])
+        cost[rows] = _MODELS[("cost", int(t))](X[rows])
+        capex[rows] = capex_inr(int(t), X[rows], np.asarray(times).reshape(len(rows), -1))
+    return {"type": pred, "cost": cost, "capex": capex}
+
+
+def _init_worker(cost_engine: str, spec: dict):
+    _load_models(cost_engine)
+    _RESULTS["shared"] = SharedArrays.attach(spec)
+
+
+def _run_chunk(args) -> dict:
+    site, type_id, n, spread, metals_flip, seed, index, _ = args
+    rng = np.random.default_rng([seed, index])
+    X = sample_scenarios(site, type_id, n, spread, rng, metals_flip)
+    return score_scenarios(X)
+
+
+def _fill_chunk(args):
+    """_run_chunk into rows start:start + n of the shared result arrays."""
+    start, n = args[-1], args[2]
+    res = _run_chunk(args)
+    for name, _ in RESULT_FIELDS:
+        _RESULTS["shared"][name][start:start + n] = res[name]
+
+
+# ---------------------- REPORT ----------------------
+
+def distribution(values: np.ndarray) -> dict:
+    values = values.astype(np.float64)
+    qs = np.quantile(values, QUANTILES)
+    tail = values[values >= qs[QUANTILES.index(0.95)]]
+    out = {"mean": float(values.mean()), "std": float(values.std())}
+    out.update({f"p{round(q * 100):g}": float(v) for q, v in zip(QUANTILES, qs)})
+    out["cvar95"] = float(tail.mean())   # mean of the worst 5%
+    return {k: round(v, 2) for k, v in out.items()}
+
+
+def report(site_type: int, res: dict) -> dict:
+    types = res["type"]
+    shares = np.bincount(types, minlength=max(TYPE_IDS) + 1)[TYPE_IDS] / len(types)
+    return {
+        "site_type": site_type,
+        "scenarios": int(len(types)),
+        "type_flip_probability": round(float((types != site_type).mean()), 5),
+        "type_shares": {str(t): round(float(p), 5) for t, p in zip(TYPE_IDS, shares)},
+        "cost_per_m3_inr": distribution(res["cost"]),
+        "capex_inr": distribution(res["capex"]),
+        "cost_per_m3_inr_by_type": {
+            str(t): distribution(res["cost"][types == t]) for t in TYPE_IDS if (types == t).any()
+        },
+    }
+
+
+def run(site: dict, n: int, spread: float = SPREAD, seed: int = 0, workers: int = None,
+        chunk: int = CHUNK, cost_engine: str = "forest", metals_flip: float = 0.0) -> dict:
+    workers = workers or os.cpu_count()
+    row = np.array([float(site[c]) for c in FEATURE_COLS])
+
+    if _MODELS.get("cost_engine") != cost_engine:
+        _load_models(cost_engine)
+    site_type = int(_MODELS["classifier"].predict(pd.DataFrame([row], columns=FEATURE_COLS))[0])
+
+    jobs = [
+        (row, site_type, min(chunk, n - start), spread, metals_flip, seed, i, start)
+        for i, start in enumerate(range(0, n, chunk))
+    ]
+    t0 = time.perf_counter()
+    if workers > 1 and len(jobs) > 1:
+        layout = {name: ((n,), dtype) for name, dtype in RESULT_FIELDS}
+        with SharedArrays.create(layout) as shared:
+            with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                     initargs=(cost_engine, shared.spec)) as pool:
+                list(pool.map(_fill_chunk, jobs))
+            res = {name: shared[name].copy() for name, _ in RESULT_FIELDS}
+    else:
+        parts = [_run_chunk(job) for job in jobs]
+        res = {k: np.concatenate([p[k] for p in parts]) for k, _ in RESULT_FIELDS}
+
+    out = report(site_type, res)
+    out["elapsed_s"] = round(time.perf_counter() - t0, 3)
+    out["workers"] = workers
+    out["cost_engine"] = cost_engine
+    if cost_engine == "lut":
+        out["cost_lut_unfit_types"] = [t for t in TYPE_IDS if t not in _MODELS["lut_types"]]
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo cost risk for one site")
+    parser.add_argument("--site", default="", help="JSON file with the site's FEATURE_COLS values")
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--spread", type=float, default=SPREAD,
+                        help="noise sigma as a fraction of the generator std per feature")
+    parser.add_argument("--metals-flip", type=float, default=0.0,
+                        help="probability that heavy_metals differs from the measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk", type=int, default=CHUNK)
+    parser.add_argument("--cost-engine", choices=("forest", "lut"), default="forest")
+    parser.add_argument("--json-out", default="")
+    args = parser.parse_args()
+
+    site = EXAMPLE_SITE
+    if args.site:
+        with open(args.site) as f:
+            site = {**EXAMPLE_SITE, **json.load(f)}
+
+    out = run(site, args.n, args.spread, args.seed, args.workers, args.chunk,
+              args.cost_engine, args.metals_flip)
+    print(json.dumps(out, indent=2))
+    print(f"{out['scenarios'] / out['elapsed_s']:,.0f} scenarios/s on {out['workers']} workers")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(out, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+"""
+Lookup-table surrogate for the per-type cost models.
+
+cost_per_m3_inr is driven almost entirely by flow and a few load features
+(TDS, turbidity, BOD/COD), and a random forest is piecewise constant between
+its split thresholds, all of which lie inside the training range. So each
+model_type{t}_cost.joblib is evaluated once over a regular grid and queries
+become multilinear interpolation in that table.
+
+Build (per type):
+  1. Axes: features whose forest importance is at least --min-importance,
+     most important first, as many as a START_KNOTS grid fits in the budget.
+     The remaining features are frozen at their training median.
+  2. Adaptive resolution: every axis starts with START_KNOTS knots spanning
+     the training min..max. The axis whose midpoint interpolation error
+     (measured on random lines through training rows) is largest is refined
+     (n -> 2n - 1, or as far as the grid budget allows); an axis that cannot
+     grow within the budget is skipped and the next-worst one refined, until
+     no axis can grow or every axis is below --tolerance.
+  3. The forest is evaluated on the full grid and stored as float32 .npy
+     (cost_lut/type{t}.npy), opened memory-mapped by the lookup.
+  4. Error report: |table - forest| on the training rows (includes the
+     frozen features) and on uniform points inside the grid box (pure
+     interpolation error), saved in cost_lut/meta.json.
+  5. Fitness: a table whose p99 error exceeds --max-p99 (MAX_P99_ERROR,
+     INR/m3) or whose max error exceeds --max-error (MAX_ABS_ERROR) in
+     either report is saved with "fit_for_lut": false and the reasons.
+     load_cost_tables() skips unfit types (cost_risk.py --cost-engine lut
+     scores them with the forest) and the build exits with status 1.
+
+Most of the training-row error comes from the frozen features: at low flow
+the forest splits on every feature (importance < 1 % each), which no grid
+within the budget can follow. Types with that kind of forest come out unfit
+rather than silently inaccurate.
+
+Inputs outside the box are clamped to it, which matches the forest: no
+split exists beyond the training range.
+
+Usage (from ml/, after train_all_models.py):
+  python cost_surrogate.py                 # build all types + report
+  python cost_surrogate.py --bench         # lookup throughput only
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from plant_schema import FEATURE_COLS, CSV_BY_TYPE, TYPE_IDS
+
+
+LUT_DIR = "cost_lut"
+META_FILE = "meta.json"
+
+GRID_BUDGET = 1 << 17       # grid points per type
+MIN_IMPORTANCE = 0.01
+START_KNOTS = 5
+LINE_SAMPLES = 64           # random lines per axis when scoring resolution
+TOLERANCE = 0.01            # mean midpoint error (INR/m3) at which an axis stops refining
+MAX_P99_ERROR = 2.5         # INR/m3, p99 |table - forest| allowed for --cost-engine lut
+MAX_ABS_ERROR = 15.0        # INR/m3, max |table - forest| allowed for --cost-engine lut
+CHUNK_ROWS = 1 << 16        # rows per forest-evaluation chunk
+LOOKUP_CHUNK = 1 << 14      # rows per interpolation chunk (keeps corners in cache)
+
+
+# ---------------------- BUILD ----------------------
+
+def _file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()[:12]
+
+
+def forest_cost(model, X: np.ndarray) -> np.ndarray:
+    """Forest predictions for a (n, len(FEATURE_COLS)) matrix, chunked."""
+    out = np.empty(len(X))
+    for start in range(0, len(X), CHUNK_ROWS):
+        chunk = pd.DataFrame(X[start:start + CHUNK_ROWS], columns=FEATURE_COLS)
+        out[start:start + CHUNK_ROWS] = model.predict(chunk)
+    return out
+
+
+def select_axes(model, X: np.ndarray, min_importance: float = MIN_IMPORTANCE,
+                budget: int = GRID_BUDGET):
+    """Grid axes (feature indices, column order) and frozen feature values."""
+    importance = model.feature_importances_
+    ranked = [i for i in np.argsort(-importance, kind="stable") if importance[i] >= min_importance]
+    max_axes = max(1, int(np.log(budget) / np.log(START_KNOTS) + 1e-9))
+    axes = sorted(int(i) for i in ranked[:max_axes])
+    fixed = {i: float(np.median(X[:, i])) for i in range(len(FEATURE_COLS)) if i not in axes}
+    return axes, fixed
+
+
+def _axis_score(model, X, fixed, axis, lo, hi, n_knots, rng) -> float:
+    """Mean |forest(mid) - linear interpolation| along one axis on random lines."""
+    base = X[rng.choice(len(X), size=min(LINE_SAMPLES, len(X)), replace=False)].copy()
+    for i, v in fixed.items():
+        base[:, i] = v
+    pts = np.linspace(lo, hi, 2 * n_knots - 1)      # knots at even, midpoints at odd
+    lines = np.repeat(base, len(pts), axis=0)
+    lines[:, axis] = np.tile(pts, len(base))
+    y = forest_cost(model, lines).reshape(len(base), len(pts))
+    interp = 0.5 * (y[:, 0:-1:2] + y[:, 2::2])
+    return float(np.abs(y[:, 1::2] - interp).mean())
+
+
+def refine_resolution(model, X, axes, fixed, budget=GRID_BUDGET,
+                      tolerance=TOLERANCE, seed=0) -> dict:
+    """Knot count per axis, refining the worst-interpolated axis first."""
+    rng = np.random.default_rng(seed)
+    lo, hi = X.min(axis=0), X.max(axis=0)
+    knots = {a: START_KNOTS for a in axes}
+    score = {a: _axis_score(model, X, fixed, a, lo[a], hi[a], knots[a], rng) for a in axes}
+
+    full = set()    # axes whose next refinement no longer fits the budget
+    while True:
+        candidates = [a for a in axes if score[a] > tolerance and hi[a] > lo[a] and a not in full]
+        if not candidates:
+            break
+        worst = max(candidates, key=score.get)
+        others = int(np.prod([knots[a] for a in axes])) // knots[worst]
+        n = min(2 * knots[worst] - 1, budget // others)
+        if n <= knots[worst]:
+            # The grid only grows, so this axis stays full; refine the next-worst
+            full.add(worst)
+            continue
+        knots[worst] = n
+        score[worst] = _axis_score(model, X, fixed, worst, lo[worst], hi[worst], knots[worst], rng)
+    return {"knots": knots, "midpoint_error": score}
+
+
+def grid_points(axes, lo, hi, knots, fixed) -> np.ndarray:
+    """Every grid point as a feature row, C order over axes (last axis fastest)."""
+    coords = np.meshgrid(*[np.linspace(lo[a], hi[a], knots[a]) for a in axes], indexing="ij")
+    X = np.empty((coords[0].size, len(FEATURE_COLS)))
+    for a, c in zip(axes, coords):
+        X[:, a] = c.ravel()
+    for i, v in fixed.items():
+        X[:, i] = v
+    return X
+
+
+def _error_stats(err: np.ndarray, ref: np.ndarray) -> dict:
+    rel = err / np.maximum(np.abs(ref), 1e-9)
+    return {
+        "n": int(len(err)),
+        "max_abs": round(float(err.max()), 4),
+        "p99_abs": round(float(np.percentile(err, 99)), 4),
+        "mean_abs": round(float(err.mean()), 4),
+        "max_rel": round(float(rel.max()), 5),
+        "p99_rel": round(float(np.percentile(rel, 99)), 5),
+    }
+
+
+def error_report(table, model, X: np.ndarray, n_uniform: int = 20000, seed: int = 0) -> dict:
+    """Table vs forest on the training rows and on uniform points in the box."""
+    rng = np.random.default_rng(seed)
+    y = forest_cost(model, X)
+    report = {"training_rows": _error_stats(np.abs(table.lookup(X) - y), y)}
+
+    U = np.empty((n_uniform, len(FEATURE_COLS)))
+    for a, lo, hi in zip(table.axes, table.lo, table.hi):
+        U[:, a] = rng.uniform(lo, hi, n_uniform)
+    for i, v in table.fixed.items():
+        U[:, i] = v
+    yu = forest_cost(model, U)
+    report["uniform_in_box"] = _error_stats(np.abs(table.lookup(U) - yu), yu)
+    return report
+
+
+def unfit_reasons(report: dict, max_p99: float = MAX_P99_ERROR,
+                  max_error: float = MAX_ABS_ERROR) -> list:
+    """Why an error report fails the --cost-engine lut bounds ([] if it passes)."""
+    reasons = []
+    for name, stats in report.items():
+        if stats["p99_abs"] > max_p99:
+            reasons.append(f"{name} p99 {stats['p99_abs']} > {max_p99} INR/m3")
+        if stats["max_abs"] > max_error:
+            reasons.append(f"{name} max {stats['max_abs']} > {max_error} INR/m3")
+    return reasons
+
+
+def build_table(type_id: int, out_dir: str = LUT_DIR, budget: int = GRID_BUDGET,
+                min_importance: float = MIN_IMPORTANCE, tolerance: float = TOLERANCE,
+                max_p99: float = MAX_P99_ERROR, max_error: float = MAX_ABS_ERROR) -> dict:
+    model_path = f"model_type{type_id}_cost.joblib"
+    model = joblib.load(model_path)
+    X = pd.read_csv(CSV_BY_TYPE[type_id])[FEATURE_COLS].to_numpy(dtype=np.float64)
+
+    axes, fixed = select_axes(model, X, min_importance, budget)
+    res = refine_resolution(model, X, axes, fixed, budget, tolerance)
+    lo, hi = X.min(axis=0), X.max(axis=0)
+    knots = res["knots"]
+
+    t0 = time.perf_counter()
+    values = forest_cost(model, grid_points(axes, lo, hi, knots, fixed))
+    shape = tuple(knots[a] for a in axes)
+    path = os.path.join(out_dir, f"type{type_id}.npy")
+    np.save(path, values.astype(np.float32).reshape(shape))
+    build_s = time.perf_counter() - t0
+
+    entry = {
+        "file": os.path.basename(path),
+        "model": model_path,
+        "model_sha1": _file_sha1(model_path),
+        "axes": [
+            {"feature": FEATURE_COLS[a], "lo": float(lo[a]), "hi": float(hi[a]), "knots": knots[a]}
+            for a in axes
+        ],
+        "fixed": {FEATURE_COLS[i]: v for i, v in fixed.items()},
+        "midpoint_error": {FEATURE_COLS[a]: round(s, 5) for a, s in res["midpoint_error"].items()},
+        "grid_points": int(np.prod(shape)),
+        "build_s": round(build_s, 2),
+    }
+    entry["error"] = error_report(CostTable.from_entry(entry, out_dir), model, X)
+    entry["unfit"] = unfit_reasons(entry["error"], max_p99, max_error)
+    entry["fit_for_lut"] = not entry["unfit"]
+    return entry
+
+
+def build_all(out_dir: str = LUT_DIR, **kwargs) -> dict:
+    os.makedirs(out_dir, exist_ok=True)
+    meta = {
+        "version": 1,
+        "grid_budget": kwargs.get("budget", GRID_BUDGET),
+        "max_p99_abs": kwargs.get("max_p99", MAX_P99_ERROR),
+        "max_abs": kwargs.get("max_error", MAX_ABS_ERROR),
+        "types": {},
+    }
+    for t in TYPE_IDS:
+        entry = build_table(t, out_dir, **kwargs)
+        meta["types"][str(t)] = entry
+        shape = "x".join(str(ax["knots"]) for ax in entry["axes"])
+        err = entry["error"]
+        print(f"type {t}: axes {[ax['feature'] for ax in entry['axes']]} grid {shape} "
+              f"({entry['grid_points']} pts, {entry['build_s']} s)")
+        print(f"   training rows  max {err['training_rows']['max_abs']} "
+              f"p99 {err['training_rows']['p99_abs']} mean {err['training_rows']['mean_abs']} INR/m3")
+        print(f"   uniform in box max {err['uniform_in_box']['max_abs']} "
+              f"p99 {err['uniform_in_box']['p99_abs']} mean {err['uniform_in_box']['mean_abs']} INR/m3")
+        for reason in entry["unfit"]:
+            print(f"   UNFIT for --cost-engine lut: {reason}")
+    with open(os.path.join(out_dir, META_FILE), "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+# ---------------------- LOOKUP ----------------------
+
+class CostTable:
+    """Multilinear interpolation in one type's memory-mapped cost grid."""
+
+    def __init__(self, table: np.ndarray, axes, lo, hi, fixed=None):
+        self.table = table
+        self.flat = table.reshape(-1)
+        self.axes = list(axes)                       # feature indices, grid order
+        self.lo = np.asarray(lo, dtype=np.float64)
+        self.hi = np.asarray(hi, dtype=np.float64)
+        self.fixed = dict(fixed or {})
+        self.knots = np.array(table.shape)
+        span = np.where(self.hi > self.lo, self.hi - self.lo, 1.0)
+        self.scale = (self.knots - 1) / span
+        self.strides = np.array([s // table.itemsize for s in table.strides], dtype=np.int32)
+        # Flat offset of each cell corner; bit k of the corner id (from the
+        # least significant end) steps along the k-th axis from the last.
+        d = len(self.axes)
+        bits = (np.arange(1 << d)[:, None] >> np.arange(d)[::-1]) & 1
+        self.corners = (bits * self.strides).sum(axis=1).astype(np.int32)
+
+    @classmethod
+    def from_entry(cls, entry: dict, root: str = LUT_DIR):
+        table = np.load(os.path.join(root, entry["file"]), mmap_mode="r")
+        axes = [FEATURE_COLS.index(ax["feature"]) for ax in entry["axes"]]
+        fixed = {FEATURE_COLS.index(k): v for k, v in entry["fixed"].items()}
+        return cls(
+            table, axes,
+            [ax["lo"] for ax in entry["axes"]],
+            [ax["hi"] for ax in entry["axes"]],
+            fixed,
+        )
+
+    def lookup(self, X, out=None) -> np.ndarray:
+        """Cost for a (n, len(FEATURE_COLS)) matrix; only the grid axes are read."""
+        X = np.asarray(X)
+        n = len(X)
+        if out is None:
+            out = np.empty(n)
+        for start in range(0, n, LOOKUP_CHUNK):
+            sl = slice(start, start + LOOKUP_CHUNK)
+            out[sl] = self._interpolate([X[sl, a] for a in self.axes])
+        return out
+
+    def lookup_axes(self, *columns, out=None) -> np.ndarray:
+        """Cost from one 1-D array per grid axis (in self.axes order) – for sweeps."""
+        columns = np.broadcast_arrays(*[np.asarray(c, dtype=np.float64) for c in columns])
+        shape = columns[0].shape
+        flat_cols = [c.reshape(-1) for c in columns]
+        n = flat_cols[0].size
+        res = np.empty(n) if out is None else out.reshape(-1)
+        for start in range(0, n, LOOKUP_CHUNK):
+            sl = slice(start, start + LOOKUP_CHUNK)
+            res[sl] = self._interpolate([c[sl] for c in flat_cols])
+        return res.reshape(shape)
+
+    def _interpolate(self, columns) -> np.ndarray:
+        # In-place arithmetic throughout: the temporaries, not the gather,
+        # dominated the lookup time
+        m = len(columns[0])
+        base = np.zeros(m, dtype=np.intp)
+        frac = []
+        for k, col in enumerate(columns):
+            u = col - self.lo[k]
+            u *= self.scale[k]
+            np.clip(u, 0.0, self.knots[k] - 1, out=u)
+            i = u.astype(np.intp)
+            np.minimum(i, self.knots[k] - 2, out=i)
+            u -= i
+            frac.append(u.astype(np.float32)[:, None])
+            i *= self.strides[k]
+            base += i
+        vals = self.flat.take(base[:, None] + self.corners)
+        # Collapse the corner axis one grid axis at a time, last axis first
+        for f in reversed(frac):
+            vals = vals.reshape(m, -1, 2)
+            low = vals[:, :, 0]
+            vals = vals[:, :, 1] - low
+            vals *= f
+            vals += low
+        return vals[:, 0]
+
+
+def load_cost_tables(root: str = LUT_DIR, include_unfit: bool = False) -> dict:
+    """
+    {type_id: CostTable} from a built cost_lut directory. Types whose table
+    failed the error bounds (or predates them) are left out unless include_unfit.
+    """
+    with open(os.path.join(root, META_FILE)) as f:
+        meta = json.load(f)
+    return {
+        int(t): CostTable.from_entry(entry, root)
+        for t, entry in meta["types"].items()
+        if include_unfit or entry.get("fit_for_lut", False)
+    }
+
+
+# ---------------------- BENCHMARK ----------------------
+
+def benchmark(tables: dict, n: int = 1_000_000, seed: int = 0, repeats: int = 3):
+    rng = np.random.default_rng(seed)
+    for t, table in tables.items():
+        cols = [rng.uniform(lo, hi, n) for lo, hi in zip(table.lo, table.hi)]
+        out = np.empty(n)
+        table.lookup_axes(*[c[:1000] for c in cols])   # warm the page cache
+        best = np.inf
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            table.lookup_axes(*cols, out=out)
+            best = min(best, time.perf_counter() - t0)
+        print(f"type {t}: {n / best:,.0f} lookups/s ({len(table.axes)} axes, "
+              f"{table.table.size} grid points)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build / benchmark the cost lookup tables")
+    parser.add_argument("--out", default=LUT_DIR)
+    parser.add_argument("--budget", type=int, default=GRID_BUDGET, help="grid points per type")
+    parser.add_argument("--min-importance", type=float, default=MIN_IMPORTANCE)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--max-p99", type=float, default=MAX_P99_ERROR,
+                        help="p99 |table - forest| (INR/m3) above which a type is unfit")
+    parser.add_argument("--max-error", type=float, default=MAX_ABS_ERROR,
+                        help="max |table - forest| (INR/m3) above which a type is unfit")
+    parser.add_argument("--bench", action="store_true", help="skip the build, benchmark lookups")
+    args = parser.parse_args()
+
+    unfit = []
+    if not args.bench:
+        meta = build_all(args.out, budget=args.budget, min_importance=args.min_importance,
+                         tolerance=args.tolerance, max_p99=args.max_p99, max_error=args.max_error)
+        unfit = [t for t, entry in meta["types"].items() if not entry["fit_for_lut"]]
+    benchmark(load_cost_tables(args.out, include_unfit=True))
+    if unfit:
+        raise SystemExit(f"types {', '.join(unfit)} exceed the error bounds "
+                         f"(p99 {args.max_p99}, max {args.max_error} INR/m3): "
+                         "--cost-engine lut uses the forest for them")
+
+
+if __name__ == "__main__":
+    main()
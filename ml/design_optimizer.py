@@ -0,0 +1,326 @@
+"""
+Cheapest feasible design over controllable inputs.
+
+Some FEATURE_COLS are treated as decision variables (e.g. a per-train flow
+after splitting the flow, or pretreatment targets for TDS / turbidity /
+BOD / COD) inside bounds; the rest stay at the site's values. Each
+candidate is scored by the plant type's time and cost forests:
+
+  objectives  : cost_per_m3_inr (min), total detention time (min)
+  constraints : per-stage time caps and/or a total time cap (minutes)
+
+Search is a vectorized NSGA-II style evolutionary loop: every generation
+evaluates a whole population in one predict() call per model (the forests
+use n_jobs=-1, i.e. all cores). Feasible candidates are ranked by
+non-dominated fronts and crowding distance, infeasible ones by total
+constraint violation. The loop stops at the time budget (or max
+generations); the result is the Pareto set of every feasible candidate
+evaluated.
+
+Usage (from ml/):
+  python design_optimizer.py --site site.json --vary TDS_mgL=300:1200 \\
+      --vary turbidity_NTU=5:50 --max-stage-time 240 --budget 10
+  python design_optimizer.py --vary flow_m3_day=500:5000 \\
+      --max-stage-time t_aeration_min=600 --max-total-time 1500
+"""
+
+import argparse
+import json
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from plant_schema import FEATURE_COLS, TIME_COLS_BY_TYPE, TYPE_IDS
+from thread_control import load_model
+
+
+INTEGER_COLS = {"heavy_metals"}
+
+POPULATION = 256
+TIME_BUDGET_S = 10.0
+MAX_GENERATIONS = 500
+MUTATION_SCALE = 0.1        # gaussian mutation sigma, as a fraction of the bound width
+
+EXAMPLE_SITE = {
+    "pH": 7.2,
+    "TDS_mgL": 1200,
+    "turbidity_NTU": 120,
+    "BOD_mgL": 200,
+    "COD_mgL": 500,
+    "total_nitrogen_mgL": 45,
+    "temperature_C": 30,
+    "flow_m3_day": 1000,
+    "heavy_metals": 1,
+}
+
+
+# ---------------------- MODELS ----------------------
+
+class DesignEvaluator:
+    """Batched time + cost predictions for one plant type."""
+
+    def __init__(self, type_id: int, n_jobs: int = -1):
+        self.type_id = type_id
+        self.time_cols = TIME_COLS_BY_TYPE[type_id]
+        self.time_model = load_model(f"model_type{type_id}_times.joblib", n_jobs)
+        self.cost_model = load_model(f"model_type{type_id}_cost.joblib", n_jobs)
+        self.evaluations = 0
+
+    def __call__(self, X: np.ndarray):
+        """(n, len(FEATURE_COLS)) → stage times (n, n_stages), cost (n,)."""
+        frame = pd.DataFrame(X, columns=FEATURE_COLS)
+        self.evaluations += len(X)
+        times = np.asarray(self.time_model.predict(frame)).reshape(len(X), -1)
+        return times, self.cost_model.predict(frame)
+
+
+def classify_site(site: dict) -> int:
+    clf = joblib.load("model_type_classifier.joblib")
+    return int(clf.predict(pd.DataFrame([site], columns=FEATURE_COLS))[0])
+
+
+# ---------------------- PARETO ----------------------
+
+def dominates(F: np.ndarray) -> np.ndarray:
+    """D[i, j] = row i dominates row j (all objectives <=, one <), minimizing."""
+    le = (F[:, None, :] <= F[None, :, :]).all(axis=2)
+    lt = (F[:, None, :] < F[None, :, :]).any(axis=2)
+    return le & lt
+
+
+def front_ranks(F: np.ndarray) -> np.ndarray:
+    """Non-dominated front index of every row (0 = Pareto front)."""
+    D = dominates(F)
+    n_dominators = D.sum(axis=0)
+    rank = np.full(len(F), -1)
+    front = 0
+    remaining = np.ones(len(F), dtype=bool)
+    while remaining.any():
+        current = remaining & (n_dominators == 0)
+        rank[current] = front
+        remaining &= ~current
+        n_dominators = n_dominators - D[current].sum(axis=0)
+        front += 1
+    return rank
+
+
+def crowding(F: np.ndarray, rank: np.ndarray) -> np.ndarray:
+    """Crowding distance within each front (boundary points get inf)."""
+    dist = np.zeros(len(F))
+    for r in np.unique(rank):
+        idx = np.flatnonzero(rank == r)
+        if len(idx) <= 2:
+            dist[idx] = np.inf
+            continue
+        for k in range(F.shape[1]):
+            order = idx[np.argsort(F[idx, k], kind="stable")]
+            span = F[order[-1], k] - F[order[0], k]
+            dist[order[0]] = dist[order[-1]] = np.inf
+            if span > 0:
+                dist[order[1:-1]] += (F[order[2:], k] - F[order[:-2], k]) / span
+    return dist
+
+
+def pareto_mask(F: np.ndarray) -> np.ndarray:
+    return ~dominates(F).any(axis=0)
+
+
+# ---------------------- SEARCH ----------------------
+
+def violation(times: np.ndarray, stage_caps: np.ndarray, total_cap: float) -> np.ndarray:
+    """Sum of minutes above the caps (0 = feasible)."""
+    v = np.maximum(times - stage_caps, 0.0).sum(axis=1)
+    return v + np.maximum(times.sum(axis=1) - total_cap, 0.0)
+
+
+def select(F: np.ndarray, viol: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the n survivors: feasible by (front, -crowding), then least violation."""
+    feasible = np.flatnonzero(viol == 0)
+    infeasible = np.flatnonzero(viol > 0)
+    order = []
+    if len(feasible):
+        rank = front_ranks(F[feasible])
+        dist = crowding(F[feasible], rank)
+        order.append(feasible[np.lexsort((-dist, rank))])
+    order.append(infeasible[np.argsort(viol[infeasible], kind="stable")])
+    return np.concatenate(order)[:n]
+
+
+def _tournament(n: int, score: np.ndarray, rng) -> np.ndarray:
+    """Binary tournaments on a survivor-order score (lower is better)."""
+    a, b = rng.integers(0, len(score), (2, n))
+    return np.where(score[a] <= score[b], a, b)
+
+
+def make_offspring(P: np.ndarray, lo: np.ndarray, hi: np.ndarray, rng) -> np.ndarray:
+    """Blend crossover + gaussian mutation on a survivor-ordered population."""
+    n, d = P.shape
+    score = np.arange(n)
+    p1 = P[_tournament(n, score, rng)]
+    p2 = P[_tournament(n, score, rng)]
+    alpha = rng.uniform(-0.25, 1.25, (n, d))
+    children = p1 + alpha * (p2 - p1)
+    mutate = rng.random((n, d)) < 1.0 / d
+    children += mutate * rng.normal(0.0, MUTATION_SCALE, (n, d)) * (hi - lo)
+    return np.clip(children, lo, hi)
+
+
+def optimize(site: dict, bounds: dict, type_id: int = None, stage_caps: dict = None,
+             total_cap: float = np.inf, budget_s: float = TIME_BUDGET_S,
+             population: int = POPULATION, max_generations: int = MAX_GENERATIONS,
+             seed: int = 0, evaluator: DesignEvaluator = None) -> dict:
+    """
+    site       : {feature: value} for every FEATURE_COLS entry
+    bounds     : {feature: (lo, hi)} decision variables
+    stage_caps : {time column: max minutes}; a "*" key caps every stage
+    total_cap  : max total detention time (minutes)
+    """
+    unknown = [c for c in bounds if c not in FEATURE_COLS]
+    if unknown:
+        raise ValueError(f"Decision variables must be FEATURE_COLS, got {unknown}")
+    if type_id is None:
+        type_id = classify_site(site)
+    if evaluator is None:
+        evaluator = DesignEvaluator(type_id)
+    time_cols = TIME_COLS_BY_TYPE[type_id]
+
+    stage_caps = dict(stage_caps or {})
+    default_cap = stage_caps.pop("*", np.inf)
+    bad = [c for c in stage_caps if c not in time_cols]
+    if bad:
+        raise ValueError(f"Type {type_id} has no stages {bad}; stages are {time_cols}")
+    caps = np.array([stage_caps.get(c, default_cap) for c in time_cols], dtype=np.float64)
+
+    dec_cols = list(bounds)
+    dec_idx = np.array([FEATURE_COLS.index(c) for c in dec_cols])
+    int_mask = np.array([c in INTEGER_COLS for c in dec_cols])
+    lo = np.array([bounds[c][0] for c in dec_cols], dtype=np.float64)
+    hi = np.array([bounds[c][1] for c in dec_cols], dtype=np.float64)
+    base = np.array([float(site[c]) for c in FEATURE_COLS])
+
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+
+    def evaluate(P):
+        P = np.where(int_mask, np.round(P), P)
+        X = np.repeat(base[None, :], len(P), axis=0)
+        X[:, dec_idx] = P
+        times, cost = evaluator(X)
+        F = np.column_stack([cost, times.sum(axis=1)])
+        return P, times, F, violation(times, caps, total_cap)
+
+    archive = {"P": [], "times": [], "F": []}
+
+    def remember(P, times, F, viol):
+        ok = viol == 0
+        archive["P"].append(P[ok])
+        archive["times"].append(times[ok])
+        archive["F"].append(F[ok])
+
+    P = rng.uniform(lo, hi, (population, len(dec_cols)))
+    P, times, F, viol = evaluate(P)
+    remember(P, times, F, viol)
+    keep = select(F, viol, population)
+    P, times, F, viol = P[keep], times[keep], F[keep], viol[keep]
+
+    generations = 0
+    while generations < max_generations and time.perf_counter() - start < budget_s:
+        C, c_times, c_F, c_viol = evaluate(make_offspring(P, lo, hi, rng))
+        remember(C, c_times, c_F, c_viol)
+        P = np.vstack([P, C])
+        times = np.vstack([times, c_times])
+        F = np.vstack([F, c_F])
+        viol = np.concatenate([viol, c_viol])
+        keep = select(F, viol, population)
+        P, times, F, viol = P[keep], times[keep], F[keep], viol[keep]
+        generations += 1
+
+    all_P = np.vstack(archive["P"])
+    all_times = np.vstack(archive["times"])
+    all_F = np.vstack(archive["F"])
+    # Deduplicate before the O(n^2) dominance check
+    all_F, first = np.unique(all_F, axis=0, return_index=True)
+    all_P, all_times = all_P[first], all_times[first]
+    front = np.flatnonzero(pareto_mask(all_F)) if len(all_F) else np.array([], dtype=int)
+    front = front[np.argsort(all_F[front, 0])]
+
+    return {
+        "type": type_id,
+        "decision_variables": dec_cols,
+        "pareto": [
+            {
+                "inputs": {c: round(float(v), 3) for c, v in zip(dec_cols, all_P[i])},
+                "cost_per_m3_inr": round(float(all_F[i, 0]), 2),
+                "total_time_min": round(float(all_F[i, 1]), 2),
+                "stage_times_min": {
+                    c: round(float(v), 2) for c, v in zip(time_cols, all_times[i])
+                },
+            }
+            for i in front
+        ],
+        "feasible_evaluated": int(len(all_F)),
+        "evaluations": evaluator.evaluations,
+        "generations": generations,
+        "elapsed_s": round(time.perf_counter() - start, 3),
+    }
+
+
+# ---------------------- CLI ----------------------
+
+def _parse_bound(text: str):
+    name, rng = text.split("=", 1)
+    lo, hi = (float(v) for v in rng.split(":"))
+    return name, (min(lo, hi), max(lo, hi))
+
+
+def _parse_cap(text: str):
+    if "=" in text:
+        name, value = text.split("=", 1)
+        return name, float(value)
+    return "*", float(text)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pareto search: cost vs total detention time")
+    parser.add_argument("--site", default="", help="JSON file with the site's FEATURE_COLS values")
+    parser.add_argument("--type", type=int, choices=TYPE_IDS, default=None,
+                        help="plant type (default: classify the site)")
+    parser.add_argument("--vary", action="append", default=[], type=_parse_bound,
+                        help="decision variable FEATURE=lo:hi (repeatable)")
+    parser.add_argument("--max-stage-time", action="append", default=[], type=_parse_cap,
+                        help="MINUTES for every stage, or t_<stage>_min=MINUTES (repeatable)")
+    parser.add_argument("--max-total-time", type=float, default=np.inf)
+    parser.add_argument("--budget", type=float, default=TIME_BUDGET_S, help="seconds")
+    parser.add_argument("--population", type=int, default=POPULATION)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json-out", default="")
+    args = parser.parse_args()
+
+    site = EXAMPLE_SITE
+    if args.site:
+        with open(args.site) as f:
+            site = {**EXAMPLE_SITE, **json.load(f)}
+    bounds = dict(args.vary) or {"TDS_mgL": (300.0, 1200.0), "turbidity_NTU": (5.0, 120.0)}
+
+    result = optimize(
+        site, bounds, type_id=args.type, stage_caps=dict(args.max_stage_time),
+        total_cap=args.max_total_time, budget_s=args.budget,
+        population=args.population, seed=args.seed,
+    )
+
+    print(f"Type {result['type']}: {result['generations']} generations, "
+          f"{result['evaluations']} evaluations in {result['elapsed_s']} s, "
+          f"{result['feasible_evaluated']} feasible")
+    print(f"Pareto set ({len(result['pareto'])} designs):")
+    for p in result["pareto"]:
+        print(f"  cost {p['cost_per_m3_inr']:>8.2f} INR/m3  total {p['total_time_min']:>8.1f} min  {p['inputs']}")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
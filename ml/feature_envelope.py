@@ -0,0 +1,116 @@
+"""
+Per-type feature envelopes: the input ranges each plant type's models were
+trained on, and a vectorized guard that flags requests outside them.
+
+Training (train_all_models.py) writes feature_envelopes.json:
+  {"version", "features", "quantiles",
+   "types": {"<t>": {"n_rows", "min", "max", "quantiles": {"q0.01": [...], ...}}}}
+
+Forests are constant beyond their outermost split, so a row outside its
+type's envelope gets an extrapolated (flat) answer without any warning.
+EnvelopeGuard compiles the envelopes into (n_types, n_features) lower /
+upper tables; checking a batch is one comparison against the rows of
+those tables selected by each row's type.
+
+Without the JSON file the generator ranges from plant_schema are used.
+"""
+
+import hashlib
+import json
+
+import numpy as np
+
+from plant_schema import FEATURE_COLS, INPUT_BOUNDS_BY_TYPE, TYPE_IDS
+
+
+ENVELOPE_PATH = "feature_envelopes.json"
+QUANTILES = (0.001, 0.01, 0.5, 0.99, 0.999)
+
+
+def _qkey(q: float) -> str:
+    return f"q{q:g}"
+
+
+def compute_envelopes(frames: dict) -> dict:
+    """frames: {type_id: DataFrame with FEATURE_COLS} → envelope document."""
+    types = {}
+    for t, df in frames.items():
+        X = df[FEATURE_COLS].to_numpy(dtype=np.float64)
+        qs = np.quantile(X, QUANTILES, axis=0)
+        types[str(t)] = {
+            "n_rows": int(len(X)),
+            "min": X.min(axis=0).tolist(),
+            "max": X.max(axis=0).tolist(),
+            "quantiles": {_qkey(q): row.tolist() for q, row in zip(QUANTILES, qs)},
+        }
+    blob = json.dumps(types, sort_keys=True).encode()
+    return {
+        "version": hashlib.sha1(blob).hexdigest()[:12],
+        "features": FEATURE_COLS,
+        "quantiles": list(QUANTILES),
+        "types": types,
+    }
+
+
+def schema_envelopes() -> dict:
+    """Generator ranges as an envelope document (no quantiles)."""
+    types = {
+        str(t): {
+            "n_rows": 0,
+            "min": INPUT_BOUNDS_BY_TYPE[t][:, 0].tolist(),
+            "max": INPUT_BOUNDS_BY_TYPE[t][:, 1].tolist(),
+            "quantiles": {},
+        }
+        for t in TYPE_IDS
+    }
+    return {"version": "schema", "features": FEATURE_COLS, "quantiles": [], "types": types}
+
+
+def save_envelopes(doc: dict, path: str = ENVELOPE_PATH):
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2)
+
+
+def load_envelopes(path: str = ENVELOPE_PATH) -> dict:
+    try:
+        with open(path) as f:
+            doc = json.load(f)
+    except FileNotFoundError:
+        return schema_envelopes()
+    if doc["features"] != FEATURE_COLS:
+        raise ValueError(f"{path} was computed for features {doc['features']}")
+    return doc
+
+
+class EnvelopeGuard:
+    """
+    bound="range" checks against the training min/max; bound="q0.001" (any
+    stored quantile q) against the [q, 1 - q] quantiles. margin widens
+    each interval by that fraction of its width.
+    """
+
+    def __init__(self, doc: dict, bound: str = "range", margin: float = 0.0):
+        self.version = doc["version"]
+        n_slots = max(TYPE_IDS) + 1
+        # Unknown type slots never flag
+        self.lo = np.full((n_slots, len(FEATURE_COLS)), -np.inf)
+        self.hi = np.full((n_slots, len(FEATURE_COLS)), np.inf)
+        for t, env in doc["types"].items():
+            if bound == "range":
+                lo, hi = np.array(env["min"]), np.array(env["max"])
+            else:
+                q = float(bound[1:])
+                lo = np.array(env["quantiles"][_qkey(q)])
+                hi = np.array(env["quantiles"][_qkey(1.0 - q)])
+            width = hi - lo
+            self.lo[int(t)] = lo - margin * width
+            self.hi[int(t)] = hi + margin * width
+
+    def check(self, X: np.ndarray, types) -> np.ndarray:
+        """(n, n_features) bool: feature outside the envelope of that row's type."""
+        types = np.broadcast_to(np.asarray(types, dtype=np.intp), (len(X),))
+        return (X < self.lo[types]) | (X > self.hi[types])
+
+    @staticmethod
+    def features(mask_row) -> list:
+        return [FEATURE_COLS[i] for i in np.flatnonzero(mask_row)]
@@ -0,0 +1,355 @@
+"""
+Flat-array evaluation of fitted sklearn random forests.
+
+All trees of a forest are concatenated into one set of node arrays
+(feature, threshold, left, right, value). Leaves point to themselves, so a
+batch of rows walks every tree at once with vectorized steps:
+
+  node[pair] = where(X[row[pair], feature[node]] <= threshold[node], left[node], right[node])
+
+over flat (row, tree) pairs, dropping pairs as they reach a leaf. The result
+is the (n_rows, n_trees) leaf matrix. A walk covers at most WALK_PAIRS
+pairs and predictions are reduced CHUNK_ROWS rows at a time, so memory
+stays bounded whatever the batch size. Gathering value[leaf] gives every
+tree's output in one array, so the forest mean (= sklearn predict),
+per-output standard deviation and quantiles all come from the same pass.
+
+ForestGroup concatenates several forests (e.g. every model of every plant
+type) so that any subset of them, each on its own subset of rows, is walked
+in a single pass.
+"""
+
+import numpy as np
+
+
+# Rows per reduction – bounds the (rows × trees × outputs) leaf-value array
+CHUNK_ROWS = 1024
+# (row, tree) pairs per walk – bounds the walk's index arrays, whatever the batch size
+WALK_PAIRS = 1 << 20
+
+
+# ---------------------- CORE ----------------------
+
+def walk(X, feature, threshold, left, right, rows, nodes) -> np.ndarray:
+    """
+    Walk flat (row, start node) pairs down to their leaves.
+    X must be float32 (sklearn compares float32 inputs with float64 thresholds).
+    """
+    flat_X = X.ravel()
+    base = rows.astype(np.int64) * X.shape[1]
+    node = nodes.copy()
+    active = np.arange(node.size)
+    cur = node
+    while active.size:
+        go_left = flat_X[base + feature[cur]] <= threshold[cur]
+        nxt = np.where(go_left, left[cur], right[cur])
+        moving = nxt != cur
+        if moving.all():
+            cur = nxt
+            continue
+        # Pairs that reached their leaf are written once and dropped
+        done = ~moving
+        node[active[done]] = nxt[done]
+        active = active[moving]
+        base = base[moving]
+        cur = nxt[moving]
+    return node
+
+
+def walk_rows(X, feature, threshold, left, right, rows, roots) -> np.ndarray:
+    """
+    (len(rows), len(roots)) leaves of rows × trees. Pairs are laid out tree
+    by tree, so consecutive steps read the nodes of the same tree.
+    """
+    pairs_rows = np.tile(rows, len(roots))
+    pairs_nodes = np.repeat(roots, len(rows))
+    leaves = walk(X, feature, threshold, left, right, pairs_rows, pairs_nodes)
+    return leaves.reshape(len(roots), len(rows)).T
+
+
+def reduce_leaves(value, leaves, quantiles=None) -> dict:
+    """
+    value[leaves] averaged over trees, chunked by rows.
+    With quantiles (tuple, possibly empty) also std and quantiles over trees.
+    """
+    return reduce_blocks(value, leaves.shape[0], lambda sl: leaves[sl], quantiles)
+
+
+def reduce_blocks(value, n, leaves_of, quantiles=None) -> dict:
+    """reduce_leaves with the leaves of each CHUNK_ROWS block from leaves_of(slice)."""
+    k = value.shape[1]
+    out = {"mean": np.empty((n, k))}
+    if quantiles is not None:
+        out["std"] = np.empty((n, k))
+        out["quantiles"] = np.empty((len(quantiles), n, k))
+    for start in range(0, n, CHUNK_ROWS):
+        sl = slice(start, min(n, start + CHUNK_ROWS))
+        vals = value[leaves_of(sl)]
+        out["mean"][sl] = vals.mean(axis=1)
+        if quantiles is not None:
+            out["std"][sl] = vals.std(axis=1)
+            if len(quantiles):
+                out["quantiles"][:, sl] = np.quantile(vals, quantiles, axis=1)
+    return out
+
+
+# ---------------------- SINGLE FOREST ----------------------
+
+class FlatForest:
+    """A RandomForestRegressor / single-output RandomForestClassifier as flat arrays."""
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth,
+                 classes=None, n_features=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value          # (n_nodes, n_outputs) or (n_nodes, n_classes)
+        self.roots = roots          # (n_trees,) node id of each root
+        self.max_depth = max_depth
+        self.classes = classes      # None for regressors
+        self.n_features = n_features
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.feature)
+
+    @property
+    def is_classifier(self) -> bool:
+        return self.classes is not None
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        trees = [est.tree_ for est in forest.estimators_]
+        sizes = np.array([t.node_count for t in trees])
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        n_nodes = int(sizes.sum())
+
+        feature = np.empty(n_nodes, dtype=np.int32)
+        threshold = np.empty(n_nodes, dtype=np.float64)
+        left = np.empty(n_nodes, dtype=np.int32)
+        right = np.empty(n_nodes, dtype=np.int32)
+
+        classes = getattr(forest, "classes_", None)
+        if classes is not None:
+            value = np.empty((n_nodes, len(classes)), dtype=np.float64)
+        else:
+            value = np.empty((n_nodes, forest.n_outputs_), dtype=np.float64)
+
+        for tree, off in zip(trees, offsets):
+            sl = slice(off, off + tree.node_count)
+            ids = np.arange(off, off + tree.node_count, dtype=np.int32)
+            is_leaf = tree.children_left == -1
+            feature[sl] = np.where(is_leaf, 0, tree.feature)
+            threshold[sl] = np.where(is_leaf, 0.0, tree.threshold)
+            left[sl] = np.where(is_leaf, ids, tree.children_left + off)
+            right[sl] = np.where(is_leaf, ids, tree.children_right + off)
+            if classes is not None:
+                v = tree.value[:, 0, :]
+                value[sl] = v / v.sum(axis=1, keepdims=True)
+            else:
+                value[sl] = tree.value[:, :, 0]
+
+        return cls(
+            feature, threshold, left, right, value,
+            roots=offsets.astype(np.int32),
+            max_depth=max(t.max_depth for t in trees),
+            classes=None if classes is None else np.asarray(classes),
+            n_features=forest.n_features_in_,
+        )
+
+    def export(self, prefix: str = ""):
+        """(arrays, meta) for model_bundle; inverse of from_export."""
+        arrays = {
+            f"{prefix}{name}": getattr(self, name)
+            for name in ("feature", "threshold", "left", "right", "value", "roots")
+        }
+        if self.classes is not None:
+            arrays[f"{prefix}classes"] = self.classes
+        return arrays, {"max_depth": int(self.max_depth), "n_features": int(self.n_features)}
+
+    @classmethod
+    def from_export(cls, arrays: dict, meta: dict, prefix: str = ""):
+        return cls(
+            *(arrays[f"{prefix}{name}"] for name in ("feature", "threshold", "left", "right", "value")),
+            roots=arrays[f"{prefix}roots"],
+            max_depth=meta["max_depth"],
+            classes=arrays.get(f"{prefix}classes"),
+            n_features=meta["n_features"],
+        )
+
+    def apply(self, X) -> np.ndarray:
+        """(n_rows, n_trees) leaf node ids, walked WALK_PAIRS (row, tree) pairs at a time."""
+        X = np.asarray(X, dtype=np.float32)
+        n = X.shape[0]
+        leaves = np.empty((n, self.n_trees), dtype=self.roots.dtype)
+        step = max(1, WALK_PAIRS // self.n_trees)
+        for start in range(0, n, step):
+            rows = np.arange(start, min(n, start + step))
+            leaves[start:start + len(rows)] = walk_rows(
+                X, self.feature, self.threshold, self.left, self.right, rows, self.roots
+            )
+        return leaves
+
+    def leaf_values(self, X) -> np.ndarray:
+        """(n_rows, n_trees, n_outputs|n_classes) output of every tree."""
+        return self.value[self.apply(X)]
+
+    def _reduce(self, X, quantiles=None) -> dict:
+        """Leaves and reduction block by block: no leaf matrix over the whole batch."""
+        X = np.asarray(X, dtype=np.float32)
+        return reduce_blocks(self.value, len(X), lambda sl: self.apply(X[sl]), quantiles)
+
+    def predict_mean(self, X) -> np.ndarray:
+        """Mean over trees – regressor predict() / classifier predict_proba()."""
+        return self._reduce(X)["mean"]
+
+    def predict(self, X) -> np.ndarray:
+        mean = self.predict_mean(X)
+        if self.is_classifier:
+            return self.classes[mean.argmax(axis=1)]
+        return mean[:, 0] if mean.shape[1] == 1 else mean
+
+    def predict_proba(self, X) -> np.ndarray:
+        return self.predict_mean(X)
+
+    def predict_dist(self, X, quantiles=(0.05, 0.95)) -> dict:
+        """
+        Mean, standard deviation and quantiles of the per-tree outputs,
+        each shaped (n_rows, n_outputs) (quantiles: (n_q, n_rows, n_outputs)).
+        """
+        return self._reduce(X, tuple(quantiles))
+
+
+# ---------------------- FOREST GROUP ----------------------
+
+class ForestGroup:
+    """
+    Several FlatForests sharing one set of concatenated node arrays, so
+    different members on different rows are walked in one pass.
+    Members keep only their value arrays (and classes).
+    """
+
+    def __init__(self, forests: dict):
+        self.members = {}
+        node_off, tree_off = 0, 0
+        parts = {"feature": [], "threshold": [], "left": [], "right": [], "roots": []}
+        for name, f in forests.items():
+            parts["feature"].append(f.feature)
+            parts["threshold"].append(f.threshold)
+            parts["left"].append(f.left + node_off)
+            parts["right"].append(f.right + node_off)
+            parts["roots"].append(f.roots + node_off)
+            self.members[name] = {
+                "node_offset": node_off,
+                "trees": slice(tree_off, tree_off + f.n_trees),
+                "value": f.value,
+                "classes": f.classes,
+            }
+            node_off += f.n_nodes
+            tree_off += f.n_trees
+        self.feature = np.concatenate(parts["feature"])
+        self.threshold = np.concatenate(parts["threshold"])
+        self.left = np.concatenate(parts["left"]).astype(np.int32)
+        self.right = np.concatenate(parts["right"]).astype(np.int32)
+        self.roots = np.concatenate(parts["roots"]).astype(np.int32)
+
+    def export(self, prefix: str = ""):
+        """
+        (arrays, meta) for model_bundle. Member names (tuples) are stored as
+        lists; member i's arrays are "{prefix}m{i}.value" / ".classes".
+        """
+        arrays = {
+            f"{prefix}{name}": getattr(self, name)
+            for name in ("feature", "threshold", "left", "right", "roots")
+        }
+        members = []
+        for i, (name, m) in enumerate(self.members.items()):
+            arrays[f"{prefix}m{i}.value"] = m["value"]
+            if m["classes"] is not None:
+                arrays[f"{prefix}m{i}.classes"] = m["classes"]
+            members.append({
+                "name": list(name) if isinstance(name, tuple) else name,
+                "node_offset": int(m["node_offset"]),
+                "trees": [m["trees"].start, m["trees"].stop],
+            })
+        return arrays, {"members": members}
+
+    @classmethod
+    def from_export(cls, arrays: dict, meta: dict, prefix: str = ""):
+        """Rebuild without concatenating: the exported arrays are used as-is (e.g. memory-mapped)."""
+        group = cls.__new__(cls)
+        for name in ("feature", "threshold", "left", "right", "roots"):
+            setattr(group, name, arrays[f"{prefix}{name}"])
+        group.members = {}
+        for i, m in enumerate(meta["members"]):
+            name = tuple(m["name"]) if isinstance(m["name"], list) else m["name"]
+            group.members[name] = {
+                "node_offset": m["node_offset"],
+                "trees": slice(*m["trees"]),
+                "value": arrays[f"{prefix}m{i}.value"],
+                "classes": arrays.get(f"{prefix}m{i}.classes"),
+            }
+        return group
+
+    def apply(self, X, requests) -> list:
+        """
+        requests: [(member names, row indices)] – walked together, at most
+        WALK_PAIRS (row, tree) pairs per walk (small requests share a walk).
+        Returns, per request, {name: (len(rows), n_trees) leaf ids local to
+        that member's value array}.
+        """
+        X = np.asarray(X, dtype=np.float32)
+        plans = []
+        for names, rows in requests:
+            rows = np.asarray(rows)
+            roots = np.concatenate([self.roots[self.members[m]["trees"]] for m in names])
+            plans.append((names, rows, roots, np.empty((len(rows), len(roots)), roots.dtype)))
+
+        batch, pairs = [], 0
+        for _, rows, roots, leaves in plans:
+            step = max(1, WALK_PAIRS // len(roots))
+            for start in range(0, len(rows), step):
+                block = (rows[start:start + step], roots, leaves, start)
+                size = len(block[0]) * len(roots)
+                if batch and pairs + size > WALK_PAIRS:
+                    self._walk_blocks(X, batch)
+                    batch, pairs = [], 0
+                batch.append(block)
+                pairs += size
+        if batch:
+            self._walk_blocks(X, batch)
+
+        results = []
+        for names, _, _, leaves in plans:
+            out, col = {}, 0
+            for m in names:
+                member = self.members[m]
+                width = member["trees"].stop - member["trees"].start
+                out[m] = leaves[:, col:col + width] - member["node_offset"]
+                col += width
+            results.append(out)
+        return results
+
+    def _walk_blocks(self, X, blocks):
+        """One walk over [(rows, roots, leaves, first row)], filling each leaves block."""
+        pairs_rows = np.concatenate([np.tile(rows, len(roots)) for rows, roots, _, _ in blocks])
+        pairs_nodes = np.concatenate([np.repeat(roots, len(rows)) for rows, roots, _, _ in blocks])
+        flat = walk(X, self.feature, self.threshold, self.left, self.right,
+                    pairs_rows, pairs_nodes)
+        pos = 0
+        for rows, roots, leaves, start in blocks:
+            size = len(rows) * len(roots)
+            block = flat[pos:pos + size].reshape(len(roots), len(rows))
+            leaves[start:start + len(rows)] = block.T
+            pos += size
+
+    def reduce(self, name, leaves, quantiles=None) -> dict:
+        return reduce_leaves(self.members[name]["value"], leaves, quantiles)
+
+    def classes(self, name):
+        return self.members[name]["classes"]
@@ -0,0 +1,454 @@
+"""
+Golden-output regression corpus and throughput floors for the prediction
+engines (run by tests/test_golden.py).
+
+The reference is test_prediction.predict_design: one row at a time
+through the sklearn models. --record generates a fixed, seeded corpus from
+the five generators (generate_type1 … generate_type5). It stores the
+reference output of every corpus row together with a fingerprint of the
+model files. It also times every engine on the corpus and stores a
+throughput floor for each (FLOOR_FRACTION of the rate measured at record
+time).
+
+Every engine must reproduce the reference. Predicted types and equipment
+must match exactly. Stage times and cost must match within the engine's
+tolerance:
+  app.predict_designs   the JSON rows, rounded to 0.01 (atol 0.01, so a
+                        last-digit rounding flip still passes)
+  app.predict_packed    float32 outputs (binary frames, portfolio.py)
+  app.predict_columnar  layout=columnar batches, unrounded
+  flat.joblib           flat engine on the flattened joblib models
+  flat.bundle           flat engine on model_bundle.bin
+  flat.pack             flat engine on models.pack, within the recorded
+                        leaf quantization error
+The app.* engines use whatever app.py loads (ML_MODEL_BUNDLE). An engine
+whose artifact is missing is skipped. The floors are only meaningful on the
+machine that recorded them.
+
+tests/test_golden.py runs the same checks on small fixed-seed models that
+tests/conftest.py trains and records in a temporary directory, so it needs
+no trained artifacts. ML_TEST_MODELS=<dir> points it at real models and
+their recording instead, and GOLDEN_FLOORS=1 adds the throughput floors.
+
+Usage (from ml/, after train_all_models.py):
+  python golden.py --record          # corpus, reference outputs, floors
+  python golden.py                   # check every engine
+  ML_TEST_MODELS=. GOLDEN_FLOORS=1 python -m pytest tests/test_golden.py -q
+"""
+
+import argparse
+import contextlib
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import time
+
+import numpy as np
+
+from model_bundle import model_files
+from plant_schema import (
+    EQUIP_COLS_BY_TYPE,
+    FEATURE_COLS,
+    STAGES_BY_TYPE,
+    TIME_COLS_BY_TYPE,
+    TYPE_IDS,
+    decode_equipment,
+)
+
+
+GOLDEN_DIR = "golden"
+REFERENCE_PATH = os.path.join(GOLDEN_DIR, "reference.json")
+FLOORS_PATH = os.path.join(GOLDEN_DIR, "throughput_floors.json")
+GENERATORS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "python generate_all_types_synthetic_data.py"
+)
+CORPUS_SEED = 1000
+ROWS_PER_TYPE = 40
+FLOOR_FRACTION = 0.5
+REPEATS = 3
+MAX_STAGES = max(len(STAGES_BY_TYPE[t]) for t in TYPE_IDS)
+
+# (atol, rtol) on stage times and cost; types and equipment are exact
+TOLERANCES = {
+    "app.predict_designs": (0.01, 0.0),
+    "app.predict_packed": (1e-6, 1e-6),
+    "app.predict_columnar": (1e-6, 0.0),
+    "flat.joblib": (1e-6, 0.0),
+    "flat.bundle": (1e-6, 0.0),
+    "flat.pack": (None, 0.0),  # from the pack's recorded quantization error
+}
+ENGINE_NAMES = list(TOLERANCES)
+
+
+# ---------------------- CORPUS ----------------------
+
+def load_generators():
+    spec = importlib.util.spec_from_file_location("type_generators", GENERATORS_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_corpus(seed: int = CORPUS_SEED, rows_per_type: int = ROWS_PER_TYPE) -> np.ndarray:
+    """(5 × rows_per_type, n_features) generator inputs, type by type."""
+    gen = load_generators()
+    parts = [
+        getattr(gen, f"generate_type{t}")(n_samples=rows_per_type, random_state=seed + t)
+        for t in TYPE_IDS
+    ]
+    return np.vstack([df[FEATURE_COLS].to_numpy(dtype=np.float64) for df in parts])
+
+
+def models_available() -> bool:
+    return all(os.path.exists(name) for name in model_files())
+
+
+def model_fingerprint() -> dict:
+    """sha1 of every model file (the reference outputs are only valid for these)."""
+    out = {}
+    for name in model_files():
+        h = hashlib.sha1()
+        with open(name, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        out[name] = h.hexdigest()
+    return out
+
+
+# ---------------------- REFERENCE ----------------------
+
+def reference_outputs(X: np.ndarray) -> list:
+    """test_prediction.predict_design on every row (models loaded once, prints muted)."""
+    import test_prediction
+
+    cache = {}
+    load = test_prediction.joblib.load
+
+    def cached_load(path):
+        if path not in cache:
+            cache[path] = load(path)
+        return cache[path]
+
+    test_prediction.joblib.load = cached_load
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return [
+                test_prediction.predict_design({
+                    col: (int(v) if col == "heavy_metals" else float(v))
+                    for col, v in zip(FEATURE_COLS, row)
+                })
+                for row in X
+            ]
+    finally:
+        test_prediction.joblib.load = load
+
+
+def batch_reference(X: np.ndarray) -> dict:
+    """
+    The joblib models' batch predict() on all rows at once: the same models
+    as reference_outputs, but none of its per-row code.
+    """
+    import joblib
+    import pandas as pd
+
+    from plant_schema import equipment_labels, load_equipment_vocab
+
+    frame = pd.DataFrame(X, columns=FEATURE_COLS)
+    tables = load_equipment_vocab()["tables"]
+    n = len(X)
+    out = {
+        "type": joblib.load("model_type_classifier.joblib").predict(frame).astype(np.int64),
+        "times": np.full((n, MAX_STAGES), np.nan),
+        "equipment": np.full((n, MAX_STAGES), None, dtype=object),
+        "cost": np.zeros(n),
+    }
+    for t in np.unique(out["type"]):
+        t = int(t)
+        rows = np.flatnonzero(out["type"] == t)
+        part = frame.iloc[rows]
+        times = joblib.load(f"model_type{t}_times.joblib").predict(part)
+        out["times"][rows, :times.shape[1]] = times
+        equip = joblib.load(f"model_type{t}_equipment.joblib").predict(part)
+        out["equipment"][rows, :equip.shape[1]] = equipment_labels(t, equip, tables[t])
+        out["cost"][rows] = joblib.load(f"model_type{t}_cost.joblib").predict(part)
+    return out
+
+
+def as_arrays(results: list) -> dict:
+    """Result dicts (predict_design / app rows) → padded arrays for comparison."""
+    n = len(results)
+    out = {
+        "type": np.array([r["predicted_type"] for r in results], dtype=np.int64),
+        "times": np.full((n, MAX_STAGES), np.nan),
+        "equipment": np.full((n, MAX_STAGES), None, dtype=object),
+        "cost": np.array([r["cost_per_m3_inr"] for r in results], dtype=np.float64),
+    }
+    for i, r in enumerate(results):
+        t = r["predicted_type"]
+        times = [r["stage_times_min"][c] for c in TIME_COLS_BY_TYPE[t]]
+        out["times"][i, :len(times)] = times
+        equipment = [str(r["stage_equipment"][c]) for c in EQUIP_COLS_BY_TYPE[t]]
+        out["equipment"][i, :len(equipment)] = equipment
+    return out
+
+
+def record(seed: int = CORPUS_SEED, rows_per_type: int = ROWS_PER_TYPE) -> dict:
+    X = make_corpus(seed, rows_per_type)
+    t0 = time.perf_counter()
+    outputs = reference_outputs(X)
+    doc = {
+        "seed": seed,
+        "rows_per_type": rows_per_type,
+        "feature_cols": FEATURE_COLS,
+        "models": model_fingerprint(),
+        "reference_s": round(time.perf_counter() - t0, 3),
+        "inputs": X.tolist(),
+        "outputs": outputs,
+    }
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with open(REFERENCE_PATH, "w") as f:
+        json.dump(doc, f)
+    return doc
+
+
+def load_reference(path: str = REFERENCE_PATH) -> dict:
+    with open(path) as f:
+        doc = json.load(f)
+    doc["X"] = np.array(doc["inputs"], dtype=np.float64)
+    doc["expected"] = as_arrays(doc["outputs"])
+    return doc
+
+
+# ---------------------- ENGINES ----------------------
+
+def _app():
+    import app
+
+    return app
+
+
+def _packed_arrays(out: dict) -> dict:
+    app = _app()
+    n = len(out["type"])
+    res = {
+        "type": out["type"].astype(np.int64),
+        "times": out["times"].astype(np.float64),
+        "equipment": np.full((n, MAX_STAGES), None, dtype=object),
+        "cost": out["cost"].astype(np.float64),
+    }
+    for t in np.unique(res["type"]):
+        t = int(t)
+        rows = np.flatnonzero(res["type"] == t)
+        k = len(STAGES_BY_TYPE[t])
+        res["equipment"][rows, :k] = decode_equipment(
+            t, out["equip"][rows, :k], app.EQUIP_LABEL_TABLES[t]
+        )
+    return res
+
+
+def _columnar_arrays(groups: list, n: int) -> dict:
+    res = {
+        "type": np.zeros(n, dtype=np.int64),
+        "times": np.full((n, MAX_STAGES), np.nan),
+        "equipment": np.full((n, MAX_STAGES), None, dtype=object),
+        "cost": np.zeros(n),
+    }
+    for g in groups:
+        k = len(g["time_cols"])
+        res["type"][g["rows"]] = g["type"]
+        res["times"][g["rows"], :k] = g["times"]
+        res["equipment"][g["rows"], :k] = g["equipment"]
+        res["cost"][g["rows"]] = g["cost"]
+    return res
+
+
+def flat_predictor(models: dict):
+    """Reference pipeline on the flat engine alone: classify, group by type, reduce."""
+    classifier, group = models["classifier"], models["group"]
+    tables = models["vocab"]["tables"]
+
+    def predict(X):
+        n = len(X)
+        types = classifier.predict(X).astype(np.int64)
+        res = {
+            "type": types,
+            "times": np.full((n, MAX_STAGES), np.nan),
+            "equipment": np.full((n, MAX_STAGES), None, dtype=object),
+            "cost": np.zeros(n),
+        }
+        groups = {int(t): np.flatnonzero(types == t) for t in np.unique(types)}
+        leaf_sets = group.apply(
+            X, [(models["type_models"][t]["members"], rows) for t, rows in groups.items()]
+        )
+        for (t, rows), leaves in zip(groups.items(), leaf_sets):
+            tm = models["type_models"][t]
+            times = group.reduce((t, "time"), leaves[(t, "time")])["mean"]
+            res["times"][rows, :times.shape[1]] = times
+            res["cost"][rows] = group.reduce((t, "cost"), leaves[(t, "cost")])["mean"][:, 0]
+            codes = np.column_stack([
+                code_map[group.reduce(member, leaves[member])["mean"].argmax(axis=1)]
+                for member, code_map in zip(tm["equip_members"], tm["equip_codes"])
+            ])
+            res["equipment"][rows, :codes.shape[1]] = decode_equipment(t, codes, tables[t])
+        return res
+
+    return predict
+
+
+def make_engine(name: str):
+    """(predict(X) → arrays, atol, rtol), or None if the engine's artifact is missing."""
+    atol, rtol = TOLERANCES[name]
+    if name == "app.predict_designs":
+        return lambda X: as_arrays(_app().predict_designs(X)), atol, rtol
+    if name == "app.predict_packed":
+        return lambda X: _packed_arrays(_app().predict_packed(X)), atol, rtol
+    if name == "app.predict_columnar":
+        return lambda X: _columnar_arrays(_app().predict_columnar(X), len(X)), atol, rtol
+    if name == "flat.joblib":
+        from model_bundle import models_from_joblib
+
+        return flat_predictor(models_from_joblib()), atol, rtol
+    if name == "flat.bundle":
+        from model_bundle import BUNDLE_PATH, load_bundle
+
+        if not os.path.exists(BUNDLE_PATH):
+            return None
+        return flat_predictor(load_bundle(BUNDLE_PATH)), atol, rtol
+    if name == "flat.pack":
+        from model_pack import PACK_PATH, load_pack
+
+        if not os.path.exists(PACK_PATH):
+            return None
+        models = load_pack(PACK_PATH)
+        meta = models["meta"]
+        atol = 1e-6 + max(
+            [m["values"]["max_error"] for m in meta["group"]["members"]]
+        )
+        return flat_predictor(models), atol, rtol
+    raise ValueError(f"unknown engine {name!r}")
+
+
+# ---------------------- CHECKS ----------------------
+
+def compare(expected: dict, got: dict, atol: float, rtol: float, limit: int = 20) -> list:
+    """Differences between an engine's arrays and the reference, as messages."""
+    errors = []
+    for i in np.flatnonzero(got["type"] != expected["type"])[:limit]:
+        errors.append(f"row {i}: type {got['type'][i]} != {expected['type'][i]}")
+    same = got["type"] == expected["type"]
+    bad_equip = same & (got["equipment"] != expected["equipment"]).any(axis=1)
+    for i in np.flatnonzero(bad_equip)[:limit]:
+        errors.append(
+            f"row {i}: equipment {list(got['equipment'][i])} != {list(expected['equipment'][i])}"
+        )
+    for key in ("times", "cost"):
+        a, b = got[key][same], expected[key][same]
+        ok = np.isclose(a, b, atol=atol, rtol=rtol) | (np.isnan(a) & np.isnan(b))
+        if not ok.all():
+            worst = np.nanmax(np.abs(a - b))
+            errors.append(f"{key}: {int((~ok).sum())} values off "
+                          f"(max abs diff {worst:.3g}, atol {atol:.3g})")
+    return errors
+
+
+def throughput(predict, X: np.ndarray, repeats: int = REPEATS) -> float:
+    """Best rows/s of `repeats` runs over the corpus (after one warm-up)."""
+    predict(X)
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        predict(X)
+        best = min(best, time.perf_counter() - t0)
+    return len(X) / best
+
+
+def load_floors(path: str = FLOORS_PATH) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)["engines"]
+
+
+def record_floors(X: np.ndarray, names=ENGINE_NAMES) -> dict:
+    engines = {}
+    for name in names:
+        engine = make_engine(name)
+        if engine is None:
+            continue
+        rows_s = throughput(engine[0], X)
+        engines[name] = {
+            "measured_rows_s": round(rows_s, 1),
+            "floor_rows_s": round(FLOOR_FRACTION * rows_s, 1),
+        }
+    doc = {"rows": len(X), "floor_fraction": FLOOR_FRACTION, "engines": engines}
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    with open(FLOORS_PATH, "w") as f:
+        json.dump(doc, f, indent=2)
+    return doc
+
+
+def check(names=ENGINE_NAMES) -> dict:
+    reference = load_reference()
+    floors = load_floors()
+    report = {}
+    for name in names:
+        engine = make_engine(name)
+        if engine is None:
+            report[name] = {"skipped": "artifact missing"}
+            continue
+        predict, atol, rtol = engine
+        errors = compare(reference["expected"], predict(reference["X"]), atol, rtol)
+        rows_s = throughput(predict, reference["X"])
+        floor = floors.get(name, {}).get("floor_rows_s")
+        report[name] = {
+            "errors": errors,
+            "rows_s": round(rows_s, 1),
+            "floor_rows_s": floor,
+            "passed": not errors and (floor is None or rows_s >= floor),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Golden outputs + throughput floors")
+    parser.add_argument("--record", action="store_true",
+                        help="regenerate the corpus, reference outputs and floors")
+    parser.add_argument("--floors-only", action="store_true",
+                        help="with --record: keep the reference outputs, re-measure the floors")
+    parser.add_argument("--seed", type=int, default=CORPUS_SEED)
+    parser.add_argument("--rows-per-type", type=int, default=ROWS_PER_TYPE)
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.floors_only:
+            doc = record(args.seed, args.rows_per_type)
+            print(f"Recorded {len(doc['outputs'])} reference outputs in {doc['reference_s']} s "
+                  f"-> {REFERENCE_PATH}")
+        doc = record_floors(load_reference()["X"])
+        for name, e in doc["engines"].items():
+            print(f"  {name:<22} {e['measured_rows_s']:>10.1f} rows/s  (floor {e['floor_rows_s']})")
+        print(f"Floors -> {FLOORS_PATH}")
+        return
+
+    reference = load_reference()
+    if reference["models"] != model_fingerprint():
+        raise SystemExit("models changed since the golden outputs were recorded: "
+                         "python golden.py --record")
+    failed = False
+    for name, r in check().items():
+        if "skipped" in r:
+            print(f"  {name:<22} skipped ({r['skipped']})")
+            continue
+        failed |= not r["passed"]
+        print(f"  {name:<22} {'ok  ' if r['passed'] else 'FAIL'} {r['rows_s']:>10.1f} rows/s "
+              f"(floor {r['floor_rows_s']})")
+        for err in r["errors"]:
+            print(f"      {err}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Incremental retraining when labelled designs are appended to the CSVs.
+
+train_all_models.py rebuilds all 16 forests from the full CSVs. This script
+compares each CSV with train_state.json (row count + digest of the rows
+the models were trained on, written by train_all_models.py) and only
+touches the models whose data changed:
+
+  appended rows   the affected forests are grown with warm_start: new
+                  trees are fitted on the current training rows (old + new)
+                  and added to the existing ones. The number of new trees
+                  is proportional to the share of new rows (at least
+                  --min-new-trees); beyond --max-trees the oldest trees,
+                  fitted on the least data, are dropped.
+  rewritten rows  (the old rows changed) or new equipment classes: that
+                  type is retrained from scratch with train_all_models.
+
+Every model is scored on a fixed holdout – the same 20% split train_all_models
+uses (random_state=42), taken from the original rows only, so scores stay
+comparable across updates. Appended rows always go to training. An update
+whose holdout score is worse than before by more than --max-regression
+(relative) is not saved. A type's times, equipment and cost models are saved
+together or not at all: if any of them is rejected the type keeps its old
+models and its appended rows stay pending for the next run.
+
+Appended per-type rows only affect that type's times/equipment/cost models;
+appended rows in synthetic_designs_all_types.csv affect the classifier.
+After an update the feature envelopes are recomputed; the model bundle
+(model_bundle.py) must be rebuilt, which --bundle does.
+
+Usage (from ml/):
+  python incremental_train.py              # update once
+  python incremental_train.py --watch 60   # poll the CSVs every 60 s
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, mean_absolute_error
+from sklearn.model_selection import train_test_split
+
+from feature_envelope import compute_envelopes, save_envelopes
+from plant_schema import (
+    ALL_TYPES_CSV,
+    COST_COL,
+    CSV_BY_TYPE,
+    EQUIP_COLS_BY_TYPE,
+    FEATURE_COLS,
+    TIME_COLS_BY_TYPE,
+    TYPE_COL,
+    TYPE_IDS,
+    compact_classes,
+    encode_equipment,
+    validate_design_frame,
+)
+from thread_control import set_n_jobs
+
+
+STATE_PATH = "train_state.json"
+HOLDOUT_SIZE = 0.2
+SPLIT_SEED = 42
+MIN_NEW_TREES = 25
+MAX_TREES = 800
+MAX_REGRESSION = 0.05
+
+
+def sources() -> dict:
+    """State key → CSV: "classifier" plus one entry per plant type."""
+    return {"classifier": ALL_TYPES_CSV, **{str(t): CSV_BY_TYPE[t] for t in TYPE_IDS}}
+
+
+# ---------------------- DATA + STATE ----------------------
+
+def load_frame(key: str) -> pd.DataFrame:
+    """Cleaned frame as train_all_models.py sees it (index = CSV row number)."""
+    # round_trip: a CSV re-saved by pandas parses back to identical values
+    df = pd.read_csv(sources()[key], float_precision="round_trip")
+    if key == "classifier":
+        return df.dropna(subset=[TYPE_COL] + FEATURE_COLS)
+    t = int(key)
+    validate_design_frame(df, t)
+    return df.dropna(subset=FEATURE_COLS + TIME_COLS_BY_TYPE[t] + EQUIP_COLS_BY_TYPE[t] + [COST_COL])
+
+
+def row_digest(df: pd.DataFrame, n_rows: int) -> str:
+    """Digest of CSV rows [0, n_rows) – changes if any of them is edited."""
+    rows = df[df.index < n_rows]
+    # Numbers as float64, so appending 12.5 to an integer column is not an edit
+    rows = rows.astype({c: np.float64 for c in rows.select_dtypes("number").columns})
+    h = hashlib.sha1(pd.util.hash_pandas_object(rows, index=True).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+def holdout_rows(key: str, df: pd.DataFrame) -> list:
+    """CSV row numbers of train_all_models.py's 20% test split."""
+    stratify = df[TYPE_COL].astype(int) if key == "classifier" else None
+    _, test = train_test_split(
+        df.index.to_numpy(), test_size=HOLDOUT_SIZE, random_state=SPLIT_SEED, stratify=stratify
+    )
+    return sorted(int(i) for i in test)
+
+
+def snapshot(key: str, df: pd.DataFrame = None, holdout: list = None) -> dict:
+    df = load_frame(key) if df is None else df
+    n_rows = int(df.index.max()) + 1 if len(df) else 0
+    return {
+        "csv": sources()[key],
+        "rows": n_rows,
+        "digest": row_digest(df, n_rows),
+        "holdout": holdout if holdout is not None else holdout_rows(key, df),
+    }
+
+
+def save_state(state: dict, path: str = STATE_PATH):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def load_state(path: str = STATE_PATH) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def initial_state() -> dict:
+    """State for models trained on the current CSVs (end of train_all_models.py)."""
+    return {"sources": {key: snapshot(key) for key in sources()}, "history": []}
+
+
+def detect_changes(state: dict) -> dict:
+    """key → ("unchanged" | "appended" | "rewritten", cleaned frame)."""
+    out = {}
+    for key in sources():
+        df = load_frame(key)
+        prev = state["sources"].get(key)
+        if prev is None or row_digest(df, prev["rows"]) != prev["digest"]:
+            out[key] = ("rewritten", df)
+        elif len(df) and df.index.max() >= prev["rows"]:
+            out[key] = ("appended", df)
+        else:
+            out[key] = ("unchanged", df)
+    return out
+
+
+# ---------------------- MODELS ----------------------
+
+def save_model(model, path: str):
+    """Atomic replace, so a running service never loads a half-written file."""
+    tmp = path + ".tmp"
+    joblib.dump(set_n_jobs(model, None), tmp)
+    os.replace(tmp, path)
+
+
+def grow_forest(est, X, y, n_new: int, min_new_trees: int, max_trees: int) -> int:
+    """Add trees fitted on (X, y) to a fitted forest; returns trees added."""
+    n_trees = len(est.estimators_)
+    add = max(min_new_trees, math.ceil(n_trees * n_new / max(len(X), 1)))
+    est.set_params(warm_start=True, n_estimators=n_trees + add, n_jobs=-1)
+    est.fit(X, y)
+    if len(est.estimators_) > max_trees:
+        est.estimators_ = est.estimators_[-max_trees:]
+        est.n_estimators = max_trees
+    est.set_params(warm_start=False)
+    return add
+
+
+def same_classes(est, y) -> bool:
+    return np.array_equal(np.unique(y), np.asarray(est.classes_).astype(np.int64))
+
+
+def relative_change(before: float, after: float, higher_is_better: bool) -> float:
+    """Positive = worse, as a fraction of the old score."""
+    delta = (before - after) if higher_is_better else (after - before)
+    return delta / max(abs(before), 1e-12)
+
+
+# ---------------------- UPDATES ----------------------
+
+def split(df: pd.DataFrame, prev: dict):
+    hold = df.index.isin(prev["holdout"])
+    new = df.index >= prev["rows"]
+    return df[~hold], df[hold], int((new & ~hold).sum())
+
+
+def accept(name: str, before: float, after: float, higher_is_better: bool,
+           max_regression: float) -> bool:
+    worse = relative_change(before, after, higher_is_better)
+    ok = worse <= max_regression
+    print(f"  {name}: holdout {before:.4f} -> {after:.4f}"
+          + ("" if ok else f"  REJECTED ({worse:+.1%} worse, limit {max_regression:.0%})"))
+    return ok
+
+
+def update_classifier(df: pd.DataFrame, prev: dict, min_new_trees: int = MIN_NEW_TREES,
+                      max_trees: int = MAX_TREES,
+                      max_regression: float = MAX_REGRESSION) -> dict:
+    train, hold, n_new = split(df, prev)
+    X, y = train[FEATURE_COLS], train[TYPE_COL].astype(int)
+    X_hold, y_hold = hold[FEATURE_COLS], hold[TYPE_COL].astype(int)
+
+    clf = joblib.load("model_type_classifier.joblib")
+    if not same_classes(clf, y):
+        return {"status": "full"}
+    before = accuracy_score(y_hold, clf.predict(X_hold))
+    added = grow_forest(clf, X, y, n_new, min_new_trees, max_trees)
+    after = accuracy_score(y_hold, clf.predict(X_hold))
+    if not accept("classifier accuracy", before, after, True, max_regression):
+        return {"status": "rejected", "new_rows": n_new}
+    save_model(clf, "model_type_classifier.joblib")
+    return {"status": "updated", "new_rows": n_new, "trees_added": added,
+            "accuracy": [round(before, 5), round(after, 5)]}
+
+
+def update_type(type_id: int, df: pd.DataFrame, prev: dict, min_new_trees: int = MIN_NEW_TREES,
+                max_trees: int = MAX_TREES, max_regression: float = MAX_REGRESSION) -> dict:
+    train, hold, n_new = split(df, prev)
+    time_cols, equip_cols = TIME_COLS_BY_TYPE[type_id], EQUIP_COLS_BY_TYPE[type_id]
+    X, X_hold = train[FEATURE_COLS], hold[FEATURE_COLS]
+    y_equip = encode_equipment(type_id, train[equip_cols].values)
+    y_equip_hold = encode_equipment(type_id, hold[equip_cols].values)
+
+    equip_model = joblib.load(f"model_type{type_id}_equipment.joblib")
+    if not all(same_classes(est, y_equip[:, i]) for i, est in enumerate(equip_model.estimators_)):
+        return {"status": "full"}
+
+    out = {"status": "updated", "new_rows": n_new, "trees_added": 0}
+    grown, rejected = [], []
+
+    # ----- Time + cost models (regression) -----
+    for kind, y, y_hold, label in (
+        ("times", train[time_cols], hold[time_cols], "stage-time MAE"),
+        ("cost", train[COST_COL], hold[COST_COL], "cost MAE"),
+    ):
+        path = f"model_type{type_id}_{kind}.joblib"
+        model = joblib.load(path)
+        before = mean_absolute_error(y_hold, model.predict(X_hold))
+        out["trees_added"] += grow_forest(model, X, y, n_new, min_new_trees, max_trees)
+        after = mean_absolute_error(y_hold, model.predict(X_hold))
+        out[f"{kind}_mae"] = [round(before, 5), round(after, 5)]
+        grown.append((model, path))
+        if not accept(f"type {type_id} {label}", before, after, False, max_regression):
+            rejected.append(kind)
+
+    # ----- Equipment model (one forest per stage) -----
+    def equip_accuracy(model):
+        pred = np.asarray(model.predict(X_hold)).astype(np.int64)
+        return float((pred == y_equip_hold).mean())
+
+    before = equip_accuracy(equip_model)
+    for i, est in enumerate(equip_model.estimators_):
+        out["trees_added"] += grow_forest(est, X, y_equip[:, i], n_new,
+                                          min_new_trees, max_trees)
+    compact_classes(equip_model)
+    after = equip_accuracy(equip_model)
+    out["equipment_accuracy"] = [round(before, 5), round(after, 5)]
+    grown.append((equip_model, f"model_type{type_id}_equipment.joblib"))
+    if not accept(f"type {type_id} equipment accuracy", before, after, True, max_regression):
+        rejected.append("equipment")
+
+    # All or nothing: the state records one row count per type, so a model
+    # saved without the others would never see the rows they rejected
+    if rejected:
+        out["status"] = "rejected"
+        out["rejected"] = rejected
+        return out
+    for model, path in grown:
+        save_model(model, path)
+    return out
+
+
+def full_retrain(key: str):
+    import train_all_models
+    if key == "classifier":
+        train_all_models.train_type_classifier()
+    else:
+        t = int(key)
+        train_all_models.train_type_models(
+            type_id=t, csv_path=CSV_BY_TYPE[t],
+            time_cols=TIME_COLS_BY_TYPE[t], equip_cols=EQUIP_COLS_BY_TYPE[t],
+        )
+
+
+def run_once(state_path: str = STATE_PATH, min_new_trees: int = MIN_NEW_TREES,
+             max_trees: int = MAX_TREES, max_regression: float = MAX_REGRESSION,
+             bundle: bool = False) -> dict:
+    try:
+        state = load_state(state_path)
+    except FileNotFoundError:
+        state = initial_state()
+        save_state(state, state_path)
+        print(f"No {state_path}: recorded the current CSVs as the trained baseline.")
+        return {}
+
+    limits = {"min_new_trees": min_new_trees, "max_trees": max_trees,
+              "max_regression": max_regression}
+    changes = detect_changes(state)
+    results = {}
+    for key, (change, df) in changes.items():
+        if change == "unchanged":
+            continue
+        prev = state["sources"].get(key)
+        print(f"\n=== {sources()[key]}: {change} "
+              f"({len(df) - (prev['rows'] if prev else 0):+d} rows) ===")
+        t0 = time.perf_counter()
+        res = {"status": "full"}
+        if change == "appended":
+            if key == "classifier":
+                res = update_classifier(df, prev, **limits)
+            else:
+                res = update_type(int(key), df, prev, **limits)
+        if res["status"] == "full":
+            print("  rows were rewritten or new classes appeared: full retrain")
+            full_retrain(key)
+            state["sources"][key] = snapshot(key, df)
+        else:
+            # Rejected updates stay pending in the state and are retried
+            if res["status"] != "rejected":
+                state["sources"][key] = snapshot(key, df, prev["holdout"])
+        res["elapsed_s"] = round(time.perf_counter() - t0, 2)
+        print(f"  {res['status']} in {res['elapsed_s']:.1f} s")
+        results[key] = res
+
+    if results:
+        envelopes = compute_envelopes({t: pd.read_csv(CSV_BY_TYPE[t]) for t in TYPE_IDS})
+        save_envelopes(envelopes)
+        state["history"].append({"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "results": results})
+        save_state(state, state_path)
+        if bundle:
+            from model_bundle import BUNDLE_PATH, build_bundle
+            build_bundle()
+            print(f"Rebuilt {BUNDLE_PATH}")
+        else:
+            print("\nModels changed: rebuild the bundle with `python model_bundle.py`.")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental retraining on appended designs")
+    parser.add_argument("--state", default=STATE_PATH)
+    parser.add_argument("--min-new-trees", type=int, default=MIN_NEW_TREES)
+    parser.add_argument("--max-trees", type=int, default=MAX_TREES)
+    parser.add_argument("--max-regression", type=float, default=MAX_REGRESSION,
+                        help="reject updates whose holdout score worsens by more than this fraction")
+    parser.add_argument("--bundle", action="store_true", help="rebuild model_bundle.bin after updates")
+    parser.add_argument("--watch", type=float, default=0.0,
+                        help="poll interval in seconds (0 = update once and exit)")
+    args = parser.parse_args()
+    options = {"state_path": args.state, "min_new_trees": args.min_new_trees,
+               "max_trees": args.max_trees, "max_regression": args.max_regression,
+               "bundle": args.bundle}
+
+    if args.watch <= 0:
+        run_once(**options)
+        return
+
+    print(f"Watching {len(sources())} CSVs every {args.watch:g} s (Ctrl+C to stop)")
+    last = None
+    while True:
+        stamp = [(os.path.getsize(p), os.path.getmtime(p)) for p in sources().values()]
+        if stamp != last:
+            run_once(**options)
+            last = [(os.path.getsize(p), os.path.getmtime(p)) for p in sources().values()]
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
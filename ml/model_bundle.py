@@ -0,0 +1,318 @@
+"""
+Consolidated model bundle for fast service startup.
+
+The serving path only needs the flat forest arrays (flat_forest.py), the
+equipment code maps and the vocabulary – not pandas, sklearn or the 16
+pickled forests. build_bundle() converts the joblib models once, checks
+that the flat engine reproduces sklearn on sample rows, and writes one
+file:
+
+  b"WTMBNDL1" | uint64 header length | JSON header | 64-byte aligned arrays
+
+The header holds the array table (dtype, shape, offset), forest metadata,
+per-type member lists, the equipment vocabulary, the feature envelopes,
+the validation results and the sizes/mtimes of the source .joblib files.
+load_bundle() memory-maps the file, so arrays are plain read-only ndarrays
+backed by the page cache and nothing is copied or unpickled at startup.
+
+Usage (from ml/, after train_all_models.py):
+  python model_bundle.py              # build + validate model_bundle.bin
+  python model_bundle.py --check      # load the existing bundle and time it
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+
+import numpy as np
+
+from feature_envelope import load_envelopes
+from flat_forest import FlatForest, ForestGroup
+from plant_schema import (
+    ALL_TYPES_CSV,
+    FEATURE_COLS,
+    TYPE_IDS,
+    equipment_code_maps,
+    load_equipment_vocab,
+    with_vocab_tables,
+)
+
+
+BUNDLE_PATH = "model_bundle.bin"
+MAGIC = b"WTMBNDL1"
+FORMAT_VERSION = 1
+ALIGN = 64
+VALIDATION_ROWS = 256
+VALIDATION_TOL = 1e-6
+
+
+def model_files() -> list:
+    files = ["model_type_classifier.joblib"]
+    for t in TYPE_IDS:
+        files += [f"model_type{t}_{kind}.joblib" for kind in ("times", "equipment", "cost")]
+    return files
+
+
+# ---------------------- FILE FORMAT ----------------------
+
+def _aligned(n: int) -> int:
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_bundle(path: str, arrays: dict, meta: dict):
+    """Write arrays + JSON meta as one file (atomically, via a temp file)."""
+    table, offset = {}, 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        if arr.dtype.kind == "O":
+            arr = arr.astype(str)
+        arrays[name] = arr
+        table[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+        offset = _aligned(offset + arr.nbytes)
+
+    header = json.dumps({**meta, "arrays": table}).encode()
+    data_start = _aligned(len(MAGIC) + 8 + len(header))
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for name, arr in arrays.items():
+            f.seek(data_start + table[name]["offset"])
+            f.write(arr.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(tmp, path)
+
+
+def read_bundle(path: str):
+    """(arrays, meta) with arrays as read-only views of a memory map."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a model bundle")
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        meta = json.loads(f.read(header_len))
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    data_start = _aligned(len(MAGIC) + 8 + header_len)
+
+    arrays = {}
+    for name, spec in meta.pop("arrays").items():
+        dtype = np.dtype(spec["dtype"])
+        count = int(np.prod(spec["shape"], dtype=np.int64))
+        arrays[name] = np.frombuffer(
+            mm, dtype=dtype, count=count, offset=data_start + spec["offset"]
+        ).reshape(spec["shape"])
+    return arrays, meta
+
+
+# ---------------------- BUILD ----------------------
+
+def models_from_joblib() -> dict:
+    """
+    Flatten the trained joblib models into the structures the API serves
+    from: classifier, per-type ForestGroup, member lists and code maps.
+    """
+    import joblib
+
+    classifier = FlatForest.from_sklearn(joblib.load("model_type_classifier.joblib"))
+    type_models, flat = {}, {}
+    for t in TYPE_IDS:
+        equip_model = joblib.load(f"model_type{t}_equipment.joblib")
+        flat[(t, "time")] = FlatForest.from_sklearn(joblib.load(f"model_type{t}_times.joblib"))
+        flat[(t, "cost")] = FlatForest.from_sklearn(joblib.load(f"model_type{t}_cost.joblib"))
+        equip_members = []
+        for i, est in enumerate(equip_model.estimators_):
+            flat[(t, "equip", i)] = FlatForest.from_sklearn(est)
+            equip_members.append((t, "equip", i))
+        type_models[t] = {
+            "members": [(t, "time"), (t, "cost")] + equip_members,
+            "equip_members": equip_members,
+            # class index -> schema equipment code, per stage estimator
+            "equip_codes": equipment_code_maps(t, equip_model),
+        }
+    return {
+        "classifier": classifier,
+        "group": ForestGroup(flat),
+        "type_models": type_models,
+        "vocab": load_equipment_vocab(),
+        "envelopes": load_envelopes(),
+    }
+
+
+def sklearn_models(n_jobs: int = 1, root: str = ".") -> dict:
+    """
+    The joblib estimators themselves: {"classifier": clf, type_id: {"times",
+    "equipment", "cost"}} (app.py scores large batches with them).
+    """
+    from thread_control import load_model
+
+    def load(name):
+        return load_model(os.path.join(root, name), n_jobs)
+
+    models = {"classifier": load("model_type_classifier.joblib")}
+    for t in TYPE_IDS:
+        models[t] = {
+            kind: load(f"model_type{t}_{kind}.joblib") for kind in ("times", "equipment", "cost")
+        }
+    return models
+
+
+def validate_models(models: dict, n_rows: int = VALIDATION_ROWS, seed: int = 0) -> dict:
+    """Flat engine vs sklearn on sample rows of every type."""
+    import joblib
+    import pandas as pd
+
+    df = pd.read_csv(ALL_TYPES_CSV)
+    df = df.sample(min(n_rows, len(df)), random_state=seed)
+    frame = df[FEATURE_COLS].astype(np.float64)
+    X = frame.to_numpy()
+
+    clf = joblib.load("model_type_classifier.joblib")
+    report = {
+        "rows": int(len(X)),
+        "classifier_proba_max_diff": float(
+            np.abs(models["classifier"].predict_proba(X) - clf.predict_proba(frame)).max()
+        ),
+        "types": {},
+    }
+    group = models["group"]
+    rows = np.arange(len(X))
+    for t in TYPE_IDS:
+        members = models["type_models"][t]
+        (leaves,) = group.apply(X, [(members["members"], rows)])
+        times = group.reduce((t, "time"), leaves[(t, "time")])["mean"]
+        cost = group.reduce((t, "cost"), leaves[(t, "cost")])["mean"][:, 0]
+        equip_model = joblib.load(f"model_type{t}_equipment.joblib")
+        ref_equip = equip_model.predict(frame)
+        mismatches = 0
+        for i, (member, code_map, est) in enumerate(
+            zip(members["equip_members"], members["equip_codes"], equip_model.estimators_)
+        ):
+            proba = group.reduce(member, leaves[member])["mean"]
+            ref_codes = code_map[np.searchsorted(est.classes_, ref_equip[:, i])]
+            mismatches += int((code_map[proba.argmax(axis=1)] != ref_codes).sum())
+        ref_times = joblib.load(f"model_type{t}_times.joblib").predict(frame)
+        ref_cost = joblib.load(f"model_type{t}_cost.joblib").predict(frame)
+        report["types"][str(t)] = {
+            "times_max_diff": float(np.abs(times - np.asarray(ref_times).reshape(times.shape)).max()),
+            "cost_max_diff": float(np.abs(cost - ref_cost).max()),
+            "equipment_mismatches": mismatches,
+        }
+
+    worst = max(
+        [report["classifier_proba_max_diff"]]
+        + [max(r["times_max_diff"], r["cost_max_diff"]) for r in report["types"].values()]
+    )
+    report["passed"] = bool(
+        worst <= VALIDATION_TOL
+        and all(r["equipment_mismatches"] == 0 for r in report["types"].values())
+    )
+    return report
+
+
+def build_bundle(path: str = BUNDLE_PATH) -> dict:
+    models = models_from_joblib()
+    validation = validate_models(models)
+    if not validation["passed"]:
+        raise ValueError(f"Flat models do not reproduce sklearn: {json.dumps(validation)}")
+
+    arrays, clf_meta = models["classifier"].export("clf.")
+    group_arrays, group_meta = models["group"].export("grp.")
+    arrays.update(group_arrays)
+    type_meta = {}
+    for t, tm in models["type_models"].items():
+        for i, codes in enumerate(tm["equip_codes"]):
+            arrays[f"codes.{t}.{i}"] = codes
+        type_meta[str(t)] = {
+            "members": [list(m) for m in tm["members"]],
+            "equip_members": [list(m) for m in tm["equip_members"]],
+        }
+
+    meta = {
+        "format": FORMAT_VERSION,
+        "feature_cols": FEATURE_COLS,
+        "classifier": clf_meta,
+        "group": group_meta,
+        "type_models": type_meta,
+        "vocab": {"version": models["vocab"]["version"], "types": models["vocab"]["types"]},
+        "envelopes": models["envelopes"],
+        "validation": validation,
+        "sources": {
+            name: {"size": os.path.getsize(name), "mtime": os.path.getmtime(name)}
+            for name in model_files()
+        },
+    }
+    write_bundle(path, arrays, meta)
+    return meta
+
+
+# ---------------------- LOAD ----------------------
+
+def stale_sources(meta: dict) -> list:
+    """Source .joblib files that changed since the bundle was built."""
+    changed = []
+    for name, info in meta.get("sources", {}).items():
+        try:
+            st = os.stat(name)
+        except FileNotFoundError:
+            continue
+        if st.st_size != info["size"] or st.st_mtime != info["mtime"]:
+            changed.append(name)
+    return changed
+
+
+def load_bundle(path: str = BUNDLE_PATH) -> dict:
+    """Same structure as models_from_joblib(), from a built bundle."""
+    arrays, meta = read_bundle(path)
+    if meta.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{path}: bundle format {meta.get('format')}, expected {FORMAT_VERSION}")
+    if meta["feature_cols"] != FEATURE_COLS:
+        raise ValueError(f"{path}: bundle was built for features {meta['feature_cols']}")
+    if not meta["validation"]["passed"]:
+        raise ValueError(f"{path}: bundle failed validation at build time")
+
+    type_models = {}
+    for t, tm in meta["type_models"].items():
+        equip_members = [tuple(m) for m in tm["equip_members"]]
+        type_models[int(t)] = {
+            "members": [tuple(m) for m in tm["members"]],
+            "equip_members": equip_members,
+            "equip_codes": [arrays[f"codes.{t}.{i}"] for i in range(len(equip_members))],
+        }
+    return {
+        "classifier": FlatForest.from_export(arrays, meta["classifier"], "clf."),
+        "group": ForestGroup.from_export(arrays, meta["group"], "grp."),
+        "type_models": type_models,
+        "vocab": with_vocab_tables(dict(meta["vocab"])),
+        "envelopes": meta.get("envelopes") or load_envelopes(),
+        "meta": meta,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build / check the consolidated model bundle")
+    parser.add_argument("--out", default=BUNDLE_PATH)
+    parser.add_argument("--check", action="store_true", help="only load and time the bundle")
+    args = parser.parse_args()
+
+    if not args.check:
+        t0 = time.perf_counter()
+        meta = build_bundle(args.out)
+        print(f"Built {args.out} ({os.path.getsize(args.out) / 1e6:.1f} MB) "
+              f"in {time.perf_counter() - t0:.1f} s")
+        print(json.dumps(meta["validation"], indent=2))
+
+    t0 = time.perf_counter()
+    models = load_bundle(args.out)
+    print(f"Loaded {args.out} in {(time.perf_counter() - t0) * 1000:.1f} ms "
+          f"({len(models['group'].members)} forests)")
+    stale = stale_sources(models["meta"])
+    if stale:
+        print(f"WARNING: rebuilt models since the bundle was built: {stale}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""
+Compact, optionally compressed storage of the flat forests.
+
+model_bundle.bin keeps the flat arrays exactly as the engine uses them
+(float64 thresholds and values, int32 features and both child arrays, values
+for every node) so they can be memory-mapped. models.pack trades that for
+size and decodes into the same FlatForest / ForestGroup structures:
+
+  feature    uint8 (there are 9 features)
+  threshold  float32, rounded *down* from sklearn's float64 threshold.
+             The engine compares float32 inputs, and for a float32 x,
+             x <= t  ⇔  x <= (largest float32 <= t), so splits are exact.
+  children   int32 right child only. sklearn's depth-first builder puts
+             every left child at node + 1, so left is rebuilt from it
+             (checked when packing; otherwise left is stored too).
+  values     leaves only (internal node values are never read), quantized
+             per output column to uint8 or uint16 on [min, max] when the
+             worst leaf error stays within --tolerance × that column's
+             range, else float32 / float64. One-hot classifier leaves are
+             exact in uint8.
+
+Each array can be compressed (zstd if the zstandard package is installed,
+or zlib). Before writing, build_pack() decodes the arrays again and checks
+them against the joblib models (verify_models, on top of
+model_bundle.validate_models): regression differences are accepted up to
+the recorded quantization error of each member, while predicted types and
+equipment codes must be identical. With the default tolerance, served
+times and costs (rounded to 0.01) can differ in the last digit.
+
+Usage (from ml/, after train_all_models.py):
+  python model_pack.py                       # build models.pack (zstd if available)
+  python model_pack.py --compress zlib --tolerance 1e-5
+  python model_pack.py --verify              # check an existing pack
+Serve it with ML_MODEL_BUNDLE=models.pack.
+"""
+
+import argparse
+import json
+import os
+import struct
+import time
+import zlib
+
+import numpy as np
+
+from feature_envelope import load_envelopes
+from flat_forest import FlatForest, ForestGroup
+from plant_schema import ALL_TYPES_CSV, FEATURE_COLS, with_vocab_tables
+
+
+PACK_PATH = "models.pack"
+MAGIC = b"WTMPACK1"
+FORMAT_VERSION = 1
+TOLERANCE = 1e-4
+ZSTD_LEVEL = 19  # build once, decode fast: ~25% smaller than zlib
+
+
+# ---------------------- CODECS ----------------------
+
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def default_codec() -> str:
+    return "zstd" if _zstd() is not None else "zlib"
+
+
+def compress(data: bytes, codec: str) -> bytes:
+    if codec == "none":
+        return data
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    if codec == "zstd":
+        zstandard = _zstd()
+        if zstandard is None:
+            raise ImportError("--compress zstd needs the zstandard package (pip install zstandard)")
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    raise ValueError(f"unknown codec {codec!r}")
+
+
+def decompress(data: bytes, codec: str) -> bytes:
+    if codec == "none":
+        return data
+    if codec == "zlib":
+        return zlib.decompress(data)
+    if codec == "zstd":
+        zstandard = _zstd()
+        if zstandard is None:
+            raise ImportError("this pack is zstd-compressed: pip install zstandard")
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"unknown codec {codec!r}")
+
+
+# ---------------------- ENCODING ----------------------
+
+def float32_floor(x: np.ndarray) -> np.ndarray:
+    """Largest float32 <= x, elementwise."""
+    t = x.astype(np.float32)
+    over = t.astype(np.float64) > x
+    t[over] = np.nextafter(t[over], np.float32(-np.inf))
+    return t
+
+
+def quantize(values: np.ndarray, tolerance: float):
+    """
+    (n_leaves, k) float64 → (stored array, meta). Tries uint8, uint16,
+    float32 in order and keeps the first whose worst error per column is
+    within tolerance × that column's range.
+    """
+    lo, hi = values.min(axis=0), values.max(axis=0)
+    span = hi - lo
+    allowed = tolerance * np.where(span > 0, span, np.abs(hi) + 1.0)
+    for dtype in (np.uint8, np.uint16):
+        scale = np.where(span > 0, span / np.iinfo(dtype).max, 1.0)
+        q = np.rint((values - lo) / scale).astype(dtype)
+        err = np.abs(q * scale + lo - values).max(axis=0)
+        if np.all(err <= allowed):
+            return q, {"encoding": np.dtype(dtype).name, "lo": lo.tolist(),
+                       "scale": scale.tolist(), "max_error": float(err.max())}
+    f32 = values.astype(np.float32)
+    err = np.abs(f32 - values).max(axis=0)
+    if np.all(err <= allowed):
+        return f32, {"encoding": "float32", "max_error": float(err.max())}
+    return values, {"encoding": "float64", "max_error": 0.0}
+
+
+def dequantize(stored: np.ndarray, meta: dict) -> np.ndarray:
+    if meta["encoding"] in ("uint8", "uint16"):
+        return stored * np.asarray(meta["scale"]) + np.asarray(meta["lo"])
+    return stored.astype(np.float64)
+
+
+def encode_nodes(feature, threshold, left, right, prefix: str) -> tuple:
+    n = len(feature)
+    ids = np.arange(n, dtype=np.int32)
+    leaf = right == ids
+    arrays = {
+        f"{prefix}feature": np.where(leaf, 0, feature).astype(np.uint8),
+        f"{prefix}threshold": np.where(leaf, 0.0, float32_floor(np.asarray(threshold, np.float64))),
+        f"{prefix}right": np.asarray(right, np.int32),
+    }
+    arrays[f"{prefix}threshold"] = arrays[f"{prefix}threshold"].astype(np.float32)
+    implicit_left = bool(np.all(left == np.where(leaf, ids, ids + 1)))
+    if not implicit_left:
+        arrays[f"{prefix}left"] = np.asarray(left, np.int32)
+    return arrays, leaf
+
+
+def decode_nodes(arrays: dict, prefix: str):
+    right = arrays[f"{prefix}right"]
+    ids = np.arange(len(right), dtype=np.int32)
+    left = arrays.get(f"{prefix}left")
+    if left is None:
+        left = np.where(right == ids, ids, ids + 1).astype(np.int32)
+    return arrays[f"{prefix}feature"], arrays[f"{prefix}threshold"], left, right
+
+
+def encode_values(value: np.ndarray, leaf: np.ndarray, name: str, tolerance: float):
+    stored, meta = quantize(np.asarray(value, np.float64)[leaf], tolerance)
+    return {name: stored}, meta
+
+
+def decode_values(stored: np.ndarray, meta: dict, leaf: np.ndarray) -> np.ndarray:
+    value = np.zeros((len(leaf), stored.shape[1]))
+    value[leaf] = dequantize(stored, meta)
+    return value
+
+
+def pack_models(models: dict, tolerance: float = TOLERANCE):
+    """(arrays, meta) of the classifier and the per-type ForestGroup."""
+    clf, group = models["classifier"], models["group"]
+
+    arrays, leaf = encode_nodes(clf.feature, clf.threshold, clf.left, clf.right, "clf.")
+    values, clf_q = encode_values(clf.value, leaf, "clf.value", tolerance)
+    arrays.update(values)
+    arrays["clf.roots"] = clf.roots
+    arrays["clf.classes"] = clf.classes
+
+    group_arrays, leaf = encode_nodes(group.feature, group.threshold, group.left, group.right, "grp.")
+    arrays.update(group_arrays)
+    arrays["grp.roots"] = group.roots
+    members = []
+    for i, (name, m) in enumerate(group.members.items()):
+        n_nodes = len(m["value"])
+        member_leaf = leaf[m["node_offset"]:m["node_offset"] + n_nodes]
+        values, q = encode_values(m["value"], member_leaf, f"grp.m{i}.value", tolerance)
+        arrays.update(values)
+        if m["classes"] is not None:
+            arrays[f"grp.m{i}.classes"] = m["classes"]
+        members.append({
+            "name": list(name) if isinstance(name, tuple) else name,
+            "node_offset": int(m["node_offset"]),
+            "n_nodes": n_nodes,
+            "trees": [m["trees"].start, m["trees"].stop],
+            "values": q,
+        })
+
+    for t, tm in models["type_models"].items():
+        for i, codes in enumerate(tm["equip_codes"]):
+            arrays[f"codes.{t}.{i}"] = codes
+
+    meta = {
+        "classifier": {"max_depth": int(clf.max_depth), "n_features": int(clf.n_features),
+                       "values": clf_q},
+        "group": {"members": members},
+        "type_models": {
+            str(t): {"members": [list(m) for m in tm["members"]],
+                     "equip_members": [list(m) for m in tm["equip_members"]]}
+            for t, tm in models["type_models"].items()
+        },
+        "vocab": {"version": models["vocab"]["version"], "types": models["vocab"]["types"]},
+        "envelopes": models["envelopes"],
+        "tolerance": tolerance,
+    }
+    return arrays, meta
+
+
+def unpack_models(arrays: dict, meta: dict) -> dict:
+    """Inverse of pack_models: the structure models_from_joblib() returns."""
+    c = meta["classifier"]
+    feature, threshold, left, right = decode_nodes(arrays, "clf.")
+    classifier = FlatForest(
+        feature, threshold, left, right,
+        decode_values(arrays["clf.value"], c["values"], left == np.arange(len(left))),
+        roots=arrays["clf.roots"], max_depth=c["max_depth"],
+        classes=arrays["clf.classes"], n_features=c["n_features"],
+    )
+
+    group = ForestGroup.__new__(ForestGroup)
+    group.feature, group.threshold, group.left, group.right = decode_nodes(arrays, "grp.")
+    group.roots = arrays["grp.roots"]
+    leaf = group.right == np.arange(len(group.right))
+    group.members = {}
+    for i, m in enumerate(meta["group"]["members"]):
+        name = tuple(m["name"]) if isinstance(m["name"], list) else m["name"]
+        member_leaf = leaf[m["node_offset"]:m["node_offset"] + m["n_nodes"]]
+        group.members[name] = {
+            "node_offset": m["node_offset"],
+            "trees": slice(*m["trees"]),
+            "value": decode_values(arrays[f"grp.m{i}.value"], m["values"], member_leaf),
+            "classes": arrays.get(f"grp.m{i}.classes"),
+        }
+
+    type_models = {}
+    for t, tm in meta["type_models"].items():
+        equip_members = [tuple(m) for m in tm["equip_members"]]
+        type_models[int(t)] = {
+            "members": [tuple(m) for m in tm["members"]],
+            "equip_members": equip_members,
+            "equip_codes": [arrays[f"codes.{t}.{i}"] for i in range(len(equip_members))],
+        }
+    return {
+        "classifier": classifier,
+        "group": group,
+        "type_models": type_models,
+        "vocab": with_vocab_tables(dict(meta["vocab"])),
+        "envelopes": meta.get("envelopes") or load_envelopes(),
+        "meta": meta,
+    }
+
+
+# ---------------------- FILE FORMAT ----------------------
+
+def write_pack(path: str, arrays: dict, meta: dict, codec: str):
+    """b"WTMPACK1" | uint64 header length | JSON header | (compressed) array blobs."""
+    table, blobs, offset = {}, [], 0
+    for name, arr in arrays.items():
+        arr = np.ascontiguousarray(arr)
+        if arr.dtype.kind == "O":
+            arr = arr.astype(str)
+        blob = compress(arr.tobytes(), codec)
+        table[name] = {"dtype": arr.dtype.str, "shape": list(arr.shape),
+                       "offset": offset, "size": len(blob)}
+        blobs.append(blob)
+        offset += len(blob)
+    header = json.dumps({**meta, "format": FORMAT_VERSION, "feature_cols": FEATURE_COLS,
+                         "codec": codec, "arrays": table}).encode()
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, path)
+
+
+def read_pack(path: str):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a model pack")
+        (header_len,) = struct.unpack("<Q", f.read(8))
+        meta = json.loads(f.read(header_len))
+        data = f.read()
+    if meta.get("format") != FORMAT_VERSION:
+        raise ValueError(f"{path}: pack format {meta.get('format')}, expected {FORMAT_VERSION}")
+    if meta["feature_cols"] != FEATURE_COLS:
+        raise ValueError(f"{path}: pack was built for features {meta['feature_cols']}")
+    arrays = {}
+    for name, spec in meta.pop("arrays").items():
+        raw = decompress(data[spec["offset"]:spec["offset"] + spec["size"]], meta["codec"])
+        arrays[name] = np.frombuffer(raw, dtype=np.dtype(spec["dtype"])).reshape(spec["shape"])
+    return arrays, meta
+
+
+def load_pack(path: str = PACK_PATH) -> dict:
+    """Same structure as model_bundle.load_bundle(), decoded from a pack."""
+    return unpack_models(*read_pack(path))
+
+
+# ---------------------- BUILD + VERIFY ----------------------
+
+def verify_models(models: dict) -> dict:
+    """Decoded pack models vs the joblib models (model_bundle.validate_models)."""
+    import joblib
+    import pandas as pd
+    from model_bundle import VALIDATION_TOL, validate_models
+
+    report = validate_models(models)
+    meta = models["meta"]
+
+    # Regression members may differ by at most their leaf quantization error
+    bound = {tuple(m["name"]): m["values"]["max_error"] + VALIDATION_TOL
+             for m in meta["group"]["members"]}
+    ok = report["classifier_proba_max_diff"] <= (
+        meta["classifier"]["values"]["max_error"] + VALIDATION_TOL
+    )
+    for t, r in report["types"].items():
+        ok &= r["times_max_diff"] <= bound[(int(t), "time")]
+        ok &= r["cost_max_diff"] <= bound[(int(t), "cost")]
+        ok &= r["equipment_mismatches"] == 0
+
+    df = pd.read_csv(ALL_TYPES_CSV)
+    frame = df[FEATURE_COLS].astype(np.float64)
+    ref = joblib.load("model_type_classifier.joblib").predict(frame)
+    mismatches = int((models["classifier"].predict(frame.to_numpy()) != ref).sum())
+    report["classifier_type_mismatches"] = mismatches
+    report["passed"] = bool(ok and mismatches == 0)
+    return report
+
+
+def build_pack(path: str = PACK_PATH, codec: str = None, tolerance: float = TOLERANCE) -> dict:
+    from model_bundle import model_files, models_from_joblib
+
+    arrays, meta = pack_models(models_from_joblib(), tolerance)
+    validation = verify_models(unpack_models(arrays, meta))
+    if not validation["passed"]:
+        raise ValueError(f"Packed models do not reproduce sklearn: {json.dumps(validation)}")
+    meta["validation"] = validation
+    meta["sources"] = {
+        name: {"size": os.path.getsize(name), "mtime": os.path.getmtime(name)}
+        for name in model_files()
+    }
+    write_pack(path, arrays, meta, codec or default_codec())
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build / verify the compact model pack")
+    parser.add_argument("--out", default=PACK_PATH)
+    parser.add_argument("--compress", choices=("zstd", "zlib", "none"), default=None,
+                        help="default: zstd if installed, else zlib")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="max leaf quantization error as a fraction of each output's range")
+    parser.add_argument("--verify", action="store_true", help="only verify an existing pack")
+    args = parser.parse_args()
+
+    if args.verify:
+        t0 = time.perf_counter()
+        models = load_pack(args.out)
+        print(f"Decoded {args.out} in {(time.perf_counter() - t0) * 1000:.0f} ms")
+        report = verify_models(models)
+        print(json.dumps(report, indent=2))
+        if not report["passed"]:
+            raise SystemExit("pack does NOT reproduce the joblib models within tolerance")
+        return
+
+    from model_bundle import BUNDLE_PATH, model_files
+
+    t0 = time.perf_counter()
+    meta = build_pack(args.out, args.compress, args.tolerance)
+    print(f"Built {args.out} in {time.perf_counter() - t0:.1f} s")
+    print(json.dumps(meta["validation"], indent=2))
+    encodings = [m["values"]["encoding"] for m in meta["group"]["members"]]
+    print("leaf value encodings:", {e: encodings.count(e) for e in sorted(set(encodings))})
+    sizes = {"joblib models": sum(os.path.getsize(f) for f in model_files())}
+    if os.path.exists(BUNDLE_PATH):
+        sizes[BUNDLE_PATH] = os.path.getsize(BUNDLE_PATH)
+    sizes[f"{args.out} ({args.compress or default_codec()})"] = os.path.getsize(args.out)
+    for name, size in sizes.items():
+        print(f"  {name:<24} {size / 1e6:8.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
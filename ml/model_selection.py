@@ -0,0 +1,371 @@
+"""
+Cross-validated hyperparameter search for the 16 production models
+(type classifier + times / equipment / cost for each plant type).
+
+Per task, the expensive preparation happens once and is cached on disk in
+cv_cache/<task>-<key>.npz:
+  - X / y exactly as train_all_models.py builds them (equipment as
+    plant_schema codes)
+  - fold ids (stratified for the classifier, plain K-fold otherwise)
+  - a uint8 quantile-binned copy of X plus the bin edges
+The key hashes the data, --folds, --seed and --bins, so new CSV rows or a
+different fold layout get a fresh cache entry and everything else is reused.
+
+Candidates come from three families:
+  rf     RandomForest (the production model), raw features
+  extra  ExtraTrees, raw features
+  hgb    HistGradientBoosting on the cached binned matrix
+sklearn's exact forest splitter gains nothing from pre-binned inputs, so
+the binned matrix only feeds the histogram family; forests read raw X.
+
+(task, candidate) jobs fan out over a process pool. Each job scores its
+folds in order and is pruned as soon as its running mean is worse than the
+best finished candidate of the same task by more than --prune-margin, so
+weak candidates usually stop after one or two folds. The production
+configuration is always the first candidate of every task, which gives the
+pruning threshold (and the leaderboard) a baseline.
+
+Scores are "lower is better": MAE (mean over outputs) for regression,
+error rate (mean over outputs) for classification.
+
+Outputs in --out-dir (default model_selection/):
+  leaderboard.csv   every job: task, family, params, folds, score, status
+  best_params.json  best finished candidate per task
+
+Usage (from ml/):
+  python model_selection.py
+  python model_selection.py --tasks classifier type4_cost --candidates 24 --workers 8
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import (
+    ExtraTreesClassifier,
+    ExtraTreesRegressor,
+    HistGradientBoostingClassifier,
+    HistGradientBoostingRegressor,
+    RandomForestClassifier,
+    RandomForestRegressor,
+)
+from sklearn.model_selection import KFold, ParameterSampler, StratifiedKFold
+from sklearn.multioutput import MultiOutputClassifier, MultiOutputRegressor
+
+from plant_schema import (
+    ALL_TYPES_CSV,
+    COST_COL,
+    CSV_BY_TYPE,
+    EQUIP_COLS_BY_TYPE,
+    FEATURE_COLS,
+    TIME_COLS_BY_TYPE,
+    TYPE_COL,
+    TYPE_IDS,
+    encode_equipment,
+    validate_design_frame,
+)
+
+
+CACHE_DIR = "cv_cache"
+OUT_DIR = "model_selection"
+N_FOLDS = 5
+N_BINS = 255
+N_CANDIDATES = 12
+PRUNE_MARGIN = 0.05
+
+# train_all_models.py settings (the baseline candidate of every task)
+PRODUCTION = ("rf", {"n_estimators": 400})
+
+SEARCH_SPACE = {
+    "rf": {
+        "n_estimators": [100, 200, 400],
+        "max_depth": [None, 24, 16, 10],
+        "min_samples_leaf": [1, 2, 4, 8],
+        "max_features": [1.0, 0.6, "sqrt"],
+    },
+    "extra": {
+        "n_estimators": [100, 200, 400],
+        "max_depth": [None, 24, 16],
+        "min_samples_leaf": [1, 2, 4],
+        "max_features": [1.0, 0.6, "sqrt"],
+    },
+    "hgb": {
+        "learning_rate": [0.03, 0.1, 0.3],
+        "max_iter": [100, 300],
+        "max_leaf_nodes": [15, 31, 63],
+        "min_samples_leaf": [5, 20],
+        "l2_regularization": [0.0, 1.0],
+    },
+}
+
+
+def task_names() -> list:
+    return ["classifier"] + [
+        f"type{t}_{kind}" for t in TYPE_IDS for kind in ("times", "equipment", "cost")
+    ]
+
+
+# ---------------------- DATA + CACHE ----------------------
+
+def load_task(name: str):
+    """(X, y, kind) with the same rows and targets train_all_models.py uses."""
+    if name == "classifier":
+        df = pd.read_csv(ALL_TYPES_CSV).dropna(subset=[TYPE_COL] + FEATURE_COLS)
+        return df[FEATURE_COLS].to_numpy(np.float64), df[TYPE_COL].to_numpy(np.int64), "classification"
+
+    type_id, kind = int(name[4:name.index("_")]), name[name.index("_") + 1:]
+    time_cols, equip_cols = TIME_COLS_BY_TYPE[type_id], EQUIP_COLS_BY_TYPE[type_id]
+    df = pd.read_csv(CSV_BY_TYPE[type_id])
+    validate_design_frame(df, type_id)
+    df = df.dropna(subset=FEATURE_COLS + time_cols + equip_cols + [COST_COL])
+    X = df[FEATURE_COLS].to_numpy(np.float64)
+    if kind == "times":
+        return X, df[time_cols].to_numpy(np.float64), "regression"
+    if kind == "equipment":
+        return X, encode_equipment(type_id, df[equip_cols].values).astype(np.int64), "classification"
+    return X, df[COST_COL].to_numpy(np.float64), "regression"
+
+
+def bin_features(X: np.ndarray, n_bins: int):
+    """uint8 quantile codes + (n_features, n_bins - 1) edges (nan-padded)."""
+    edges = np.full((X.shape[1], n_bins - 1), np.nan)
+    Xb = np.empty(X.shape, dtype=np.uint8)
+    for j in range(X.shape[1]):
+        values = np.unique(X[:, j])
+        if len(values) <= n_bins:
+            cuts = (values[:-1] + values[1:]) / 2
+        else:
+            cuts = np.unique(np.quantile(X[:, j], np.linspace(0, 1, n_bins + 1)[1:-1]))
+        edges[j, :len(cuts)] = cuts
+        Xb[:, j] = np.searchsorted(cuts, X[:, j], side="right")
+    return Xb, edges
+
+
+def prepare_task(name: str, n_folds: int, seed: int, n_bins: int,
+                 cache_dir: str = CACHE_DIR) -> str:
+    """Path of the task's cache file, building it if the data changed."""
+    X, y, kind = load_task(name)
+    h = hashlib.sha1()
+    for part in (X, y, np.array([n_folds, seed, n_bins])):
+        h.update(np.ascontiguousarray(part).tobytes())
+    path = os.path.join(cache_dir, f"{name}-{h.hexdigest()[:12]}.npz")
+    if os.path.exists(path):
+        return path
+
+    if kind == "classification" and y.ndim == 1:
+        splitter = StratifiedKFold(n_folds, shuffle=True, random_state=seed)
+    else:
+        splitter = KFold(n_folds, shuffle=True, random_state=seed)
+    folds = np.empty(len(X), dtype=np.int8)
+    for i, (_, test) in enumerate(splitter.split(X, y)):
+        folds[test] = i
+    Xb, edges = bin_features(X, n_bins)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, X=X, y=y, folds=folds, Xb=Xb, edges=edges, kind=kind)
+    os.replace(tmp, path)
+    return path
+
+
+# ---------------------- CANDIDATES ----------------------
+
+def make_estimator(family: str, params: dict, kind: str, multi_output: bool):
+    if family == "hgb":
+        cls = HistGradientBoostingClassifier if kind == "classification" else HistGradientBoostingRegressor
+        est = cls(random_state=42, **params)
+        if multi_output:
+            wrap = MultiOutputClassifier if kind == "classification" else MultiOutputRegressor
+            est = wrap(est)
+        return est
+
+    if kind == "classification":
+        cls = RandomForestClassifier if family == "rf" else ExtraTreesClassifier
+    else:
+        cls = RandomForestRegressor if family == "rf" else ExtraTreesRegressor
+    est = cls(random_state=42, n_jobs=1, **params)
+    # Production trains one forest per equipment stage
+    if multi_output and kind == "classification":
+        est = MultiOutputClassifier(est)
+    return est
+
+
+def candidates(n: int, seed: int, families=tuple(SEARCH_SPACE)) -> list:
+    """Production config first, then n random draws spread over families."""
+    out = [PRODUCTION]
+    per_family = max(1, n // len(families))
+    for i, family in enumerate(families):
+        for params in ParameterSampler(SEARCH_SPACE[family], per_family, random_state=seed + i):
+            if (family, params) != PRODUCTION:
+                out.append((family, params))
+    return out
+
+
+# ---------------------- WORKERS ----------------------
+
+_DATA = {}
+
+
+def _task_data(path: str) -> dict:
+    if path not in _DATA:
+        with np.load(path) as z:
+            _DATA[path] = {k: z[k] for k in z.files}
+    return _DATA[path]
+
+
+def fold_score(kind: str, y_true: np.ndarray, y_pred: np.ndarray) -> float:
+    y_true = y_true.reshape(len(y_true), -1)
+    y_pred = np.asarray(y_pred).reshape(y_true.shape)
+    if kind == "classification":
+        return float((y_true != y_pred).mean())
+    return float(np.abs(y_true - y_pred).mean(axis=0).mean())
+
+
+def evaluate(job: dict) -> dict:
+    """Score one candidate fold by fold; stop early above job["threshold"]."""
+    data = _task_data(job["path"])
+    kind, y, folds = str(data["kind"]), data["y"], data["folds"]
+    X = data["Xb"] if job["family"] == "hgb" else data["X"]
+    multi_output = y.ndim > 1 and y.shape[1] > 1
+
+    t0 = time.perf_counter()
+    scores, status = [], "done"
+    for k in range(int(folds.max()) + 1):
+        test = folds == k
+        est = make_estimator(job["family"], job["params"], kind, multi_output)
+        est.fit(X[~test], y[~test])
+        scores.append(fold_score(kind, y[test], est.predict(X[test])))
+        if np.mean(scores) > job["threshold"] and k + 1 < folds.max() + 1:
+            status = "pruned"
+            break
+    return {
+        "task": job["task"],
+        "family": job["family"],
+        "params": json.dumps(job["params"], sort_keys=True),
+        "folds": len(scores),
+        "score": float(np.mean(scores)),
+        "score_std": float(np.std(scores)),
+        "fit_s": round(time.perf_counter() - t0, 3),
+        "status": status,
+    }
+
+
+# ---------------------- SEARCH ----------------------
+
+def search(tasks: list, n_candidates: int = N_CANDIDATES, n_folds: int = N_FOLDS,
+           n_bins: int = N_BINS, seed: int = 0, workers: int = None,
+           prune_margin: float = PRUNE_MARGIN, families=tuple(SEARCH_SPACE)) -> pd.DataFrame:
+    workers = workers or os.cpu_count()
+    paths = {t: prepare_task(t, n_folds, seed, n_bins) for t in tasks}
+    pending = {t: candidates(n_candidates, seed, families) for t in tasks}
+    best = {t: np.inf for t in tasks}
+
+    def next_job():
+        # Round-robin over tasks so every baseline is scored early
+        for task in sorted(pending, key=lambda t: -len(pending[t])):
+            if pending[task]:
+                family, params = pending[task].pop(0)
+                return {"task": task, "path": paths[task], "family": family, "params": params,
+                        "threshold": best[task] * (1.0 + prune_margin)}
+        return None
+
+    rows = []
+
+    def record(row):
+        rows.append(row)
+        if row["status"] == "done":
+            best[row["task"]] = min(best[row["task"]], row["score"])
+        print(f"  {row['task']:<16} {row['family']:<5} {row['status']:<6} "
+              f"folds={row['folds']} score={row['score']:.4f} ({row['fit_s']:.1f} s) {row['params']}")
+
+    if workers <= 1:
+        job = next_job()
+        while job is not None:
+            record(evaluate(job))
+            job = next_job()
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            running = set()
+            while True:
+                while len(running) < workers:
+                    job = next_job()
+                    if job is None:
+                        break
+                    running.add(pool.submit(evaluate, job))
+                if not running:
+                    break
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    record(fut.result())
+
+    board = pd.DataFrame(rows)
+    board["rank"] = board.assign(
+        key=np.where(board["status"] == "done", board["score"], np.inf)
+    ).groupby("task")["key"].rank(method="first").astype(int)
+    return board.sort_values(["task", "rank"]).reset_index(drop=True)
+
+
+def best_params(board: pd.DataFrame) -> dict:
+    out = {}
+    for task, grp in board[board["status"] == "done"].groupby("task"):
+        top = grp.sort_values("score").iloc[0]
+        baseline = grp[(grp["family"] == PRODUCTION[0])
+                       & (grp["params"] == json.dumps(PRODUCTION[1], sort_keys=True))]
+        out[task] = {
+            "family": top["family"],
+            "params": json.loads(top["params"]),
+            "score": round(float(top["score"]), 6),
+            "baseline_score": round(float(baseline["score"].iloc[0]), 6) if len(baseline) else None,
+        }
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-validated hyperparameter search")
+    parser.add_argument("--tasks", nargs="*", default=None,
+                        help=f"subset of: {' '.join(task_names())}")
+    parser.add_argument("--families", nargs="*", default=list(SEARCH_SPACE),
+                        choices=list(SEARCH_SPACE))
+    parser.add_argument("--candidates", type=int, default=N_CANDIDATES,
+                        help="random candidates per task (plus the production baseline)")
+    parser.add_argument("--folds", type=int, default=N_FOLDS)
+    parser.add_argument("--bins", type=int, default=N_BINS, choices=range(2, 256),
+                        metavar="2..255")
+    parser.add_argument("--prune-margin", type=float, default=PRUNE_MARGIN)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    args = parser.parse_args()
+
+    tasks = args.tasks or task_names()
+    unknown = sorted(set(tasks) - set(task_names()))
+    if unknown:
+        parser.error(f"unknown tasks: {unknown}")
+
+    t0 = time.perf_counter()
+    board = search(tasks, args.candidates, args.folds, args.bins, args.seed,
+                   args.workers, args.prune_margin, tuple(args.families))
+    elapsed = time.perf_counter() - t0
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    board.to_csv(os.path.join(args.out_dir, "leaderboard.csv"), index=False)
+    best = best_params(board)
+    with open(os.path.join(args.out_dir, "best_params.json"), "w") as f:
+        json.dump(best, f, indent=2)
+
+    pruned = int((board["status"] == "pruned").sum())
+    print(f"\n{len(board)} candidates on {len(tasks)} tasks in {elapsed:.1f} s "
+          f"({pruned} pruned early)")
+    for task, info in best.items():
+        print(f"  {task:<16} {info['family']:<5} score={info['score']:.4f} "
+              f"(baseline {info['baseline_score']})  {json.dumps(info['params'])}")
+    print(f"Saved: {args.out_dir}/leaderboard.csv, {args.out_dir}/best_params.json")
+
+
+if __name__ == "__main__":
+    main()
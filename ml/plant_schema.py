@@ -0,0 +1,486 @@
+"""
+Declarative schema for the five plant types.
+
+Single source of truth for everything the generators, training script and
+API used to spell out by hand:
+  - model input features (FEATURE_COLS)
+  - per-type treatment stages, in process order
+  - detention-time clamp bounds used by the generators (minutes)
+  - equipment vocabulary per stage (index in the list = integer code)
+  - generator input ranges (uniform) and heavy-metal probability per type
+  - the generator cost model: coefficients, load indices (clipped
+    feature ratios), the stages whose detention hours carry CAPEX and the
+    OPEX terms (coefficient, index)
+
+PLANT_TYPES is compiled once at import into the lookup structures used
+elsewhere:
+  TIME_COLS_BY_TYPE / EQUIP_COLS_BY_TYPE – column lists ("t_<stage>_min", "equip_<stage>")
+  TIME_BOUNDS_BY_TYPE                    – (n_stages, 2) float arrays
+  INPUT_BOUNDS_BY_TYPE                   – (n_features, 2) generator input ranges
+  EQUIP_VOCAB_BY_TYPE                    – per-stage label tuples
+  EQUIP_CODES_BY_TYPE                    – per-stage {label: code}
+  EQUIP_LABEL_TABLE                      – (n_stages, max_vocab) object arrays,
+                                           so codes decode with one fancy index
+
+Equipment models are trained on the integer codes; the vocabulary is saved
+as equipment_vocab.json next to the models (save_equipment_vocab).
+"""
+
+import hashlib
+import json
+
+import numpy as np
+
+
+# ---------------------- MODEL INPUTS ----------------------
+
+FEATURE_COLS = [
+    "pH",
+    "TDS_mgL",
+    "turbidity_NTU",
+    "BOD_mgL",
+    "COD_mgL",
+    "total_nitrogen_mgL",
+    "temperature_C",
+    "flow_m3_day",
+    "heavy_metals",
+]
+
+TYPE_COL = "type"
+COST_COL = "cost_per_m3_inr"
+ALL_TYPES_CSV = "synthetic_designs_all_types.csv"
+EQUIP_VOCAB_PATH = "equipment_vocab.json"
+
+
+# ---------------------- PLANT TYPES ----------------------
+# inputs: generator range per feature (uniform); heavy_metals_p: P(heavy_metals = 1)
+# heavy_metals_draw: how the generator draws it – "bernoulli" (random() < p),
+#   "coin" (integers(0, 2)) or "none" (always 0, no draw)
+# stages: (stage, (t_min, t_max) minutes, equipment vocabulary)
+
+PLANT_TYPES = {
+    1: {
+        "label": "Drinking / Potable Water",
+        "csv": "type1_potable_synthetic.csv",
+        "inputs": {
+            "pH": (6.5, 8.5), "TDS_mgL": (100, 1200), "turbidity_NTU": (0.5, 50),
+            "BOD_mgL": (1, 15), "COD_mgL": (5, 50), "total_nitrogen_mgL": (0.5, 10),
+            "temperature_C": (10, 35), "flow_m3_day": (100, 5000),
+        },
+        "heavy_metals_p": 0.05, "heavy_metals_draw": "bernoulli",
+        "stages": [
+            ("screening", (0.5, 5.0), ["coarse_bar_screen", "fine_bar_screen"]),
+            ("coag_floc", (5.0, 60.0),
+             ["rapid_mixer_light", "rapid_mixer_standard", "rapid_mixer_high_rate"]),
+            ("sedimentation", (30.0, 240.0), ["circular_clarifier", "hopper_bottom_clarifier"]),
+            ("filtration", (5.0, 60.0), ["rapid_sand_filter", "dual_media_filter"]),
+            ("carbon_polishing", (3.0, 60.0), ["pressure_carbon_filter"]),
+            ("disinfection", (3.0, 60.0), ["uv_disinfection", "chlorination_system"]),
+        ],
+        "cost": {
+            "capex_terms": ["flow", "tds", "hours"],
+            "capex_hour_stages": ["coag_floc", "sedimentation", "filtration",
+                                  "carbon_polishing", "disinfection"],
+            "indices": {
+                "turbidity": {"terms": {"turbidity_NTU": 30.0}, "clip": (0.2, 3.0)},
+                "organic": {"terms": {"BOD_mgL": 5.0, "COD_mgL": 25.0}, "clip": (0.2, 3.0)},
+            },
+            "capex_index": "organic",
+            "opex_terms": [("chem_per_flow", "turbidity"), ("carbon_per_flow", "organic"),
+                           ("disinfection_per_flow", None)],
+            "base_capex": 3e5, "capex_per_flow": 1500.0, "capex_per_tds": 10.0,
+            "capex_per_organic_hour": 5e3,
+            "base_opex": 5e3, "chem_per_flow": 3.0, "carbon_per_flow": 2.0,
+            "disinfection_per_flow": 1.5,
+        },
+    },
+    2: {
+        "label": "Domestic / Grey Water (STP)",
+        "csv": "type2_domestic_synthetic.csv",
+        "inputs": {
+            "pH": (6.0, 8.5), "TDS_mgL": (300, 1500), "turbidity_NTU": (20, 300),
+            "BOD_mgL": (150, 400), "COD_mgL": (300, 800), "total_nitrogen_mgL": (15, 60),
+            "temperature_C": (15, 40), "flow_m3_day": (200, 10000),
+        },
+        "heavy_metals_p": 0.0, "heavy_metals_draw": "none",
+        "stages": [
+            ("screening", (0.5, 5.0), ["manual_bar_screen", "mechanical_bar_screen"]),
+            ("oil_grease", (5.0, 60.0), ["api_separator", "cpi_separator"]),
+            ("equalization", (30.0, 360.0), ["circular_eq_tank", "rectangular_eq_tank"]),
+            ("coag_floc", (10.0, 60.0), ["flash_mixer_plus_flocculator"]),
+            ("primary_clarifier", (30.0, 240.0), ["primary_clarifier_circular"]),
+            ("aeration", (120.0, 960.0), ["extended_aeration", "diffused_aeration"]),
+            ("secondary_clarifier", (60.0, 360.0), ["secondary_clarifier_circular"]),
+            ("filtration", (10.0, 60.0), ["pressure_sand_filter", "dual_media_filter"]),
+            ("disinfection", (10.0, 60.0), ["chlorination"]),
+        ],
+        "cost": {
+            "capex_terms": ["flow", "hours"],
+            "capex_hour_stages": ["aeration", "equalization", "primary_clarifier",
+                                  "secondary_clarifier"],
+            "indices": {"organic": {"terms": {"BOD_mgL": 250.0}, "clip": (0.4, 3.0)}},
+            "capex_index": "organic",
+            "opex_terms": [("aeration_per_flow", "organic"), ("chem_per_flow", None),
+                           ("sludge_per_day", "organic")],
+            "base_capex": 8e5, "capex_per_flow": 2500.0, "capex_per_organic_hour": 2000.0,
+            "base_opex": 1.5e4, "aeration_per_flow": 12.0, "chem_per_flow": 4.0,
+            "sludge_per_day": 3000.0,
+        },
+    },
+    3: {
+        "label": "Treated Wastewater (Recycle, MBR)",
+        "csv": "type3_recycle_mbr_synthetic.csv",
+        "inputs": {
+            "pH": (6.5, 8.5), "TDS_mgL": (300, 2000), "turbidity_NTU": (10, 200),
+            "BOD_mgL": (80, 250), "COD_mgL": (200, 700), "total_nitrogen_mgL": (10, 40),
+            "temperature_C": (15, 40), "flow_m3_day": (200, 8000),
+        },
+        "heavy_metals_p": 0.1, "heavy_metals_draw": "bernoulli",
+        "stages": [
+            ("screening", (0.5, 5.0), ["fine_screen"]),
+            ("grit_chamber", (5.0, 40.0), ["vortex_grit_chamber", "aerated_grit_chamber"]),
+            ("equalization", (30.0, 360.0), ["eq_tank_with_mixing"]),
+            ("biological_reactor", (120.0, 720.0), ["anoxic_aerobic_bioreactor"]),
+            ("mbr", (10.0, 90.0), ["submerged_mbr", "external_mbr"]),
+            ("activated_carbon", (5.0, 60.0), ["pressure_carbon_filter"]),
+            ("disinfection", (5.0, 60.0), ["uv_disinfection"]),
+        ],
+        "cost": {
+            "capex_terms": ["flow", "hours", "heavy_metals"],
+            "capex_hour_stages": ["biological_reactor", "mbr", "equalization"],
+            "indices": {
+                "organic": {"terms": {"BOD_mgL": 200.0}, "clip": (0.5, 2.5)},
+                "tds": {"terms": {"TDS_mgL": 1000.0}, "clip": (0.3, 3.0)},
+            },
+            "capex_index": None,
+            "opex_terms": [("aeration_per_flow", "organic"), ("membrane_per_flow", "tds"),
+                           ("chem_per_flow", None)],
+            "base_capex": 1.5e6, "capex_per_flow": 3000.0, "capex_per_hour": 3e4,
+            "capex_heavy_metals": 2e5,
+            "base_opex": 2e4, "aeration_per_flow": 14.0, "membrane_per_flow": 5.0,
+            "chem_per_flow": 3.0,
+        },
+    },
+    4: {
+        "label": "Industrial Effluent (High TDS / metals)",
+        "csv": "type4_industrial_synthetic.csv",
+        "inputs": {
+            "pH": (5.0, 9.0), "TDS_mgL": (800, 6000), "turbidity_NTU": (20, 500),
+            "BOD_mgL": (50, 800), "COD_mgL": (150, 2500), "total_nitrogen_mgL": (10, 100),
+            "temperature_C": (15, 40), "flow_m3_day": (100, 5000),
+        },
+        "heavy_metals_p": 0.5, "heavy_metals_draw": "coin",
+        "stages": [
+            ("screening", (0.5, 10.0),
+             ["coarse_bar_screen", "mechanical_screen", "fine_bar_screen"]),
+            ("neutralization", (10.0, 240.0),
+             ["batch_neutralization_tank", "continuous_stirred_tank"]),
+            ("precipitation", (10.0, 240.0), ["circular_clarifier", "rectangular_clarifier"]),
+            ("heavy_metal_removal", (10.0, 240.0),
+             ["none", "chemical_precipitation_unit", "precipitation_plus_ion_exchange"]),
+            ("filter_press", (20.0, 240.0), ["plate_and_frame_press", "belt_filter_press"]),
+            ("carbon_filter", (5.0, 120.0), ["pressure_carbon_filter", "gravity_carbon_filter"]),
+            ("ro", (20.0, 240.0), ["single_pass_ro", "double_pass_ro", "ro_with_energy_recovery"]),
+        ],
+        "cost": {
+            "capex_terms": ["flow", "tds", "heavy_metals", "hours"],
+            "capex_hour_stages": ["neutralization", "precipitation", "heavy_metal_removal",
+                                  "filter_press", "carbon_filter", "ro"],
+            "indices": {
+                "organic": {"terms": {"BOD_mgL": 300.0, "COD_mgL": 600.0}, "clip": (0.3, 3.0)},
+                "tds": {"terms": {"TDS_mgL": 2000.0}, "clip": (0.4, 3.0)},
+                "sludge": {"terms": {"BOD_mgL": 300.0, "COD_mgL": 600.0}, "clip": (0.3, 3.0),
+                           "add": {"heavy_metals": 0.5}},
+            },
+            "capex_index": "organic",
+            "opex_terms": [("chem_per_flow", "organic"), ("ro_power_per_flow", "tds"),
+                           ("sludge_per_day", "sludge")],
+            "base_capex": 5e5, "capex_per_flow": 2000.0, "capex_per_tds": 50.0,
+            "capex_heavy_metals": 2e5, "capex_per_organic_hour": 1e4,
+            "base_opex": 1e4, "chem_per_flow": 10.0, "ro_power_per_flow": 15.0,
+            "sludge_per_day": 2000.0,
+        },
+    },
+    5: {
+        "label": "High Organic Load Wastewater",
+        "csv": "type5_high_organic_synthetic.csv",
+        "inputs": {
+            "pH": (6.0, 8.0), "TDS_mgL": (500, 4000), "turbidity_NTU": (50, 600),
+            "BOD_mgL": (500, 2500), "COD_mgL": (800, 5000), "total_nitrogen_mgL": (30, 200),
+            "temperature_C": (20, 40), "flow_m3_day": (100, 6000),
+        },
+        "heavy_metals_p": 0.2, "heavy_metals_draw": "bernoulli",
+        "stages": [
+            ("screening", (0.5, 5.0), ["coarse_screen", "mechanical_screen"]),
+            ("anaerobic_reactor", (240.0, 2880.0), ["anaerobic_filter", "uasb_reactor"]),
+            ("biogas_handling", (5.0, 60.0), ["biogas_holder_and_flare"]),
+            ("aeration", (60.0, 960.0), ["diffused_aeration_tank"]),
+            ("secondary_clarifier", (60.0, 360.0), ["secondary_clarifier_circular"]),
+            ("sludge_handling", (30.0, 360.0), ["sludge_drying_beds", "sludge_thickener_plus_press"]),
+            ("tertiary_filtration", (10.0, 60.0), ["pressure_sand_filter_plus_acf"]),
+        ],
+        "cost": {
+            "capex_terms": ["flow", "hours", "heavy_metals"],
+            "capex_hour_stages": ["anaerobic_reactor", "aeration", "sludge_handling"],
+            "indices": {
+                "organic": {"terms": {"BOD_mgL": 1000.0}, "clip": (0.5, 3.0)},
+                "sludge": {"terms": {"COD_mgL": 2000.0}, "clip": (0.5, 3.0)},
+            },
+            "capex_index": "organic",
+            "opex_terms": [("aeration_per_flow", "organic"), ("sludge_per_day", "sludge"),
+                           ("chem_per_flow", None), ("biogas_credit_per_flow", "organic")],
+            "base_capex": 1.2e6, "capex_per_flow": 2500.0, "capex_per_organic_hour": 3e4,
+            "capex_heavy_metals": 1e5,
+            "base_opex": 2e4, "aeration_per_flow": 15.0, "sludge_per_day": 4000.0,
+            "chem_per_flow": 4.0, "biogas_credit_per_flow": -5.0,
+        },
+    },
+}
+
+
+# ---------------------- COMPILED TABLES ----------------------
+
+def time_col(stage: str) -> str:
+    return f"t_{stage}_min"
+
+
+def equip_col(stage: str) -> str:
+    return f"equip_{stage}"
+
+
+TYPE_IDS = sorted(PLANT_TYPES)
+
+CSV_BY_TYPE = {t: spec["csv"] for t, spec in PLANT_TYPES.items()}
+
+STAGES_BY_TYPE = {t: [s[0] for s in spec["stages"]] for t, spec in PLANT_TYPES.items()}
+
+TIME_COLS_BY_TYPE = {t: [time_col(s) for s in STAGES_BY_TYPE[t]] for t in TYPE_IDS}
+
+EQUIP_COLS_BY_TYPE = {t: [equip_col(s) for s in STAGES_BY_TYPE[t]] for t in TYPE_IDS}
+
+TIME_BOUNDS_BY_TYPE = {
+    t: np.array([s[1] for s in spec["stages"]], dtype=np.float64)
+    for t, spec in PLANT_TYPES.items()
+}
+
+# (len(FEATURE_COLS), 2) generator ranges in column order; heavy_metals spans (0, 1)
+INPUT_BOUNDS_BY_TYPE = {
+    t: np.array(
+        [spec["inputs"].get(col, (0.0, 1.0)) for col in FEATURE_COLS], dtype=np.float64
+    )
+    for t, spec in PLANT_TYPES.items()
+}
+
+HEAVY_METALS_P_BY_TYPE = {t: spec["heavy_metals_p"] for t, spec in PLANT_TYPES.items()}
+HEAVY_METALS_DRAW_BY_TYPE = {t: spec["heavy_metals_draw"] for t, spec in PLANT_TYPES.items()}
+
+EQUIP_VOCAB_BY_TYPE = {
+    t: [tuple(s[2]) for s in spec["stages"]] for t, spec in PLANT_TYPES.items()
+}
+
+EQUIP_CODES_BY_TYPE = {
+    t: [{label: code for code, label in enumerate(vocab)} for vocab in EQUIP_VOCAB_BY_TYPE[t]]
+    for t in TYPE_IDS
+}
+
+
+def _label_table(vocabs) -> np.ndarray:
+    width = max(len(v) for v in vocabs)
+    table = np.full((len(vocabs), width), None, dtype=object)
+    for i, vocab in enumerate(vocabs):
+        table[i, :len(vocab)] = vocab
+    return table
+
+
+EQUIP_LABEL_TABLE = {t: _label_table(EQUIP_VOCAB_BY_TYPE[t]) for t in TYPE_IDS}
+
+STAGE_INDEX_BY_TYPE = {t: np.arange(len(STAGES_BY_TYPE[t])) for t in TYPE_IDS}
+
+
+# ---------------------- PERSISTED VOCABULARY ----------------------
+# Equipment models are trained on the integer codes above. The vocabulary they
+# were trained with is written next to the models, so clients (and the API)
+# can decode codes even if this file changes later.
+
+def vocab_document(vocab_by_type=None) -> dict:
+    vocab_by_type = vocab_by_type or EQUIP_VOCAB_BY_TYPE
+    types = {
+        str(t): {
+            equip_col(stage): list(vocab)
+            for stage, vocab in zip(STAGES_BY_TYPE[t], vocab_by_type[t])
+        }
+        for t in TYPE_IDS
+    }
+    blob = json.dumps(types, sort_keys=True).encode()
+    return {"version": hashlib.sha1(blob).hexdigest()[:12], "types": types}
+
+
+EQUIP_VOCAB_VERSION = vocab_document()["version"]
+
+
+def save_equipment_vocab(path: str = EQUIP_VOCAB_PATH) -> dict:
+    doc = vocab_document()
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2)
+    return doc
+
+
+def load_equipment_vocab(path: str = EQUIP_VOCAB_PATH) -> dict:
+    """
+    Vocabulary persisted at training time, or the schema one if no file exists
+    (models trained before integer encoding carry their labels themselves).
+    """
+    try:
+        with open(path) as f:
+            doc = json.load(f)
+    except FileNotFoundError:
+        doc = vocab_document()
+    return with_vocab_tables(doc)
+
+
+def with_vocab_tables(doc: dict) -> dict:
+    """Add {type_id: label table} under "tables" to a vocabulary document."""
+    doc["tables"] = {
+        int(t): _label_table(list(cols.values())) for t, cols in doc["types"].items()
+    }
+    return doc
+
+
+# ---------------------- HELPERS ----------------------
+
+def allocate_outputs(type_id: int, n_rows: int) -> dict:
+    """Preallocated result buffers for n_rows predictions of one type."""
+    n_stages = len(STAGES_BY_TYPE[type_id])
+    return {
+        "times": np.empty((n_rows, n_stages), dtype=np.float64),
+        "equip": np.empty((n_rows, n_stages), dtype=np.uint8),
+        "cost": np.empty(n_rows, dtype=np.float64),
+    }
+
+
+def cost_index(type_id: int, name: str, X: np.ndarray) -> np.ndarray:
+    """A generator cost index: clipped mean of feature / divisor terms (+ unclipped adds)."""
+    spec = PLANT_TYPES[type_id]["cost"]["indices"][name]
+    terms = [X[:, FEATURE_COLS.index(c)] / div for c, div in spec["terms"].items()]
+    value = np.clip(sum(terms) / len(terms), *spec["clip"])
+    for c, coef in spec.get("add", {}).items():
+        value = value + coef * X[:, FEATURE_COLS.index(c)]
+    return value
+
+
+def capex_inr(type_id: int, X: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """
+    Generator CAPEX for (n, len(FEATURE_COLS)) inputs and (n, n_stages) stage
+    times (minutes, TIME_COLS_BY_TYPE order) – no model predicts CAPEX.
+    Terms are added in the cost spec's capex_terms order, which is each
+    generator's original formula order (bit-identical columns).
+    """
+    cost = PLANT_TYPES[type_id]["cost"]
+    col = {c: X[:, i] for i, c in enumerate(FEATURE_COLS)}
+    stages = STAGES_BY_TYPE[type_id]
+    minutes = times[:, stages.index(cost["capex_hour_stages"][0])]
+    for s in cost["capex_hour_stages"][1:]:
+        minutes = minutes + times[:, stages.index(s)]
+    hours = minutes / 60.0
+
+    per_hour = cost.get("capex_per_hour", 0.0)
+    if cost["capex_index"] is not None:
+        per_hour = per_hour + cost["capex_per_organic_hour"] * cost_index(
+            type_id, cost["capex_index"], X
+        )
+
+    terms = {
+        "flow": lambda: cost["capex_per_flow"] * col["flow_m3_day"],
+        "tds": lambda: cost["capex_per_tds"] * col["TDS_mgL"],
+        "heavy_metals": lambda: cost["capex_heavy_metals"] * col["heavy_metals"],
+        "hours": lambda: per_hour * hours,
+    }
+    capex = np.full(len(X), cost["base_capex"], dtype=np.float64)
+    for name in cost["capex_terms"]:
+        capex = capex + terms[name]()
+    return capex
+
+
+def opex_per_day_inr(type_id: int, X: np.ndarray) -> np.ndarray:
+    """Generator OPEX: base + per-flow and per-day terms, each scaled by an index."""
+    cost = PLANT_TYPES[type_id]["cost"]
+    flow = X[:, FEATURE_COLS.index("flow_m3_day")]
+    opex = np.full(len(X), cost["base_opex"], dtype=np.float64)
+    for key, index in cost["opex_terms"]:
+        # coefficient * flow * index, in the generator's order (bit-identical columns)
+        term = cost[key] * flow if key.endswith("_per_flow") else np.full(len(X), cost[key])
+        opex += term if index is None else term * cost_index(type_id, index, X)
+    return opex
+
+
+def rule_cost_per_m3(type_id: int, X: np.ndarray) -> np.ndarray:
+    """Analytic cost per m3 (generator OPEX / flow) – valid outside the training ranges."""
+    return opex_per_day_inr(type_id, X) / X[:, FEATURE_COLS.index("flow_m3_day")]
+
+
+def encode_equipment(type_id: int, labels) -> np.ndarray:
+    """(n_rows, n_stages) equipment labels → uint8 codes. Unknown labels raise KeyError."""
+    labels = np.asarray(labels, dtype=object)
+    codes = np.empty(labels.shape, dtype=np.uint8)
+    for i, mapping in enumerate(EQUIP_CODES_BY_TYPE[type_id]):
+        codes[:, i] = [mapping[label] for label in labels[:, i]]
+    return codes
+
+
+def decode_equipment(type_id: int, codes: np.ndarray, label_table=None) -> np.ndarray:
+    """(n_rows, n_stages) codes → labels, by indexing the label table."""
+    if label_table is None:
+        label_table = EQUIP_LABEL_TABLE[type_id]
+    return label_table[STAGE_INDEX_BY_TYPE[type_id], codes]
+
+
+def equipment_code_maps(type_id: int, equip_model) -> list:
+    """
+    For a fitted MultiOutputClassifier, map each stage estimator's class index
+    to the equipment code, so predictions decode without touching class labels.
+    Integer-trained models already use codes as classes; older models trained
+    on label strings are mapped through the schema vocabulary.
+    """
+    maps = []
+    for mapping, est in zip(EQUIP_CODES_BY_TYPE[type_id], equip_model.estimators_):
+        classes = np.asarray(est.classes_)
+        if classes.dtype.kind in "iu":
+            maps.append(classes.astype(np.uint8))
+        else:
+            maps.append(np.array([mapping[str(c)] for c in classes], dtype=np.uint8))
+    return maps
+
+
+def compact_classes(equip_model):
+    """
+    Store classes_ of an integer-trained MultiOutputClassifier as uint8
+    instead of int64/object arrays.
+    """
+    for est in equip_model.estimators_:
+        est.classes_ = np.asarray(est.classes_).astype(np.uint8)
+    return equip_model
+
+
+def equipment_labels(type_id: int, equip_pred, label_table=None) -> np.ndarray:
+    """
+    Raw MultiOutputClassifier.predict output → labels, for both integer-trained
+    models (codes) and older string-trained ones.
+    """
+    equip_pred = np.asarray(equip_pred)
+    if equip_pred.dtype.kind in "iu":
+        return decode_equipment(type_id, equip_pred.astype(np.intp), label_table)
+    return equip_pred.astype(str).astype(object)
+
+
+def validate_design_frame(df, type_id: int):
+    """Check a generated/loaded per-type frame against the schema (names + vocabularies)."""
+    missing = [
+        c for c in FEATURE_COLS + TIME_COLS_BY_TYPE[type_id] + EQUIP_COLS_BY_TYPE[type_id] + [COST_COL]
+        if c not in df.columns
+    ]
+    if missing:
+        raise ValueError(f"Type {type_id} frame is missing columns: {missing}")
+    for col, vocab in zip(EQUIP_COLS_BY_TYPE[type_id], EQUIP_VOCAB_BY_TYPE[type_id]):
+        unknown = set(df[col].dropna().unique()) - set(vocab)
+        if unknown:
+            raise ValueError(f"Type {type_id} {col} has labels outside the schema: {sorted(unknown)}")
@@ -0,0 +1,290 @@
+"""
+Portfolio scoring: predict designs for every candidate site of a regional
+survey (CSV or Parquet, hundreds of thousands of rows) with the serving
+pipeline of app.py.
+
+The input is read in chunks of --chunk-rows. Each chunk's feature matrix
+goes into a shared memory buffer of shared_scoring.ScoringExecutor. Every
+worker process (app.py imported once, models resident, one thread each)
+scores an even share of it with app.predict_packed, straight into
+shared output arrays; only slice bounds are pickled. A share of
+app.SKLEARN_MIN_ROWS rows or more goes through the sklearn estimators,
+which are faster at that size than the flat forests, so keep
+--chunk-rows / --workers above it (the default 50,000 covers 16 workers). While the workers
+score one chunk, this process writes the previous one to its own part
+file in the output directory
+
+  <out>/part-000000.parquet, part-000001.parquet, ...   (written atomically)
+  <out>/_manifest.json                                   (input + settings)
+
+so results land on disk as they are produced and memory stays bounded:
+two chunks are in flight, whatever the input size.
+Re-running the same command resumes: chunks whose part file exists are
+skipped (--restart starts over). The directory reads back as one table,
+e.g. pd.read_parquet(<out>).
+
+Output columns (one row per input row, in input order by "row"):
+  row, --keep columns, valid (all features numeric), predicted_type,
+  type_probability, cost_per_m3_inr, cost_source (forest / rules),
+  ood_features, and per stage i = 1..9: stage{i}, stage{i}_time_min,
+  stage{i}_equipment (empty past the type's last stage).
+
+Parquet input/output needs pyarrow (pip install pyarrow); --format csv
+writes CSV parts without it.
+
+Usage (from ml/):
+  python portfolio.py survey.parquet --out survey_designs --workers 4
+  python portfolio.py sites.csv --out sites_designs --keep site_id,district \\
+      --chunk-rows 20000 --ood-policy rules
+  python portfolio.py sites.csv --out sites_designs        # resume after a crash
+"""
+
+import argparse
+import json
+import os
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from binary_frames import MAX_STAGES
+from plant_schema import FEATURE_COLS, STAGES_BY_TYPE, decode_equipment
+from shared_scoring import ScoringExecutor, load_app
+
+
+CHUNK_ROWS = 50_000
+SLOTS = 2
+MANIFEST = "_manifest.json"
+COST_SOURCES = np.array(["forest", "rules"], dtype=object)
+
+
+# ---------------------- INPUT ----------------------
+
+def require_pyarrow(what: str):
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise SystemExit(f"{what} needs pyarrow (pip install pyarrow)")
+
+
+def is_parquet(path: str) -> bool:
+    return path.endswith((".parquet", ".pq")) or os.path.isdir(path)
+
+
+def read_chunks(path: str, columns: list, chunk_rows: int):
+    """DataFrames of up to chunk_rows rows with the given columns."""
+    if is_parquet(path):
+        require_pyarrow("Parquet input")
+        import pyarrow.dataset as ds
+
+        for batch in ds.dataset(path, format="parquet").to_batches(
+            columns=columns, batch_size=chunk_rows
+        ):
+            if batch.num_rows:
+                yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, usecols=columns, chunksize=chunk_rows)
+
+
+def feature_rows(frame: pd.DataFrame):
+    """(X float64 in FEATURE_COLS order, valid mask); non-numeric cells make a row invalid."""
+    X = np.column_stack([
+        pd.to_numeric(frame[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        for col in FEATURE_COLS
+    ])
+    return X, np.isfinite(X).all(axis=1)
+
+
+# ---------------------- SCORING ----------------------
+
+def ood_labels(masks: np.ndarray) -> np.ndarray:
+    """uint16 out-of-envelope bitmasks → "feature,feature" strings ("" inside)."""
+    uniq, inverse = np.unique(masks, return_inverse=True)
+    labels = np.array(
+        [",".join(c for i, c in enumerate(FEATURE_COLS) if m >> i & 1) for m in uniq],
+        dtype=object,
+    )
+    return labels[inverse]
+
+
+def result_frame(frame: pd.DataFrame, first_row: int, keep: list, valid: np.ndarray,
+                 out: dict, label_tables: dict) -> pd.DataFrame:
+    """Output rows of a chunk from the predict_packed arrays of its valid rows."""
+    n = len(frame)
+    rows = np.flatnonzero(valid)
+    res = {"row": np.arange(first_row, first_row + n, dtype=np.int64)}
+    for col in keep:
+        res[col] = frame[col].to_numpy()
+    res["valid"] = valid
+
+    types = pd.array(np.zeros(n, dtype=np.int8), dtype="Int8")
+    types[rows] = out["type"]
+    types[~valid] = pd.NA
+    res["predicted_type"] = types
+    for name, src in (("type_probability", "probability"), ("cost_per_m3_inr", "cost")):
+        col = np.full(n, np.nan, dtype=np.float32)
+        col[rows] = out[src]
+        res[name] = col
+    res["cost_source"] = np.full(n, None, dtype=object)
+    res["cost_source"][rows] = COST_SOURCES[out["cost_source"]]
+    res["ood_features"] = np.full(n, None, dtype=object)
+    res["ood_features"][rows] = ood_labels(out["ood"])
+
+    stage = np.full((n, MAX_STAGES), None, dtype=object)
+    equip = np.full((n, MAX_STAGES), None, dtype=object)
+    times = np.full((n, MAX_STAGES), np.nan, dtype=np.float32)
+    times[rows] = out["times"]
+    for t in np.unique(out["type"]):
+        t = int(t)
+        mine = out["type"] == t
+        k = len(STAGES_BY_TYPE[t])
+        stage[rows[mine], :k] = STAGES_BY_TYPE[t]
+        equip[rows[mine], :k] = decode_equipment(t, out["equip"][mine, :k], label_tables[t])
+    for i in range(MAX_STAGES):
+        res[f"stage{i + 1}"] = stage[:, i]
+        res[f"stage{i + 1}_time_min"] = times[:, i]
+        res[f"stage{i + 1}_equipment"] = equip[:, i]
+    return pd.DataFrame(res)
+
+
+def write_part(res: pd.DataFrame, path: str, fmt: str):
+    # Hidden until complete: readers of the directory skip dot files
+    tmp = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+    if fmt == "parquet":
+        res.to_parquet(tmp, index=False)
+    else:
+        res.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+# ---------------------- JOB ----------------------
+
+def part_path(out_dir: str, chunk_id: int, fmt: str) -> str:
+    return os.path.join(out_dir, f"part-{chunk_id:06d}.{fmt}")
+
+
+def job_settings(input_path: str, chunk_rows: int, fmt: str, keep: list,
+                 ood_policy: str) -> dict:
+    st = os.stat(input_path)
+    return {
+        "input": os.path.abspath(input_path),
+        "input_size": st.st_size,
+        "input_mtime": st.st_mtime,
+        "chunk_rows": chunk_rows,
+        "format": fmt,
+        "keep": keep,
+        "ood_policy": ood_policy,
+        "feature_cols": FEATURE_COLS,
+    }
+
+
+def open_output(out: str, settings: dict, restart: bool = False) -> dict:
+    """Create or reuse the output directory; a resumed run must use the same settings."""
+    manifest_path = os.path.join(out, MANIFEST)
+    os.makedirs(out, exist_ok=True)
+    if restart:
+        for name in os.listdir(out):
+            if name.startswith(("part-", ".part-")) or name == MANIFEST:
+                os.remove(os.path.join(out, name))
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous = json.load(f)
+        changed = [k for k, v in settings.items() if previous["settings"].get(k) != v]
+        if changed:
+            raise SystemExit(
+                f"{out} holds results of a different job ({', '.join(changed)} changed); "
+                "use --restart or another --out"
+            )
+        return previous
+    manifest = {"settings": settings, "complete": False}
+    write_manifest(out, manifest)
+    return manifest
+
+
+def write_manifest(out_dir: str, manifest: dict):
+    path = os.path.join(out_dir, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def run(input_path: str, out: str, fmt: str = "parquet", chunk_rows: int = CHUNK_ROWS,
+        workers: int = None, keep: list = (), ood_policy: str = "flag",
+        restart: bool = False) -> dict:
+    """Score input_path into part files under out (see the module docstring); run stats."""
+    keep = list(keep)
+    if fmt == "parquet":
+        require_pyarrow("Parquet output")
+    settings = job_settings(input_path, chunk_rows, fmt, keep, ood_policy)
+    manifest = open_output(out, settings, restart)
+    columns = FEATURE_COLS + [c for c in keep if c not in FEATURE_COLS]
+
+    stats = {"chunks": 0, "skipped": 0, "rows": 0, "invalid": 0}
+
+    def finish(chunk_id, first_row, frame, valid, batch, path, started):
+        res = result_frame(frame, first_row, keep, valid, batch.result(), label_tables)
+        write_part(res, path, fmt)
+        stats["chunks"] += 1
+        stats["rows"] += len(res)
+        stats["invalid"] += int((~valid).sum())
+        now = time.perf_counter()
+        rate = stats["rows"] / (now - t0)
+        print(f"  chunk {chunk_id:>6}: {len(res):>7} rows "
+              f"in {now - started:.2f} s  ({stats['rows']} rows, {rate:,.0f} rows/s)")
+
+    # Chunk k is parsed and written here while the workers score chunk k + 1
+    pending = deque()
+    first_row, n_chunks = 0, 0
+    with ScoringExecutor(workers, capacity=chunk_rows, slots=SLOTS) as executor:
+        label_tables = load_app().EQUIP_LABEL_TABLES
+        # Rates cover scoring, not worker startup (models, sklearn estimators)
+        t0 = time.perf_counter()
+        for chunk_id, frame in enumerate(read_chunks(input_path, columns, chunk_rows)):
+            n_chunks = chunk_id + 1
+            path = part_path(out, chunk_id, fmt)
+            chunk_first_row = first_row
+            first_row += len(frame)
+            if os.path.exists(path):
+                stats["skipped"] += 1
+                continue
+            if len(pending) == SLOTS:
+                finish(*pending.popleft())
+            started = time.perf_counter()
+            X, valid = feature_rows(frame)
+            batch = executor.submit(X[valid], ood_policy)
+            pending.append((chunk_id, chunk_first_row, frame, valid, batch, path, started))
+        while pending:
+            finish(*pending.popleft())
+
+    manifest.update({"complete": True, "rows": first_row, "chunks": n_chunks})
+    write_manifest(out, manifest)
+    stats["elapsed_s"] = round(time.perf_counter() - t0, 2)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict designs for a portfolio of sites")
+    parser.add_argument("input", help="CSV or Parquet file (or directory) of site inputs")
+    parser.add_argument("--out", required=True, help="output directory of part files")
+    parser.add_argument("--format", choices=("parquet", "csv"), default="parquet")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--keep", default="",
+                        help="comma-separated input columns copied to the output (e.g. site_id)")
+    parser.add_argument("--ood-policy", choices=("flag", "rules"), default="flag")
+    parser.add_argument("--restart", action="store_true",
+                        help="discard existing results in --out instead of resuming")
+    args = parser.parse_args()
+
+    print(f"Scoring {args.input} -> {args.out}/ ({args.workers} workers, "
+          f"{args.chunk_rows} rows per chunk)")
+    stats = run(args.input, args.out, args.format, args.chunk_rows, args.workers,
+                [c for c in args.keep.split(",") if c], args.ood_policy, args.restart)
+    print(f"Done: {stats['rows']} rows in {stats['chunks']} new chunks "
+          f"({stats['skipped']} already done, {stats['invalid']} invalid rows) "
+          f"in {stats['elapsed_s']} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+On-demand profiling for the ML service (admin endpoints in app.py).
+
+SamplingProfiler
+  A background thread snapshots every thread's Python stack with
+  sys._current_frames() each interval and counts identical stacks. Output
+  is either collapsed stacks ("thread;outer;...;inner count" lines, the
+  input of flamegraph.pl / speedscope / inferno) or a speedscope JSON
+  document. Nothing runs unless a profile has been requested.
+
+Tracer
+  Per-request timings of the model calls. enable() swaps timing wrappers
+  in for the instrumented functions and disable() puts the originals
+  back, so with tracing off the serving path is exactly the untraced code.
+  While enabled, only requests carrying the X-ML-Trace header are timed
+  (TraceMiddleware): their spans are aggregated per label, returned in a
+  Server-Timing response header and kept in a ring buffer.
+"""
+
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+
+TRACE_HEADER = b"x-ml-trace"
+RECENT_TRACES = 200
+
+
+# ---------------------- SAMPLING PROFILER ----------------------
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, interval_s: float = 0.005):
+        self.interval_s = interval_s
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed_s = time.perf_counter() - self.started
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval_s):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.counts[tuple(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(
+            f"{';'.join(stack)} {count}\n" for stack, count in self.counts.most_common()
+        )
+
+    def speedscope(self) -> dict:
+        """speedscope "sampled" profile: one per thread, weights in samples."""
+        frames, index = [], {}
+        by_thread = {}
+        for stack, count in self.counts.items():
+            ids = []
+            for label in stack[1:]:
+                if label not in index:
+                    index[label] = len(frames)
+                    frames.append({"name": label})
+                ids.append(index[label])
+            samples, weights = by_thread.setdefault(stack[0], ([], []))
+            samples.append(ids)
+            weights.append(count)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": thread,
+                    "unit": "none",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+                for thread, (samples, weights) in by_thread.items()
+            ],
+            "name": f"ml-service {self.samples} samples / {self.interval_s * 1000:g} ms",
+            "exporter": "ml/profiling.py",
+        }
+
+
+# ---------------------- TRACING ----------------------
+
+class Tracer:
+    """
+    targets: [(owner, attribute, label)] – a module or object whose
+    attribute is the function to time. label may be a callable taking the
+    call's arguments, for per-model labels.
+    """
+
+    def __init__(self, targets: list):
+        self.targets = targets
+        self.enabled = False
+        self.current = contextvars.ContextVar("ml_trace", default=None)
+        self.recent = deque(maxlen=RECENT_TRACES)
+        self._originals = []
+        self._lock = threading.Lock()
+
+    def _timed(self, fn, label):
+        current = self.current
+
+        def timed(*args, **kwargs):
+            spans = current.get()
+            if spans is None:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                name = label(*args, **kwargs) if callable(label) else label
+                spans.append((name, time.perf_counter() - t0))
+
+        return timed
+
+    def enable(self):
+        with self._lock:
+            if self.enabled:
+                return
+            for owner, attr, label in self.targets:
+                fn = getattr(owner, attr)
+                self._originals.append((owner, attr, fn, attr in vars(owner)))
+                setattr(owner, attr, self._timed(fn, label))
+            self.enabled = True
+
+    def disable(self):
+        with self._lock:
+            for owner, attr, fn, own_attr in reversed(self._originals):
+                if own_attr:
+                    setattr(owner, attr, fn)
+                else:
+                    delattr(owner, attr)  # bound method: fall back to the class
+            self._originals = []
+            self.enabled = False
+
+    @staticmethod
+    def summarize(spans: list) -> dict:
+        """label → {"calls", "ms"} in first-call order."""
+        out = {}
+        for name, dur in spans:
+            entry = out.setdefault(name, {"calls": 0, "ms": 0.0})
+            entry["calls"] += 1
+            entry["ms"] += dur * 1000
+        for entry in out.values():
+            entry["ms"] = round(entry["ms"], 3)
+        return out
+
+
+class TraceMiddleware:
+    """ASGI middleware: time requests with the X-ML-Trace header while tracing is on."""
+
+    def __init__(self, app, tracer: Tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if (not self.tracer.enabled or scope["type"] != "http"
+                or not any(k == TRACE_HEADER for k, _ in scope["headers"])):
+            return await self.app(scope, receive, send)
+
+        spans = []
+        token = self.tracer.current.set(spans)
+        t0 = time.perf_counter()
+
+        async def traced_send(message):
+            if message["type"] == "http.response.start":
+                summary = Tracer.summarize(spans)
+                total = (time.perf_counter() - t0) * 1000
+                timing = ", ".join(
+                    f'{name};dur={s["ms"]};desc="{s["calls"]} calls"' for name, s in summary.items()
+                )
+                timing = f"{timing}, total;dur={total:.3f}" if timing else f"total;dur={total:.3f}"
+                message = {**message, "headers": list(message.get("headers", []))
+                           + [(b"server-timing", timing.encode())]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, traced_send)
+        finally:
+            self.tracer.current.reset(token)
+            self.tracer.recent.append({
+                "path": scope["path"],
+                "time": time.time(),
+                "total_ms": round((time.perf_counter() - t0) * 1000, 3),
+                "spans": Tracer.summarize(spans),
+            })
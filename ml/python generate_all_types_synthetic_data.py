@@ -29,15 +29,80 @@ Each type has its own:
 You can train:
   - A classifier on (inputs → type)
   - Separate models per type on (inputs → times, equipment, cost)
+
+Each generate_typeN draws its inputs uniformly; with inputs=<(n, 9) array in
+FEATURE_COLS order> it labels those rows instead (stage times, equipment and
+costs follow from the inputs exactly as for drawn rows). active_sampling.py
+uses this to choose where the training rows go.
+
+Input ranges, heavy-metal probabilities, stage-time clamp bounds and the
+CAPEX/OPEX model come from plant_schema.PLANT_TYPES; the stage-time and
+equipment rules stay here.
 """
 
 import numpy as np
 import pandas as pd
 
+from plant_schema import (
+    ALL_TYPES_CSV,
+    COST_COL,
+    CSV_BY_TYPE,
+    FEATURE_COLS,
+    HEAVY_METALS_DRAW_BY_TYPE,
+    HEAVY_METALS_P_BY_TYPE,
+    INPUT_BOUNDS_BY_TYPE,
+    TIME_BOUNDS_BY_TYPE,
+    TIME_COLS_BY_TYPE,
+    capex_inr,
+    opex_per_day_inr,
+    validate_design_frame,
+)
+
+
+def _given_inputs(inputs, i: int) -> tuple:
+    """Row i of the given inputs as (pH, TDS, ..., flow_m3_day, heavy_metals)."""
+    row = [float(v) for v in inputs[i]]
+    return (*row[:8], int(row[8]))
+
+
+def _draw_inputs(rng, type_id: int) -> tuple:
+    """Uniform draws over the schema input ranges, in FEATURE_COLS order (heavy_metals last)."""
+    row = [rng.uniform(lo, hi) for lo, hi in INPUT_BOUNDS_BY_TYPE[type_id][:-1]]
+    draw = HEAVY_METALS_DRAW_BY_TYPE[type_id]
+    if draw == "none":
+        heavy_metals = 0
+    elif draw == "coin":
+        heavy_metals = int(rng.integers(0, 2))
+    else:
+        heavy_metals = int(rng.random() < HEAVY_METALS_P_BY_TYPE[type_id])
+    return (*row, heavy_metals)
+
+
+def _row_inputs(rng, type_id: int, inputs, i: int) -> tuple:
+    return _draw_inputs(rng, type_id) if inputs is None else _given_inputs(inputs, i)
+
+
+def _clamp_times(type_id: int, times) -> list:
+    """Stage times (TIME_COLS_BY_TYPE order) clipped to the schema bounds."""
+    bounds = TIME_BOUNDS_BY_TYPE[type_id]
+    return np.clip(np.asarray(times, dtype=np.float64), bounds[:, 0], bounds[:, 1]).tolist()
+
+
+def _design_frame(rows: list, type_id: int) -> pd.DataFrame:
+    """Generated rows plus capex_inr, opex_per_day_inr and cost_per_m3_inr (schema cost model)."""
+    df = pd.DataFrame(rows)
+    if df.empty:
+        return df
+    X = df[FEATURE_COLS].to_numpy(dtype=np.float64)
+    times = df[TIME_COLS_BY_TYPE[type_id]].to_numpy(dtype=np.float64)
+    df["capex_inr"] = capex_inr(type_id, X, times)
+    df["opex_per_day_inr"] = opex_per_day_inr(type_id, X)
+    df[COST_COL] = df["opex_per_day_inr"] / df["flow_m3_day"]
+    return df
 
 # ---------------------------- TYPE 1 – DRINKING WATER ----------------------------
 
-def generate_type1(n_samples: int = 800, random_state: int = 1) -> pd.DataFrame:
+def generate_type1(n_samples: int = 800, random_state: int = 1, inputs=None) -> pd.DataFrame:
     """
     Type 1 – Drinking / Potable Water
     Sequence:
@@ -47,21 +112,15 @@ def generate_type1(n_samples: int = 800, random_state: int = 1) -> pd.DataFrame:
     rng = np.random.default_rng(random_state)
     rows = []
 
-    for _ in range(n_samples):
+    if inputs is not None:
+        n_samples = len(inputs)
+    for i in range(n_samples):
         w_type = 1
 
         # Water quality – relatively clean but needs polishing
-        pH = rng.uniform(6.5, 8.5)
-        TDS = rng.uniform(100, 1200)
-        turbidity = rng.uniform(0.5, 50)
-        BOD = rng.uniform(1, 15)
-        COD = rng.uniform(5, 50)
-        total_n = rng.uniform(0.5, 10)
-        temperature = rng.uniform(10, 35)
-        flow_m3_day = rng.uniform(100, 5000)
+        (pH, TDS, turbidity, BOD, COD, total_n, temperature, flow_m3_day,
+         heavy_metals) = _row_inputs(rng, 1, inputs, i)
         total_volume_L_day = flow_m3_day * 1000
-        # Most potable sources have negligible heavy metals
-        heavy_metals = int(rng.random() < 0.05)
 
         # Helper indices
         turbidity_index = np.clip(turbidity / 30.0, 0.2, 3.0)
@@ -85,13 +144,12 @@ def generate_type1(n_samples: int = 800, random_state: int = 1) -> pd.DataFrame:
         base_disinf = rng.uniform(5.0, 30.0)
         t_disinfection = base_disinf * (0.7 + 0.4 * organics_index)
 
-        # Clamp
-        t_screening = float(np.clip(t_screening, 0.5, 5.0))
-        t_coag_floc = float(np.clip(t_coag_floc, 5.0, 60.0))
-        t_sedimentation = float(np.clip(t_sedimentation, 30.0, 240.0))
-        t_filtration = float(np.clip(t_filtration, 5.0, 60.0))
-        t_carbon_polishing = float(np.clip(t_carbon_polishing, 3.0, 60.0))
-        t_disinfection = float(np.clip(t_disinfection, 3.0, 60.0))
+        # Clamp to the schema bounds
+        (t_screening, t_coag_floc, t_sedimentation, t_filtration,
+         t_carbon_polishing, t_disinfection) = _clamp_times(1, [
+            t_screening, t_coag_floc, t_sedimentation, t_filtration, t_carbon_polishing,
+            t_disinfection,
+        ])
 
         # Equipment
         if turbidity < 10:
@@ -123,27 +181,6 @@ def generate_type1(n_samples: int = 800, random_state: int = 1) -> pd.DataFrame:
         else:
             equip_disinfection = "chlorination_system"
 
-        # Cost model – potable train cheaper than industrial
-        base_capex = 3e5
-        time_sum_hours = (t_coag_floc + t_sedimentation +
-                          t_filtration + t_carbon_polishing +
-                          t_disinfection) / 60.0
-
-        capex_inr = (
-            base_capex
-            + 1500.0 * flow_m3_day
-            + 10.0 * TDS
-            + 5e3 * organics_index * time_sum_hours
-        )
-
-        base_opex = 5e3
-        chem_cost = 3.0 * flow_m3_day * turbidity_index
-        carbon_cost = 2.0 * flow_m3_day * organics_index
-        disinf_cost = 1.5 * flow_m3_day
-
-        opex_per_day_inr = base_opex + chem_cost + carbon_cost + disinf_cost
-        cost_per_m3_inr = opex_per_day_inr / flow_m3_day
-
         row = {
             "type": w_type,
             "pH": pH,
@@ -170,19 +207,15 @@ def generate_type1(n_samples: int = 800, random_state: int = 1) -> pd.DataFrame:
             "equip_filtration": equip_filtration,
             "equip_carbon_polishing": equip_carbon_polishing,
             "equip_disinfection": equip_disinfection,
-
-            "capex_inr": capex_inr,
-            "opex_per_day_inr": opex_per_day_inr,
-            "cost_per_m3_inr": cost_per_m3_inr,
         }
         rows.append(row)
 
-    return pd.DataFrame(rows)
+    return _design_frame(rows, 1)
 
 
 # ---------------------------- TYPE 2 – DOMESTIC / GREY WATER ----------------------------
 
-def generate_type2(n_samples: int = 800, random_state: int = 2) -> pd.DataFrame:
+def generate_type2(n_samples: int = 800, random_state: int = 2, inputs=None) -> pd.DataFrame:
     """
     Type 2 – Domestic / Grey Water (STP)
     Sequence:
@@ -193,20 +226,15 @@ def generate_type2(n_samples: int = 800, random_state: int = 2) -> pd.DataFrame:
     rng = np.random.default_rng(random_state)
     rows = []
 
-    for _ in range(n_samples):
+    if inputs is not None:
+        n_samples = len(inputs)
+    for i in range(n_samples):
         w_type = 2
 
         # Domestic sewage – moderate TDS, high BOD/COD
-        pH = rng.uniform(6.0, 8.5)
-        TDS = rng.uniform(300, 1500)
-        turbidity = rng.uniform(20, 300)
-        BOD = rng.uniform(150, 400)
-        COD = rng.uniform(300, 800)
-        total_n = rng.uniform(15, 60)
-        temperature = rng.uniform(15, 40)
-        flow_m3_day = rng.uniform(200, 10000)
+        (pH, TDS, turbidity, BOD, COD, total_n, temperature, flow_m3_day,
+         heavy_metals) = _row_inputs(rng, 2, inputs, i)
         total_volume_L_day = flow_m3_day * 1000
-        heavy_metals = 0  # usually negligible in domestic
 
         organic_index = np.clip(BOD / 250.0, 0.4, 3.0)
         grease_index = np.clip(turbidity / 150.0, 0.3, 3.0)
@@ -238,16 +266,12 @@ def generate_type2(n_samples: int = 800, random_state: int = 2) -> pd.DataFrame:
         base_disinf = rng.uniform(15.0, 45.0)
         t_disinfection = base_disinf * (0.8 + 0.3 * organic_index)
 
-        # Clamp
-        t_screening = float(np.clip(t_screening, 0.5, 5.0))
-        t_oil_grease = float(np.clip(t_oil_grease, 5.0, 60.0))
-        t_equalization = float(np.clip(t_equalization, 30.0, 360.0))
-        t_coag_floc = float(np.clip(t_coag_floc, 10.0, 60.0))
-        t_primary = float(np.clip(t_primary, 30.0, 240.0))
-        t_aeration = float(np.clip(t_aeration, 120.0, 960.0))
-        t_secondary = float(np.clip(t_secondary, 60.0, 360.0))
-        t_filtration = float(np.clip(t_filtration, 10.0, 60.0))
-        t_disinfection = float(np.clip(t_disinfection, 10.0, 60.0))
+        # Clamp to the schema bounds
+        (t_screening, t_oil_grease, t_equalization, t_coag_floc, t_primary,
+         t_aeration, t_secondary, t_filtration, t_disinfection) = _clamp_times(2, [
+            t_screening, t_oil_grease, t_equalization, t_coag_floc, t_primary,
+            t_aeration, t_secondary, t_filtration, t_disinfection,
+        ])
 
         # Equipment
         equip_screening = "mechanical_bar_screen" if flow_m3_day > 3000 else "manual_bar_screen"
@@ -274,24 +298,6 @@ def generate_type2(n_samples: int = 800, random_state: int = 2) -> pd.DataFrame:
 
         equip_disinfection = "chlorination"
 
-        # Costs – aeration dominates OPEX
-        base_capex = 8e5
-        time_sum_hours = (t_aeration + t_equalization + t_primary + t_secondary) / 60.0
-
-        capex_inr = (
-            base_capex
-            + 2500.0 * flow_m3_day
-            + 2000.0 * organic_index * time_sum_hours
-        )
-
-        base_opex = 1.5e4
-        aeration_power_cost = 12.0 * flow_m3_day * organic_index
-        chem_cost = 4.0 * flow_m3_day
-        sludge_cost = 3000.0 * organic_index
-
-        opex_per_day_inr = base_opex + aeration_power_cost + chem_cost + sludge_cost
-        cost_per_m3_inr = opex_per_day_inr / flow_m3_day
-
         row = {
             "type": w_type,
             "pH": pH,
@@ -324,19 +330,15 @@ def generate_type2(n_samples: int = 800, random_state: int = 2) -> pd.DataFrame:
             "equip_secondary_clarifier": equip_secondary,
             "equip_filtration": equip_filtration,
             "equip_disinfection": equip_disinfection,
-
-            "capex_inr": capex_inr,
-            "opex_per_day_inr": opex_per_day_inr,
-            "cost_per_m3_inr": cost_per_m3_inr,
         }
         rows.append(row)
 
-    return pd.DataFrame(rows)
+    return _design_frame(rows, 2)
 
 
 # ---------------------------- TYPE 3 – RECYCLE GRADE (MBR) ----------------------------
 
-def generate_type3(n_samples: int = 800, random_state: int = 3) -> pd.DataFrame:
+def generate_type3(n_samples: int = 800, random_state: int = 3, inputs=None) -> pd.DataFrame:
     """
     Type 3 – Treated Wastewater (Recycle Grade) – MBR-centric
     Sequence:
@@ -347,19 +349,14 @@ def generate_type3(n_samples: int = 800, random_state: int = 3) -> pd.DataFrame:
     rng = np.random.default_rng(random_state)
     rows = []
 
-    for _ in range(n_samples):
+    if inputs is not None:
+        n_samples = len(inputs)
+    for i in range(n_samples):
         w_type = 3
 
-        pH = rng.uniform(6.5, 8.5)
-        TDS = rng.uniform(300, 2000)
-        turbidity = rng.uniform(10, 200)
-        BOD = rng.uniform(80, 250)
-        COD = rng.uniform(200, 700)
-        total_n = rng.uniform(10, 40)
-        temperature = rng.uniform(15, 40)
-        flow_m3_day = rng.uniform(200, 8000)
+        (pH, TDS, turbidity, BOD, COD, total_n, temperature, flow_m3_day,
+         heavy_metals) = _row_inputs(rng, 3, inputs, i)
         total_volume_L_day = flow_m3_day * 1000
-        heavy_metals = int(rng.random() < 0.1)
 
         organic_index = np.clip(BOD / 200.0, 0.5, 2.5)
         grit_index = np.clip(turbidity / 150.0, 0.3, 3.0)
@@ -386,14 +383,11 @@ def generate_type3(n_samples: int = 800, random_state: int = 3) -> pd.DataFrame:
         base_disinf = rng.uniform(10.0, 30.0)
         t_disinfection = base_disinf * (0.8 + 0.4 * organic_index)
 
-        # Clamp
-        t_screening = float(np.clip(t_screening, 0.5, 5.0))
-        t_grit = float(np.clip(t_grit, 5.0, 40.0))
-        t_equalization = float(np.clip(t_equalization, 30.0, 360.0))
-        t_bio = float(np.clip(t_bio, 120.0, 720.0))
-        t_mbr = float(np.clip(t_mbr, 10.0, 90.0))
-        t_carbon = float(np.clip(t_carbon, 5.0, 60.0))
-        t_disinfection = float(np.clip(t_disinfection, 5.0, 60.0))
+        # Clamp to the schema bounds
+        (t_screening, t_grit, t_equalization, t_bio, t_mbr, t_carbon,
+         t_disinfection) = _clamp_times(3, [
+            t_screening, t_grit, t_equalization, t_bio, t_mbr, t_carbon, t_disinfection,
+        ])
 
         # Equipment
         equip_screening = "fine_screen"
@@ -410,25 +404,6 @@ def generate_type3(n_samples: int = 800, random_state: int = 3) -> pd.DataFrame:
 
         equip_disinfection = "uv_disinfection"
 
-        # Cost – MBR + membranes expensive
-        base_capex = 1.5e6
-        time_sum_hours = (t_bio + t_mbr + t_equalization) / 60.0
-
-        capex_inr = (
-            base_capex
-            + 3000.0 * flow_m3_day
-            + 3e4 * time_sum_hours
-            + 2e5 * heavy_metals
-        )
-
-        base_opex = 2e4
-        aeration_cost = 14.0 * flow_m3_day * organic_index
-        membrane_clean_cost = 5.0 * flow_m3_day * tds_index
-        chem_cost = 3.0 * flow_m3_day
-
-        opex_per_day_inr = base_opex + aeration_cost + membrane_clean_cost + chem_cost
-        cost_per_m3_inr = opex_per_day_inr / flow_m3_day
-
         row = {
             "type": w_type,
             "pH": pH,
@@ -457,19 +432,15 @@ def generate_type3(n_samples: int = 800, random_state: int = 3) -> pd.DataFrame:
             "equip_mbr": equip_mbr,
             "equip_activated_carbon": equip_carbon,
             "equip_disinfection": equip_disinfection,
-
-            "capex_inr": capex_inr,
-            "opex_per_day_inr": opex_per_day_inr,
-            "cost_per_m3_inr": cost_per_m3_inr,
         }
         rows.append(row)
 
-    return pd.DataFrame(rows)
+    return _design_frame(rows, 3)
 
 
 # ---------------------------- TYPE 4 – INDUSTRIAL EFFLUENT ----------------------------
 
-def generate_type4(n_samples: int = 1000, random_state: int = 4) -> pd.DataFrame:
+def generate_type4(n_samples: int = 1000, random_state: int = 4, inputs=None) -> pd.DataFrame:
     """
     Type 4 – Industrial Effluent
     Sequence:
@@ -480,19 +451,14 @@ def generate_type4(n_samples: int = 1000, random_state: int = 4) -> pd.DataFrame
     rng = np.random.default_rng(random_state)
     rows = []
 
-    for _ in range(n_samples):
+    if inputs is not None:
+        n_samples = len(inputs)
+    for i in range(n_samples):
         w_type = 4
 
-        pH = rng.uniform(5.0, 9.0)
-        TDS = rng.uniform(800, 6000)
-        turbidity = rng.uniform(20, 500)
-        BOD = rng.uniform(50, 800)
-        COD = rng.uniform(150, 2500)
-        total_n = rng.uniform(10, 100)
-        temperature = rng.uniform(15, 40)
-        flow_m3_day = rng.uniform(100, 5000)
+        (pH, TDS, turbidity, BOD, COD, total_n, temperature, flow_m3_day,
+         heavy_metals) = _row_inputs(rng, 4, inputs, i)
         total_volume_L_day = flow_m3_day * 1000
-        heavy_metals = int(rng.integers(0, 2))
 
         organic_index = float(np.clip((BOD / 300.0 + COD / 600.0) / 2.0, 0.3, 3.0))
         tds_index = float(np.clip(TDS / 2000.0, 0.4, 3.0))
@@ -522,14 +488,12 @@ def generate_type4(n_samples: int = 1000, random_state: int = 4) -> pd.DataFrame
         base_ro = rng.uniform(30.0, 90.0)
         t_ro = base_ro * (0.7 + 0.4 * tds_index)
 
-        # Clamp
-        t_screening = float(np.clip(t_screening, 0.5, 10.0))
-        t_neutralization = float(np.clip(t_neutralization, 10.0, 240.0))
-        t_precipitation = float(np.clip(t_precipitation, 10.0, 240.0))
-        t_heavy_metal_removal = float(np.clip(t_heavy_metal_removal, 10.0, 240.0))
-        t_filter_press = float(np.clip(t_filter_press, 20.0, 240.0))
-        t_carbon_filter = float(np.clip(t_carbon_filter, 5.0, 120.0))
-        t_ro = float(np.clip(t_ro, 20.0, 240.0))
+        # Clamp to the schema bounds
+        (t_screening, t_neutralization, t_precipitation, t_heavy_metal_removal,
+         t_filter_press, t_carbon_filter, t_ro) = _clamp_times(4, [
+            t_screening, t_neutralization, t_precipitation, t_heavy_metal_removal,
+            t_filter_press, t_carbon_filter, t_ro,
+        ])
 
         # Equipment
         if flow_m3_day < 500:
@@ -560,28 +524,6 @@ def generate_type4(n_samples: int = 1000, random_state: int = 4) -> pd.DataFrame
         else:
             equip_ro = "ro_with_energy_recovery"
 
-        # Costs
-        base_capex = 5e5
-        time_sum_hours = (t_neutralization + t_precipitation +
-                          t_heavy_metal_removal + t_filter_press +
-                          t_carbon_filter + t_ro) / 60.0
-
-        capex_inr = (
-            base_capex
-            + 2000.0 * flow_m3_day
-            + 50.0 * TDS
-            + heavy_metals * 2e5
-            + 1e4 * organic_index * time_sum_hours
-        )
-
-        base_opex = 1e4
-        chem_cost = 10.0 * flow_m3_day * organic_index
-        ro_power_cost = 15.0 * flow_m3_day * tds_index
-        sludge_cost = 2000.0 * sludge_index
-
-        opex_per_day_inr = base_opex + chem_cost + ro_power_cost + sludge_cost
-        cost_per_m3_inr = opex_per_day_inr / flow_m3_day
-
         row = {
             "type": w_type,
             "pH": pH,
@@ -610,19 +552,15 @@ def generate_type4(n_samples: int = 1000, random_state: int = 4) -> pd.DataFrame
             "equip_filter_press": equip_filter_press,
             "equip_carbon_filter": equip_carbon_filter,
             "equip_ro": equip_ro,
-
-            "capex_inr": capex_inr,
-            "opex_per_day_inr": opex_per_day_inr,
-            "cost_per_m3_inr": cost_per_m3_inr,
         }
         rows.append(row)
 
-    return pd.DataFrame(rows)
+    return _design_frame(rows, 4)
 
 
 # ---------------------------- TYPE 5 – HIGH ORGANIC LOAD ----------------------------
 
-def generate_type5(n_samples: int = 800, random_state: int = 5) -> pd.DataFrame:
+def generate_type5(n_samples: int = 800, random_state: int = 5, inputs=None) -> pd.DataFrame:
     """
     Type 5 – High Organic Load Wastewater
     Sequence:
@@ -633,19 +571,14 @@ def generate_type5(n_samples: int = 800, random_state: int = 5) -> pd.DataFrame:
     rng = np.random.default_rng(random_state)
     rows = []
 
-    for _ in range(n_samples):
+    if inputs is not None:
+        n_samples = len(inputs)
+    for i in range(n_samples):
         w_type = 5
 
-        pH = rng.uniform(6.0, 8.0)
-        TDS = rng.uniform(500, 4000)
-        turbidity = rng.uniform(50, 600)
-        BOD = rng.uniform(500, 2500)
-        COD = rng.uniform(800, 5000)
-        total_n = rng.uniform(30, 200)
-        temperature = rng.uniform(20, 40)
-        flow_m3_day = rng.uniform(100, 6000)
+        (pH, TDS, turbidity, BOD, COD, total_n, temperature, flow_m3_day,
+         heavy_metals) = _row_inputs(rng, 5, inputs, i)
         total_volume_L_day = flow_m3_day * 1000
-        heavy_metals = int(rng.random() < 0.2)
 
         organic_index = np.clip(BOD / 1000.0, 0.5, 3.0)
         sludge_index = np.clip((COD / 2000.0), 0.5, 3.0)
@@ -671,14 +604,12 @@ def generate_type5(n_samples: int = 800, random_state: int = 5) -> pd.DataFrame:
         base_tertiary = rng.uniform(10.0, 30.0)
         t_tertiary = base_tertiary * (0.8 + 0.3 * organic_index)
 
-        # Clamp
-        t_screening = float(np.clip(t_screening, 0.5, 5.0))
-        t_anaerobic = float(np.clip(t_anaerobic, 240.0, 2880.0))
-        t_biogas = float(np.clip(t_biogas, 5.0, 60.0))
-        t_aeration = float(np.clip(t_aeration, 60.0, 960.0))
-        t_secondary = float(np.clip(t_secondary, 60.0, 360.0))
-        t_sludge = float(np.clip(t_sludge, 30.0, 360.0))
-        t_tertiary = float(np.clip(t_tertiary, 10.0, 60.0))
+        # Clamp to the schema bounds
+        (t_screening, t_anaerobic, t_biogas, t_aeration, t_secondary, t_sludge,
+         t_tertiary) = _clamp_times(5, [
+            t_screening, t_anaerobic, t_biogas, t_aeration, t_secondary, t_sludge,
+            t_tertiary,
+        ])
 
         # Equipment
         equip_screening = "coarse_screen" if flow_m3_day < 1000 else "mechanical_screen"
@@ -698,28 +629,6 @@ def generate_type5(n_samples: int = 800, random_state: int = 5) -> pd.DataFrame:
 
         equip_tertiary = "pressure_sand_filter_plus_acf"
 
-        # Cost – anaerobic + sludge handling + aeration
-        base_capex = 1.2e6
-        time_sum_hours = (t_anaerobic + t_aeration + t_sludge) / 60.0
-
-        capex_inr = (
-            base_capex
-            + 2500.0 * flow_m3_day
-            + 3e4 * organic_index * time_sum_hours
-            + 1e5 * heavy_metals
-        )
-
-        base_opex = 2e4
-        aeration_cost = 15.0 * flow_m3_day * organic_index
-        sludge_cost = 4000.0 * sludge_index
-        chem_cost = 4.0 * flow_m3_day
-
-        # Biogas gives some credit (negative cost)
-        biogas_credit = -5.0 * flow_m3_day * organic_index
-
-        opex_per_day_inr = base_opex + aeration_cost + sludge_cost + chem_cost + biogas_credit
-        cost_per_m3_inr = opex_per_day_inr / flow_m3_day
-
         row = {
             "type": w_type,
             "pH": pH,
@@ -748,14 +657,10 @@ def generate_type5(n_samples: int = 800, random_state: int = 5) -> pd.DataFrame:
             "equip_secondary_clarifier": equip_secondary,
             "equip_sludge_handling": equip_sludge,
             "equip_tertiary_filtration": equip_tertiary,
-
-            "capex_inr": capex_inr,
-            "opex_per_day_inr": opex_per_day_inr,
-            "cost_per_m3_inr": cost_per_m3_inr,
         }
         rows.append(row)
 
-    return pd.DataFrame(rows)
+    return _design_frame(rows, 5)
 
 
 # ---------------------------- MAIN: GENERATE & SAVE ----------------------------
@@ -767,15 +672,16 @@ if __name__ == "__main__":
     df4 = generate_type4()
     df5 = generate_type5()
 
-    df1.to_csv("type1_potable_synthetic.csv", index=False)
-    df2.to_csv("type2_domestic_synthetic.csv", index=False)
-    df3.to_csv("type3_recycle_mbr_synthetic.csv", index=False)
-    df4.to_csv("type4_industrial_synthetic.csv", index=False)
-    df5.to_csv("type5_high_organic_synthetic.csv", index=False)
+    frames = {1: df1, 2: df2, 3: df3, 4: df4, 5: df5}
+
+    # Stage names / equipment labels above must match plant_schema.py
+    for type_id, df in frames.items():
+        validate_design_frame(df, type_id)
+        df.to_csv(CSV_BY_TYPE[type_id], index=False)
 
     # Combined dataset (union of all columns)
-    df_all = pd.concat([df1, df2, df3, df4, df5], ignore_index=True)
-    df_all.to_csv("synthetic_designs_all_types.csv", index=False)
+    df_all = pd.concat(list(frames.values()), ignore_index=True)
+    df_all.to_csv(ALL_TYPES_CSV, index=False)
 
     print("Type 1 shape:", df1.shape)
     print("Type 2 shape:", df2.shape)
@@ -784,9 +690,6 @@ if __name__ == "__main__":
     print("Type 5 shape:", df5.shape)
     print("ALL  shape:", df_all.shape)
     print("\nSaved 6 CSV files:")
-    print("  - type1_potable_synthetic.csv")
-    print("  - type2_domestic_synthetic.csv")
-    print("  - type3_recycle_mbr_synthetic.csv")
-    print("  - type4_industrial_synthetic.csv")
-    print("  - type5_high_organic_synthetic.csv")
-    print("  - synthetic_designs_all_types.csv")
+    for type_id in frames:
+        print(f"  - {CSV_BY_TYPE[type_id]}")
+    print(f"  - {ALL_TYPES_CSV}")
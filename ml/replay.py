@@ -0,0 +1,249 @@
+"""
+Replay recorded or synthetic design-input streams against a local ML service.
+
+Sources:
+  - NDJSON (one JSON object per line). Feature keys may sit at the top level or
+    under "body"/"payload" (a dict or a JSON string). "timestamp", "ts" or
+    "createdAt" (epoch seconds or ISO-8601) drive the replay schedule.
+  - The synthetic CSVs (type*_synthetic.csv, synthetic_designs_all_types.csv).
+    They carry no timestamps, so rows are spaced at --rate per second.
+
+The schedule is compressed by --speed (2 = twice real time, 0 = as fast as
+possible). Requests share one pooled keep-alive client; --concurrency bounds
+the number in flight.
+
+Latency is measured from each request's scheduled send time, so time spent
+waiting for a free slot (or behind a lagging sender) counts, and an
+overloaded service shows up in the tail instead of being hidden by the
+closed loop (coordinated omission). service_ms is the time from the actual
+send to the response.
+
+Usage (service started with: python app.py, or uvicorn app:app --port 8001):
+  python replay.py type2_domestic_synthetic.csv --rate 50 --speed 4
+  python replay.py stream.ndjson --speed 10 --concurrency 64
+  python replay.py synthetic_designs_all_types.csv --speed 0 \\
+      --batch-size 256 --path /predict-design/batch
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+
+import httpx
+import numpy as np
+
+from plant_schema import FEATURE_COLS
+
+
+TIMESTAMP_KEYS = ("timestamp", "ts", "createdAt")
+
+LOCAL_HOSTS = {"127.0.0.1", "localhost", "::1", "0.0.0.0"}
+
+
+# ---------------------- LOADING ----------------------
+
+def _to_payload(obj: dict) -> dict:
+    for key in ("body", "payload"):
+        if key in obj:
+            inner = obj[key]
+            if isinstance(inner, str):
+                inner = json.loads(inner)
+            if isinstance(inner, dict):
+                obj = {**obj, **inner}
+    payload = {col: obj[col] for col in FEATURE_COLS}
+    payload["heavy_metals"] = bool(int(payload["heavy_metals"]))
+    return payload
+
+
+def _to_epoch(value):
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+def load_ndjson(path: str):
+    events = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            ts = next((obj[k] for k in TIMESTAMP_KEYS if k in obj), None)
+            events.append((_to_epoch(ts), _to_payload(obj)))
+    if all(ts is not None for ts, _ in events):
+        events.sort(key=lambda e: e[0])
+    return events
+
+
+def load_csv(path: str):
+    events = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            payload = {col: float(row[col]) for col in FEATURE_COLS}
+            payload["heavy_metals"] = bool(int(float(row["heavy_metals"])))
+            events.append((None, payload))
+    return events
+
+
+def load_stream(path: str):
+    if path.endswith(".csv"):
+        return load_csv(path)
+    return load_ndjson(path)
+
+
+def schedule(events, rate: float, speed: float) -> np.ndarray:
+    """Send offsets (seconds from start) for each event."""
+    n = len(events)
+    if speed <= 0:
+        return np.zeros(n)
+    stamps = [ts for ts, _ in events]
+    if all(ts is not None for ts in stamps):
+        ts = np.array(stamps, dtype=np.float64)
+        offsets = ts - ts.min()
+    else:
+        offsets = np.arange(n) / rate
+    return offsets / speed
+
+
+# ---------------------- REPLAY ----------------------
+
+async def _send(client, path, body, n_rows, scheduled, semaphore, stats):
+    """scheduled: perf_counter() time the request was due to be sent."""
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            res = await client.post(path, json=body)
+            end = time.perf_counter()
+            if res.status_code < 400:
+                stats["latency"].append(end - scheduled)
+                stats["service"].append(end - start)
+                stats["rows_ok"] += n_rows
+            else:
+                stats["errors"][str(res.status_code)] = stats["errors"].get(str(res.status_code), 0) + 1
+        except httpx.HTTPError as exc:
+            name = type(exc).__name__
+            stats["errors"][name] = stats["errors"].get(name, 0) + 1
+
+
+async def replay(events, base_url: str, path: str, offsets: np.ndarray,
+                 concurrency: int = 32, batch_size: int = 1, timeout: float = 30.0):
+    stats = {"latency": [], "service": [], "rows_ok": 0, "errors": {}, "max_lag": 0.0}
+    limits = httpx.Limits(
+        max_connections=concurrency, max_keepalive_connections=concurrency
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+    payloads = [p for _, p in events]
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        tasks = []
+        start = time.perf_counter()
+        for i in range(0, len(payloads), batch_size):
+            delay = offsets[i] - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                stats["max_lag"] = max(stats["max_lag"], -delay)
+            chunk = payloads[i:i + batch_size]
+            body = chunk if batch_size > 1 else chunk[0]
+            tasks.append(asyncio.create_task(
+                _send(client, path, body, len(chunk), start + offsets[i], semaphore, stats)
+            ))
+        await asyncio.gather(*tasks)
+        stats["elapsed"] = time.perf_counter() - start
+        stats["requests"] = len(tasks)
+        stats["rows"] = len(payloads)
+    return stats
+
+
+def _percentiles(values_s) -> dict:
+    ms = np.array(values_s) * 1000.0
+    p50, p90, p99 = np.percentile(ms, [50, 90, 99])
+    return {
+        "mean": round(float(ms.mean()), 2),
+        "p50": round(float(p50), 2),
+        "p90": round(float(p90), 2),
+        "p99": round(float(p99), 2),
+        "max": round(float(ms.max()), 2),
+    }
+
+
+def summarize(stats: dict) -> dict:
+    lat = np.array(stats["latency"])
+    n_err = sum(stats["errors"].values())
+    elapsed = stats["elapsed"] or 1e-9
+    summary = {
+        "requests": stats["requests"],
+        "rows": stats["rows"],
+        "elapsed_s": round(elapsed, 3),
+        "throughput_req_s": round(len(lat) / elapsed, 1),
+        "throughput_rows_s": round(stats["rows_ok"] / elapsed, 1),
+        "error_rate": round(n_err / max(stats["requests"], 1), 4),
+        "errors": stats["errors"],
+        "max_schedule_lag_s": round(stats["max_lag"], 3),
+    }
+    if len(lat):
+        summary["latency_ms"] = _percentiles(stats["latency"])
+        summary["service_ms"] = _percentiles(stats["service"])
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay design inputs against the ML service")
+    parser.add_argument("source", help="NDJSON or CSV stream")
+    parser.add_argument("--url", default="http://127.0.0.1:8001")
+    parser.add_argument("--path", default="/predict-design")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="multiple of real time (0 = as fast as possible)")
+    parser.add_argument("--rate", type=float, default=10.0,
+                        help="rows/s at speed 1 for streams without timestamps")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="rows per request; >1 posts a JSON list (batch endpoints)")
+    parser.add_argument("--limit", type=int, default=0)
+    parser.add_argument("--loop", type=int, default=1, help="repeat the stream N times")
+    parser.add_argument("--json-out", default="")
+    parser.add_argument("--allow-remote", action="store_true")
+    args = parser.parse_args()
+
+    host = urlparse(args.url).hostname
+    if host not in LOCAL_HOSTS and not args.allow_remote:
+        parser.error(f"refusing to replay against non-local host {host!r} (use --allow-remote)")
+
+    events = load_stream(args.source)
+    if args.limit:
+        events = events[:args.limit]
+    if args.loop > 1:
+        span = len(events) / args.rate
+        stamps = [ts for ts, _ in events]
+        if all(ts is not None for ts in stamps):
+            span = max(stamps) - min(stamps) + 1.0
+        events = [
+            (None if ts is None else ts + k * span, p)
+            for k in range(args.loop) for ts, p in events
+        ]
+
+    offsets = schedule(events, args.rate, args.speed)
+    print(f"Replaying {len(events)} rows from {args.source} -> {args.url}{args.path} "
+          f"(speed={args.speed}, concurrency={args.concurrency}, batch={args.batch_size})")
+
+    stats = asyncio.run(replay(
+        events, args.url, args.path, offsets,
+        concurrency=args.concurrency, batch_size=args.batch_size,
+    ))
+    summary = summarize(stats)
+    print(json.dumps(summary, indent=2))
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,501 @@
+"""
+Columnar archive + multi-resolution rollups for historical SensorReading data.
+
+Old readings are moved out of Mongo into per-location chunk directories of
+memory-mapped .npy columns:
+
+  <root>/<location>/<level>/<chunk_id>/
+      meta.json            – base timestamp, row count, enum dictionaries, version
+      ts_delta.<v>.npy     – uint32 deltas (ms for raw, buckets for rollups)
+      <field>.<v>.npy      – float32 values                       (raw)
+      <field>_{mean,min,max,count}.<v>.npy                        (rollups)
+      sourceType.<v>.npy, recoveryUnitStatus.<v>.npy – uint8 dictionary codes
+
+A rewrite saves the columns of version v + 1 next to the current ones and
+then commits them by atomically replacing meta.json, so a crash at any point
+leaves either the old or the new chunk readable. Superseded files are
+removed after the commit.
+
+Levels:
+  raw   – every reading, chunked per day
+  1min  – per-minute rollups, chunked per week
+  1h    – hourly rollups, chunked per quarter
+  1d    – daily rollups, chunked per decade
+
+query() picks the finest level that answers the window in at most the
+requested number of chart points and only touches the chunks overlapping the
+requested window, so a year-long chart reads daily/hourly rollups (kilobytes
+to a few megabytes) instead of every raw document.
+"""
+
+import json
+import os
+
+import numpy as np
+
+from alert_engine import NUMERIC_FIELDS, RECOVERY_STATUSES
+
+
+SOURCE_TYPES = ["groundwater", "surface", "tap", "tank", "other"]
+
+ENUM_FIELDS = {
+    "sourceType": SOURCE_TYPES,
+    "recoveryUnitStatus": RECOVERY_STATUSES,
+}
+
+DAY_S = 86400
+
+# level: (bucket seconds, chunk span seconds); bucket 0 = raw readings
+LEVELS = {
+    "raw": (0, DAY_S),
+    "1min": (60, 7 * DAY_S),
+    "1h": (3600, 91 * DAY_S),
+    "1d": (DAY_S, 3650 * DAY_S),
+}
+
+ROLLUP_ORDER = ["raw", "1min", "1h", "1d"]
+
+
+# ---------------------- RECORDS → COLUMNS ----------------------
+
+def _epoch_seconds(value) -> float:
+    if hasattr(value, "timestamp"):
+        return value.timestamp()
+    return float(value)
+
+
+def columns_from_records(records) -> dict:
+    """
+    SensorReading documents → {location, ts (epoch s), numeric fields, enum codes}.
+    Enum values not in the known dictionaries are mapped to "other"/-1 → 255.
+    """
+    cols = {
+        "location": np.array(
+            [str(r.get("location", r.get("locationId"))) for r in records], dtype=object
+        ),
+        "ts": np.array([_epoch_seconds(r["createdAt"]) for r in records], dtype=np.float64),
+    }
+    for field in NUMERIC_FIELDS:
+        cols[field] = np.array(
+            [np.nan if r.get(field) is None else r.get(field) for r in records],
+            dtype=np.float64,
+        )
+    for field, vocab in ENUM_FIELDS.items():
+        index = {v: i for i, v in enumerate(vocab)}
+        cols[field] = np.array(
+            [index.get(r.get(field), 255) for r in records], dtype=np.uint8
+        )
+    return cols
+
+
+# ---------------------- CHUNK I/O ----------------------
+
+def _safe_name(location: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(location))
+
+
+def _chunk_path(root: str, location: str, level: str, chunk_id: int) -> str:
+    return os.path.join(root, _safe_name(location), level, f"{chunk_id:08d}")
+
+
+def _column_file(meta: dict, name: str) -> str:
+    return f"{name}.{meta['version']}.npy"
+
+
+def _read_meta(path: str) -> dict:
+    with open(os.path.join(path, "meta.json")) as f:
+        return json.load(f)
+
+
+def _write_chunk(path: str, meta: dict, arrays: dict):
+    """Write the columns as a new version, then commit it by replacing meta.json."""
+    os.makedirs(path, exist_ok=True)
+    meta_path = os.path.join(path, "meta.json")
+    meta = dict(meta, version=_read_meta(path)["version"] + 1 if os.path.exists(meta_path) else 0)
+    for name, arr in arrays.items():
+        with open(os.path.join(path, _column_file(meta, name)), "wb") as f:
+            np.save(f, arr)
+            f.flush()
+            os.fsync(f.fileno())
+    tmp = meta_path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, meta_path)
+
+    current = {_column_file(meta, name) for name in arrays} | {"meta.json"}
+    for name in os.listdir(path):
+        if name not in current:
+            os.remove(os.path.join(path, name))
+
+
+def _read_chunk(path: str, names=None):
+    """Return (meta, {column: memmap}) – only the requested columns are opened."""
+    meta = _read_meta(path)
+    arrays = {}
+    for name in names or meta["columns"]:
+        arrays[name] = np.load(os.path.join(path, _column_file(meta, name)), mmap_mode="r")
+    return meta, arrays
+
+
+def _chunk_ids(root: str, location: str, level: str, t_lo: float, t_hi: float):
+    """Existing chunk ids of a level overlapping [t_lo, t_hi)."""
+    span = LEVELS[level][1]
+    level_dir = os.path.join(root, _safe_name(location), level)
+    if not os.path.isdir(level_dir):
+        return []
+    lo, hi = int(t_lo // span), int(np.ceil(t_hi / span))
+    ids = []
+    for name in os.listdir(level_dir):
+        if not name.isdigit():
+            continue
+        cid = int(name)
+        if lo <= cid < hi:
+            ids.append(cid)
+    return sorted(ids)
+
+
+def _chunk_bytes(path: str, meta: dict, names) -> int:
+    return sum(os.path.getsize(os.path.join(path, _column_file(meta, n))) for n in names)
+
+
+# ---------------------- ENCODING ----------------------
+
+def _encode_raw(ts: np.ndarray, cols: dict):
+    ts_ms = np.round(ts * 1000.0).astype(np.int64)
+    delta = np.diff(ts_ms, prepend=ts_ms[0]).astype(np.uint32)
+    arrays = {"ts_delta": delta}
+    for field in NUMERIC_FIELDS:
+        arrays[field] = cols[field].astype(np.float32)
+    for field in ENUM_FIELDS:
+        arrays[field] = cols[field].astype(np.uint8)
+    meta = {
+        "ts0": int(ts_ms[0]),
+        "n": int(len(ts_ms)),
+        "unit_s": 0.001,
+        "dictionaries": ENUM_FIELDS,
+        "columns": list(arrays),
+    }
+    return meta, arrays
+
+
+def _decode_ts(meta: dict, delta: np.ndarray) -> np.ndarray:
+    """Delta column → epoch seconds (float64)."""
+    ticks = meta["ts0"] + np.cumsum(delta, dtype=np.int64)
+    return ticks * meta["unit_s"]
+
+
+def _rollup_columns():
+    names = []
+    for field in NUMERIC_FIELDS:
+        names += [f"{field}_mean", f"{field}_min", f"{field}_max", f"{field}_count"]
+    return names
+
+
+def _encode_rollup(bucket_s: int, buckets: np.ndarray, agg: dict):
+    delta = np.diff(buckets, prepend=buckets[0]).astype(np.uint32)
+    arrays = {"ts_delta": delta}
+    for field in NUMERIC_FIELDS:
+        count = agg[f"{field}_count"]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = agg[f"{field}_sum"] / count
+        arrays[f"{field}_mean"] = mean.astype(np.float32)
+        arrays[f"{field}_min"] = np.where(count > 0, agg[f"{field}_min"], np.nan).astype(np.float32)
+        arrays[f"{field}_max"] = np.where(count > 0, agg[f"{field}_max"], np.nan).astype(np.float32)
+        arrays[f"{field}_count"] = count.astype(np.uint32)
+    for field in ENUM_FIELDS:
+        arrays[field] = agg[field].astype(np.uint8)
+    meta = {
+        "ts0": int(buckets[0]),
+        "n": int(len(buckets)),
+        "unit_s": bucket_s,
+        "dictionaries": ENUM_FIELDS,
+        "columns": list(arrays),
+    }
+    return meta, arrays
+
+
+# ---------------------- AGGREGATION ----------------------
+
+def _raw_partials(arrays: dict) -> dict:
+    """Per-reading partial aggregates, so raw and rollups aggregate the same way."""
+    parts = {}
+    for field in NUMERIC_FIELDS:
+        v = np.asarray(arrays[field], dtype=np.float64)
+        ok = ~np.isnan(v)
+        parts[f"{field}_sum"] = np.where(ok, v, 0.0)
+        parts[f"{field}_count"] = ok.astype(np.int64)
+        parts[f"{field}_min"] = np.where(ok, v, np.inf)
+        parts[f"{field}_max"] = np.where(ok, v, -np.inf)
+    for field in ENUM_FIELDS:
+        parts[field] = np.asarray(arrays[field])
+    return parts
+
+
+def _rollup_partials(arrays: dict) -> dict:
+    parts = {}
+    for field in NUMERIC_FIELDS:
+        count = np.asarray(arrays[f"{field}_count"], dtype=np.int64)
+        ok = count > 0
+        mean = np.asarray(arrays[f"{field}_mean"], dtype=np.float64)
+        parts[f"{field}_sum"] = np.where(ok, mean * count, 0.0)
+        parts[f"{field}_count"] = count
+        parts[f"{field}_min"] = np.where(ok, arrays[f"{field}_min"], np.inf)
+        parts[f"{field}_max"] = np.where(ok, arrays[f"{field}_max"], -np.inf)
+    for field in ENUM_FIELDS:
+        parts[field] = np.asarray(arrays[field])
+    return parts
+
+
+def _aggregate(ts: np.ndarray, parts: dict, bucket_s: int):
+    """Sorted timestamps + partials → (bucket indices, aggregated partials)."""
+    bucket = np.floor(ts / bucket_s).astype(np.int64)
+    starts = np.flatnonzero(np.diff(bucket, prepend=bucket[0] - 1))
+    ends = np.append(starts[1:], len(bucket)) - 1
+    agg = {}
+    for field in NUMERIC_FIELDS:
+        agg[f"{field}_sum"] = np.add.reduceat(parts[f"{field}_sum"], starts)
+        agg[f"{field}_count"] = np.add.reduceat(parts[f"{field}_count"], starts)
+        agg[f"{field}_min"] = np.minimum.reduceat(parts[f"{field}_min"], starts)
+        agg[f"{field}_max"] = np.maximum.reduceat(parts[f"{field}_max"], starts)
+    for field in ENUM_FIELDS:
+        # Last observed state in the bucket (e.g. unit status at end of hour)
+        agg[field] = parts[field][ends]
+    return bucket[starts], agg
+
+
+# ---------------------- ARCHIVE ----------------------
+
+class SensorArchive:
+    """Per-location columnar archive rooted at a directory."""
+
+    def __init__(self, root: str = "sensor_archive"):
+        self.root = root
+
+    # ----- writing -----
+
+    def append(self, cols: dict):
+        """
+        Archive a columnar batch (see columns_from_records) and refresh the
+        rollups covering it. Readings already archived at the same millisecond
+        are replaced.
+        """
+        if len(cols["ts"]) == 0:
+            return 0
+        locations = cols["location"].astype(str)
+        for location in np.unique(locations):
+            mask = locations == location
+            sub = {k: v[mask] for k, v in cols.items() if k != "location"}
+            self._append_location(str(location), sub)
+        return len(cols["ts"])
+
+    def _append_location(self, location: str, cols: dict):
+        order = np.argsort(cols["ts"], kind="stable")
+        cols = {k: v[order] for k, v in cols.items()}
+        span = LEVELS["raw"][1]
+        day = np.floor(cols["ts"] / span).astype(np.int64)
+
+        for chunk_id in np.unique(day):
+            sel = day == chunk_id
+            new = {k: v[sel] for k, v in cols.items()}
+            path = _chunk_path(self.root, location, "raw", int(chunk_id))
+            if os.path.exists(path):
+                new = self._merge_raw(path, new)
+            meta, arrays = _encode_raw(new["ts"], new)
+            _write_chunk(path, meta, arrays)
+
+        t_lo, t_hi = float(cols["ts"][0]), float(cols["ts"][-1])
+        for finer, level in zip(ROLLUP_ORDER, ROLLUP_ORDER[1:]):
+            bucket_s = LEVELS[level][0]
+            t_lo = np.floor(t_lo / bucket_s) * bucket_s
+            t_hi = (np.floor(t_hi / bucket_s) + 1) * bucket_s
+            self._rebuild_rollup(location, finer, level, t_lo, t_hi)
+
+    def _merge_raw(self, path: str, new: dict) -> dict:
+        meta, old = _read_chunk(path)
+        merged = {"ts": np.concatenate([_decode_ts(meta, old["ts_delta"]), new["ts"]])}
+        for k in list(NUMERIC_FIELDS) + list(ENUM_FIELDS):
+            merged[k] = np.concatenate([np.asarray(old[k], dtype=new[k].dtype), new[k]])
+        # Keep the newest copy of each millisecond, in time order (np.unique
+        # sorts by timestamp; the last occurrence of each is the newest)
+        ts_ms = np.round(merged["ts"] * 1000.0).astype(np.int64)
+        _, first = np.unique(ts_ms[::-1], return_index=True)
+        keep = len(ts_ms) - 1 - first
+        return {k: v[keep] for k, v in merged.items()}
+
+    def _rebuild_rollup(self, location: str, finer: str, level: str, t_lo: float, t_hi: float):
+        bucket_s, span = LEVELS[level]
+        ts, parts = self._read_partials(location, finer, t_lo, t_hi)
+        if len(ts) == 0:
+            return
+        buckets, agg = _aggregate(ts, parts, bucket_s)
+
+        chunk_of = (buckets * bucket_s) // span
+        for chunk_id in np.unique(chunk_of):
+            sel = chunk_of == chunk_id
+            b_new = buckets[sel]
+            a_new = {k: v[sel] for k, v in agg.items()}
+            path = _chunk_path(self.root, location, level, int(chunk_id))
+            if os.path.exists(path):
+                meta, old = _read_chunk(path)
+                b_old = np.round(_decode_ts(meta, old["ts_delta"]) / bucket_s).astype(np.int64)
+                keep = (b_old < b_new[0]) | (b_old > b_new[-1])
+                if keep.any():
+                    p_old = _rollup_partials({k: v[keep] for k, v in old.items()})
+                    b_all = np.concatenate([b_old[keep], b_new])
+                    order = np.argsort(b_all, kind="stable")
+                    b_new = b_all[order]
+                    a_new = {
+                        k: np.concatenate([p_old[k], a_new[k]])[order] for k in a_new
+                    }
+            meta, arrays = _encode_rollup(bucket_s, b_new, a_new)
+            _write_chunk(path, meta, arrays)
+
+    # ----- reading -----
+
+    def _read_partials(self, location: str, level: str, t_lo: float, t_hi: float):
+        ts_parts, partials = [], []
+        for chunk_id in _chunk_ids(self.root, location, level, t_lo, t_hi):
+            path = _chunk_path(self.root, location, level, chunk_id)
+            meta, arrays = _read_chunk(path)
+            ts = _decode_ts(meta, arrays["ts_delta"])
+            sel = (ts >= t_lo) & (ts < t_hi)
+            arrays = {k: np.asarray(v)[sel] for k, v in arrays.items()}
+            ts_parts.append(ts[sel])
+            partials.append(
+                _raw_partials(arrays) if level == "raw" else _rollup_partials(arrays)
+            )
+        if not ts_parts:
+            return np.empty(0), {}
+        return (
+            np.concatenate(ts_parts),
+            {k: np.concatenate([p[k] for p in partials]) for k in partials[0]},
+        )
+
+    def _raw_rows(self, location: str, start: float, end: float) -> int:
+        """Upper bound on the raw readings in [start, end): rows of the overlapping chunks."""
+        return sum(
+            _read_meta(_chunk_path(self.root, location, "raw", chunk_id))["n"]
+            for chunk_id in _chunk_ids(self.root, location, "raw", start, end)
+        )
+
+    def choose_level(self, start: float, end: float, max_points: int = 1000,
+                     location=None) -> str:
+        """
+        Finest level that covers [start, end) in at most max_points buckets
+        (1d if none does). Raw is only considered for a location, whose raw
+        chunk row counts bound the number of readings.
+        """
+        levels = ROLLUP_ORDER if location is not None else ROLLUP_ORDER[1:]
+        for level in levels:
+            bucket_s = LEVELS[level][0]
+            if bucket_s == 0:
+                points = self._raw_rows(str(location), start, end)
+            else:
+                points = int(np.ceil(end / bucket_s) - np.floor(start / bucket_s))
+            if points <= max_points:
+                return level
+        return ROLLUP_ORDER[-1]
+
+    def query(self, location, start: float, end: float, max_points: int = 1000,
+              fields=None, level: str = None) -> dict:
+        """
+        Chart query over [start, end) (epoch seconds).
+
+        Returns {"level", "ts", "bytes_read", <field>: values} for raw data, or
+        <field>_mean/_min/_max/_count arrays for rollups. Only the requested
+        columns of the overlapping chunks are memory-mapped.
+        """
+        location = str(location)
+        fields = list(fields or NUMERIC_FIELDS)
+        level = level or self.choose_level(start, end, max_points, location)
+        numeric = [f for f in fields if f not in ENUM_FIELDS]
+        if level != "raw":
+            numeric = [f"{f}_{stat}" for f in numeric for stat in ("mean", "min", "max", "count")]
+        names = numeric + [f for f in fields if f in ENUM_FIELDS]
+
+        out = {"level": level, "bytes_read": 0}
+        ts_parts, cols = [], {n: [] for n in names}
+        for chunk_id in _chunk_ids(self.root, location, level, start, end):
+            path = _chunk_path(self.root, location, level, chunk_id)
+            meta, arrays = _read_chunk(path, ["ts_delta"] + names)
+            ts = _decode_ts(meta, arrays["ts_delta"])
+            lo, hi = np.searchsorted(ts, [start, end])
+            ts_parts.append(ts[lo:hi])
+            for n in names:
+                cols[n].append(np.asarray(arrays[n][lo:hi]))
+            out["bytes_read"] += _chunk_bytes(path, meta, ["ts_delta"] + names)
+
+        out["ts"] = np.concatenate(ts_parts) if ts_parts else np.empty(0)
+        for n in names:
+            out[n] = np.concatenate(cols[n]) if cols[n] else np.empty(0, dtype=np.float32)
+        return out
+
+    def decode_enum(self, field: str, codes: np.ndarray) -> np.ndarray:
+        vocab = np.array(ENUM_FIELDS[field] + ["unknown"], dtype=object)
+        return vocab[np.minimum(codes, len(vocab) - 1)]
+
+
+# ---------------------- MONGO PIPELINE ----------------------
+
+def archive_collection(collection, archive: SensorArchive, older_than,
+                       batch_size: int = 50_000, delete: bool = False) -> int:
+    """
+    Move SensorReading documents with createdAt < older_than (datetime) into the
+    archive, batch by batch (pymongo-style collection). Documents are only
+    deleted after their batch has been written.
+    """
+    total = 0
+    batch = []
+    cursor = collection.find({"createdAt": {"$lt": older_than}}).sort("createdAt", 1)
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            total += _archive_batch(collection, archive, batch, delete)
+            batch = []
+    if batch:
+        total += _archive_batch(collection, archive, batch, delete)
+    return total
+
+
+def _archive_batch(collection, archive, docs, delete):
+    n = archive.append(columns_from_records(docs))
+    if delete:
+        collection.delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+    return n
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    rng = np.random.default_rng(0)
+    n = 30 * 8640  # 30 days at one reading per 10 s
+    t0 = 1.7e9
+    cols = {
+        "location": np.array(["demo_site"] * n, dtype=object),
+        "ts": t0 + np.arange(n) * 10.0,
+        "ph": rng.normal(7.3, 0.3, n),
+        "turbidity": rng.gamma(2.0, 1.5, n),
+        "tds": rng.normal(400, 60, n),
+        "temperature": rng.uniform(18, 32, n),
+        "ecoliCount": (rng.random(n) < 0.001).astype(float),
+        "tankLevel": rng.uniform(10, 100, n),
+        "sourceType": np.full(n, 0, dtype=np.uint8),
+        "recoveryUnitStatus": rng.choice(np.arange(3, dtype=np.uint8), n, p=[0.98, 0.01, 0.01]),
+    }
+
+    with tempfile.TemporaryDirectory() as root:
+        archive = SensorArchive(root)
+        start = time.perf_counter()
+        archive.append(cols)
+        print(f"Archived {n} readings in {time.perf_counter() - start:.2f}s")
+
+        for days, points in [(1, 1000), (7, 500), (30, 800), (30, 20)]:
+            start = time.perf_counter()
+            res = archive.query("demo_site", t0, t0 + days * DAY_S, max_points=points)
+            ms = (time.perf_counter() - start) * 1000
+            print(f"{days:>2} days / {points:>4} pts -> level={res['level']:<4} "
+                  f"points={len(res['ts']):>6} read={res['bytes_read'] / 1e6:.2f} MB "
+                  f"in {ms:.1f} ms")
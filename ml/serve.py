@@ -0,0 +1,259 @@
+"""
+Multi-process launcher for the ML service with an explicit topology:
+workers × threads, optionally pinned to CPUs.
+
+The listening socket is bound once here and shared by every worker process
+(as uvicorn --workers does). Each worker gets ML_THREADS and, with
+--affinity, its own ML_CPUS slice; app.py applies them at import
+(thread_control.configure_process), so BLAS/OpenMP pools and the API's
+TYPE_POOL never exceed the worker's share of the host.
+
+--benchmark starts the service in every candidate layout that fits the
+host (workers × threads <= usable CPUs, with and without pinning), drives
+it with closed-loop clients – single designs plus a share of 64-row
+batches – and saves the layout with the best throughput (p99 latency
+breaks near-ties) to serve_layout.json. Without --workers/--threads,
+serve.py uses that file.
+
+Usage (from ml/):
+  python serve.py --workers 4 --threads 1 --affinity
+  python serve.py --benchmark --seconds 10 --clients 16
+  python serve.py                    # serve_layout.json, else 1 worker
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+import numpy as np
+
+from plant_schema import FEATURE_COLS, INPUT_BOUNDS_BY_TYPE, TYPE_IDS
+from thread_control import available_cpus, format_cpus
+
+
+LAYOUT_PATH = "serve_layout.json"
+KEEP_ALIVE_S = int(os.environ.get("ML_KEEP_ALIVE_S", "30"))
+BATCH_ROWS = 64
+
+
+# ---------------------- LAUNCHER ----------------------
+
+def plan_workers(workers: int, threads: int, affinity: bool) -> list:
+    """Environment of every worker; pinned workers get consecutive CPU slices."""
+    cpus = available_cpus()
+    plan = []
+    for i in range(workers):
+        env = {"ML_THREADS": str(threads), "ML_WORKER": str(i)}
+        if affinity:
+            mine = [cpus[(i * threads + k) % len(cpus)] for k in range(threads)]
+            env["ML_CPUS"] = format_cpus(sorted(set(mine)))
+        plan.append(env)
+    return plan
+
+
+def bind_socket(host: str, port: int, backlog: int = 2048) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(sock: socket.socket, env: dict, log_level: str):
+    os.environ.update(env)
+    import uvicorn
+
+    config = uvicorn.Config("app:app", timeout_keep_alive=KEEP_ALIVE_S, log_level=log_level)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def start_workers(sock, plan: list, log_level: str = "warning") -> list:
+    ctx = multiprocessing.get_context("spawn")
+    procs = []
+    for env in plan:
+        proc = ctx.Process(target=_run_worker, args=(sock, env, log_level), daemon=True)
+        proc.start()
+        procs.append(proc)
+    return procs
+
+
+def stop_workers(procs: list):
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        proc.join(10)
+
+
+def wait_ready(host: str, port: int, timeout_s: float = 120.0):
+    deadline = time.monotonic() + timeout_s
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=2)
+            conn.request("GET", "/startup")
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"service on {host}:{port} did not start")
+
+
+# ---------------------- LOAD ----------------------
+
+def sample_designs(n: int, rng) -> list:
+    """In-distribution request bodies: each row drawn from a random type's ranges."""
+    rows = []
+    for t in rng.choice(TYPE_IDS, size=n):
+        bounds = INPUT_BOUNDS_BY_TYPE[int(t)]
+        x = bounds[:, 0] + rng.random(len(FEATURE_COLS)) * (bounds[:, 1] - bounds[:, 0])
+        row = {c: round(float(v), 3) for c, v in zip(FEATURE_COLS, x)}
+        row["heavy_metals"] = bool(x[FEATURE_COLS.index("heavy_metals")] >= 0.5)
+        rows.append(row)
+    return rows
+
+
+def _client(args) -> dict:
+    host, port, seconds, batch_share, seed = args
+    rng = np.random.default_rng(seed)
+    singles = [json.dumps(r) for r in sample_designs(256, rng)]
+    batches = [json.dumps(sample_designs(BATCH_ROWS, rng)) for _ in range(8)]
+    headers = {"Content-Type": "application/json"}
+
+    conn = http.client.HTTPConnection(host, port)
+    latencies, rows, errors = [], 0, 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        batch = rng.random() < batch_share
+        if batch:
+            path, body = "/predict-design/batch", batches[rng.integers(len(batches))]
+        else:
+            path, body = "/predict-design", singles[rng.integers(len(singles))]
+        t0 = time.perf_counter()
+        conn.request("POST", path, body=body, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        latencies.append(time.perf_counter() - t0)
+        if resp.status != 200:
+            errors += 1
+        rows += BATCH_ROWS if batch else 1
+    conn.close()
+    return {"latencies": latencies, "rows": rows, "errors": errors}
+
+
+def drive(host: str, port: int, seconds: float, clients: int, batch_share: float) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(clients) as pool:
+        parts = pool.map(_client, [(host, port, seconds, batch_share, i) for i in range(clients)])
+    lat = np.concatenate([p["latencies"] for p in parts]) * 1000
+    return {
+        "requests_s": round(len(lat) / seconds, 1),
+        "rows_s": round(sum(p["rows"] for p in parts) / seconds, 1),
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p99_ms": round(float(np.percentile(lat, 99)), 2),
+        "errors": sum(p["errors"] for p in parts),
+    }
+
+
+# ---------------------- BENCHMARK ----------------------
+
+def candidate_layouts(n_cpus: int) -> list:
+    layouts = set()
+    workers = 1
+    while workers <= n_cpus:
+        for threads in {1, n_cpus // workers}:
+            layouts.add((workers, threads, False))
+            if n_cpus > 1:
+                layouts.add((workers, threads, True))
+        workers *= 2
+    if n_cpus not in {w for w, _, _ in layouts}:
+        layouts.add((n_cpus, 1, False))
+    return sorted(layouts)
+
+
+def benchmark(host: str, port: int, seconds: float, clients: int, batch_share: float) -> dict:
+    n_cpus = len(available_cpus())
+    results = []
+    for workers, threads, affinity in candidate_layouts(n_cpus):
+        sock = bind_socket(host, port)
+        procs = start_workers(sock, plan_workers(workers, threads, affinity))
+        try:
+            wait_ready(host, port)
+            drive(host, port, min(2.0, seconds), clients, batch_share)  # warm-up
+            stats = drive(host, port, seconds, clients, batch_share)
+        finally:
+            stop_workers(procs)
+            sock.close()
+        row = {"workers": workers, "threads": threads, "affinity": affinity, **stats}
+        results.append(row)
+        print(f"  {workers:>2} workers x {threads:>2} threads {'pinned' if affinity else '      '}  "
+              f"{stats['requests_s']:>8.1f} req/s {stats['rows_s']:>9.1f} rows/s  "
+              f"p50 {stats['p50_ms']:>7.2f} ms  p99 {stats['p99_ms']:>7.2f} ms")
+
+    # Best throughput; within 3% of it, the lowest p99
+    top = max(r["rows_s"] for r in results)
+    best = min((r for r in results if r["rows_s"] >= 0.97 * top), key=lambda r: r["p99_ms"])
+    return {
+        "host_cpus": n_cpus,
+        "clients": clients,
+        "batch_share": batch_share,
+        "best": {k: best[k] for k in ("workers", "threads", "affinity")},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the ML API with a worker x thread layout")
+    parser.add_argument("--host", default=os.environ.get("ML_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("ML_PORT", "8001")))
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=0, help="thread budget per worker")
+    parser.add_argument("--affinity", action="store_true", help="pin each worker to its own CPUs")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--seconds", type=float, default=10.0, help="benchmark time per layout")
+    parser.add_argument("--clients", type=int, default=2 * len(available_cpus()))
+    parser.add_argument("--batch-share", type=float, default=0.1,
+                        help="fraction of benchmark requests that are 64-row batches")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(f"Benchmarking layouts on {len(available_cpus())} CPUs, {args.clients} clients")
+        report = benchmark(args.host, args.port, args.seconds, args.clients, args.batch_share)
+        with open(LAYOUT_PATH, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Best: {report['best']} (saved to {LAYOUT_PATH})")
+        return
+
+    layout = {"workers": 1, "threads": len(available_cpus()), "affinity": False}
+    if not (args.workers or args.threads) and os.path.exists(LAYOUT_PATH):
+        with open(LAYOUT_PATH) as f:
+            layout = json.load(f)["best"]
+    if args.workers:
+        layout["workers"] = args.workers
+    if args.threads:
+        layout["threads"] = args.threads
+    layout["affinity"] = layout["affinity"] or args.affinity
+
+    sock = bind_socket(args.host, args.port)
+    plan = plan_workers(layout["workers"], layout["threads"], layout["affinity"])
+    procs = start_workers(sock, plan, log_level="info")
+    print(f"Serving on {args.host}:{args.port}: {layout['workers']} workers x "
+          f"{layout['threads']} threads" + (" (pinned)" if layout["affinity"] else ""))
+
+    def shutdown(signum, frame):
+        stop_workers(procs)
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    for proc in procs:
+        proc.join()
+
+
+if __name__ == "__main__":
+    main()
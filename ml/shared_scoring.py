@@ -0,0 +1,393 @@
+"""
+Process-pool scoring over shared memory: feature matrices and results stay
+in multiprocessing.shared_memory blocks instead of being pickled to and
+from the workers.
+
+ScoringExecutor owns one block set of --slots buffers. Each buffer holds
+  X        (capacity, len(FEATURE_COLS)) float64 inputs
+  outputs  the app.predict_packed arrays (binary_frames.RESPONSE_FIELDS):
+           cost, probability, times, ood, type, cost_source, equip
+Every worker process attaches the blocks and imports app.py once, in the
+pool initializer, so models stay resident (one thread per worker). A
+task is only (buffer, start, stop, ood_policy). The worker scores the
+zero-copy view X[start:stop] and writes the results into the same rows
+of the output arrays.
+
+submit() copies a matrix into a free buffer and splits it into one slice
+per worker (or slices of --slice-rows), so every worker shares every
+batch. Each worker picks the engine per slice (app.row_blocks): slices
+of app.SKLEARN_MIN_ROWS or more go through the sklearn estimators,
+smaller ones through the flat forests. Those are faster at the respective
+sizes, and app.py bounds a worker's scratch memory either way. When a
+worker's share of a full buffer is large enough for sklearn, the pool
+initializer loads the estimators up front. result() waits for the slices
+and returns copies, which frees the buffer. With 2 buffers the caller can
+consume one batch (write a file, reduce) while the workers score the next.
+
+SharedArrays is the plain building block (named arrays in shared memory,
+re-attached in workers from .spec). cost_risk.py uses it for its result
+arrays; portfolio.py scores its chunks through ScoringExecutor.
+
+--benchmark times the same rows, for each --workers count, through
+  - sklearn: a pool where every worker loads the joblib estimators and
+    predicts its pickled DataFrame chunks (the baseline),
+  - pickled: the same pool running app.predict_packed,
+  - shared: ScoringExecutor.
+
+Usage (from ml/):
+  python shared_scoring.py --benchmark --rows 100000 --workers 1 2 4
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+import pandas as pd
+
+from binary_frames import RESPONSE_FIELDS
+from plant_schema import FEATURE_COLS
+
+
+CAPACITY = 50_000
+SLOTS = 2
+
+_WORKER = {}
+
+
+# ---------------------- SHARED ARRAYS ----------------------
+
+def _attach_block(name: str) -> shared_memory.SharedMemory:
+    """Attach without registering for cleanup: the creating process unlinks."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:  # Python < 3.13 registers every attached block
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class SharedArrays:
+    """
+    Named numpy arrays, one shared memory block each.
+    SharedArrays.create({"x": ((n, 9), "f8")}) allocates (zero-filled);
+    SharedArrays.attach(arrays.spec) maps the same blocks in another process.
+    """
+
+    def __init__(self, blocks: dict, spec: dict, owner: bool):
+        self.blocks = blocks
+        self.spec = spec
+        self.owner = owner
+        self.arrays = {
+            name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=blocks[name].buf)
+            for name, (_, shape, dtype) in spec.items()
+        }
+
+    @classmethod
+    def create(cls, layout: dict) -> "SharedArrays":
+        blocks, spec = {}, {}
+        try:
+            for name, (shape, dtype) in layout.items():
+                shape = tuple(int(s) for s in np.atleast_1d(shape))
+                size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+                blocks[name] = shared_memory.SharedMemory(create=True, size=size)
+                spec[name] = (blocks[name].name, shape, np.dtype(dtype).str)
+        except BaseException:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        return cls(blocks, spec, owner=True)
+
+    @classmethod
+    def attach(cls, spec: dict) -> "SharedArrays":
+        return cls({name: _attach_block(s[0]) for name, s in spec.items()}, spec, owner=False)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def close(self):
+        """Drop the views and unmap the blocks; the owner also frees them."""
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def buffer_layout(slots: int, capacity: int) -> dict:
+    layout = {"X": ((slots, capacity, len(FEATURE_COLS)), "<f8")}
+    for name, dtype, shape in RESPONSE_FIELDS:
+        layout[name] = ((slots, capacity) + shape, dtype)
+    return layout
+
+
+# ---------------------- WORKERS ----------------------
+
+def load_app():
+    """Import the serving pipeline once per process, with a one-thread budget."""
+    if "app" not in _WORKER:
+        os.environ.setdefault("ML_THREADS", "1")
+        import app
+
+        _WORKER["app"] = app
+    return _WORKER["app"]
+
+
+def _ready() -> int:
+    load_app()
+    return os.getpid()
+
+
+def preload_engine(share_rows: int):
+    """Load the sklearn estimators now if slices of share_rows rows will use them."""
+    app = load_app()
+    if app.SKLEARN_ENGINE.available and 0 < app.SKLEARN_MIN_ROWS <= share_rows:
+        app.SKLEARN_ENGINE.models()
+
+
+def _init_worker(spec: dict, share_rows: int):
+    preload_engine(share_rows)
+    _WORKER["buffers"] = SharedArrays.attach(spec)
+
+
+def score_into(buffers: dict, slot: int, start: int, stop: int, ood_policy: str) -> int:
+    """Score X[slot, start:stop] in place into the output arrays of the slot."""
+    out = load_app().predict_packed(buffers["X"][slot, start:stop], ood_policy)
+    for name, _, _ in RESPONSE_FIELDS:
+        buffers[name][slot, start:stop] = out[name]
+    return stop - start
+
+
+def _score_slice(slot: int, start: int, stop: int, ood_policy: str) -> int:
+    return score_into(_WORKER["buffers"].arrays, slot, start, stop, ood_policy)
+
+
+# ---------------------- EXECUTOR ----------------------
+
+class Batch:
+    """Rows submitted to a ScoringExecutor; result() waits and frees the buffer."""
+
+    def __init__(self, executor, slot: int, n_rows: int, futures: list):
+        self.executor = executor
+        self.slot = slot
+        self.n_rows = n_rows
+        self.futures = futures
+        self._result = None
+
+    def done(self) -> bool:
+        return all(f.done() for f in self.futures)
+
+    def result(self) -> dict:
+        if self._result is None:
+            for f in self.futures:
+                f.result()
+            buffers = self.executor.buffers.arrays
+            self._result = {
+                name: buffers[name][self.slot, : self.n_rows].copy()
+                for name, _, _ in RESPONSE_FIELDS
+            }
+            self.executor._release(self.slot)
+        return self._result
+
+
+class ScoringExecutor:
+    """
+    app.predict_packed on a process pool over shared memory buffers.
+    workers=1 scores in the calling process (same buffers, no pool).
+
+      with ScoringExecutor(workers=4) as ex:
+          out = ex.score(X)              # or: batch = ex.submit(X); ...; batch.result()
+    """
+
+    def __init__(self, workers: int = None, capacity: int = CAPACITY,
+                 slice_rows: int = None, slots: int = SLOTS):
+        self.workers = workers or os.cpu_count()
+        self.capacity = capacity
+        self.slice_rows = slice_rows
+        self.buffers = SharedArrays.create(buffer_layout(slots, capacity))
+        self.free = deque(range(slots))
+        self.pending = deque()
+        self.pool = None
+        share_rows = self.slice_length(capacity)
+        try:
+            if self.workers > 1:
+                self.pool = ProcessPoolExecutor(
+                    self.workers, initializer=_init_worker,
+                    initargs=(self.buffers.spec, share_rows),
+                )
+                # Start every worker (models loaded) before the first batch
+                wait([self.pool.submit(_ready) for _ in range(self.workers)])
+            else:
+                preload_engine(share_rows)
+        except BaseException:
+            self.close()
+            raise
+
+    def submit(self, X: np.ndarray, ood_policy: str = "flag") -> Batch:
+        """Queue up to capacity rows; blocks while every buffer holds an unread batch."""
+        n = len(X)
+        if n > self.capacity:
+            raise ValueError(f"{n} rows exceed the buffer capacity ({self.capacity})")
+        while not self.free:
+            self.pending[0].result()
+        slot = self.free.popleft()
+        self.buffers["X"][slot, :n] = X
+        futures = []
+        step = self.slice_length(n)
+        for start in range(0, n, step):
+            stop = min(n, start + step)
+            if self.pool is None:
+                score_into(self.buffers.arrays, slot, start, stop, ood_policy)
+            else:
+                futures.append(self.pool.submit(_score_slice, slot, start, stop, ood_policy))
+        batch = Batch(self, slot, n, futures)
+        self.pending.append(batch)
+        return batch
+
+    def slice_length(self, n_rows: int) -> int:
+        """Rows per task for a batch of n_rows: slice_rows, or an even share per worker."""
+        if self.slice_rows:
+            return self.slice_rows
+        return max(1, -(-n_rows // self.workers))
+
+    def score(self, X: np.ndarray, ood_policy: str = "flag") -> dict:
+        """predict_packed(X) for any number of rows, one buffer-sized window at a time."""
+        batches = [
+            self.submit(X[start:start + self.capacity], ood_policy)
+            for start in range(0, max(len(X), 1), self.capacity)
+        ]
+        parts = [b.result() for b in batches]
+        return {name: np.concatenate([p[name] for p in parts]) for name, _, _ in RESPONSE_FIELDS}
+
+    def _release(self, slot: int):
+        self.pending = deque(b for b in self.pending if b.slot != slot)
+        self.free.append(slot)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+        if self.buffers.blocks:
+            self.buffers.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------------------- BENCHMARK ----------------------
+
+def _score_pickled(frame: pd.DataFrame, ood_policy: str) -> dict:
+    X = frame[FEATURE_COLS].to_numpy(dtype=np.float64)
+    return load_app().predict_packed(X, ood_policy)
+
+
+def _init_sklearn():
+    from model_bundle import sklearn_models
+
+    _WORKER["sklearn"] = sklearn_models()
+
+
+def _score_sklearn(frame: pd.DataFrame) -> np.ndarray:
+    """Baseline: type, stage times, equipment and cost straight from the joblib estimators."""
+    models = _WORKER["sklearn"]
+    X = frame[FEATURE_COLS]
+    types = models["classifier"].predict(X)
+    cost = np.empty(len(X))
+    for t in np.unique(types):
+        mine = types == t
+        part = X[mine]
+        models[int(t)]["times"].predict(part)
+        models[int(t)]["equipment"].predict(part)
+        cost[mine] = models[int(t)]["cost"].predict(part)
+    return cost
+
+
+def benchmark(rows: int, workers_list: list, chunk_rows: int, seed: int = 0) -> list:
+    from serve import sample_designs
+
+    frame = pd.DataFrame(sample_designs(rows, np.random.default_rng(seed)))
+    frame["heavy_metals"] = frame["heavy_metals"].astype(np.float64)
+    X = frame[FEATURE_COLS].to_numpy(dtype=np.float64)
+    chunks = [frame.iloc[i:i + chunk_rows] for i in range(0, rows, chunk_rows)]
+
+    results = []
+    for workers in workers_list:
+        # Baseline: one even share of the rows per worker, sklearn predict
+        share = -(-rows // workers)
+        with ProcessPoolExecutor(workers, initializer=_init_sklearn) as pool:
+            wait([pool.submit(os.getpid) for _ in range(workers)])
+            t0 = time.perf_counter()
+            parts = list(pool.map(_score_sklearn, [frame.iloc[i:i + share]
+                                                   for i in range(0, rows, share)]))
+            sklearn_s = time.perf_counter() - t0
+        baseline = np.concatenate(parts)
+
+        with ProcessPoolExecutor(workers, initializer=preload_engine,
+                                 initargs=(chunk_rows,)) as pool:
+            wait([pool.submit(_ready) for _ in range(workers)])
+            t0 = time.perf_counter()
+            parts = list(pool.map(_score_pickled, chunks, ["flag"] * len(chunks)))
+            pickled_s = time.perf_counter() - t0
+        pickled = np.concatenate([p["cost"] for p in parts])
+
+        with ScoringExecutor(workers, capacity=chunk_rows) as ex:
+            t0 = time.perf_counter()
+            out = ex.score(X)
+            shared_s = time.perf_counter() - t0
+        # Engines agree to float32 rounding (model_bundle validates 1e-6)
+        for name, cost in (("pickled pool", pickled), ("sklearn baseline", baseline)):
+            if not np.allclose(out["cost"], cost, rtol=1e-6, atol=1e-4):
+                raise AssertionError(f"shared-memory results differ from the {name}")
+
+        row = {
+            "workers": workers,
+            "sklearn_rows_s": round(rows / sklearn_s, 1),
+            "pickled_rows_s": round(rows / pickled_s, 1),
+            "shared_rows_s": round(rows / shared_s, 1),
+        }
+        results.append(row)
+        print(f"  {workers:>2} workers: sklearn {row['sklearn_rows_s']:>10,.1f} rows/s, "
+              f"pickled frames {row['pickled_rows_s']:>10,.1f} rows/s, "
+              f"shared memory {row['shared_rows_s']:>10,.1f} rows/s")
+    base = results[0]["shared_rows_s"] / results[0]["workers"]
+    for row in results:
+        row["shared_efficiency"] = round(row["shared_rows_s"] / (base * row["workers"]), 3)
+        row["shared_vs_sklearn"] = round(row["shared_rows_s"] / row["sklearn_rows_s"], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared-memory process-pool scoring")
+    parser.add_argument("--benchmark", action="store_true")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[os.cpu_count()])
+    parser.add_argument("--chunk-rows", type=int, default=CAPACITY)
+    args = parser.parse_args()
+    if not args.benchmark:
+        parser.error("nothing to do (library module; see --benchmark)")
+
+    print(f"Scoring {args.rows} rows, {os.cpu_count()} CPUs")
+    for row in benchmark(args.rows, args.workers, args.chunk_rows):
+        print(f"  {row['workers']:>2} workers: scaling efficiency {row['shared_efficiency']:.2f}, "
+              f"{row['shared_vs_sklearn']:.2f}x the sklearn baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Single-flight call coalescing for the ML service.
+
+Under a burst, many identical requests (same feature vector, same query
+options) arrive while the first one is still being scored. SingleFlight
+lets the first caller for a key run the computation; every caller that
+arrives with the same key before it finishes waits for that result
+instead of walking the forests again. Keys are forgotten as soon as the
+call completes, so nothing is cached beyond the in-flight window.
+
+Results are shared between the callers – treat them as read-only.
+"""
+
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, fn, *args):
+        """fn(*args), or the result of the identical call already running."""
+        with self._lock:
+            fut = self._calls.get(key)
+            leader = fut is None
+            if leader:
+                fut = Future()
+                self._calls[key] = fut
+                self.calls += 1
+            else:
+                self.shared += 1
+        if not leader:
+            return fut.result()
+
+        try:
+            result = fn(*args)
+        except BaseException as exc:
+            fut.set_exception(exc)
+            raise
+        else:
+            fut.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "shared": self.shared, "in_flight": len(self._calls)}
@@ -1,119 +1,13 @@
 import joblib
 import pandas as pd
 
-# Same feature order as during training
-FEATURE_COLS = [
-    "pH",
-    "TDS_mgL",
-    "turbidity_NTU",
-    "BOD_mgL",
-    "COD_mgL",
-    "total_nitrogen_mgL",
-    "temperature_C",
-    "flow_m3_day",
-    "heavy_metals",
-]
-
-
-# ----------------- Helpers: column maps per type -----------------
-
-TIME_COLS_BY_TYPE = {
-    1: [
-        "t_screening_min",
-        "t_coag_floc_min",
-        "t_sedimentation_min",
-        "t_filtration_min",
-        "t_carbon_polishing_min",
-        "t_disinfection_min",
-    ],
-    2: [
-        "t_screening_min",
-        "t_oil_grease_min",
-        "t_equalization_min",
-        "t_coag_floc_min",
-        "t_primary_clarifier_min",
-        "t_aeration_min",
-        "t_secondary_clarifier_min",
-        "t_filtration_min",
-        "t_disinfection_min",
-    ],
-    3: [
-        "t_screening_min",
-        "t_grit_chamber_min",
-        "t_equalization_min",
-        "t_biological_reactor_min",
-        "t_mbr_min",
-        "t_activated_carbon_min",
-        "t_disinfection_min",
-    ],
-    4: [
-        "t_screening_min",
-        "t_neutralization_min",
-        "t_precipitation_min",
-        "t_heavy_metal_removal_min",
-        "t_filter_press_min",
-        "t_carbon_filter_min",
-        "t_ro_min",
-    ],
-    5: [
-        "t_screening_min",
-        "t_anaerobic_reactor_min",
-        "t_biogas_handling_min",
-        "t_aeration_min",
-        "t_secondary_clarifier_min",
-        "t_sludge_handling_min",
-        "t_tertiary_filtration_min",
-    ],
-}
-
-EQUIP_COLS_BY_TYPE = {
-    1: [
-        "equip_screening",
-        "equip_coag_floc",
-        "equip_sedimentation",
-        "equip_filtration",
-        "equip_carbon_polishing",
-        "equip_disinfection",
-    ],
-    2: [
-        "equip_screening",
-        "equip_oil_grease",
-        "equip_equalization",
-        "equip_coag_floc",
-        "equip_primary_clarifier",
-        "equip_aeration",
-        "equip_secondary_clarifier",
-        "equip_filtration",
-        "equip_disinfection",
-    ],
-    3: [
-        "equip_screening",
-        "equip_grit_chamber",
-        "equip_equalization",
-        "equip_biological_reactor",
-        "equip_mbr",
-        "equip_activated_carbon",
-        "equip_disinfection",
-    ],
-    4: [
-        "equip_screening",
-        "equip_neutralization",
-        "equip_precipitation",
-        "equip_heavy_metal_removal",
-        "equip_filter_press",
-        "equip_carbon_filter",
-        "equip_ro",
-    ],
-    5: [
-        "equip_screening",
-        "equip_anaerobic_reactor",
-        "equip_biogas_handling",
-        "equip_aeration",
-        "equip_secondary_clarifier",
-        "equip_sludge_handling",
-        "equip_tertiary_filtration",
-    ],
-}
+from plant_schema import (
+    FEATURE_COLS,
+    TIME_COLS_BY_TYPE,
+    EQUIP_COLS_BY_TYPE,
+    equipment_labels,
+    load_equipment_vocab,
+)
 
 
 def load_models_for_type(type_id: int):
@@ -158,14 +52,16 @@ def predict_design(sample: dict):
 
     # 4) Predict equipment
     equip_cols = EQUIP_COLS_BY_TYPE[predicted_type]
-    equip_pred = equip_model.predict(X)[0]  # list/array of labels
+    equip_pred = equip_model.predict(X)  # integer codes (or labels for old models)
+    label_table = load_equipment_vocab()["tables"][predicted_type]
+    equip_labels = equipment_labels(predicted_type, equip_pred, label_table)[0]
 
     # 5) Predict cost per m3
     cost_per_m3 = float(cost_model.predict(X)[0])
 
     # Pack results nicely
     stage_times = {col: float(val) for col, val in zip(time_cols, times_pred)}
-    stage_equipment = {col: str(val) for col, val in zip(equip_cols, equip_pred)}
+    stage_equipment = {col: str(val) for col, val in zip(equip_cols, equip_labels)}
 
     return {
         "predicted_type": predicted_type,
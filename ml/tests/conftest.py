@@ -0,0 +1,73 @@
+import os
+import sys
+
+import pytest
+
+
+ML_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ML_DIR)
+
+# Fixture models: every forest of train_all_models.py, FIXTURE_TREES trees each,
+# fitted on FIXTURE_ROWS generated rows per type (fixed seeds)
+FIXTURE_ROWS = 150
+FIXTURE_TREES = 8
+
+
+@pytest.fixture(scope="session", autouse=True)
+def ml_cwd():
+    """The ml/ scripts read models and CSVs relative to ml/."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(ML_DIR)
+        yield
+
+
+def build_fixture_models(path: str):
+    """
+    In path: generated CSVs, trained models, model_bundle.bin, models.pack and
+    the golden recording (what train_all_models.py, model_bundle.py,
+    model_pack.py and golden.py --record write), small enough to build per run.
+    """
+    import pandas as pd
+
+    import golden
+    import train_all_models
+    from model_bundle import build_bundle
+    from model_pack import build_pack
+    from plant_schema import ALL_TYPES_CSV, CSV_BY_TYPE, TYPE_IDS
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(path)
+        gen = golden.load_generators()
+        frames = [
+            getattr(gen, f"generate_type{t}")(n_samples=FIXTURE_ROWS, random_state=t)
+            for t in TYPE_IDS
+        ]
+        for t, df in zip(TYPE_IDS, frames):
+            df.to_csv(CSV_BY_TYPE[t], index=False)
+        pd.concat(frames, ignore_index=True).to_csv(ALL_TYPES_CSV, index=False)
+        train_all_models.train_all(n_estimators=FIXTURE_TREES)
+        build_bundle()
+        build_pack()
+        golden.record()
+
+
+@pytest.fixture(scope="session")
+def models_dir(tmp_path_factory, ml_cwd):
+    """
+    Directory with trained models: ML_TEST_MODELS if set (e.g. ML_TEST_MODELS=.
+    for the real ones in ml/), otherwise fixture models built once per session.
+    """
+    given = os.environ.get("ML_TEST_MODELS")
+    if given:
+        return os.path.abspath(given)
+    path = str(tmp_path_factory.mktemp("models"))
+    build_fixture_models(path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def models_cwd(models_dir):
+    """Run a test module inside models_dir (app.py and friends load models from the cwd)."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(models_dir)
+        yield models_dir
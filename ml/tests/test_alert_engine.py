@@ -0,0 +1,101 @@
+"""
+Hysteresis of the alert engine and the Alert documents it writes.
+"""
+
+from datetime import datetime, timezone
+import time
+
+import numpy as np
+import pytest
+
+from alert_engine import AlertEngine, batch_from_records, insert_alerts
+
+
+class Location:
+    """Stand-in for a bson ObjectId: not a str, stringifies to its hex id."""
+
+    def __init__(self, hex_id):
+        self.hex_id = hex_id
+
+    def __str__(self):
+        return self.hex_id
+
+
+class Collection:
+    def __init__(self):
+        self.docs = []
+
+    def insert_many(self, docs, ordered=True):
+        self.docs.extend(docs)
+
+
+def readings(location, values, t0=0.0):
+    return [
+        {"location": location, "turbidity": v, "createdAt": t0 + i}
+        for i, v in enumerate(values)
+    ]
+
+
+def turbidity_alerts(alerts):
+    return [a for a in alerts if a["rule"] == "turbidity_high"]
+
+
+def test_alert_only_on_trip_edge_with_hysteresis():
+    # turbidity_high: trips above 5.0, clears at or below 4.5
+    engine = AlertEngine()
+    loc = Location("65f0c0ffee0000000000aaaa")
+    alerts = engine.evaluate_records(readings(loc, [3.0, 6.0, 7.0, 4.8, 6.5, 4.5, 5.5]))
+    assert [a["readingTimestamp"] for a in turbidity_alerts(alerts)] == [1.0, 6.0]
+    assert engine.active_alerts() == {loc: ["turbidity_high"]}
+
+
+def test_active_state_carries_between_batches():
+    engine = AlertEngine()
+    loc = Location("65f0c0ffee0000000000bbbb")
+    assert len(turbidity_alerts(engine.evaluate_records(readings(loc, [6.0])))) == 1
+    # Still above the clear threshold: no new alert in the next batch
+    assert turbidity_alerts(engine.evaluate_records(readings(loc, [4.9, 8.0], t0=1))) == []
+    assert turbidity_alerts(engine.evaluate_records(readings(loc, [4.0], t0=3))) == []
+    assert len(turbidity_alerts(engine.evaluate_records(readings(loc, [9.0], t0=4)))) == 1
+
+
+def test_reading_without_timestamp_is_dropped():
+    loc = Location("65f0c0ffee0000000000cccc")
+    records = readings(loc, [3.0, 3.0]) + [{"location": loc, "turbidity": 9.0, "createdAt": None}]
+    batch = batch_from_records(records)
+    assert np.isnan(batch["timestamp"][-1])
+    engine = AlertEngine()
+    assert turbidity_alerts(engine.evaluate(batch)) == []
+    assert engine.active_alerts() == {}
+
+
+@pytest.fixture
+def local_tz_ist():
+    """A local timezone other than UTC, so naive datetimes read as local time differ."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv("TZ", "Asia/Kolkata")
+        time.tzset()
+        yield
+    time.tzset()
+
+
+def test_naive_mongo_datetimes_are_utc(local_tz_ist):
+    aware = datetime(2024, 3, 1, 6, 30, tzinfo=timezone.utc)
+    records = [{"location": "a", "createdAt": aware},
+               {"location": "a", "createdAt": aware.replace(tzinfo=None)},
+               {"location": "a", "createdAt": aware.timestamp()}]
+    assert batch_from_records(records)["timestamp"].tolist() == [aware.timestamp()] * 3
+
+
+def test_inserted_alerts_keep_location_and_timestamps():
+    loc = Location("65f0c0ffee0000000000dddd")
+    alerts = AlertEngine().evaluate_records(readings(loc, [9.0]))
+    collection = Collection()
+    before = datetime.now(timezone.utc)
+    assert insert_alerts(collection, alerts) == len(alerts) == 1
+    (doc,) = collection.docs
+    assert doc["location"] is loc
+    assert doc["createdAt"] == doc["updatedAt"]
+    assert doc["createdAt"] >= before
+    assert set(doc) == {"location", "severity", "type", "message", "acknowledged",
+                        "createdAt", "updatedAt"}
@@ -0,0 +1,61 @@
+"""
+The columnar JSON layout on the models_dir models decodes to the row
+layout's designs, duplicates included.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from columnar import encode_json, expand_duplicates
+from plant_schema import FEATURE_COLS
+from shared_scoring import load_app
+
+ROWS = 200
+
+
+@pytest.fixture(scope="module")
+def app(models_cwd):
+    return load_app()
+
+
+def decode(doc: dict) -> list:
+    """The row-layout fields of every input row, from a columnar JSON document."""
+    groups = {g["predicted_type"]: g for g in doc["groups"]}
+    seen = dict.fromkeys(groups, 0)
+    rows = []
+    for t in doc["predicted_type"]:
+        g, j = groups[t], seen[t]
+        seen[t] += 1
+        rows.append({
+            "predicted_type": t,
+            "stage_times_min": {c: v[j] for c, v in g["stage_times_min"].items()},
+            "stage_equipment": {
+                c: e["dictionary"][e["index"][j]] for c, e in g["stage_equipment"].items()
+            },
+            "cost_per_m3_inr": g["cost_per_m3_inr"][j],
+        })
+    return rows
+
+
+@pytest.mark.parametrize("duplicates", [False, True])
+def test_json_decodes_to_the_row_layout(app, duplicates):
+    from serve import sample_designs
+
+    X = pd.DataFrame(sample_designs(ROWS, np.random.default_rng(5)))[FEATURE_COLS]
+    X = X.to_numpy(dtype=np.float64)
+    if duplicates:
+        X = np.concatenate([X, X[::3]])
+    unique, inverse = np.unique(X, axis=0, return_inverse=True)
+    groups = expand_duplicates(app.predict_columnar(unique), inverse.reshape(-1))
+    got = decode(json.loads(encode_json(groups, len(X), "labels")))
+
+    want = app.predict_designs(X)
+    assert len(got) == len(want)
+    for g, w in zip(got, want):
+        assert g["predicted_type"] == w["predicted_type"]
+        assert g["stage_equipment"] == w["stage_equipment"]
+        assert g["stage_times_min"] == pytest.approx(w["stage_times_min"], abs=0.011)
+        assert g["cost_per_m3_inr"] == pytest.approx(w["cost_per_m3_inr"], abs=0.011)
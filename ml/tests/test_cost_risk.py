@@ -0,0 +1,65 @@
+"""
+Monte Carlo cost risk on the models_dir models: results depend only on the
+seed and chunk size, not on the number of workers, and switching the cost
+engine within one process switches the models.
+"""
+
+import numpy as np
+import pytest
+
+import cost_risk
+import cost_surrogate
+from plant_schema import FEATURE_COLS
+
+N = 1500
+CHUNK = 400     # 4 chunks, the last one partial
+
+
+@pytest.fixture(scope="module")
+def runs(models_cwd):
+    return {
+        workers: cost_risk.run(cost_risk.EXAMPLE_SITE, N, seed=3, workers=workers, chunk=CHUNK)
+        for workers in (1, 2, 3)
+    }
+
+
+def strip(out):
+    return {k: v for k, v in out.items() if k not in ("elapsed_s", "workers")}
+
+
+@pytest.mark.parametrize("workers", [2, 3])
+def test_results_do_not_depend_on_workers(runs, workers):
+    assert strip(runs[workers]) == strip(runs[1])
+
+
+def test_seed_and_chunk_define_the_scenarios():
+    site = np.array([float(cost_risk.EXAMPLE_SITE[c]) for c in FEATURE_COLS])
+    a = cost_risk.sample_scenarios(site, 1, 100, 0.1, np.random.default_rng([3, 2]))
+    b = cost_risk.sample_scenarios(site, 1, 100, 0.1, np.random.default_rng([3, 2]))
+    np.testing.assert_array_equal(a, b)
+    assert (a[:, cost_risk.HEAVY_METALS] == site[cost_risk.HEAVY_METALS]).all()
+    assert ((a >= cost_risk.DOMAIN[:, 0]) & (a <= cost_risk.DOMAIN[:, 1])).all()
+
+
+def test_report_counts_every_scenario(runs):
+    out = runs[1]
+    assert out["scenarios"] == N
+    assert sum(out["type_shares"].values()) == pytest.approx(1.0, abs=1e-4)
+    dist = out["cost_per_m3_inr"]
+    assert dist["p5"] <= dist["p50"] <= dist["p95"] <= dist["p99"]
+
+
+def test_switching_cost_engine_reloads_models(runs, tmp_path, monkeypatch):
+    out = str(tmp_path / "cost_lut")
+    cost_surrogate.build_all(out, budget=1 << 10)
+    load_cost_tables = cost_surrogate.load_cost_tables
+    monkeypatch.setattr(cost_surrogate, "load_cost_tables",
+                        lambda: load_cost_tables(out, include_unfit=True))
+
+    lut = cost_risk.run(cost_risk.EXAMPLE_SITE, N, seed=3, workers=1, chunk=CHUNK,
+                        cost_engine="lut")
+    assert lut["cost_engine"] == "lut" and lut["cost_lut_unfit_types"] == []
+    assert lut["cost_per_m3_inr"] != runs[1]["cost_per_m3_inr"]
+
+    forest = cost_risk.run(cost_risk.EXAMPLE_SITE, N, seed=3, workers=1, chunk=CHUNK)
+    assert strip(forest) == strip(runs[1])
@@ -0,0 +1,74 @@
+"""
+The cost lookup tables against the cost forests they replace, built on the
+models_dir models with a small grid budget.
+"""
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+import cost_surrogate
+from plant_schema import CSV_BY_TYPE, FEATURE_COLS, TYPE_IDS
+
+
+BUDGET = 1 << 12
+
+
+@pytest.fixture(scope="module")
+def built(models_cwd, tmp_path_factory):
+    out = str(tmp_path_factory.mktemp("cost_lut"))
+    return out, cost_surrogate.build_all(out, budget=BUDGET)
+
+
+def training_rows(type_id):
+    return pd.read_csv(CSV_BY_TYPE[type_id])[FEATURE_COLS].to_numpy(dtype=np.float64)
+
+
+@pytest.mark.parametrize("type_id", TYPE_IDS)
+def test_fit_flag_matches_error_against_forest(built, type_id):
+    out, meta = built
+    entry = meta["types"][str(type_id)]
+    table = cost_surrogate.CostTable.from_entry(entry, out)
+    model = joblib.load(entry["model"])
+    X = training_rows(type_id)
+    err = np.abs(table.lookup(X) - cost_surrogate.forest_cost(model, X))
+    assert err.max() == pytest.approx(entry["error"]["training_rows"]["max_abs"], abs=1e-3)
+    within = (np.percentile(err, 99) <= cost_surrogate.MAX_P99_ERROR + 1e-3
+              and err.max() <= cost_surrogate.MAX_ABS_ERROR + 1e-3)
+    if entry["fit_for_lut"]:
+        assert within and entry["unfit"] == []
+    else:
+        assert entry["unfit"]
+
+
+def test_unfit_tables_are_not_loaded(built):
+    out, meta = built
+    fit = sorted(int(t) for t, entry in meta["types"].items() if entry["fit_for_lut"])
+    assert sorted(cost_surrogate.load_cost_tables(out)) == fit
+    assert sorted(cost_surrogate.load_cost_tables(out, include_unfit=True)) == TYPE_IDS
+
+
+@pytest.mark.parametrize("type_id", TYPE_IDS)
+def test_refinement_fills_the_budget(built, type_id):
+    # Refinement stops only when every axis is within tolerance or cannot grow
+    _, meta = built
+    entry = meta["types"][str(type_id)]
+    knots = [ax["knots"] for ax in entry["axes"]]
+    assert entry["grid_points"] == np.prod(knots) <= BUDGET
+    for ax, n in zip(entry["axes"], knots):
+        if ax["hi"] > ax["lo"] and entry["midpoint_error"][ax["feature"]] > cost_surrogate.TOLERANCE:
+            assert entry["grid_points"] // n * (n + 1) > BUDGET, ax["feature"]
+
+
+def test_knots_reproduce_the_forest(built):
+    out, meta = built
+    entry = meta["types"][str(TYPE_IDS[0])]
+    table = cost_surrogate.CostTable.from_entry(entry, out)
+    lo, hi = np.zeros(len(FEATURE_COLS)), np.zeros(len(FEATURE_COLS))
+    knots = {}
+    for a, ax in zip(table.axes, entry["axes"]):
+        lo[a], hi[a], knots[a] = ax["lo"], ax["hi"], ax["knots"]
+    X = cost_surrogate.grid_points(table.axes, lo, hi, knots, table.fixed)
+    model = joblib.load(entry["model"])
+    np.testing.assert_allclose(table.lookup(X), cost_surrogate.forest_cost(model, X), rtol=1e-6)
@@ -0,0 +1,64 @@
+"""
+Pareto ranking of the design optimizer, and the Pareto set it returns for a
+site on the models_dir models.
+"""
+
+import numpy as np
+import pytest
+
+import design_optimizer
+from design_optimizer import DesignEvaluator, dominates, front_ranks, optimize, pareto_mask
+from plant_schema import FEATURE_COLS
+
+
+CAP = 700.0     # t_aeration_min cap (generator range 120-960 min)
+
+
+def test_fronts_are_non_dominated_and_ordered():
+    rng = np.random.default_rng(0)
+    F = np.round(rng.random((300, 2)), 2)    # ties included
+    D = dominates(F)
+    rank = front_ranks(F)
+    np.testing.assert_array_equal(rank == 0, pareto_mask(F))
+    for r in np.unique(rank):
+        members = rank == r
+        assert not D[np.ix_(members, members)].any()
+        if r > 0:
+            # Every row of front r is dominated by some row of front r - 1
+            assert D[np.ix_(rank == r - 1, members)].any(axis=0).all()
+
+
+@pytest.fixture(scope="module")
+def result(models_cwd):
+    evaluator = DesignEvaluator(2, n_jobs=1)
+    bounds = {"TDS_mgL": (300.0, 1200.0), "BOD_mgL": (50.0, 300.0)}
+    out = optimize(design_optimizer.EXAMPLE_SITE, bounds, type_id=2,
+                   stage_caps={"t_aeration_min": CAP}, population=32, max_generations=5,
+                   budget_s=60.0, evaluator=evaluator)
+    return out, bounds, evaluator
+
+
+def test_pareto_set_is_feasible_and_non_dominated(result):
+    out, bounds, _ = result
+    assert out["pareto"]
+    F = np.array([[p["cost_per_m3_inr"], p["total_time_min"]] for p in out["pareto"]])
+    # Reported values are rounded to 0.01: only a clearer margin is dominance
+    better = (F[:, None, :] <= F[None, :, :]).all(axis=2)
+    clearly = (F[:, None, :] < F[None, :, :] - 0.01).any(axis=2)
+    assert not (better & clearly).any()
+    for p in out["pareto"]:
+        assert p["stage_times_min"]["t_aeration_min"] <= CAP
+        for col, (lo, hi) in bounds.items():
+            assert lo <= p["inputs"][col] <= hi
+
+
+def test_pareto_points_score_as_reported(result):
+    out, _, evaluator = result
+    X = np.repeat([[float(design_optimizer.EXAMPLE_SITE[c]) for c in FEATURE_COLS]],
+                  len(out["pareto"]), axis=0)
+    for col in out["decision_variables"]:
+        X[:, FEATURE_COLS.index(col)] = [p["inputs"][col] for p in out["pareto"]]
+    times, cost = evaluator(X)
+    np.testing.assert_allclose(cost, [p["cost_per_m3_inr"] for p in out["pareto"]], atol=0.006)
+    np.testing.assert_allclose(times.sum(axis=1), [p["total_time_min"] for p in out["pareto"]],
+                               atol=0.006)
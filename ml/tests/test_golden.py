@@ -0,0 +1,62 @@
+"""
+Every prediction engine against the golden outputs of the reference
+sklearn path (test_prediction.predict_design), on the models of the
+models_dir fixture (small fixed-seed ones unless ML_TEST_MODELS is set).
+Throughput floors are machine-specific and only checked with GOLDEN_FLOORS=1.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+import golden
+
+
+@pytest.fixture(scope="module")
+def reference(models_cwd):
+    if not golden.models_available():
+        pytest.skip("models not trained: python train_all_models.py")
+    if not os.path.exists(golden.REFERENCE_PATH):
+        pytest.skip("no golden outputs: python golden.py --record")
+    ref = golden.load_reference()
+    if ref["models"] != golden.model_fingerprint():
+        pytest.fail("models changed since the golden outputs were recorded: "
+                    "python golden.py --record")
+    return ref
+
+
+@pytest.fixture(scope="module", params=golden.ENGINE_NAMES)
+def engine(request, reference):
+    made = golden.make_engine(request.param)
+    if made is None:
+        pytest.skip(f"{request.param}: artifact missing")
+    return request.param, made
+
+
+def test_corpus_is_reproducible(reference):
+    X = golden.make_corpus(reference["seed"], reference["rows_per_type"])
+    np.testing.assert_array_equal(X, reference["X"])
+
+
+def test_reference_path_matches_batch_predict(reference):
+    # Row-at-a-time reference vs the models' own batch predict()
+    got = golden.batch_reference(reference["X"])
+    assert golden.compare(reference["expected"], got, atol=1e-9, rtol=1e-12) == []
+
+
+def test_engine_matches_golden(engine, reference):
+    name, (predict, atol, rtol) = engine
+    errors = golden.compare(reference["expected"], predict(reference["X"]), atol, rtol)
+    assert not errors, f"{name}:\n" + "\n".join(errors)
+
+
+@pytest.mark.skipif(not os.environ.get("GOLDEN_FLOORS"),
+                    reason="throughput floors are machine-specific: GOLDEN_FLOORS=1")
+def test_engine_throughput_floor(engine, reference):
+    name, (predict, _, _) = engine
+    floor = golden.load_floors().get(name, {}).get("floor_rows_s")
+    if floor is None:
+        pytest.skip(f"{name}: no recorded floor")
+    rows_s = golden.throughput(predict, reference["X"])
+    assert rows_s >= floor, f"{name}: {rows_s:.1f} rows/s < floor {floor}"
@@ -0,0 +1,60 @@
+"""
+Water and tracer mass balance of the tanks-in-series simulation, and the
+residence time distribution against the design detention time.
+"""
+
+import numpy as np
+import pytest
+
+from hydraulic_sim import (
+    DT_MIN,
+    EQ_START_FILL,
+    build_network,
+    monte_carlo_influent,
+    residence_time_distribution,
+    simulate,
+)
+from plant_schema import TIME_BOUNDS_BY_TYPE
+
+FLOW = 1000.0
+
+
+def mid_times(type_id):
+    return TIME_BOUNDS_BY_TYPE[type_id].mean(axis=1)
+
+
+@pytest.mark.parametrize("type_id,tanks", [(1, 1), (2, 2), (3, 3)])
+def test_tracer_mass_balance(type_id, tanks):
+    net = build_network(type_id, mid_times(type_id), FLOW, tanks)
+    q, c = monte_carlo_influent(net["q_design"][0], 1.0, 20, spike=(2.0, 3.0), seed=1)
+    res = simulate(net, q, c, record_every=1)
+
+    water_in = q.sum(axis=1) * DT_MIN
+    water_out = res["effluent_q"].sum(axis=1) * DT_MIN
+    volume = np.repeat(net["volume"], len(q), axis=0)
+    eq = net["equalization"]
+    # Only the equalization buffer changes volume (assumes at most one)
+    volume[:, eq] = EQ_START_FILL * volume[:, eq] + (water_in - water_out)[:, None]
+
+    mass_in = (q * c).sum(axis=1) * DT_MIN
+    mass_out = (res["effluent_q"] * res["effluent_c"]).sum(axis=1) * DT_MIN
+    stored = (volume * res["final_c"]).sum(axis=1)
+    np.testing.assert_allclose(mass_out + stored, mass_in, rtol=1e-9)
+
+
+def test_decay_removes_mass():
+    net = build_network(1, mid_times(1), FLOW)
+    q = np.full((1, 2000), net["q_design"][0])
+    c = np.full((1, 2000), 50.0)
+    tracer = simulate(net, q, c, record_every=100)
+    decayed = simulate(net, q, c, record_every=100, decay_per_min={"sedimentation": 0.01})
+    assert tracer["effluent_c"][0, -1] == pytest.approx(50.0, rel=1e-4)
+    assert decayed["effluent_c"][0, -1] < 0.9 * tracer["effluent_c"][0, -1]
+
+
+@pytest.mark.parametrize("tanks", [1, 4])
+def test_mean_residence_time_is_design_time(tanks):
+    net = build_network(1, mid_times(1), FLOW, tanks)
+    rtd = residence_time_distribution(net)
+    np.testing.assert_allclose(rtd["mean_min"], rtd["design_total_min"], rtol=0.01)
+    assert rtd["t10_min"][0] < rtd["t50_min"][0] < rtd["t90_min"][0]
@@ -0,0 +1,92 @@
+"""
+Incremental retraining on a copy of the models_dir models: appended rows are
+detected against train_state.json, applied once, and a rejected update stays
+pending for the next run.
+"""
+
+import shutil
+
+import pandas as pd
+import pytest
+
+import golden
+import incremental_train
+from plant_schema import CSV_BY_TYPE
+
+
+def run_once(max_regression=1.0):
+    return incremental_train.run_once(min_new_trees=2, max_trees=20,
+                                      max_regression=max_regression)
+
+
+@pytest.fixture
+def workdir(models_dir, tmp_path, monkeypatch):
+    path = tmp_path / "models"
+    shutil.copytree(models_dir, path)
+    monkeypatch.chdir(path)
+    incremental_train.save_state(incremental_train.initial_state())
+    return path
+
+
+def append_rows(type_id, n=30, seed=99):
+    gen = golden.load_generators()
+    rows = getattr(gen, f"generate_type{type_id}")(n_samples=n, random_state=seed)
+    columns = pd.read_csv(CSV_BY_TYPE[type_id], nrows=0).columns
+    rows[columns].to_csv(CSV_BY_TYPE[type_id], mode="a", header=False, index=False)
+
+
+def changes():
+    state = incremental_train.load_state()
+    return {k: c for k, (c, _) in incremental_train.detect_changes(state).items()}
+
+
+def test_appended_rows_are_applied_once(workdir):
+    before = incremental_train.load_state()["sources"]["1"]
+    append_rows(1)
+    assert changes() == {"classifier": "unchanged", "1": "appended", "2": "unchanged",
+                         "3": "unchanged", "4": "unchanged", "5": "unchanged"}
+
+    results = run_once()
+    assert list(results) == ["1"] and results["1"]["status"] == "updated"
+    after = incremental_train.load_state()
+    assert after["sources"]["1"]["rows"] == before["rows"] + 30
+    assert after["sources"]["1"]["holdout"] == before["holdout"]
+    assert len(after["history"]) == 1
+    # Resuming from the saved state finds nothing left to do
+    assert set(changes().values()) == {"unchanged"}
+    assert run_once() == {}
+
+
+def test_rejected_update_stays_pending(workdir):
+    append_rows(2)
+    models = {p: p.read_bytes() for p in workdir.glob("model_type2_*.joblib")}
+    # A limit no holdout score can meet: every model update is rejected
+    results = run_once(max_regression=-10.0)
+    assert results["2"]["status"] == "rejected"
+    assert {p: p.read_bytes() for p in models} == models
+    assert changes()["2"] == "appended"
+    assert run_once()["2"]["status"] == "updated"
+    assert changes()["2"] == "unchanged"
+
+
+def test_one_rejected_model_keeps_the_whole_type_pending(workdir, monkeypatch):
+    append_rows(2)
+    models = {p: p.read_bytes() for p in workdir.glob("model_type2_*.joblib")}
+    accept = incremental_train.accept
+    monkeypatch.setattr(incremental_train, "accept",
+                        lambda name, *a: "cost" not in name and accept(name, *a))
+    results = run_once()
+    assert results["2"]["status"] == "rejected" and results["2"]["rejected"] == ["cost"]
+    assert {p: p.read_bytes() for p in models} == models
+    assert changes()["2"] == "appended"
+    monkeypatch.setattr(incremental_train, "accept", accept)
+    assert run_once()["2"]["status"] == "updated"
+    assert all(p.read_bytes() != old for p, old in models.items())
+    assert changes()["2"] == "unchanged"
+
+
+def test_edited_rows_are_a_rewrite(workdir):
+    df = pd.read_csv(CSV_BY_TYPE[3])
+    df.loc[0, "pH"] += 0.5
+    df.to_csv(CSV_BY_TYPE[3], index=False)
+    assert changes()["3"] == "rewritten"
@@ -0,0 +1,76 @@
+"""
+Portfolio scoring on the models_dir models: a run interrupted after some
+chunks resumes from its part files and ends with the same table as an
+uninterrupted run.
+"""
+
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import portfolio
+from plant_schema import ALL_TYPES_CSV, FEATURE_COLS
+
+CHUNK_ROWS = 25
+
+
+@pytest.fixture(scope="module")
+def sites(models_cwd, tmp_path_factory):
+    df = pd.read_csv(ALL_TYPES_CSV)[FEATURE_COLS].sample(110, random_state=0)
+    df.insert(0, "site_id", [f"S{i:04d}" for i in range(len(df))])
+    df = df.astype({"TDS_mgL": object})
+    df.loc[df.index[7], "TDS_mgL"] = "n/a"
+    path = str(tmp_path_factory.mktemp("portfolio") / "sites.csv")
+    df.to_csv(path, index=False)
+    return path
+
+
+def run(sites, out, **options):
+    return portfolio.run(sites, str(out), fmt="csv", chunk_rows=CHUNK_ROWS, workers=1,
+                         keep=["site_id"], **options)
+
+
+def read_parts(out):
+    parts = sorted(glob.glob(os.path.join(out, "part-*.csv")))
+    return pd.concat([pd.read_csv(p) for p in parts], ignore_index=True)
+
+
+def test_interrupted_run_resumes(sites, tmp_path, monkeypatch):
+    full = run(sites, tmp_path / "full")
+    assert full["chunks"] == 5 and full["rows"] == 110 and full["invalid"] == 1
+
+    write_part = portfolio.write_part
+    written = []
+
+    def crash_after_two(res, path, fmt):
+        if len(written) == 2:
+            raise KeyboardInterrupt
+        write_part(res, path, fmt)
+        written.append(path)
+
+    monkeypatch.setattr(portfolio, "write_part", crash_after_two)
+    out = tmp_path / "resumed"
+    with pytest.raises(KeyboardInterrupt):
+        run(sites, out)
+    monkeypatch.undo()
+    assert len(glob.glob(str(out / "part-*.csv"))) == 2
+    assert not glob.glob(str(out / ".part-*"))
+
+    resumed = run(sites, out)
+    assert resumed["skipped"] == 2 and resumed["chunks"] == 3
+    pd.testing.assert_frame_equal(read_parts(out), read_parts(tmp_path / "full"))
+    table = read_parts(out)
+    np.testing.assert_array_equal(table["row"], np.arange(110))
+    assert not table["valid"][7] and table["valid"].sum() == 109
+
+
+def test_resume_refuses_other_settings(sites, tmp_path):
+    out = tmp_path / "out"
+    run(sites, out)
+    with pytest.raises(SystemExit):
+        run(sites, out, ood_policy="rules")
+    restarted = run(sites, out, ood_policy="rules", restart=True)
+    assert restarted["skipped"] == 0 and restarted["chunks"] == 5
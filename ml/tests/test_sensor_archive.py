@@ -0,0 +1,105 @@
+"""
+Sensor archive round trips: delta/float32/dictionary encoding, the rollup
+levels against the raw readings, level choice and crash-safe chunk rewrites.
+"""
+
+import numpy as np
+import pytest
+
+import sensor_archive
+from alert_engine import NUMERIC_FIELDS
+from sensor_archive import DAY_S, ENUM_FIELDS, SensorArchive, columns_from_records
+
+T0 = 1.7e9
+
+
+def make_columns(n, step_s=10.0, t0=T0, seed=0):
+    rng = np.random.default_rng(seed)
+    cols = {
+        "location": np.array(["site"] * n, dtype=object),
+        "ts": t0 + np.arange(n) * step_s,
+    }
+    for field in NUMERIC_FIELDS:
+        cols[field] = rng.normal(10.0, 2.0, n)
+    cols["ph"][::7] = np.nan
+    for field, vocab in ENUM_FIELDS.items():
+        cols[field] = rng.integers(0, len(vocab), n).astype(np.uint8)
+    return cols
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return SensorArchive(str(tmp_path))
+
+
+def test_records_round_trip_through_raw_level(archive):
+    records = [
+        {"location": "a1", "createdAt": T0 + 0.5, "ph": 7.1, "turbidity": 2.0,
+         "sourceType": "tank", "recoveryUnitStatus": "RUNNING"},
+        {"location": "a1", "createdAt": T0 + 3.25, "ph": None, "turbidity": 3.5,
+         "sourceType": "lake", "recoveryUnitStatus": "IDLE"},
+    ]
+    archive.append(columns_from_records(records))
+    res = archive.query("a1", T0, T0 + 60, level="raw", fields=["ph", "turbidity", "sourceType"])
+    np.testing.assert_array_equal(res["ts"], [T0 + 0.5, T0 + 3.25])
+    np.testing.assert_array_equal(res["ph"], np.array([7.1, np.nan], dtype=np.float32))
+    np.testing.assert_array_equal(res["turbidity"], np.array([2.0, 3.5], dtype=np.float32))
+    assert list(archive.decode_enum("sourceType", res["sourceType"])) == ["tank", "unknown"]
+
+
+def test_same_millisecond_is_replaced(archive):
+    cols = make_columns(100)
+    archive.append(cols)
+    update = {k: v[40:60].copy() for k, v in cols.items()}
+    update["turbidity"][:] = -1.0
+    archive.append(update)
+    res = archive.query("site", T0, T0 + DAY_S, level="raw", fields=["turbidity"])
+    np.testing.assert_array_equal(res["ts"], cols["ts"])
+    assert (res["turbidity"][40:60] == -1.0).all()
+    np.testing.assert_array_equal(res["turbidity"][:40], cols["turbidity"][:40].astype(np.float32))
+
+
+@pytest.mark.parametrize("level", ["1min", "1h", "1d"])
+def test_rollups_match_raw(archive, level):
+    cols = make_columns(3 * 8640)    # 3 days at one reading per 10 s
+    archive.append(cols)
+    bucket_s = sensor_archive.LEVELS[level][0]
+    res = archive.query("site", 0, T0 + 4 * DAY_S, level=level, fields=["ph", "tds"])
+    buckets = np.floor(cols["ts"] / bucket_s)
+    np.testing.assert_array_equal(res["ts"], np.unique(buckets) * bucket_s)
+    for field in ("ph", "tds"):
+        raw = cols[field].astype(np.float32).astype(np.float64)
+        for i, b in enumerate(np.unique(buckets)[:50]):
+            v = raw[(buckets == b) & ~np.isnan(raw)]
+            assert res[f"{field}_count"][i] == len(v)
+            assert res[f"{field}_min"][i] == np.float32(v.min())
+            assert res[f"{field}_max"][i] == np.float32(v.max())
+            assert res[f"{field}_mean"][i] == pytest.approx(v.mean(), rel=1e-5)
+
+
+def test_query_stays_within_max_points(archive):
+    archive.append(make_columns(30 * 864, step_s=100.0))     # 30 days
+    # 864 readings a day: raw fits 1000 points for a day, not for a week
+    for days, points, level in [(1, 1000, "raw"), (7, 1000, "1h"), (7, 7000, "raw"),
+                                (30, 800, "1h"), (30, 20, "1d")]:
+        res = archive.query("site", T0, T0 + days * DAY_S, max_points=points)
+        assert res["level"] == level
+        if level != "1d":
+            assert len(res["ts"]) <= points
+
+
+def test_failed_rewrite_keeps_the_old_chunk(archive, monkeypatch):
+    cols = make_columns(50)
+    archive.append(cols)
+    update = {k: v[:10].copy() for k, v in cols.items()}
+    update["tds"][:] = 0.0
+
+    def crash(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(sensor_archive.os, "replace", crash)
+    with pytest.raises(OSError):
+        archive.append(update)
+    monkeypatch.undo()
+    res = archive.query("site", T0, T0 + DAY_S, level="raw", fields=["tds"])
+    np.testing.assert_array_equal(res["tds"], cols["tds"].astype(np.float32))
@@ -0,0 +1,71 @@
+"""
+Shared-memory scoring on the models_dir models gives exactly the arrays of
+an in-process app.predict_packed call, for any worker count and slicing,
+and the arrays of the flat engine when slices go through sklearn.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from binary_frames import RESPONSE_FIELDS
+from plant_schema import FEATURE_COLS
+from shared_scoring import ScoringExecutor, SharedArrays, load_app
+
+ROWS = 700
+
+
+@pytest.fixture(scope="module")
+def expected(models_cwd):
+    from serve import sample_designs
+
+    designs = pd.DataFrame(sample_designs(ROWS, np.random.default_rng(7)))
+    X = designs[FEATURE_COLS].to_numpy(dtype=np.float64)
+    return X, load_app().predict_packed(X, "flag")
+
+
+@pytest.mark.parametrize("workers,capacity,slice_rows", [(1, 300, 64), (2, 300, 64),
+                                                         (3, 1000, 128), (2, 1000, None)])
+def test_matches_in_process_predict_packed(expected, workers, capacity, slice_rows):
+    X, want = expected
+    with ScoringExecutor(workers, capacity=capacity, slice_rows=slice_rows) as ex:
+        got = ex.score(X)
+    for name, _, _ in RESPONSE_FIELDS:
+        np.testing.assert_array_equal(got[name], want[name], err_msg=name)
+
+
+def sklearn_loaded() -> bool:
+    return load_app().SKLEARN_ENGINE._models is not None
+
+
+def test_large_slices_use_the_sklearn_engine(expected, monkeypatch):
+    X, want = expected
+    app = load_app()
+    # Forked workers inherit the lowered threshold: each 350-row share goes to sklearn
+    monkeypatch.setattr(app, "SKLEARN_MIN_ROWS", 300)
+    with ScoringExecutor(2, capacity=1000) as ex:
+        assert ex.slice_length(ROWS) == 350
+        got = ex.score(X)
+        assert all(ex.pool.submit(sklearn_loaded).result() for _ in range(2))
+    for name, _, _ in RESPONSE_FIELDS:
+        if got[name].dtype.kind == "f":
+            np.testing.assert_allclose(got[name], want[name], rtol=1e-6, err_msg=name)
+        else:
+            np.testing.assert_array_equal(got[name], want[name], err_msg=name)
+
+
+def test_buffers_are_reused_across_batches(expected):
+    X, want = expected
+    with ScoringExecutor(2, capacity=256, slice_rows=100, slots=2) as ex:
+        batches = [ex.submit(X[i:i + 256]) for i in range(0, ROWS, 256)]
+        cost = np.concatenate([b.result()["cost"] for b in batches])
+        assert sorted(ex.free) == [0, 1]
+    np.testing.assert_array_equal(cost, want["cost"])
+
+
+def test_attached_arrays_share_memory():
+    with SharedArrays.create({"x": ((4, 3), "<f8")}) as owner:
+        view = SharedArrays.attach(owner.spec)
+        view["x"][1] = [1.0, 2.0, 3.0]
+        np.testing.assert_array_equal(owner["x"][1], [1.0, 2.0, 3.0])
+        view.close()
@@ -0,0 +1,62 @@
+"""
+Large batches scored by the sklearn estimators (app.row_blocks) give the
+flat engine's answers on the models_dir models.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from plant_schema import FEATURE_COLS
+from shared_scoring import load_app
+
+ROWS = 600
+
+
+@pytest.fixture(scope="module")
+def app(models_cwd):
+    return load_app()
+
+
+@pytest.fixture(scope="module")
+def designs(app):
+    from serve import sample_designs
+
+    df = pd.DataFrame(sample_designs(ROWS, np.random.default_rng(11)))
+    return df[FEATURE_COLS].to_numpy(dtype=np.float64)
+
+
+def test_row_blocks_split_by_engine(app, monkeypatch):
+    monkeypatch.setattr(app, "SKLEARN_MIN_ROWS", 300)
+    monkeypatch.setattr(app, "SKLEARN_BLOCK_ROWS", 500)
+    monkeypatch.setattr(app, "BLOCK_ROWS", 200)
+    assert list(app.row_blocks(1250)) == [
+        (0, 500, "sklearn"), (500, 1000, "sklearn"), (1000, 1200, "flat"), (1200, 1250, "flat"),
+    ]
+    assert list(app.row_blocks(299)) == [(0, 200, "flat"), (200, 299, "flat")]
+    assert {e for _, _, e in app.row_blocks(1250, quantiles=(0.5,))} == {"flat"}
+
+
+def test_sklearn_blocks_match_flat(app, designs, monkeypatch):
+    assert app.SKLEARN_ENGINE.available
+    flat = app.predict_packed(designs)
+    flat_rows = app.predict_designs(designs, top_k=2, min_probability=0.0)
+
+    monkeypatch.setattr(app, "SKLEARN_MIN_ROWS", 1)
+    sk = app.predict_packed(designs)
+    sk_rows = app.predict_designs(designs, top_k=2, min_probability=0.0)
+    assert app.SKLEARN_ENGINE._models is not None
+
+    for name in ("type", "equip", "ood", "cost_source"):
+        np.testing.assert_array_equal(sk[name], flat[name], err_msg=name)
+    for name in ("probability", "times", "cost"):
+        np.testing.assert_allclose(sk[name], flat[name], rtol=1e-6, err_msg=name)
+
+    def designs_of(results):
+        return [
+            [(r["predicted_type"], r["stage_equipment"])
+             for r in [res] + res.get("alternatives", [])]
+            for res in results
+        ]
+
+    assert designs_of(sk_rows) == designs_of(flat_rows)
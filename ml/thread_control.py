@@ -0,0 +1,103 @@
+"""
+Thread-count control for serving and batch jobs.
+
+Three layers can each start a pool per process, and with several service
+workers they multiply:
+  - sklearn forests: joblib threads from the n_jobs saved in the model
+    (train_all_models.py fits with n_jobs=-1 and now saves n_jobs=None);
+    load_model() overrides it at load time
+  - BLAS / OpenMP pools inside numpy and scipy: limit_native_threads()
+    (threadpoolctl when installed, else the *_NUM_THREADS variables,
+    which only take effect before numpy is imported)
+  - the API's own TYPE_POOL (app.py), sized from the thread budget
+
+configure_process() applies one budget per process from ML_THREADS and
+ML_CPUS (a CPU list like "0-3,8"), which serve.py sets for every worker.
+"""
+
+import os
+
+
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+
+
+def available_cpus() -> list:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_cpus(spec: str) -> list:
+    """"0-3,8" → [0, 1, 2, 3, 8]."""
+    cpus = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cpus.extend(range(int(lo), int(hi or lo) + 1))
+    return sorted(set(cpus))
+
+
+def format_cpus(cpus) -> str:
+    return ",".join(str(c) for c in cpus)
+
+
+# ---------------------- SKLEARN MODELS ----------------------
+
+def set_n_jobs(model, n_jobs):
+    """Set n_jobs on a fitted estimator and every nested estimator (MultiOutput*)."""
+    if hasattr(model, "n_jobs"):
+        model.n_jobs = n_jobs
+    for est in getattr(model, "estimators_", []) or []:
+        if hasattr(est, "estimators_") or hasattr(est, "n_jobs"):
+            set_n_jobs(est, n_jobs)
+    return model
+
+
+def load_model(path: str, n_jobs=1):
+    """joblib.load with the saved parallelism replaced (1 = no thread pool)."""
+    import joblib
+
+    return set_n_jobs(joblib.load(path), n_jobs)
+
+
+# ---------------------- NATIVE POOLS ----------------------
+
+_LIMITS = []
+
+
+def limit_native_threads(n: int) -> str:
+    """Cap BLAS/OpenMP pools of this process at n threads; returns the method used."""
+    try:
+        from threadpoolctl import threadpool_limits
+    except ImportError:
+        for var in THREAD_ENV_VARS:
+            os.environ[var] = str(n)
+        return "env"
+    _LIMITS.append(threadpool_limits(limits=n))  # kept alive: limits last for the process
+    return "threadpoolctl"
+
+
+def configure_process(threads: int = None, cpus=None) -> dict:
+    """
+    Apply ML_THREADS / ML_CPUS (or the arguments) to this process: CPU
+    affinity first, then native pools capped at the thread budget, which
+    defaults to the number of usable CPUs.
+    """
+    if cpus is None and os.environ.get("ML_CPUS"):
+        cpus = parse_cpus(os.environ["ML_CPUS"])
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    if threads is None:
+        threads = int(os.environ.get("ML_THREADS", "0")) or len(available_cpus())
+
+    method = limit_native_threads(threads)
+    return {"threads": threads, "cpus": format_cpus(available_cpus()), "native_limits": method}
@@ -19,40 +19,47 @@ from sklearn.multioutput import MultiOutputClassifier
 from sklearn.metrics import accuracy_score, mean_absolute_error
 import joblib
 
-
-# ---------------------- COMMON FEATURE COLUMNS ----------------------
-
-FEATURE_COLS = [
-    "pH",
-    "TDS_mgL",
-    "turbidity_NTU",
-    "BOD_mgL",
-    "COD_mgL",
-    "total_nitrogen_mgL",
-    "temperature_C",
-    "flow_m3_day",
-    "heavy_metals",
-]
+from feature_envelope import ENVELOPE_PATH, compute_envelopes, save_envelopes
+from incremental_train import STATE_PATH, initial_state, save_state
+from thread_control import set_n_jobs
+from plant_schema import (
+    FEATURE_COLS,
+    TYPE_IDS,
+    PLANT_TYPES,
+    CSV_BY_TYPE,
+    TIME_COLS_BY_TYPE,
+    EQUIP_COLS_BY_TYPE,
+    ALL_TYPES_CSV,
+    TYPE_COL,
+    COST_COL,
+    compact_classes,
+    encode_equipment,
+    save_equipment_vocab,
+    validate_design_frame,
+)
+
+
+N_ESTIMATORS = 400  # trees per forest (tests/conftest.py trains tiny ones)
 
 
 # ---------------------- 1. TYPE CLASSIFIER (1–5) ----------------------
 
-def train_type_classifier():
+def train_type_classifier(n_estimators: int = N_ESTIMATORS):
     print("\n=== Training TYPE classifier (1–5) ===")
-    df_all = pd.read_csv("synthetic_designs_all_types.csv")
+    df_all = pd.read_csv(ALL_TYPES_CSV)
 
     # Filter to rows that have type and all features (should be all rows)
-    df_all = df_all.dropna(subset=["type"] + FEATURE_COLS)
+    df_all = df_all.dropna(subset=[TYPE_COL] + FEATURE_COLS)
 
     X = df_all[FEATURE_COLS]
-    y_type = df_all["type"].astype(int)
+    y_type = df_all[TYPE_COL].astype(int)
 
     X_train, X_test, y_train, y_test = train_test_split(
         X, y_type, test_size=0.2, random_state=42, stratify=y_type
     )
 
     clf = RandomForestClassifier(
-        n_estimators=400,
+        n_estimators=n_estimators,
         random_state=42,
         n_jobs=-1
     )
@@ -63,7 +70,9 @@ def train_type_classifier():
     acc = accuracy_score(y_test, y_pred)
     print(f"Type classifier accuracy: {acc:.3f}")
 
-    joblib.dump(clf, "model_type_classifier.joblib")
+    # Fitted on all cores, saved single-threaded: loaders pick their own
+    # parallelism (thread_control.load_model)
+    joblib.dump(set_n_jobs(clf, None), "model_type_classifier.joblib")
     print("Saved: model_type_classifier.joblib")
 
 
@@ -74,11 +83,13 @@ def train_type_models(
     csv_path: str,
     time_cols: list,
     equip_cols: list,
-    cost_col: str = "cost_per_m3_inr",
+    cost_col: str = COST_COL,
+    n_estimators: int = N_ESTIMATORS,
 ):
     print(f"\n=== Training models for TYPE {type_id} from {csv_path} ===")
 
     df = pd.read_csv(csv_path)
+    validate_design_frame(df, type_id)
     # Basic cleaning: drop any rows with missing in inputs/outputs
     df = df.dropna(subset=FEATURE_COLS + time_cols + equip_cols + [cost_col])
 
@@ -92,7 +103,7 @@ def train_type_models(
     )
 
     time_model = RandomForestRegressor(
-        n_estimators=400,
+        n_estimators=n_estimators,
         random_state=42,
         n_jobs=-1
     )
@@ -104,11 +115,17 @@ def train_type_models(
     print(f"[Type {type_id}] Stage-time MAE (minutes): {mae_time:.2f}")
 
     time_model_path = f"model_type{type_id}_times.joblib"
-    joblib.dump(time_model, time_model_path)
+    joblib.dump(set_n_jobs(time_model, None), time_model_path)
     print(f"Saved: {time_model_path}")
 
     # ----- Equipment model (multi-output classification) -----
-    y_equip = df[equip_cols]
+    # Labels are trained as small integer codes (plant_schema vocabulary),
+    # so classes_ are uint8 arrays instead of per-tree object arrays.
+    y_equip = pd.DataFrame(
+        encode_equipment(type_id, df[equip_cols].values),
+        columns=equip_cols,
+        index=df.index,
+    )
 
     X_train_e, X_test_e, y_train_e, y_test_e = train_test_split(
         X, y_equip, test_size=0.2, random_state=42
@@ -116,13 +133,14 @@ def train_type_models(
 
     equip_model = MultiOutputClassifier(
         RandomForestClassifier(
-            n_estimators=400,
+            n_estimators=n_estimators,
             random_state=42,
             n_jobs=-1
         )
     )
 
     equip_model.fit(X_train_e, y_train_e)
+    compact_classes(equip_model)
     y_pred_e = equip_model.predict(X_test_e)
 
     print(f"[Type {type_id}] Equipment classification accuracies:")
@@ -132,7 +150,7 @@ def train_type_models(
         print(f"  {col}: {acc:.3f}")
 
     equip_model_path = f"model_type{type_id}_equipment.joblib"
-    joblib.dump(equip_model, equip_model_path)
+    joblib.dump(set_n_jobs(equip_model, None), equip_model_path)
     print(f"Saved: {equip_model_path}")
 
     # ----- Cost model (regression) -----
@@ -143,7 +161,7 @@ def train_type_models(
     )
 
     cost_model = RandomForestRegressor(
-        n_estimators=400,
+        n_estimators=n_estimators,
         random_state=42,
         n_jobs=-1
     )
@@ -155,148 +173,41 @@ def train_type_models(
     print(f"[Type {type_id}] Cost MAE (INR/m3): {mae_cost:.2f}")
 
     cost_model_path = f"model_type{type_id}_cost.joblib"
-    joblib.dump(cost_model, cost_model_path)
+    joblib.dump(set_n_jobs(cost_model, None), cost_model_path)
     print(f"Saved: {cost_model_path}")
 
 
 # ---------------------- MAIN ----------------------
 
-if __name__ == "__main__":
+def train_all(n_estimators: int = N_ESTIMATORS):
     # 1. Type classifier
-    train_type_classifier()
-
-    # 2. Per-type models
-
-    # ---- TYPE 1: Drinking / Potable ----
-    type1_time_cols = [
-        "t_screening_min",
-        "t_coag_floc_min",
-        "t_sedimentation_min",
-        "t_filtration_min",
-        "t_carbon_polishing_min",
-        "t_disinfection_min",
-    ]
-    type1_equip_cols = [
-        "equip_screening",
-        "equip_coag_floc",
-        "equip_sedimentation",
-        "equip_filtration",
-        "equip_carbon_polishing",
-        "equip_disinfection",
-    ]
-    train_type_models(
-        type_id=1,
-        csv_path="type1_potable_synthetic.csv",
-        time_cols=type1_time_cols,
-        equip_cols=type1_equip_cols,
-    )
+    train_type_classifier(n_estimators)
+
+    vocab = save_equipment_vocab()
+    print(f"\nSaved: equipment_vocab.json (version {vocab['version']})")
+
+    # 2. Per-type models (stage columns come from plant_schema)
+    for type_id in TYPE_IDS:
+        print(f"\n---- TYPE {type_id}: {PLANT_TYPES[type_id]['label']} ----")
+        train_type_models(
+            type_id=type_id,
+            csv_path=CSV_BY_TYPE[type_id],
+            time_cols=TIME_COLS_BY_TYPE[type_id],
+            equip_cols=EQUIP_COLS_BY_TYPE[type_id],
+            n_estimators=n_estimators,
+        )
 
-    # ---- TYPE 2: Domestic / Grey Water (STP) ----
-    type2_time_cols = [
-        "t_screening_min",
-        "t_oil_grease_min",
-        "t_equalization_min",
-        "t_coag_floc_min",
-        "t_primary_clarifier_min",
-        "t_aeration_min",
-        "t_secondary_clarifier_min",
-        "t_filtration_min",
-        "t_disinfection_min",
-    ]
-    type2_equip_cols = [
-        "equip_screening",
-        "equip_oil_grease",
-        "equip_equalization",
-        "equip_coag_floc",
-        "equip_primary_clarifier",
-        "equip_aeration",
-        "equip_secondary_clarifier",
-        "equip_filtration",
-        "equip_disinfection",
-    ]
-    train_type_models(
-        type_id=2,
-        csv_path="type2_domestic_synthetic.csv",
-        time_cols=type2_time_cols,
-        equip_cols=type2_equip_cols,
-    )
+    # 3. Feature envelopes the API checks requests against
+    envelopes = compute_envelopes({t: pd.read_csv(CSV_BY_TYPE[t]) for t in TYPE_IDS})
+    save_envelopes(envelopes)
+    print(f"\nSaved: {ENVELOPE_PATH} (version {envelopes['version']})")
 
-    # ---- TYPE 3: Recycle Grade (MBR) ----
-    type3_time_cols = [
-        "t_screening_min",
-        "t_grit_chamber_min",
-        "t_equalization_min",
-        "t_biological_reactor_min",
-        "t_mbr_min",
-        "t_activated_carbon_min",
-        "t_disinfection_min",
-    ]
-    type3_equip_cols = [
-        "equip_screening",
-        "equip_grit_chamber",
-        "equip_equalization",
-        "equip_biological_reactor",
-        "equip_mbr",
-        "equip_activated_carbon",
-        "equip_disinfection",
-    ]
-    train_type_models(
-        type_id=3,
-        csv_path="type3_recycle_mbr_synthetic.csv",
-        time_cols=type3_time_cols,
-        equip_cols=type3_equip_cols,
-    )
+    # 4. Rows + holdout the models were trained on (incremental_train.py)
+    save_state(initial_state())
+    print(f"Saved: {STATE_PATH}")
 
-    # ---- TYPE 4: Industrial Effluent ----
-    type4_time_cols = [
-        "t_screening_min",
-        "t_neutralization_min",
-        "t_precipitation_min",
-        "t_heavy_metal_removal_min",
-        "t_filter_press_min",
-        "t_carbon_filter_min",
-        "t_ro_min",
-    ]
-    type4_equip_cols = [
-        "equip_screening",
-        "equip_neutralization",
-        "equip_precipitation",
-        "equip_heavy_metal_removal",
-        "equip_filter_press",
-        "equip_carbon_filter",
-        "equip_ro",
-    ]
-    train_type_models(
-        type_id=4,
-        csv_path="type4_industrial_synthetic.csv",
-        time_cols=type4_time_cols,
-        equip_cols=type4_equip_cols,
-    )
+    print("\n✅ All models trained and saved.")
 
-    # ---- TYPE 5: High Organic Load ----
-    type5_time_cols = [
-        "t_screening_min",
-        "t_anaerobic_reactor_min",
-        "t_biogas_handling_min",
-        "t_aeration_min",
-        "t_secondary_clarifier_min",
-        "t_sludge_handling_min",
-        "t_tertiary_filtration_min",
-    ]
-    type5_equip_cols = [
-        "equip_screening",
-        "equip_anaerobic_reactor",
-        "equip_biogas_handling",
-        "equip_aeration",
-        "equip_secondary_clarifier",
-        "equip_sludge_handling",
-        "equip_tertiary_filtration",
-    ]
-    train_type_models(
-        type_id=5,
-        csv_path="type5_high_organic_synthetic.csv",
-        time_cols=type5_time_cols,
-        equip_cols=type5_equip_cols,
-    )
 
-    print("\n✅ All models trained and saved.")
+if __name__ == "__main__":
+    train_all()